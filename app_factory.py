@@ -1,6 +1,8 @@
 from datetime import datetime
 from flask import Flask, render_template, request, jsonify
 from config import Config
+from core.pubsub import init_pubsub
+from core.request_cache import init_request_memo
 from extensions import db, login_manager
 
 
@@ -13,6 +15,8 @@ def _build_base_app(config_class, config_overrides):
     db.init_app(app)
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
+    init_request_memo(app)
+    init_pubsub(app)
 
     @login_manager.user_loader
     def load_user(user_id):
@@ -148,6 +152,13 @@ def _migrate_add_columns():
         "ALTER TABLE course_schedules ADD COLUMN cancelled_at TIMESTAMP",
         "ALTER TABLE course_schedules ADD COLUMN cancel_reason TEXT",
         "ALTER TABLE course_schedules ADD COLUMN cancelled_by_user_id INTEGER REFERENCES users(id)",
+        "ALTER TABLE course_schedules ADD COLUMN feedback_pending BOOLEAN DEFAULT 0 NOT NULL",
+        "ALTER TABLE course_schedules ADD COLUMN legacy_enrollment_id INTEGER",
+        "ALTER TABLE schedule_import_runs ADD COLUMN progress_stage TEXT",
+        "ALTER TABLE schedule_import_runs ADD COLUMN progress_done INTEGER DEFAULT 0 NOT NULL",
+        "ALTER TABLE schedule_import_runs ADD COLUMN progress_total INTEGER DEFAULT 0 NOT NULL",
+        "ALTER TABLE schedule_import_runs ADD COLUMN started_at TIMESTAMP",
+        "ALTER TABLE schedule_import_runs ADD COLUMN finished_at TIMESTAMP",
         "ALTER TABLE student_profiles ADD COLUMN excluded_dates TEXT",
         "ALTER TABLE users ADD COLUMN teacher_work_mode TEXT DEFAULT 'part_time'",
         "ALTER TABLE users ADD COLUMN default_working_template_json TEXT",
@@ -184,6 +195,17 @@ def _migrate_add_columns():
             db.session.commit()
         except Exception:
             db.session.rollback()
+    _migrate_add_indexes()
+
+
+def _migrate_add_indexes():
+    """幂等地补建模型里声明的索引（create_all 不会给已存在的表补索引）"""
+    for table in db.metadata.sorted_tables:
+        for index in sorted(table.indexes, key=lambda item: item.name or ''):
+            try:
+                index.create(bind=db.engine, checkfirst=True)
+            except Exception:
+                db.session.rollback()
 
 
 def _init_data():
@@ -206,8 +228,12 @@ def _init_data():
 
 
 def _cleanup_expired():
-    """Placeholder expired-record cleanup; kept as a hook for shared startup wiring."""
-    return None
+    """启动时清理过期记录：上次进程退出时没跑完的课表导入任务记为失败。"""
+    from modules.oa.services import fail_abandoned_schedule_import_runs
+
+    failed = fail_abandoned_schedule_import_runs(stale_after_seconds=0)
+    if failed:
+        print(f"已将 {failed} 个中断的课表导入任务标记为失败")
 
 
 def _backfill_schedule_links():
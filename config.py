@@ -51,6 +51,17 @@ class Config:
     SMS_REMINDER_LEAD_MINUTES = int(os.environ.get('SMS_REMINDER_LEAD_MINUTES', '120') or 120)
     SMS_REMINDER_SCAN_WINDOW_MINUTES = int(os.environ.get('SMS_REMINDER_SCAN_WINDOW_MINUTES', '10') or 10)
     SCF_REMINDER_JOB_TOKEN = os.environ.get('SCF_REMINDER_JOB_TOKEN', '')
+    SCF_WORKFLOW_JOB_TOKEN = os.environ.get('SCF_WORKFLOW_JOB_TOKEN', '')
+    # 删除关联对象、新建流程待办后，过期流程待办的关闭放到提交后的后台线程里执行
+    SCF_WORKFLOW_RECONCILE_ASYNC = os.environ.get('SCF_WORKFLOW_RECONCILE_ASYNC', '1').strip().lower() in {'1', 'true', 'yes', 'on'}
+    SCF_SCHEDULING_JOB_TOKEN = os.environ.get('SCF_SCHEDULING_JOB_TOKEN', '')
+    # OpenClaw 快照提醒：数据变更后由后台线程增量刷新，轮询时超过该秒数再整体重算一次兜底
+    SCF_REMINDER_SYNC_ASYNC = os.environ.get('SCF_REMINDER_SYNC_ASYNC', '1').strip().lower() in {'1', 'true', 'yes', 'on'}
+    SCF_REMINDER_RESYNC_SECONDS = int(os.environ.get('SCF_REMINDER_RESYNC_SECONDS', '900') or 900)
+    # 课表 Excel 导入放到后台线程执行，上传接口立即返回导入任务，前端轮询进度
+    SCF_SCHEDULE_IMPORT_ASYNC = os.environ.get('SCF_SCHEDULE_IMPORT_ASYNC', '1').strip().lower() in {'1', 'true', 'yes', 'on'}
+    # 导入任务开始后超过该秒数仍未结束、且不在本进程执行中，视为已中断记为失败
+    SCF_SCHEDULE_IMPORT_STALE_SECONDS = int(os.environ.get('SCF_SCHEDULE_IMPORT_STALE_SECONDS', '1800') or 1800)
     TENCENT_MEETING_ENABLED = os.environ.get('TENCENT_MEETING_ENABLED', '').strip().lower() in {'1', 'true', 'yes', 'on'}
     TENCENT_MEETING_API_HOST = os.environ.get('TENCENT_MEETING_API_HOST', 'https://api.meeting.qq.com')
     TENCENT_MEETING_APP_ID = os.environ.get('TENCENT_MEETING_APP_ID', '')
@@ -73,8 +84,19 @@ class Config:
     COURSE_FEEDBACK_AI_PROVIDER = os.environ.get('COURSE_FEEDBACK_AI_PROVIDER', 'zhipu')
     FEEDBACK_SHARE_LINK_TTL_DAYS = int(os.environ.get('FEEDBACK_SHARE_LINK_TTL_DAYS', '30') or 30)
 
+    # 服务端推送（聊天长轮询）的频道状态后端，目前只有进程内的 local
+    SCF_PUBSUB_BACKEND = os.environ.get('SCF_PUBSUB_BACKEND', 'local')
+    # 同时挂起的聊天长轮询上限，超出的请求立即返回并让前端稍后再查，避免占满 gunicorn 线程
+    SCF_CHAT_LONG_POLL_MAX_WAITERS = int(os.environ.get('SCF_CHAT_LONG_POLL_MAX_WAITERS', '4') or 4)
+
     # 代码执行配置
     CODE_EXECUTION_TIMEOUT = 5  # 秒
+    CODE_SANDBOX_WORKERS = int(os.environ.get('CODE_SANDBOX_WORKERS', '0') or 0)  # 0 表示按 CPU 核数
+    CODE_SANDBOX_MAX_RUNS = int(os.environ.get('CODE_SANDBOX_MAX_RUNS', '50') or 50)
+    CODE_SANDBOX_MEMORY_MB = int(os.environ.get('CODE_SANDBOX_MEMORY_MB', '256') or 256)
+    CODE_SANDBOX_OUTPUT_LIMIT = int(os.environ.get('CODE_SANDBOX_OUTPUT_LIMIT', str(64 * 1024)) or 64 * 1024)
+    # C 编译产物缓存目录，留空表示 SCF_RUNTIME_ROOT/c_binaries；必须只有运行用户可写
+    C_BINARY_CACHE_DIR = os.environ.get('C_BINARY_CACHE_DIR', '')
 
     # AI 提供商密钥 (从环境变量读取)
     DEEPSEEK_API_KEY = os.environ.get('DEEPSEEK_API_KEY', '')
@@ -107,3 +129,6 @@ class TestingConfig(Config):
     SCF_AUTO_BACKFILL_SCHEDULE_LINKS = False
     SCF_AUTO_CLEANUP_EXPIRED = False
     SCF_RUN_ONCE_MIGRATIONS = False
+    SCF_SCHEDULE_IMPORT_ASYNC = False
+    SCF_REMINDER_SYNC_ASYNC = False
+    SCF_WORKFLOW_RECONCILE_ASYNC = False
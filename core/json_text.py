@@ -0,0 +1,80 @@
+"""JSON documents stored in Text columns.
+
+`loads` uses orjson when it is installed and falls back to the standard
+library for anything orjson rejects (NaN literals, oversized integers).
+`dumps` keeps the standard library format so stored text stays byte-for-byte
+compatible with rows written before.
+
+`JsonTextMixin` gives models a per-instance decoded cache: a column is parsed
+once for as long as its raw text stays the same object/value in the identity
+map; assigning new text (or reloading a changed row) invalidates it.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+_CACHE_ATTR = '_json_text_cache'
+_INVALID = object()
+
+
+def loads(text):
+    if orjson is not None:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            if not isinstance(text, (str, bytes, bytearray)):
+                raise TypeError(f'JSON text must be str, not {type(text).__name__}') from None
+    return json.loads(text)
+
+
+def dumps(value):
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _decode(raw, expect):
+    try:
+        value = loads(raw)
+    except (TypeError, ValueError):
+        return _INVALID
+    if expect is not None and not isinstance(value, expect):
+        return _INVALID
+    return value
+
+
+class JsonTextMixin:
+    """Typed access to Text columns holding JSON.
+
+    - `json_view()` returns the cached decoded value, shared by every caller;
+      treat it as read-only (payload builders, serializers).
+    - `json_copy()` returns a freshly decoded value the caller may mutate.
+    - `set_json()` serializes once and assigns the column, so the usual
+      attribute history marks the row dirty for the next flush.
+    """
+
+    def json_view(self, column, default=None, *, expect=None):
+        raw = getattr(self, column)
+        if not raw:
+            return default
+        cache = self.__dict__.get(_CACHE_ATTR)
+        if cache is None:
+            cache = self.__dict__[_CACHE_ATTR] = {}
+        cached = cache.get((column, expect))
+        if cached is not None and (cached[0] is raw or cached[0] == raw):
+            value = cached[1]
+        else:
+            value = _decode(raw, expect)
+            cache[(column, expect)] = (raw, value)
+        return default if value is _INVALID else value
+
+    def json_copy(self, column, default=None, *, expect=None):
+        raw = getattr(self, column)
+        if not raw:
+            return default
+        value = _decode(raw, expect)
+        return default if value is _INVALID else value
+
+    def set_json(self, column, value):
+        setattr(self, column, None if value is None else dumps(value))
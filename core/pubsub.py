@@ -0,0 +1,113 @@
+"""Channel state broker for server-push endpoints.
+
+A channel holds the latest published state (a small dict) plus a version
+number that grows on every publish. Long-poll handlers read the state from
+memory and block in `wait()` until the version moves. An idle client
+therefore costs no database queries.
+
+`LocalBroker` keeps channels in process memory, which fits the single
+gunicorn worker deployment. Another backend (Redis, for example) only has to
+implement the `ChannelBroker` methods. It is selected with the
+`SCF_PUBSUB_BACKEND` setting.
+"""
+import threading
+
+
+class ChannelBroker:
+    """Interface every broker backend implements."""
+
+    def get(self, channel):
+        """Return (version, state) for a channel, or None when nothing was published yet."""
+        raise NotImplementedError
+
+    def seed(self, channel, state):
+        """Store an initial state unless one exists; returns the current (version, state)."""
+        raise NotImplementedError
+
+    def publish(self, channel, state):
+        """Replace the channel state, bump its version and wake waiters."""
+        raise NotImplementedError
+
+    def publish_if_version(self, channel, expected_version, state):
+        """Publish only while the channel is still at `expected_version` (None: not created yet).
+
+        Readers that reload a stale channel use this so a publish that lands during
+        the reload is not overwritten. Returns the new version, or None when the
+        channel moved on in the meantime.
+        """
+        raise NotImplementedError
+
+    def invalidate_all(self):
+        """Publish an empty state to every known channel so readers reload it."""
+        raise NotImplementedError
+
+    def wait(self, channel, version, timeout):
+        """Block until the channel version differs from `version` or `timeout` seconds pass.
+
+        Returns the current (version, state), or None if the channel is unknown.
+        """
+        raise NotImplementedError
+
+
+class LocalBroker(ChannelBroker):
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._channels = {}
+
+    def get(self, channel):
+        with self._condition:
+            return self._channels.get(channel)
+
+    def seed(self, channel, state):
+        with self._condition:
+            return self._channels.setdefault(channel, (0, dict(state)))
+
+    def publish(self, channel, state):
+        with self._condition:
+            version = self._channels.get(channel, (0, None))[0] + 1
+            self._channels[channel] = (version, dict(state))
+            self._condition.notify_all()
+            return version
+
+    def publish_if_version(self, channel, expected_version, state):
+        with self._condition:
+            current = self._channels.get(channel)
+            if (current[0] if current is not None else None) != expected_version:
+                return None
+            return self.publish(channel, state)
+
+    def invalidate_all(self):
+        with self._condition:
+            for channel, (version, _) in list(self._channels.items()):
+                self._channels[channel] = (version + 1, {})
+            self._condition.notify_all()
+
+    def wait(self, channel, version, timeout):
+        def _changed():
+            current = self._channels.get(channel)
+            return current is not None and current[0] != version
+
+        with self._condition:
+            if timeout > 0:
+                self._condition.wait_for(_changed, timeout)
+            return self._channels.get(channel)
+
+
+_BACKENDS = {
+    'local': LocalBroker,
+}
+_EXTENSION_KEY = 'scf_pubsub'
+
+
+def init_pubsub(app):
+    backend = (app.config.get('SCF_PUBSUB_BACKEND') or 'local').strip().lower()
+    if backend not in _BACKENDS:
+        raise ValueError(f'Unknown SCF_PUBSUB_BACKEND: {backend}')
+    app.extensions[_EXTENSION_KEY] = _BACKENDS[backend]()
+
+
+def get_broker(app=None):
+    """The app's broker, or None when `init_pubsub` was not called."""
+    from flask import current_app
+
+    return (app or current_app).extensions.get(_EXTENSION_KEY)
@@ -0,0 +1,141 @@
+"""Request-scoped memoization for service helpers.
+
+Results live on `flask.g` for the duration of one request. Each helper
+declares the tables it reads; a flush or bulk statement drops only the
+entries whose tables were written, so lookups that a write cannot affect
+(the teacher record while a todo is updated, for instance) survive the
+autoflushes in between. Helpers that declare no tables are dropped on any
+write. Commit and rollback clear the memo outright. Outside a request
+(CLI, background jobs) helpers run uncached.
+"""
+import copy
+import functools
+
+from flask import g, has_app_context, has_request_context
+from sqlalchemy import event, inspect as sa_inspect
+from sqlalchemy.orm import Session
+
+_MEMO_ATTR = '_scf_request_memo'
+
+
+def init_request_memo(app):
+    """Clear the memo at the end of every request, even when the app context outlives it."""
+    app.teardown_request(lambda exc: clear_request_memo())
+
+
+def clear_request_memo():
+    if has_app_context():
+        g.pop(_MEMO_ATTR, None)
+
+
+def invalidate_request_memo(tables=None):
+    """Drop memo entries that read any of `tables`; None drops everything."""
+    if not has_app_context():
+        return
+    memo = g.get(_MEMO_ATTR)
+    if not memo:
+        return
+    if tables is None:
+        memo.clear()
+        return
+    tables = set(tables)
+    for slot in [slot for slot, (_, depends) in memo.items() if depends is None or depends & tables]:
+        memo.pop(slot, None)
+
+
+def _session_has_pending_changes():
+    from extensions import db
+
+    session = db.session
+    return bool(session.new or session.deleted or session.dirty)
+
+
+def _memo_usable():
+    return has_request_context() and not _session_has_pending_changes()
+
+
+def request_memoized(key=None, *, tables=None, copy_result=False):
+    """Memoize a helper per request.
+
+    :param key: callable building a hashable cache key from the call arguments;
+        returning None skips the cache for that call. Defaults to the raw arguments.
+    :param tables: names of the tables the helper reads. Entries are dropped
+        when a flush or bulk statement writes one of them; without it they are
+        dropped on every write.
+    :param copy_result: return a deep copy of the cached value, for helpers whose
+        callers may mutate the result (plans, templates, payload dicts).
+
+    Calls made while the session holds unflushed changes bypass the cache, the
+    same way autoflush would have made the underlying query see them.
+    The wrapper's `prime({cache_key: value})` stores results a caller loaded in
+    bulk, so list endpoints can fill the memo with one query per batch.
+    """
+    depends = frozenset(tables) if tables is not None else None
+
+    def decorator(func):
+        name = f'{func.__module__}.{func.__qualname__}'
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _memo_usable():
+                return func(*args, **kwargs)
+            try:
+                cache_key = key(*args, **kwargs) if key else (args, tuple(sorted(kwargs.items())))
+                hash(cache_key)
+            except TypeError:
+                cache_key = None
+            if cache_key is None:
+                return func(*args, **kwargs)
+
+            memo = g.setdefault(_MEMO_ATTR, {})
+            slot = (name, cache_key)
+            if slot in memo:
+                value = memo[slot][0]
+            else:
+                value = func(*args, **kwargs)
+                memo[slot] = (value, depends)
+            return copy.deepcopy(value) if copy_result else value
+
+        def prime(values):
+            if not _memo_usable():
+                return
+            memo = g.setdefault(_MEMO_ATTR, {})
+            for cache_key, value in values.items():
+                memo[(name, cache_key)] = (value, depends)
+
+        wrapper.uncached = func
+        wrapper.prime = prime
+        return wrapper
+
+    return decorator
+
+
+def _flushed_tables(session):
+    tables = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        tables.update(table.name for table in sa_inspect(obj).mapper.tables)
+    return tables
+
+
+@event.listens_for(Session, 'after_flush')
+def _invalidate_memo_after_flush(session, flush_context):
+    invalidate_request_memo(_flushed_tables(session))
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _invalidate_memo_after_bulk_write(orm_execute_state):
+    if orm_execute_state.is_select:
+        return
+    table = getattr(orm_execute_state.statement, 'table', None)
+    name = getattr(table, 'name', None)
+    invalidate_request_memo([name] if name else None)
+
+
+@event.listens_for(Session, 'after_commit')
+def _clear_memo_after_commit(session):
+    clear_request_memo()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _clear_memo_after_rollback(session):
+    clear_request_memo()
@@ -1,5 +1,8 @@
 # Gunicorn configuration
 bind = "0.0.0.0:5000"
 workers = 1
+# Chat long-polls (/auth/api/chat/updates) park a thread for up to 25s; at most
+# SCF_CHAT_LONG_POLL_MAX_WAITERS (default 4) wait at once, the rest stay free for normal requests
+threads = 8
 timeout = 600  # 10 minutes - needed for slow AI API calls (especially dual-model)
 graceful_timeout = 300  # Grace period for worker shutdown
@@ -37,6 +37,11 @@ def run_once_migrations():
         _mark_applied('oa_schedule_delivery_sms_v3')
         print('[migration] OA 线上线下 / 会议占位 / 报名默认上课方式回填完成')
 
+    if not _is_applied('schedule_feedback_pending_v1'):
+        _backfill_schedule_feedback_pending()
+        _mark_applied('schedule_feedback_pending_v1')
+        print('[migration] 待交课后反馈课次集合回填完成')
+
 
 # ========== 基础设施 ==========
 
@@ -80,6 +85,12 @@ def _backfill_schedule_semantics():
     backfill_schedule_semantics()
 
 
+def _backfill_schedule_feedback_pending():
+    from modules.auth.services import backfill_schedule_feedback_pending
+
+    backfill_schedule_feedback_pending()
+
+
 def _backfill_schedule_delivery_sms_v3():
     # 兜底：即使被单独调用，也先补齐 Enrollment 的 v4 列，避免 ORM 查询旧库时缺列。
     _backfill_enrollment_ai_scheduling_v4()
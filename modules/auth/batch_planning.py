@@ -0,0 +1,128 @@
+"""待排课报名的批量重算。
+
+`refresh_enrollment_scheduling_ai_state` 平时由请求逐个触发，每次单独读取老师和学生
+的占用。批量任务改为：
+- 一次读入所有 `pending_schedule` 报名涉及的老师、学生在规划期内的占用，所有报名
+  共用这份快照；
+- 按优先级依次排：冲刺交付在前，其次目标完成日早的，最后按报名先后；
+- 每个报名算出推荐方案后，把方案课次记进快照，后面的报名自动避开这些时段，
+  紧急的报名先占到容量；
+- 每排完 `chunk_size` 个报名提交一次。提交时不让已加载的对象过期，快照在整个
+  任务期间保持可用。
+
+入口有两个：内部任务接口 `/oa/api/internal/enrollments/replan/run`，以及命令行脚本
+`scripts/replan_pending_enrollments.py`。
+"""
+from datetime import date, timedelta
+
+from sqlalchemy.orm import selectinload
+
+from extensions import db
+
+
+DEFAULT_CHUNK_SIZE = 20
+
+
+class _ReservedSession:
+    """推荐方案里的一节课。只写进共享占用快照，不落库。"""
+
+    id = None
+    is_cancelled = False
+
+    def __init__(self, enrollment, session):
+        self.date = date.fromisoformat(session['date'])
+        self.time_start = session['time_start']
+        self.time_end = session['time_end']
+        self.teacher_id = enrollment.teacher_id
+        self.teacher = enrollment.teacher.display_name if enrollment.teacher else None
+        self.enrollment_id = enrollment.id
+        self.enrollment = enrollment
+        self.student_profile_id_snapshot = enrollment.student_profile_id
+        self.course_name = enrollment.course_name
+        self.students = enrollment.student_name
+
+
+def _replan_priority_key(enrollment):
+    return (
+        0 if enrollment.delivery_urgency == 'rush' else 1,
+        enrollment.target_finish_date or date.max,
+        enrollment.id,
+    )
+
+
+def _load_shared_occupancy(enrollments, today):
+    from modules.auth.plan_search import plan_horizon_weeks
+    from modules.auth.services import _get_total_sessions, _load_student_excluded_dates
+    from modules.oa.schedule_conflicts import ScheduleOccupancy
+
+    horizon_weeks = max(
+        plan_horizon_weeks(
+            _get_total_sessions(enrollment),
+            max(int(enrollment.sessions_per_week or 1), 1),
+            _load_student_excluded_dates(enrollment.student_profile),
+        )
+        for enrollment in enrollments
+    )
+    return ScheduleOccupancy.load(
+        date_start=today,
+        date_end=today + timedelta(weeks=horizon_weeks),
+        teacher_ids=[enrollment.teacher_id for enrollment in enrollments],
+        teacher_names=[enrollment.teacher.display_name for enrollment in enrollments if enrollment.teacher],
+        student_profile_ids=[enrollment.student_profile_id for enrollment in enrollments],
+    )
+
+
+def replan_pending_enrollments(*, enrollment_ids=None, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False):
+    """按优先级重算待排课报名的候选池、推荐方案和风险评估，返回每个报名的结果摘要。"""
+    from modules.auth.models import Enrollment
+    from modules.auth.services import get_business_today, refresh_enrollment_scheduling_ai_state
+
+    query = Enrollment.query.filter(Enrollment.status == 'pending_schedule').options(
+        selectinload(Enrollment.teacher),
+        selectinload(Enrollment.student_profile),
+    )
+    if enrollment_ids is not None:
+        # 显式传入空列表表示一个都不处理，不能退化成全部待排课报名
+        query = query.filter(Enrollment.id.in_(enrollment_ids))
+    enrollments = sorted(query.all(), key=_replan_priority_key)
+    result = {'replanned': 0, 'recommended': 0, 'committed_chunks': 0, 'enrollments': []}
+    if dry_run:
+        result['dry_run'] = True
+    if not enrollments:
+        return result
+
+    chunk_size = max(int(chunk_size or DEFAULT_CHUNK_SIZE), 1)
+    occupancy = _load_shared_occupancy(enrollments, get_business_today())
+    session = db.session()
+    expire_on_commit = session.expire_on_commit
+    session.expire_on_commit = False
+    try:
+        for position, enrollment in enumerate(enrollments, start=1):
+            state = refresh_enrollment_scheduling_ai_state(enrollment, occupancy=occupancy)
+            bundle = state['recommended_bundle']
+            if bundle:
+                for planned_session in bundle.get('session_dates') or []:
+                    occupancy.track(_ReservedSession(enrollment, planned_session))
+            risk_assessment = state['risk_assessment'] or {}
+            result['enrollments'].append({
+                'enrollment_id': enrollment.id,
+                'has_recommendation': bool(bundle),
+                'date_end': bundle.get('date_end') if bundle else None,
+                'recommended_action': risk_assessment.get('recommended_action'),
+            })
+            result['replanned'] += 1
+            result['recommended'] += 1 if bundle else 0
+            if not dry_run and position % chunk_size == 0:
+                session.commit()
+                result['committed_chunks'] += 1
+        if dry_run:
+            session.rollback()
+        elif len(enrollments) % chunk_size:
+            session.commit()
+            result['committed_chunks'] += 1
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.expire_on_commit = expire_on_commit
+    return result
@@ -4,12 +4,24 @@ from sqlalchemy import or_, and_, func
 from extensions import db
 from modules.auth import auth_bp
 from modules.auth.models import User, ChatMessage
+from modules.auth.chat_services import (
+    chat_long_poll_slot,
+    current_chat_state,
+    mark_chat_users_changed,
+    wait_for_chat_state,
+)
 from modules.auth.services import (
     serialize_business_datetime,
     user_can_access_chat_history,
     user_can_chat_with,
 )
 
+CHAT_UPDATES_MAX_WAIT_SECONDS = 25
+CHAT_UPDATES_BUSY_RETRY_SECONDS = 5
+CHAT_UPDATES_MAX_MESSAGES = 100
+CHAT_HISTORY_PAGE_SIZE = 50
+CHAT_HISTORY_MAX_PAGE_SIZE = 200
+
 
 def _build_chat_message_payload(message):
     return {
@@ -38,50 +50,56 @@ def chat_page():
     return render_template('auth/chat.html')
 
 
+def _chat_partner_expression(uid):
+    return db.case((ChatMessage.sender_id == uid, ChatMessage.receiver_id), else_=ChatMessage.sender_id)
+
+
+def _conversation_summary_rows(uid):
+    """一次查询取出每个会话的最新消息、对方用户和未读数，按最新消息时间倒序。"""
+    partner_id = _chat_partner_expression(uid)
+    ranked = db.session.query(
+        ChatMessage.id.label('message_id'),
+        partner_id.label('partner_id'),
+        func.row_number().over(
+            partition_by=partner_id,
+            order_by=(ChatMessage.created_at.desc(), ChatMessage.id.desc()),
+        ).label('rank'),
+        func.sum(
+            db.case((and_(ChatMessage.receiver_id == uid, ChatMessage.is_read == False), 1), else_=0)
+        ).over(partition_by=partner_id).label('unread'),
+    ).filter(
+        or_(ChatMessage.sender_id == uid, ChatMessage.receiver_id == uid),
+    ).subquery()
+
+    return db.session.query(ChatMessage, User, ranked.c.unread).join(
+        ranked, ranked.c.message_id == ChatMessage.id,
+    ).join(
+        User, User.id == ranked.c.partner_id,
+    ).filter(
+        ranked.c.rank == 1,
+        User.id != uid,
+    ).order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).all()
+
+
 @auth_bp.route('/api/chat/conversations')
 @login_required
 def api_chat_conversations():
-    """获取当前用户的会话列表（最近消息的对方用户）"""
-    uid = current_user.id
-
-    # 找到所有和当前用户有消息往来的用户
-    partner_ids = db.session.query(
-        func.distinct(
-            db.case(
-                (ChatMessage.sender_id == uid, ChatMessage.receiver_id),
-                else_=ChatMessage.sender_id
-            )
-        )
-    ).filter(
-        or_(ChatMessage.sender_id == uid, ChatMessage.receiver_id == uid)
-    ).all()
+    """获取当前用户的会话列表（最近消息的对方用户）
 
+    有消息往来本身就满足 `user_can_access_chat_history`，列表里不再逐个校验。
+    """
     conversations = []
-    for (pid,) in partner_ids:
-        partner = db.session.get(User, pid)
-        if not partner or not user_can_access_chat_history(current_user, partner):
-            continue
-        # 最新一条消息
-        last_msg = ChatMessage.query.filter(
-            or_(
-                and_(ChatMessage.sender_id == uid, ChatMessage.receiver_id == pid),
-                and_(ChatMessage.sender_id == pid, ChatMessage.receiver_id == uid),
-            )
-        ).order_by(ChatMessage.created_at.desc()).first()
-        # 未读数
-        unread = ChatMessage.query.filter_by(
-            sender_id=pid, receiver_id=uid, is_read=False).count()
+    for last_msg, partner, unread in _conversation_summary_rows(current_user.id):
+        unread = int(unread or 0)
         conversations.append({
-            'user_id': pid,
+            'user_id': partner.id,
             'display_name': partner.display_name,
             'role': partner.role,
-            'last_message': last_msg.content[:50] if last_msg else '',
-            'last_time': serialize_business_datetime(last_msg.created_at) if last_msg else None,
+            'last_message': last_msg.content[:50],
+            'last_time': serialize_business_datetime(last_msg.created_at),
             'unread': unread,
             'unread_count': unread,
         })
-
-    conversations.sort(key=lambda c: c['last_time'] or '', reverse=True)
     return jsonify({'success': True, 'data': conversations})
 
 
@@ -112,21 +130,50 @@ def api_chat_messages():
     if not user_can_access_chat_history(current_user, partner):
         return jsonify({'success': False, 'error': '无权查看该会话'}), 403
 
+    before_id = request.args.get('before_id', type=int)
+    after_id = request.args.get('after_id', type=int)
+    if before_id and after_id:
+        return jsonify({'success': False, 'error': 'before_id 和 after_id 不能同时使用'}), 400
+    limit = min(max(request.args.get('limit', default=CHAT_HISTORY_PAGE_SIZE, type=int), 1), CHAT_HISTORY_MAX_PAGE_SIZE)
+
     uid = current_user.id
-    messages = ChatMessage.query.filter(
+    query = ChatMessage.query.filter(
         or_(
             and_(ChatMessage.sender_id == uid, ChatMessage.receiver_id == partner_id),
             and_(ChatMessage.sender_id == partner_id, ChatMessage.receiver_id == uid),
         )
-    ).order_by(ChatMessage.created_at.asc()).limit(200).all()
-
-    # 标记对方发的消息为已读
-    ChatMessage.query.filter_by(
-        sender_id=partner_id, receiver_id=uid, is_read=False
-    ).update({'is_read': True})
-    db.session.commit()
-
-    return jsonify({'success': True, 'data': [_build_chat_message_payload(m) for m in messages]})
+    )
+    if after_id:
+        # 增量拉取：只取游标之后的新消息，按时间正序
+        messages = query.filter(ChatMessage.id > after_id).order_by(ChatMessage.id.asc()).limit(limit + 1).all()
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+    else:
+        # 默认取最新一页；before_id 向前翻更早的消息
+        if before_id:
+            query = query.filter(ChatMessage.id < before_id)
+        messages = query.order_by(ChatMessage.id.desc()).limit(limit + 1).all()
+        has_more = len(messages) > limit
+        messages = messages[:limit][::-1]
+
+    # 提交会让消息过期，先序列化
+    payload = [_build_chat_message_payload(m) for m in messages]
+    if not before_id:
+        # 标记对方发的消息为已读，一条 UPDATE 完成
+        marked = ChatMessage.query.filter_by(
+            sender_id=partner_id, receiver_id=uid, is_read=False
+        ).update({'is_read': True}, synchronize_session=False)
+        if marked:
+            mark_chat_users_changed(uid)
+            db.session.commit()
+
+    return jsonify({
+        'success': True,
+        'data': payload,
+        'has_more': has_more,
+        'oldest_id': payload[0]['id'] if payload else None,
+        'newest_id': payload[-1]['id'] if payload else None,
+    })
 
 
 @auth_bp.route('/api/chat/send', methods=['POST'])
@@ -165,12 +212,44 @@ def api_chat_send():
 @auth_bp.route('/api/chat/unread-count')
 @login_required
 def api_chat_unread_count():
-    unread_messages = ChatMessage.query.filter_by(
-        receiver_id=current_user.id, is_read=False
-    ).all()
-    count = 0
-    for message in unread_messages:
-        sender = db.session.get(User, message.sender_id)
-        if sender and user_can_access_chat_history(current_user, sender):
-            count += 1
-    return jsonify({'success': True, 'count': count})
+    _, state = current_chat_state(current_user.id)
+    return jsonify({'success': True, 'count': state['unread_count']})
+
+
+@auth_bp.route('/api/chat/updates')
+@login_required
+def api_chat_updates():
+    """长轮询：有比 since_id 更新的消息或未读数变化时立即返回，否则最多等待 timeout 秒。
+
+    不传 since_id 时只返回当前状态（最新消息 id、未读数），用来初始化游标或刷新角标。
+    长轮询名额已满时不等待，直接返回当前状态并带上 retry_after，前端按它退避后再查。
+    """
+    uid = current_user.id
+    since_id = request.args.get('since_id', type=int)
+    timeout = min(max(request.args.get('timeout', default=0, type=float), 0), CHAT_UPDATES_MAX_WAIT_SECONDS)
+
+    version, state = current_chat_state(uid)
+    retry_after = None
+    if since_id is not None and state['last_id'] <= since_id and timeout > 0:
+        with chat_long_poll_slot() as acquired:
+            if acquired:
+                # 等待期间不占用数据库连接
+                db.session.close()
+                version, state = wait_for_chat_state(uid, version, timeout)
+            else:
+                retry_after = CHAT_UPDATES_BUSY_RETRY_SECONDS
+
+    messages = []
+    if since_id is not None and state['last_id'] > since_id:
+        messages = ChatMessage.query.filter(
+            or_(ChatMessage.sender_id == uid, ChatMessage.receiver_id == uid),
+            ChatMessage.id > since_id,
+        ).order_by(ChatMessage.id.asc()).limit(CHAT_UPDATES_MAX_MESSAGES).all()
+    data = {
+        'messages': [_build_chat_message_payload(message) for message in messages],
+        'last_id': messages[-1].id if len(messages) == CHAT_UPDATES_MAX_MESSAGES else state['last_id'],
+        'unread_count': state['unread_count'],
+    }
+    if retry_after is not None:
+        data['retry_after'] = retry_after
+    return jsonify({'success': True, 'data': data})
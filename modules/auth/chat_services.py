@@ -0,0 +1,136 @@
+"""站内聊天的推送状态：每个用户一个频道，记录最新消息 id 和未读数。
+
+聊天消息新增、修改或删除后，会话提交时把涉及用户的频道标记为过期。
+下一个读取方从数据库重算一次并发布，长轮询的等待方随之被唤醒；
+没有变化时读取频道只走内存，空闲客户端不产生数据库查询。
+"""
+import threading
+from contextlib import contextmanager
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, or_
+from sqlalchemy.orm import Session
+
+from core.pubsub import get_broker
+from extensions import db
+from modules.auth.models import ChatMessage, User
+
+_PENDING_USERS = 'scf_chat_pending_users'
+_ALL_USERS = object()
+_RELOAD_ATTEMPTS = 3
+_LONG_POLL_SLOTS_KEY = 'scf_chat_long_poll_slots'
+_LONG_POLL_SLOTS_LOCK = threading.Lock()
+
+
+def chat_channel(user_id):
+    return f'chat:user:{user_id}'
+
+
+def count_unread_chat_messages(user_id):
+    # 未读消息的发送人和当前用户必然有往来，只需排除已删除的发送人
+    return db.session.query(func.count(ChatMessage.id)).join(
+        User, User.id == ChatMessage.sender_id,
+    ).filter(
+        ChatMessage.receiver_id == user_id,
+        ChatMessage.is_read == False,
+        ChatMessage.sender_id != user_id,
+    ).scalar() or 0
+
+
+def _load_chat_state(user_id):
+    last_id = db.session.query(func.max(ChatMessage.id)).filter(
+        or_(ChatMessage.sender_id == user_id, ChatMessage.receiver_id == user_id),
+    ).scalar()
+    return {'last_id': last_id or 0, 'unread_count': count_unread_chat_messages(user_id)}
+
+
+def current_chat_state(user_id):
+    """
+    返回 (version, state)；频道没有状态或已过期时从数据库重算并发布。
+
+    重算期间如果又有提交把频道标记为过期，版本号会变，这次的结果已经不是最新的：
+    只在版本没变时才发布，否则重新读取。一直被并发提交打断时直接返回数据库结果，
+    频道保持过期，留给下一个读取方。
+    """
+    broker = get_broker()
+    channel = chat_channel(user_id)
+    for _ in range(_RELOAD_ATTEMPTS):
+        entry = broker.get(channel)
+        if entry is not None and entry[1]:
+            return entry
+        expected_version = entry[0] if entry is not None else None
+        state = _load_chat_state(user_id)
+        version = broker.publish_if_version(channel, expected_version, state)
+        if version is not None:
+            return version, state
+    return (entry[0] if entry is not None else 0), state
+
+
+def wait_for_chat_state(user_id, version, timeout):
+    """阻塞到频道版本变化或超时，返回最新的 (version, state)。"""
+    get_broker().wait(chat_channel(user_id), version, timeout)
+    return current_chat_state(user_id)
+
+
+@contextmanager
+def chat_long_poll_slot():
+    """
+    占用一个长轮询名额，拿到时 yield True，名额已满时立即 yield False 不等待。
+
+    每个挂起的长轮询都占着一个请求线程，名额上限（SCF_CHAT_LONG_POLL_MAX_WAITERS）
+    保证多开几个聊天页也不会把 AI、导入等普通请求的线程占满。
+    """
+    app = current_app._get_current_object()
+    with _LONG_POLL_SLOTS_LOCK:
+        slots = app.extensions.get(_LONG_POLL_SLOTS_KEY)
+        if slots is None:
+            slots = threading.BoundedSemaphore(max(int(app.config.get('SCF_CHAT_LONG_POLL_MAX_WAITERS') or 0), 1))
+            app.extensions[_LONG_POLL_SLOTS_KEY] = slots
+    acquired = slots.acquire(blocking=False)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            slots.release()
+
+
+def mark_chat_users_changed(*user_ids, session=None):
+    """批量 UPDATE 不经过 flush 事件，调用方用它登记受影响的用户。"""
+    session = session or db.session
+    session.info.setdefault(_PENDING_USERS, set()).update(user_id for user_id in user_ids if user_id)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_chat_users(session, flush_context):
+    user_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, ChatMessage):
+            user_ids.update((obj.sender_id, obj.receiver_id))
+    if user_ids:
+        mark_chat_users_changed(*user_ids, session=session)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _flag_bulk_chat_delete(orm_execute_state):
+    if not orm_execute_state.is_delete:
+        return
+    if any(mapper.class_ is ChatMessage for mapper in orm_execute_state.all_mappers):
+        orm_execute_state.session.info.setdefault(_PENDING_USERS, set()).add(_ALL_USERS)
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_chat_changes(session):
+    user_ids = session.info.pop(_PENDING_USERS, None)
+    broker = get_broker() if user_ids and has_app_context() else None
+    if broker is None:
+        return
+    if _ALL_USERS in user_ids:
+        broker.invalidate_all()
+        return
+    for user_id in user_ids:
+        broker.publish(chat_channel(user_id), {})
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_chat_changes(session):
+    session.info.pop(_PENDING_USERS, None)
@@ -18,8 +18,9 @@ from modules.auth.services import (
     _normalize_excluded_dates_entries,
     _validate_available_slot_entries,
     _validate_excluded_dates_entries,
-    _linked_schedule_query,
     build_enrollment_payload,
+    build_enrollment_payloads,
+    build_enrollment_progress_map,
     build_leave_request_payload,
     create_enrollment_record,
     delete_enrollment_hard,
@@ -27,7 +28,6 @@ from modules.auth.services import (
     find_matching_slots,
     get_accessible_enrollment_query,
     get_business_now,
-    get_business_today,
     process_leave_request_decision,
     preview_availability_intake,
     propose_enrollment_schedule,
@@ -121,7 +121,7 @@ def api_list_enrollments():
     enrollments = query.order_by(Enrollment.created_at.desc()).all()
     return jsonify({
         'success': True,
-        'data': [build_enrollment_payload(enrollment, current_user) for enrollment in enrollments],
+        'data': build_enrollment_payloads(enrollments, current_user),
     })
 
 
@@ -267,6 +267,27 @@ def api_match_slots(enrollment_id):
         return jsonify({'success': False, 'error': f'匹配失败: {str(exc)}'}), 500
 
 
+@auth_bp.route('/api/enrollments/timetable/preview', methods=['POST'])
+@role_required('admin')
+def api_preview_enrollment_timetable():
+    from modules.auth.timetable_optimizer import DEFAULT_ALTERNATIVES, preview_enrollment_timetable
+
+    data = request.get_json(silent=True) or {}
+    enrollment_ids = data.get('enrollment_ids')
+    if enrollment_ids is not None and (
+        not isinstance(enrollment_ids, list)
+        or not all(isinstance(item, int) and not isinstance(item, bool) for item in enrollment_ids)
+    ):
+        return jsonify({'success': False, 'error': 'enrollment_ids 必须是报名 id 列表'}), 400
+    try:
+        alternatives = int(data.get('alternatives') or DEFAULT_ALTERNATIVES)
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'alternatives 必须是整数'}), 400
+
+    result = preview_enrollment_timetable(enrollment_ids=enrollment_ids, alternatives=alternatives)
+    return jsonify({'success': True, 'data': result})
+
+
 @auth_bp.route('/api/enrollments/<int:enrollment_id>/confirm', methods=['POST'])
 @role_required('admin')
 def api_confirm_slot(enrollment_id):
@@ -499,33 +520,7 @@ def api_enrollments_progress():
         Enrollment.status.in_(['confirmed', 'active', 'completed'])
     ).all()
 
-    today = get_business_today()
-    progress_map = {}
-
-    for enrollment in enrollments:
-        total_sessions = int(enrollment.total_hours / enrollment.hours_per_session) if enrollment.total_hours and enrollment.hours_per_session else 0
-        if total_sessions == 0:
-            continue
-
-        schedules = _linked_schedule_query(enrollment.id).order_by(
-            CourseSchedule.date,
-            CourseSchedule.time_start,
-        ).all()
-        if not schedules:
-            continue
-
-        for index, schedule in enumerate(schedules, 1):
-            is_ending = index > max(total_sessions - 3, 0)
-            progress_map[schedule.id] = {
-                'session_number': index,
-                'total': total_sessions,
-                'is_ending': is_ending,
-                'completed': schedule.date < today,
-                'delivered': bool(schedule.feedback and schedule.feedback.status == 'submitted'),
-                'course_name': enrollment.course_name,
-                'student_name': enrollment.student_name,
-            }
-
+    progress_map = build_enrollment_progress_map(enrollments)
     return jsonify({'success': True, 'data': progress_map})
 
 
@@ -1,6 +1,5 @@
 """External auth-domain API routes (enrollments, student profiles, leave requests, teacher availability)."""
 import json
-from datetime import date
 
 from flask import request, send_file
 
@@ -9,6 +8,7 @@ from modules.auth import auth_bp
 from modules.auth.models import Enrollment, LeaveRequest, StudentProfile, TeacherAvailability, User
 from modules.auth.services import (
     build_enrollment_payload,
+    build_enrollment_progress_map,
     create_enrollment_record,
     delete_enrollment_hard,
     export_enrollment_schedule_xlsx,
@@ -268,34 +268,13 @@ def external_delete_enrollment(enrollment_id):
 @auth_bp.route('/api/external/enrollments/progress', methods=['GET'])
 @external_api_required
 def external_enrollment_progress():
-    today = date.today()
-    progress_map = {}
-
     enrollments = Enrollment.query.filter(
         Enrollment.status.in_(['confirmed', 'active'])
     ).all()
-    for enrollment in enrollments:
-        if not enrollment.total_hours or not enrollment.hours_per_session:
-            continue
-        total_sessions = int(enrollment.total_hours / enrollment.hours_per_session)
-        if total_sessions <= 0:
-            continue
-
-        schedules = CourseSchedule.query.filter(
-            CourseSchedule.teacher == (enrollment.teacher.display_name if enrollment.teacher else ''),
-            CourseSchedule.course_name == enrollment.course_name,
-            CourseSchedule.students.contains(enrollment.student_name),
-        ).order_by(CourseSchedule.date, CourseSchedule.time_start).all()
-
-        for index, schedule in enumerate(schedules, 1):
-            progress_map[schedule.id] = {
-                'session_number': index,
-                'total': total_sessions,
-                'is_ending': index > max(total_sessions - 3, 0),
-                'completed': schedule.date < today,
-                'course_name': enrollment.course_name,
-                'student_name': enrollment.student_name,
-            }
+    progress_map = {
+        schedule_id: {key: value for key, value in item.items() if key != 'delivered'}
+        for schedule_id, item in build_enrollment_progress_map(enrollments).items()
+    }
 
     return external_success(progress_map)
 
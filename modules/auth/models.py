@@ -2,6 +2,8 @@ import json
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
+
+from core.json_text import JsonTextMixin
 from extensions import db
 
 
@@ -135,7 +137,7 @@ class TeacherAvailability(db.Model):
         }
 
 
-class Enrollment(db.Model):
+class Enrollment(JsonTextMixin, db.Model):
     """报名/签约记录"""
     __tablename__ = 'enrollments'
 
@@ -175,43 +177,6 @@ class Enrollment(db.Model):
     )
 
     def to_dict(self):
-        import json
-        proposed = []
-        if self.proposed_slots:
-            try:
-                proposed = json.loads(self.proposed_slots)
-            except (json.JSONDecodeError, TypeError):
-                pass
-        confirmed = None
-        if self.confirmed_slot:
-            try:
-                confirmed = json.loads(self.confirmed_slot)
-            except (json.JSONDecodeError, TypeError):
-                pass
-        availability_intake = None
-        if self.availability_intake:
-            try:
-                availability_intake = json.loads(self.availability_intake)
-            except (json.JSONDecodeError, TypeError):
-                pass
-        candidate_slot_pool = []
-        if self.candidate_slot_pool:
-            try:
-                candidate_slot_pool = json.loads(self.candidate_slot_pool)
-            except (json.JSONDecodeError, TypeError):
-                pass
-        recommended_bundle = None
-        if self.recommended_bundle:
-            try:
-                recommended_bundle = json.loads(self.recommended_bundle)
-            except (json.JSONDecodeError, TypeError):
-                pass
-        risk_assessment = None
-        if self.risk_assessment:
-            try:
-                risk_assessment = json.loads(self.risk_assessment)
-            except (json.JSONDecodeError, TypeError):
-                pass
         return {
             'id': self.id,
             'student_name': self.student_name,
@@ -229,12 +194,13 @@ class Enrollment(db.Model):
             'student_profile_id': self.student_profile_id,
             'delivery_preference': self.delivery_preference,
             'student_profile': self.student_profile.to_dict() if self.student_profile else None,
-            'proposed_slots': proposed,
-            'confirmed_slot': confirmed,
-            'availability_intake': availability_intake,
-            'candidate_slot_pool': candidate_slot_pool,
-            'recommended_bundle': recommended_bundle,
-            'risk_assessment': risk_assessment,
+            # 解析结果按实例缓存并在调用方之间共享，组装 payload 时只读不改
+            'proposed_slots': self.json_view('proposed_slots', []),
+            'confirmed_slot': self.json_view('confirmed_slot'),
+            'availability_intake': self.json_view('availability_intake'),
+            'candidate_slot_pool': self.json_view('candidate_slot_pool', []),
+            'recommended_bundle': self.json_view('recommended_bundle'),
+            'risk_assessment': self.json_view('risk_assessment'),
             'notes': self.notes,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
@@ -244,6 +210,9 @@ class Enrollment(db.Model):
 class LeaveRequest(db.Model):
     """请假申请"""
     __tablename__ = 'leave_requests'
+    __table_args__ = (
+        db.Index('ix_leave_requests_schedule_created', 'schedule_id', 'created_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     enrollment_id = db.Column(db.Integer, db.ForeignKey('enrollments.id'), nullable=True)
@@ -304,6 +273,10 @@ class LeaveRequest(db.Model):
 class ChatMessage(db.Model):
     """聊天消息"""
     __tablename__ = 'chat_messages'
+    __table_args__ = (
+        db.Index('ix_chat_messages_sender_receiver_id', 'sender_id', 'receiver_id', 'id'),
+        db.Index('ix_chat_messages_receiver_read_sender', 'receiver_id', 'is_read', 'sender_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     sender_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -420,8 +393,12 @@ class IntegrationActionLog(db.Model):
         }
 
 
-class ReminderEvent(db.Model):
+class ReminderEvent(JsonTextMixin, db.Model):
     __tablename__ = 'reminder_events'
+    __table_args__ = (
+        db.Index('ix_reminder_events_target_status_created', 'target_user_id', 'status', 'created_at'),
+        db.Index('ix_reminder_events_target_created_id', 'target_user_id', 'created_at', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     event_key = db.Column(db.String(255), unique=True, nullable=False)
@@ -449,19 +426,14 @@ class ReminderEvent(db.Model):
     )
 
     def get_payload_data(self):
-        if not self.payload_json:
-            return {}
-        try:
-            data = json.loads(self.payload_json)
-        except (TypeError, ValueError):
-            return {}
-        return data if isinstance(data, dict) else {}
+        return self.json_copy('payload_json', {}, expect=dict)
+
+    def get_payload_view(self):
+        """只读的已解析 payload，同一实例内只解析一次。"""
+        return self.json_view('payload_json', {}, expect=dict)
 
     def set_payload_data(self, value):
-        if value is None:
-            self.payload_json = None
-            return
-        self.payload_json = json.dumps(value, ensure_ascii=False)
+        self.set_json('payload_json', value)
 
     def to_dict(self):
         return {
@@ -475,7 +447,7 @@ class ReminderEvent(db.Model):
             'title': self.title,
             'summary': self.summary,
             'action_key': self.action_key,
-            'payload': self.get_payload_data(),
+            'payload': self.get_payload_view(),
             'status': self.status,
             'due_at': self.due_at.isoformat() if self.due_at else None,
             'source_request_id': self.source_request_id,
@@ -489,6 +461,7 @@ class ReminderDelivery(db.Model):
     __tablename__ = 'reminder_deliveries'
     __table_args__ = (
         db.UniqueConstraint('event_id', 'channel', 'receiver_external_id', name='uq_reminder_delivery_event_channel_receiver'),
+        db.Index('ix_reminder_deliveries_channel_status', 'channel', 'delivery_status'),
     )
 
     id = db.Column(db.Integer, primary_key=True)
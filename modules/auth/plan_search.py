@@ -0,0 +1,273 @@
+"""排课推荐方案的内存搜索。
+
+自动排课要在候选时段里挑出每周 N 个时段的组合。过去每个组合都要生成方案、
+再逐课次查老师和学生的冲突，组合一多就是几百次数据库往返。
+
+这里在搜索前一次性准备好所有数据：
+- 报名关联课次的 id，校验冲突时忽略它们；
+- 规划期内老师和学生的全部占用；
+- 学生的不可上课日期。
+每个候选时段按“第几周”生成两个位图：`excluded` 标记该周那天不可上课
+（课次顺延，不算错误），`blocked` 标记该周课次已过时或和现有课程冲突。
+组合的合法性和 `_collect_manual_plan_issues` 给出的错误口径一致，评估只做
+位运算和前缀和，不再访问数据库。
+
+搜索按 `_plan_sort_key` 做分支限界：
+- 前几周必然会用到的课次一旦冲突，这个候选直接剔除；
+- 同一天时间重叠、且必然在同一天上课的两个时段不会同时入选；
+- 已凑满前 N 个方案时，剩余候选的天数和评分上界都赢不了第 N 名的分支直接剪掉。
+"""
+from datetime import datetime, timedelta
+
+from modules.oa.schedule_conflicts import ScheduleOccupancy, time_to_minutes
+
+
+class PlanSearchSpace:
+    """一个报名的候选时段和占用位图；`best_combinations()` 返回最优的若干组时段。"""
+
+    def __init__(
+        self,
+        candidates,
+        *,
+        required_weekly,
+        total_sessions,
+        excluded_set,
+        today,
+        now,
+        occupancy,
+        conflict_owners,
+        ignore_schedule_ids=(),
+        target_finish_date=None,
+    ):
+        from modules.auth.services import _first_occurrence_on_or_after, _slot_signature, _slot_sort_key
+
+        self.candidates = list(candidates)
+        self.required_weekly = required_weekly
+        self.total_sessions = total_sessions
+        self.target_finish_date = target_finish_date
+        self.horizon = plan_horizon_weeks(total_sessions, required_weekly, excluded_set)
+        # 前 ceil(total / k) - 1 周里每个未被排除的课次都一定会用到
+        self.certain_weeks = max(-(-total_sessions // required_weekly) - 1, 0)
+
+        self._sort_keys = [_slot_sort_key(slot) for slot in self.candidates]
+        self._signatures = [_slot_signature(slot) for slot in self.candidates]
+        self._first_dates = [
+            _first_occurrence_on_or_after(slot['day_of_week'], today)
+            for slot in self.candidates
+        ]
+        self._excluded = []
+        self._blocked = []
+        self._available_before = []
+        ignore_ids = set(ignore_schedule_ids or ())
+        for slot, first_date in zip(self.candidates, self._first_dates):
+            start_time = datetime.strptime(slot['time_start'], '%H:%M').time()
+            excluded = blocked = 0
+            available_before = [0]
+            for week in range(self.horizon):
+                course_date = first_date + timedelta(weeks=week)
+                if course_date.isoformat() in excluded_set:
+                    excluded |= 1 << week
+                    available_before.append(available_before[-1])
+                    continue
+                available_before.append(available_before[-1] + 1)
+                conflicts = occupancy.find_conflicts(
+                    course_date,
+                    slot['time_start'],
+                    slot['time_end'],
+                    exclude_schedule_ids=ignore_ids,
+                    require_teacher=False,
+                    **conflict_owners,
+                )
+                if datetime.combine(course_date, start_time) < now or conflicts['teacher'] or conflicts['student']:
+                    blocked |= 1 << week
+            self._excluded.append(excluded)
+            self._blocked.append(blocked)
+            self._available_before.append(available_before)
+
+        certain_mask = (1 << self.certain_weeks) - 1
+        self._feasible = [
+            index for index in range(len(self.candidates))
+            if not self._blocked[index] & certain_mask
+        ]
+        self._overlapping_pairs = set()
+        self._certain_clashes = set()
+        for index, slot in enumerate(self.candidates):
+            for other in range(index + 1, len(self.candidates)):
+                other_slot = self.candidates[other]
+                if other_slot['day_of_week'] != slot['day_of_week']:
+                    continue
+                if not _minutes_overlap(slot, other_slot):
+                    continue
+                self._overlapping_pairs.add((index, other))
+                # 同一个星期几的日期相同，不可上课的周也相同
+                if ~self._excluded[index] & certain_mask:
+                    self._certain_clashes.add((index, other))
+
+    @classmethod
+    def for_enrollment(cls, enrollment, candidates, *, required_weekly, total_sessions, excluded_set, occupancy=None):
+        """一次读入规划期内老师和学生的占用，冲突口径同 `_collect_manual_plan_issues`。
+
+        传入 `occupancy` 时直接复用（批量排课的共享快照），报名关联课次按 id 忽略。
+        """
+        from modules.auth.services import _linked_schedule_ids, get_business_now
+        from modules.oa.models import CourseSchedule
+
+        now = get_business_now()
+        today = now.date()
+        ignore_ids = _linked_schedule_ids(enrollment.id) if enrollment.id else []
+        teacher_name = enrollment.teacher.display_name if enrollment.teacher else None
+        space_kwargs = {
+            'required_weekly': required_weekly,
+            'total_sessions': total_sessions,
+            'excluded_set': excluded_set,
+            'today': today,
+            'now': now,
+            'conflict_owners': {
+                'teacher_id': enrollment.teacher_id,
+                'teacher_name': teacher_name or '',
+                'enrollment_id': enrollment.id,
+                'student_profile_id': enrollment.student_profile_id,
+            },
+            'ignore_schedule_ids': ignore_ids,
+            'target_finish_date': getattr(enrollment, 'target_finish_date', None),
+        }
+        if not candidates or required_weekly > len(candidates):
+            return cls(candidates, occupancy=ScheduleOccupancy(), **space_kwargs)
+        if occupancy is not None:
+            return cls(candidates, occupancy=occupancy, **space_kwargs)
+
+        occupancy = ScheduleOccupancy.load(
+            date_start=today,
+            date_end=today + timedelta(weeks=plan_horizon_weeks(total_sessions, required_weekly, excluded_set)),
+            teacher_id=enrollment.teacher_id,
+            teacher_name=teacher_name,
+            student_profile_id=enrollment.student_profile_id,
+            filters=[~CourseSchedule.id.in_(ignore_ids)] if ignore_ids else (),
+        )
+        return cls(candidates, occupancy=occupancy, **space_kwargs)
+
+    def evaluate(self, combo):
+        """按 `_build_session_dates` 的顺序展开组合；不合法返回 None，否则返回方案排序键。
+
+        `combo` 是按 `_slot_sort_key` 排好序的候选下标。
+        """
+        total = self.total_sessions
+        available = self._available_before
+        if sum(available[index][self.horizon] for index in combo) < total:
+            return None
+
+        # 最后一周：已排课次数第一次达到总课次的那一周
+        low, high = 1, self.horizon
+        while low < high:
+            middle = (low + high) // 2
+            if sum(available[index][middle] for index in combo) >= total:
+                high = middle
+            else:
+                low = middle + 1
+        last_week = low - 1
+        remaining = total - sum(available[index][last_week] for index in combo)
+        final_slots = []
+        for index in combo:
+            if self._excluded[index] >> last_week & 1:
+                continue
+            final_slots.append(index)
+            if len(final_slots) == remaining:
+                break
+
+        full_weeks = (1 << last_week) - 1
+        for index in combo:
+            used = full_weeks | ((1 << last_week) if index in final_slots else 0)
+            if self._blocked[index] & used:
+                return None
+        for index, other in zip(combo, combo[1:]):
+            pair = (min(index, other), max(index, other))
+            if pair not in self._overlapping_pairs:
+                continue
+            if ~self._excluded[index] & full_weeks or (index in final_slots and other in final_slots):
+                return None
+
+        first_week = min(_lowest_clear_bit(self._excluded[index]) for index in combo)
+        first_index = next(index for index in combo if not self._excluded[index] >> first_week & 1)
+        date_start = self._first_dates[first_index] + timedelta(weeks=first_week)
+        date_end = self._first_dates[final_slots[-1]] + timedelta(weeks=last_week)
+        if self.target_finish_date and date_end > self.target_finish_date:
+            return None
+
+        slots = [self.candidates[index] for index in combo]
+        return (
+            ((date_end - date_start).days // 7 + 1) or 999,
+            -len({slot['day_of_week'] for slot in slots}),
+            -sum(slot.get('score', 0) for slot in slots),
+            sum(len(slot.get('conflicts', [])) for slot in slots),
+            tuple(self._signatures[index] for index in combo),
+        )
+
+    def best_combinations(self, limit=3):
+        """按 `_plan_sort_key` 从优到劣返回至多 `limit` 组时段（每组按 `_slot_sort_key` 排序）。"""
+        required = self.required_weekly
+        feasible = self._feasible
+        if limit <= 0 or required > len(feasible):
+            return []
+
+        scores = [self.candidates[index].get('score', 0) for index in feasible]
+        # best_tail[position][m]：从 position 起任选 m 个候选能拿到的最高评分
+        best_tail = []
+        for position in range(len(feasible) + 1):
+            tail = sorted(scores[position:], reverse=True)
+            sums = [0]
+            for value in tail[:required]:
+                sums.append(sums[-1] + value)
+            best_tail.append(sums)
+        weeks_floor = max(self.certain_weeks, 1)
+        best = []
+
+        def _visit(start, chosen, score, days):
+            need = required - len(chosen)
+            if not need:
+                combo = tuple(sorted(chosen, key=self._sort_keys.__getitem__))
+                key = self.evaluate(combo)
+                if key is not None and (len(best) < limit or key < best[-1][0]):
+                    best.append((key, combo))
+                    best.sort()
+                    del best[limit:]
+                return
+            for position in range(start, len(feasible) - need + 1):
+                index = feasible[position]
+                if any((min(index, other), max(index, other)) in self._certain_clashes for other in chosen):
+                    continue
+                next_score = score + scores[position]
+                next_days = days | {self.candidates[index]['day_of_week']}
+                if len(best) >= limit:
+                    tail = best_tail[position + 1]
+                    score_bound = next_score + tail[need - 1]
+                    days_bound = min(required, len(next_days) + need - 1)
+                    if (weeks_floor, -days_bound, -score_bound) > best[-1][0][:3]:
+                        continue
+                _visit(position + 1, chosen + [index], next_score, next_days)
+
+        _visit(0, [], 0, frozenset())
+        return [[self.candidates[index] for index in combo] for _, combo in best]
+
+
+def plan_horizon_weeks(total_sessions, required_weekly, excluded_set):
+    """位图要覆盖的周数。
+
+    上限和 `_build_session_dates` 的最长周数相同。k 个时段、E 个不可上课日期时，
+    第 ceil(total / k) + E 周之前一定能排满。
+    """
+    return min(
+        total_sessions + len(excluded_set) + 52,
+        -(-total_sessions // required_weekly) + len(excluded_set) + 1,
+    )
+
+
+def _minutes_overlap(slot, other):
+    start = time_to_minutes(slot['time_start'])
+    end = time_to_minutes(slot['time_end'])
+    other_start = time_to_minutes(other['time_start'])
+    other_end = time_to_minutes(other['time_end'])
+    return min(end, other_end) - max(start, other_start) >= 1
+
+
+def _lowest_clear_bit(mask):
+    return (~mask & (mask + 1)).bit_length() - 1
@@ -4,6 +4,7 @@ from datetime import date, datetime, timedelta
 
 from flask import jsonify, redirect, render_template, request
 from flask_login import current_user, login_user, login_required, logout_user
+from sqlalchemy import and_, func, or_
 
 from extensions import db
 from modules.auth import auth_bp
@@ -20,15 +21,15 @@ from modules.auth.services import (
     _teacher_identity_names,
     _teacher_schedule_identity_filter,
     _validate_available_slot_entries,
-    build_enrollment_payload,
+    build_enrollment_payloads,
     build_feedback_payload,
     build_leave_request_payload,
-    build_schedule_payload,
+    build_schedule_payloads,
     delete_student_user_hard,
     get_accessible_enrollment_query,
+    get_business_now,
     get_business_today,
     reject_enrollment_schedule,
-    schedule_requires_course_feedback,
     save_course_feedback,
     seed_staff_accounts,
     student_confirm_schedule,
@@ -531,27 +532,98 @@ def _rename_slot_validation_errors(errors, label):
     return [str(item).replace('可补课时段', label) for item in (errors or [])]
 
 
-def _annotate_pending_feedback_risk(payloads):
-    if not payloads:
-        return []
+ACTION_CENTER_PAGE_SIZE = 20
+ACTION_CENTER_MAX_PAGE_SIZE = 100
 
-    teacher_counts = {}
-    for item in payloads:
-        teacher_id = item.get('teacher_id')
-        if teacher_id is None:
-            continue
-        teacher_counts[teacher_id] = teacher_counts.get(teacher_id, 0) + 1
 
+def _action_center_page_limit(name):
+    limit = request.args.get(name, type=int) or ACTION_CENTER_PAGE_SIZE
+    return max(1, min(limit, ACTION_CENTER_MAX_PAGE_SIZE))
+
+
+def _started_pending_feedback_query():
+    """物化的待交反馈集合里已开课的课次，走 (feedback_pending, date, time_start) 索引。"""
+    now = get_business_now()
+    today = now.date()
+    return CourseSchedule.query.filter(
+        CourseSchedule.feedback_pending == True,
+        or_(
+            CourseSchedule.date < today,
+            and_(CourseSchedule.date == today, CourseSchedule.time_start <= now.strftime('%H:%M')),
+        ),
+    )
+
+
+def _annotate_pending_feedback_risk(schedules, base_query):
+    """老师维度的欠交计数用一次 GROUP BY 算出，和是否分页无关。"""
+    teacher_counts = dict(
+        base_query.with_entities(CourseSchedule.teacher_id, func.count(CourseSchedule.id))
+        .filter(CourseSchedule.teacher_id.isnot(None))
+        .group_by(CourseSchedule.teacher_id)
+        .all()
+    )
+    payloads = build_schedule_payloads(schedules, current_user)
     for item in payloads:
-        teacher_id = item.get('teacher_id')
-        item['missing_feedback_count_for_teacher_recent'] = teacher_counts.get(teacher_id, 0)
-        item['is_repeat_late_teacher'] = teacher_counts.get(teacher_id, 0) >= 2
+        count = teacher_counts.get(item.get('teacher_id'), 0)
+        item['missing_feedback_count_for_teacher_recent'] = count
+        item['is_repeat_late_teacher'] = count >= 2
         item['feedback_delay_days'] = max(int(item.get('feedback_delay_days') or 0), 0)
     return payloads
 
 
-def _exclude_approved_leave(payloads):
-    return [item for item in (payloads or []) if item.get('leave_status') != 'approved']
+def _build_pending_feedback_payloads():
+    """仪表盘用的完整待交反馈列表，整体按风险排序，不分页。"""
+    base_query = _started_pending_feedback_query()
+    schedules = base_query.order_by(
+        CourseSchedule.date.asc(),
+        CourseSchedule.time_start.asc(),
+        CourseSchedule.id.asc(),
+    ).all()
+    return _sort_action_items(_annotate_pending_feedback_risk(schedules, base_query))
+
+
+def _pending_feedback_page(*, cursor=None, limit=ACTION_CENTER_PAGE_SIZE):
+    """待交反馈按 (date, time_start, id) 升序做游标分页，最早欠交的排在前面。
+
+    游标格式为 `YYYY-MM-DD|HH:MM|id`，无法解析时从头开始。只用于按桶翻页的接口，
+    仪表盘拿的是 `_build_pending_feedback_payloads()` 的完整列表。
+    """
+    base_query = _started_pending_feedback_query()
+    query = base_query
+    cursor_parts = str(cursor or '').split('|')
+    if len(cursor_parts) == 3:
+        try:
+            cursor_date = date.fromisoformat(cursor_parts[0])
+            cursor_time = cursor_parts[1]
+            cursor_id = int(cursor_parts[2])
+        except ValueError:
+            pass
+        else:
+            query = query.filter(or_(
+                CourseSchedule.date > cursor_date,
+                and_(CourseSchedule.date == cursor_date, CourseSchedule.time_start > cursor_time),
+                and_(
+                    CourseSchedule.date == cursor_date,
+                    CourseSchedule.time_start == cursor_time,
+                    CourseSchedule.id > cursor_id,
+                ),
+            ))
+    schedules = query.order_by(
+        CourseSchedule.date.asc(),
+        CourseSchedule.time_start.asc(),
+        CourseSchedule.id.asc(),
+    ).limit(limit + 1).all()
+    has_more = len(schedules) > limit
+    schedules = schedules[:limit]
+
+    last = schedules[-1] if schedules else None
+    next_cursor = f'{last.date.isoformat()}|{last.time_start}|{last.id}' if has_more and last else None
+    return _sort_action_items(_annotate_pending_feedback_risk(schedules, base_query)), {
+        'limit': limit,
+        'total': base_query.count(),
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None,
+    }
 
 
 def _build_leave_case_payloads(actor):
@@ -565,6 +637,47 @@ def _build_leave_case_payloads(actor):
     return _sort_action_items(items)
 
 
+def _leave_case_page(actor, *, cursor=None, limit=ACTION_CENTER_PAGE_SIZE):
+    """请假案例按 (created_at, id) 倒序做游标分页，游标格式为 `ISO时间|id`。"""
+    base_query = LeaveRequest.query
+    query = base_query
+    cursor_parts = str(cursor or '').split('|')
+    if len(cursor_parts) == 2:
+        try:
+            cursor_created_at = datetime.fromisoformat(cursor_parts[0])
+            cursor_id = int(cursor_parts[1])
+        except ValueError:
+            pass
+        else:
+            query = query.filter(or_(
+                LeaveRequest.created_at < cursor_created_at,
+                and_(LeaveRequest.created_at == cursor_created_at, LeaveRequest.id < cursor_id),
+            ))
+    leave_requests = query.order_by(
+        LeaveRequest.created_at.desc(),
+        LeaveRequest.id.desc(),
+    ).limit(limit + 1).all()
+    has_more = len(leave_requests) > limit
+    leave_requests = leave_requests[:limit]
+
+    last = leave_requests[-1] if leave_requests else None
+    next_cursor = (
+        f'{last.created_at.isoformat()}|{last.id}'
+        if has_more and last and last.created_at else None
+    )
+    items = [build_leave_request_payload(item, actor) for item in leave_requests]
+    return _sort_action_items(items), {
+        'limit': limit,
+        'total': base_query.count(),
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None,
+    }
+
+
+def _exclude_approved_leave(payloads):
+    return [item for item in (payloads or []) if item.get('leave_status') != 'approved']
+
+
 def _teacher_students_summary(user):
     enrollments = get_accessible_enrollment_query(user).filter(
         Enrollment.status.in_(['confirmed', 'active', 'pending_student_confirm', 'pending_schedule'])
@@ -701,7 +814,7 @@ def teacher_dashboard():
 def api_teacher_my_schedule():
     start, end = _resolve_date_range(request.args.get('range', 'week'))
     schedules = _teacher_schedule_query(current_user, start, end).all()
-    payload_schedules = [build_schedule_payload(schedule, current_user) for schedule in schedules]
+    payload_schedules = build_schedule_payloads(schedules, current_user)
 
     enrollments = get_accessible_enrollment_query(current_user).filter(
         Enrollment.status.in_(['confirmed', 'active', 'pending_student_confirm', 'pending_schedule'])
@@ -723,16 +836,16 @@ def api_teacher_my_schedule():
 
     today = get_business_today()
     upcoming_end = today + timedelta(days=7)
-    upcoming = _exclude_approved_leave([
-        build_schedule_payload(schedule, current_user)
+    upcoming = _exclude_approved_leave(build_schedule_payloads([
+        schedule
         for schedule in _teacher_schedule_query(current_user, today, upcoming_end).all()
         if schedule.date and today <= schedule.date <= upcoming_end
-    ])
+    ], current_user))
     pending_feedback = [
-        payload for payload in [
-            build_schedule_payload(schedule, current_user)
-            for schedule in _teacher_schedule_query(current_user, end=today).all()
-        ]
+        payload for payload in build_schedule_payloads(
+            _teacher_schedule_query(current_user, end=today).all(),
+            current_user,
+        )
         if payload.get('next_action_status') == 'waiting_teacher_feedback'
     ]
 
@@ -813,18 +926,18 @@ def api_teacher_action_center():
         )
     ])
 
-    feedback_schedule_payloads = [
-        build_schedule_payload(schedule, current_user)
-        for schedule in _teacher_schedule_query(current_user, end=today).all()
-    ]
+    feedback_schedule_payloads = build_schedule_payloads(
+        _teacher_schedule_query(current_user, end=today).all(),
+        current_user,
+    )
     pending_feedback = _sort_action_items([
         item for item in feedback_schedule_payloads
         if item.get('next_action_status') == 'waiting_teacher_feedback'
     ])
-    upcoming_schedule_payloads = [
-        build_schedule_payload(schedule, current_user)
-        for schedule in _teacher_schedule_query(current_user, today, upcoming_end).all()
-    ]
+    upcoming_schedule_payloads = build_schedule_payloads(
+        _teacher_schedule_query(current_user, today, upcoming_end).all(),
+        current_user,
+    )
     upcoming_schedules = sorted(
         _exclude_approved_leave([
             item for item in upcoming_schedule_payloads
@@ -887,9 +1000,7 @@ def api_teacher_my_schedules_by_date():
         return error_response, status_code
 
     schedules = _teacher_schedule_query(current_user, start, end).all()
-    payloads = _exclude_approved_leave([
-        build_schedule_payload(schedule, current_user) for schedule in schedules
-    ])
+    payloads = _exclude_approved_leave(build_schedule_payloads(schedules, current_user))
     return jsonify({
         'success': True,
         'data': payloads,
@@ -939,20 +1050,19 @@ def api_student_my_info():
             CourseFeedback.submitted_at.desc(),
             CourseFeedback.updated_at.desc(),
         ).limit(3).all()
-        recent_feedbacks = [
-            build_schedule_payload(feedback.schedule, current_user)
-            for feedback in recent_feedback_rows
-            if feedback.schedule
-        ]
+        recent_feedbacks = build_schedule_payloads(
+            [feedback.schedule for feedback in recent_feedback_rows if feedback.schedule],
+            current_user,
+        )
 
     return jsonify({
         'success': True,
         'data': {
             'profile': _student_profile_payload(profile),
-            'schedules': [build_schedule_payload(schedule, current_user) for schedule in schedules],
-            'upcoming_schedules': [build_schedule_payload(schedule, current_user) for schedule in upcoming_schedules],
+            'schedules': build_schedule_payloads(schedules, current_user),
+            'upcoming_schedules': build_schedule_payloads(upcoming_schedules, current_user),
             'recent_feedbacks': recent_feedbacks,
-            'enrollments': [build_enrollment_payload(enrollment, current_user) for enrollment in enrollments],
+            'enrollments': build_enrollment_payloads(enrollments, current_user),
         }
     })
 
@@ -1006,12 +1116,12 @@ def api_student_action_center():
         and item.get('next_action_role') == 'student'
         and item.get('enrollment_id')
     }
-    enrollments = [
-        build_enrollment_payload(enrollment, current_user)
-        for enrollment in Enrollment.query.filter(
+    enrollments = build_enrollment_payloads(
+        Enrollment.query.filter(
             Enrollment.student_profile_id == profile.id
-        ).order_by(Enrollment.created_at.desc()).all()
-    ]
+        ).order_by(Enrollment.created_at.desc()).all(),
+        current_user,
+    )
     pending_enrollments = _sort_action_items([
         item for item in enrollments
         if (
@@ -1030,10 +1140,10 @@ def api_student_action_center():
         + [_build_scheduling_case_from_enrollment(item) for item in pending_enrollments]
     )
 
-    upcoming_schedules = [
-        build_schedule_payload(schedule, current_user)
-        for schedule in _student_schedule_query(current_user, today, today + timedelta(days=30)).limit(20).all()
-    ]
+    upcoming_schedules = build_schedule_payloads(
+        _student_schedule_query(current_user, today, today + timedelta(days=30)).limit(20).all(),
+        current_user,
+    )
     leave_requests = _sort_action_items([
         build_leave_request_payload(item, current_user)
         for item in LeaveRequest.query.join(
@@ -1075,8 +1185,6 @@ def api_student_action_center():
 def api_admin_action_center():
     from modules.auth.workflow_services import build_workflow_todo_payload, list_workflow_todos_for_user
 
-    today = get_business_today()
-
     workflow_todos = [
         build_workflow_todo_payload(todo, current_user)
         for todo in list_workflow_todos_for_user(current_user, status='open')
@@ -1107,19 +1215,22 @@ def api_admin_action_center():
         if item.get('todo_type') == OATodo.TODO_TYPE_ENROLLMENT_REPLAN and item.get('enrollment_id')
     }
 
-    pending_schedule_enrollments = _sort_action_items([
-        build_enrollment_payload(enrollment, current_user)
-        for enrollment in get_accessible_enrollment_query(current_user).filter(
+    pending_schedule_enrollments = _sort_action_items(build_enrollment_payloads(
+        get_accessible_enrollment_query(current_user).filter(
             Enrollment.status.in_(['pending_info', 'pending_schedule'])
-        ).order_by(Enrollment.updated_at.desc(), Enrollment.created_at.desc()).all()
-    ])
-    waiting_student_confirm_enrollments = _sort_action_items([
-        build_enrollment_payload(enrollment, current_user)
-        for enrollment in get_accessible_enrollment_query(current_user).filter(
-            Enrollment.status == 'pending_student_confirm'
-        ).order_by(Enrollment.updated_at.desc(), Enrollment.created_at.desc()).all()
-        if enrollment.id not in workflow_enrollment_ids
-    ])
+        ).order_by(Enrollment.updated_at.desc(), Enrollment.created_at.desc()).all(),
+        current_user,
+    ))
+    waiting_student_confirm_enrollments = _sort_action_items(build_enrollment_payloads(
+        [
+            enrollment
+            for enrollment in get_accessible_enrollment_query(current_user).filter(
+                Enrollment.status == 'pending_student_confirm'
+            ).order_by(Enrollment.updated_at.desc(), Enrollment.created_at.desc()).all()
+            if enrollment.id not in workflow_enrollment_ids
+        ],
+        current_user,
+    ))
     waiting_student_confirm_items = _sort_action_items(
         [
             {**item, 'kind': 'workflow_waiting_confirm'}
@@ -1136,17 +1247,8 @@ def api_admin_action_center():
             LeaveRequest.status == 'pending'
         ).order_by(LeaveRequest.created_at.desc()).all()
     ])
-    pending_feedback_schedules = _sort_action_items(_annotate_pending_feedback_risk([
-        build_schedule_payload(schedule, current_user)
-        for schedule in CourseSchedule.query.filter(
-            CourseSchedule.date <= today,
-            CourseSchedule.is_cancelled == False,
-        ).order_by(CourseSchedule.date.desc(), CourseSchedule.time_start.asc()).all()
-        if schedule_requires_course_feedback(schedule)
-        and _schedule_has_started(schedule)
-        and not (schedule.feedback and schedule.feedback.status == 'submitted')
-        and not (_latest_leave_request(schedule) and _latest_leave_request(schedule).status == 'approved')
-    ]))
+    # 仪表盘按完整列表渲染并提供审批操作，这两组不分页；按桶翻页见 api_admin_action_center_bucket
+    pending_feedback_schedules = _build_pending_feedback_payloads()
     leave_cases = _build_leave_case_payloads(current_user)
     scheduling_risk_cases = _build_admin_scheduling_risk_cases(
         pending_schedule_enrollments=pending_schedule_enrollments,
@@ -1201,6 +1303,21 @@ def api_admin_action_center():
     })
 
 
+@auth_bp.route('/api/admin/action-center/<bucket>')
+@role_required('admin')
+def api_admin_action_center_bucket(bucket):
+    """按桶翻页：只有随历史增长的待交反馈和请假案例需要游标。"""
+    cursor = request.args.get('cursor')
+    limit = _action_center_page_limit('limit')
+    if bucket == 'pending-feedback':
+        items, page = _pending_feedback_page(cursor=cursor, limit=limit)
+    elif bucket == 'leave-cases':
+        items, page = _leave_case_page(current_user, cursor=cursor, limit=limit)
+    else:
+        return jsonify({'success': False, 'error': '未知的待办分组'}), 404
+    return jsonify({'success': True, 'data': {'items': items, **page}})
+
+
 def _student_scheduling_cases_for_current_user():
     from modules.auth.workflow_services import build_workflow_todo_payload, list_workflow_todos_for_user
 
@@ -1219,12 +1336,12 @@ def _student_scheduling_cases_for_current_user():
         if item.get('todo_type') == OATodo.TODO_TYPE_ENROLLMENT_REPLAN
         and item.get('enrollment_id')
     }
-    enrollments = [
-        build_enrollment_payload(enrollment, current_user)
-        for enrollment in Enrollment.query.filter(
+    enrollments = build_enrollment_payloads(
+        Enrollment.query.filter(
             Enrollment.student_profile_id == profile.id
-        ).order_by(Enrollment.created_at.desc()).all()
-    ]
+        ).order_by(Enrollment.created_at.desc()).all(),
+        current_user,
+    )
     pending_enrollments = _sort_action_items([
         item for item in enrollments
         if (
@@ -1273,19 +1390,22 @@ def _admin_scheduling_cases_for_current_user():
         for item in workflow_todos
         if item.get('todo_type') == OATodo.TODO_TYPE_ENROLLMENT_REPLAN and item.get('enrollment_id')
     }
-    pending_schedule_enrollments = _sort_action_items([
-        build_enrollment_payload(enrollment, current_user)
-        for enrollment in get_accessible_enrollment_query(current_user).filter(
+    pending_schedule_enrollments = _sort_action_items(build_enrollment_payloads(
+        get_accessible_enrollment_query(current_user).filter(
             Enrollment.status.in_(['pending_info', 'pending_schedule'])
-        ).order_by(Enrollment.updated_at.desc(), Enrollment.created_at.desc()).all()
-    ])
-    waiting_student_confirm_enrollments = _sort_action_items([
-        build_enrollment_payload(enrollment, current_user)
-        for enrollment in get_accessible_enrollment_query(current_user).filter(
-            Enrollment.status == 'pending_student_confirm'
-        ).order_by(Enrollment.updated_at.desc(), Enrollment.created_at.desc()).all()
-        if enrollment.id not in scheduling_workflow_enrollment_ids
-    ])
+        ).order_by(Enrollment.updated_at.desc(), Enrollment.created_at.desc()).all(),
+        current_user,
+    ))
+    waiting_student_confirm_enrollments = _sort_action_items(build_enrollment_payloads(
+        [
+            enrollment
+            for enrollment in get_accessible_enrollment_query(current_user).filter(
+                Enrollment.status == 'pending_student_confirm'
+            ).order_by(Enrollment.updated_at.desc(), Enrollment.created_at.desc()).all()
+            if enrollment.id not in scheduling_workflow_enrollment_ids
+        ],
+        current_user,
+    ))
     return _dedupe_scheduling_cases(
         [
             _build_scheduling_case_from_enrollment(item)
@@ -1406,7 +1526,7 @@ def api_student_my_schedules_by_date():
     schedules = _student_schedule_query(current_user, start, end).all()
     return jsonify({
         'success': True,
-        'data': [build_schedule_payload(schedule, current_user) for schedule in schedules],
+        'data': build_schedule_payloads(schedules, current_user),
         'total': len(schedules),
     })
 
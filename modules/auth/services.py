@@ -1,16 +1,21 @@
 """自动排课、删除清理和账号初始化服务。"""
+import bisect
+import functools
 import io
 import json
 import re
 import secrets
 import unicodedata
 from datetime import datetime, date, timedelta, time, timezone
-from itertools import combinations, product
+from itertools import product
 from math import ceil
 from zoneinfo import ZoneInfo
 
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, inspect as sa_inspect, or_
+from sqlalchemy.orm import selectinload
 
+from core import json_text
+from core.request_cache import request_memoized
 from extensions import db
 from modules.auth.availability_ai_services import (
     build_availability_intake_summary,
@@ -90,6 +95,66 @@ def get_course_feedback_skip_reason(schedule):
     return None
 
 
+def schedule_feedback_pending(schedule):
+    """需要课后反馈、反馈未提交、最近一次请假也未获批的课次，才进入待交反馈集合。"""
+    if not schedule_requires_course_feedback(schedule):
+        return False
+    if schedule.feedback and schedule.feedback.status == 'submitted':
+        return False
+    latest_leave = _latest_leave_request(schedule)
+    return not (latest_leave and latest_leave.status == 'approved')
+
+
+def refresh_schedule_feedback_pending(schedule_ids, *, session=None, batch_size=500):
+    """按当前库内状态重算 `feedback_pending`，返回实际变更的课次数。
+
+    用 Core UPDATE 写回并保留 updated_at，不把标记维护算作课次本身的修改。
+    """
+    from sqlalchemy.orm.attributes import set_committed_value
+    from modules.oa.models import CourseSchedule
+
+    session = session or db.session
+    schedule_ids = sorted({int(schedule_id) for schedule_id in schedule_ids or () if schedule_id})
+    changed = 0
+    for offset in range(0, len(schedule_ids), batch_size):
+        schedules = session.query(CourseSchedule).options(
+            selectinload(CourseSchedule.feedback),
+            selectinload(CourseSchedule.leave_requests),
+        ).filter(
+            CourseSchedule.id.in_(schedule_ids[offset:offset + batch_size])
+        ).populate_existing().all()
+
+        updates = {True: [], False: []}
+        for schedule in schedules:
+            pending = schedule_feedback_pending(schedule)
+            if bool(schedule.feedback_pending) != pending:
+                updates[pending].append(schedule)
+        for pending, targets in updates.items():
+            if not targets:
+                continue
+            session.execute(
+                CourseSchedule.__table__.update().where(
+                    CourseSchedule.__table__.c.id.in_([schedule.id for schedule in targets])
+                ).values(
+                    feedback_pending=pending,
+                    updated_at=CourseSchedule.__table__.c.updated_at,
+                )
+            )
+            for schedule in targets:
+                set_committed_value(schedule, 'feedback_pending', pending)
+            changed += len(targets)
+    return changed
+
+
+def backfill_schedule_feedback_pending(batch_size=500):
+    from modules.oa.models import CourseSchedule
+
+    schedule_ids = [row[0] for row in db.session.query(CourseSchedule.id).order_by(CourseSchedule.id.asc()).all()]
+    changed = refresh_schedule_feedback_pending(schedule_ids, batch_size=batch_size)
+    db.session.commit()
+    return changed
+
+
 def generate_intake_token():
     """生成学生填表链接的 token。"""
     return secrets.token_urlsafe(32)
@@ -159,6 +224,23 @@ def get_company_full_time_working_template():
     return [dict(item) for item in DEFAULT_FULL_TIME_WORKING_TEMPLATE]
 
 
+def _teacher_memo_key(teacher_or_user):
+    """按老师 id 缓存；传入的是未落库对象时返回 None，不走缓存。"""
+    if teacher_or_user is None or isinstance(teacher_or_user, bool):
+        return None
+    if isinstance(teacher_or_user, int):
+        return teacher_or_user
+    teacher = getattr(teacher_or_user, 'teacher', None) if hasattr(teacher_or_user, 'teacher_id') else None
+    teacher_id = getattr(teacher, 'id', None) or getattr(teacher_or_user, 'teacher_id', None)
+    if teacher_id is None and hasattr(teacher_or_user, 'role'):
+        teacher_id = getattr(teacher_or_user, 'id', None)
+    return teacher_id
+
+
+@request_memoized(
+    key=lambda teacher_or_user: teacher_or_user if isinstance(teacher_or_user, int) else None,
+    tables=('users',),
+)
 def _resolve_teacher_user_record(teacher_or_user):
     from modules.auth.models import User
 
@@ -185,6 +267,7 @@ def resolve_teacher_work_mode(teacher_or_user):
     )
 
 
+@request_memoized(key=_teacher_memo_key, tables=('users',), copy_result=True)
 def resolve_teacher_default_working_template(teacher_or_user):
     teacher = _resolve_teacher_user_record(teacher_or_user)
     mode = resolve_teacher_work_mode(teacher)
@@ -224,6 +307,7 @@ def enrollment_requires_teacher_confirmation(enrollment):
     return bool(risk_assessment.get('teacher_confirmation_required'))
 
 
+@request_memoized(key=_teacher_memo_key, tables=('users', 'teacher_availability'), copy_result=True)
 def _teacher_work_context(teacher_or_user):
     teacher = _resolve_teacher_user_record(teacher_or_user)
     mode = resolve_teacher_work_mode(teacher)
@@ -320,8 +404,8 @@ def _enrollment_json_field(value):
         return None
     if isinstance(value, str):
         try:
-            return json.loads(value)
-        except (json.JSONDecodeError, TypeError):
+            return json_text.loads(value)
+        except (TypeError, ValueError):
             return None
     return value
 
@@ -1320,8 +1404,35 @@ def _candidate_pool_label(candidate):
     return f'{_day_name(candidate["day_of_week"])} {candidate["time_start"]}-{candidate["time_end"]}'
 
 
-def _candidate_pool_for_enrollment(enrollment):
+def _candidate_pool_horizon_end(enrollment, today):
+    """候选时段只需要核对方案可能用到的日期：到目标完成日，或按课次数估算的最晚结束日。"""
+    from modules.auth.plan_search import plan_horizon_weeks
+
+    required_weekly = max(int(enrollment.sessions_per_week or 1), 1)
+    horizon_end = today + timedelta(weeks=plan_horizon_weeks(
+        _get_total_sessions(enrollment),
+        required_weekly,
+        _load_student_excluded_dates(enrollment.student_profile),
+    ))
+    target_finish_date = getattr(enrollment, 'target_finish_date', None)
+    if target_finish_date:
+        horizon_end = min(horizon_end, target_finish_date)
+    return horizon_end
+
+
+# 规划期内只撞上个别日期的候选块仍保留，按冲突日期数扣分；方案搜索会避开真正用到的冲突周
+CANDIDATE_MAX_CONFLICT_DATES = 2
+CANDIDATE_CONFLICT_DATE_PENALTY = 2
+
+
+def _candidate_pool_for_enrollment(enrollment, *, occupancy=None):
+    """老师和学生可用时间的交集切成课时长度的候选块，剔除规划期内与老师现有课程频繁冲突的块。
+
+    冲突日期不超过 `CANDIDATE_MAX_CONFLICT_DATES` 的块保留并按 `conflict_dates` 扣分。
+    批量排课时传入共享的 `occupancy`，不再单独查询老师课次。
+    """
     from modules.oa.models import CourseSchedule
+    from modules.oa.schedule_conflicts import ScheduleOccupancy
 
     teacher_context = _teacher_work_context(enrollment.teacher or enrollment.teacher_id)
     teacher_slots = _load_teacher_available_ranges(enrollment.teacher_id)
@@ -1339,19 +1450,22 @@ def _candidate_pool_for_enrollment(enrollment):
         }
 
     min_minutes = max(int((enrollment.hours_per_session or 2.0) * 60), 30)
-    query = CourseSchedule.query.filter(
-        CourseSchedule.teacher_id == enrollment.teacher_id,
-        CourseSchedule.is_cancelled == False,
-    )
-    if enrollment.id:
-        query = query.filter(
-            or_(CourseSchedule.enrollment_id.is_(None), CourseSchedule.enrollment_id != enrollment.id)
+    today = get_business_today()
+    horizon_end = _candidate_pool_horizon_end(enrollment, today)
+    excluded_set = _load_student_excluded_dates(enrollment.student_profile)
+    teacher_name = enrollment.teacher.display_name if enrollment.teacher else None
+    if occupancy is None:
+        filters = []
+        if enrollment.id:
+            filters.append(or_(CourseSchedule.enrollment_id.is_(None), CourseSchedule.enrollment_id != enrollment.id))
+        occupancy = ScheduleOccupancy.load(
+            date_start=today,
+            date_end=horizon_end,
+            teacher_id=enrollment.teacher_id,
+            teacher_name=teacher_name,
+            filters=filters,
         )
 
-    existing_by_day = {}
-    for schedule in query.all():
-        existing_by_day.setdefault(schedule.day_of_week, []).append(schedule)
-
     candidates = []
     for teacher_slot in teacher_slots:
         teacher_day = int(teacher_slot.get('day_of_week', teacher_slot.get('day', -1)))
@@ -1379,23 +1493,31 @@ def _candidate_pool_for_enrollment(enrollment):
                 block_end = _minutes_to_time(cursor + min_minutes)
 
                 conflicts = []
-                for existing in existing_by_day.get(teacher_day, []):
-                    if _compute_overlap(
-                        block_start,
-                        block_end,
-                        existing.time_start,
-                        existing.time_end,
-                        1,
-                    ):
-                        conflicts.append({
-                            'course_name': existing.course_name,
-                            'time': f'{existing.time_start}-{existing.time_end}',
-                            'students': existing.students,
-                        })
-
-                score = 0
-                if not conflicts:
-                    score += 4
+                course_date = _first_occurrence_on_or_after(teacher_day, today)
+                while course_date <= horizon_end:
+                    if course_date.isoformat() not in excluded_set:
+                        for existing in occupancy.find_conflicts(
+                            course_date,
+                            block_start,
+                            block_end,
+                            teacher_id=enrollment.teacher_id,
+                            teacher_name=teacher_name,
+                        )['teacher']:
+                            if enrollment.id and existing.enrollment_id == enrollment.id:
+                                continue
+                            conflicts.append({
+                                'date': course_date.isoformat(),
+                                'course_name': existing.course_name,
+                                'time': f'{existing.time_start}-{existing.time_end}',
+                                'students': existing.students,
+                            })
+                    course_date += timedelta(weeks=1)
+
+                conflict_dates = len({item['date'] for item in conflicts})
+                if conflict_dates > CANDIDATE_MAX_CONFLICT_DATES:
+                    cursor += 60
+                    continue
+                score = max(4 - CANDIDATE_CONFLICT_DATE_PENALTY * conflict_dates, 0)
                 if teacher_slot.get('is_preferred'):
                     score += 1
                 if block_start >= student_slot.get('start', student_slot.get('time_start', '')) and block_end <= student_slot.get('end', student_slot.get('time_end', '')):
@@ -1408,6 +1530,7 @@ def _candidate_pool_for_enrollment(enrollment):
                     'score': score,
                     'is_preferred': bool(teacher_slot.get('is_preferred')),
                     'conflicts': conflicts,
+                    'conflict_dates': conflict_dates,
                     'label': f'{_day_name(teacher_slot["day_of_week"])} {block_start}-{block_end}',
                 })
                 cursor += 60
@@ -1425,7 +1548,6 @@ def _candidate_pool_for_enrollment(enrollment):
             'within_student_constraints': True,
         }
         for candidate in sorted(deduped.values(), key=_candidate_sort_key)
-        if not candidate.get('conflicts')
     ]
     return candidate_pool, teacher_slots, {
         **teacher_context,
@@ -1529,41 +1651,40 @@ def _assess_enrollment_scheduling_risk(enrollment, candidate_pool, recommended_b
     }
 
 
-def refresh_enrollment_scheduling_ai_state(enrollment):
-    if not enrollment:
-        return {'candidate_slot_pool': [], 'recommended_bundle': None, 'risk_assessment': None, 'proposed_plans': []}
+def _search_enrollment_plans(enrollment, *, occupancy=None, limit=3):
+    """返回 (候选时段池, 按 `_plan_sort_key` 排序的前 `limit` 个合法方案)。"""
+    from modules.auth.plan_search import PlanSearchSpace
 
-    candidate_pool, _, _ = _candidate_pool_for_enrollment(enrollment)
+    candidate_pool, _, _ = _candidate_pool_for_enrollment(enrollment, occupancy=occupancy)
     required_weekly = max(int(enrollment.sessions_per_week or 1), 1)
     total_sessions = _get_total_sessions(enrollment)
     excluded_set = _load_student_excluded_dates(enrollment.student_profile)
 
     top_candidates = candidate_pool[: min(len(candidate_pool), max(required_weekly + 6, 8))]
-    valid_plans = []
-    for combo in combinations(top_candidates, required_weekly):
-        selected_blocks = sorted(list(combo), key=_slot_sort_key)
-        plan = _build_plan(selected_blocks, total_sessions, excluded_set)
-        normalized_plan = normalize_plan(plan, enrollment)
-        plan_errors, _ = _collect_manual_plan_issues(
-            enrollment,
-            normalized_plan.get('session_dates', []),
-            weekly_slots=normalized_plan.get('weekly_slots') or selected_blocks,
-        )
-        target_finish_date = getattr(enrollment, 'target_finish_date', None)
-        if target_finish_date and normalized_plan.get('date_end'):
-            try:
-                plan_end = date.fromisoformat(normalized_plan['date_end'])
-            except ValueError:
-                plan_end = None
-            if plan_end and plan_end > target_finish_date:
-                plan_errors.append(
-                    f'方案完成时间晚于目标完成日 {target_finish_date.isoformat()}'
-                )
-        if plan_errors:
-            continue
-        valid_plans.append(normalized_plan)
-        if len(valid_plans) >= 3:
-            break
+    search_space = PlanSearchSpace.for_enrollment(
+        enrollment,
+        top_candidates,
+        required_weekly=required_weekly,
+        total_sessions=total_sessions,
+        excluded_set=excluded_set,
+        occupancy=occupancy,
+    )
+    plans = [
+        normalize_plan(_build_plan(selected_blocks, total_sessions, excluded_set), enrollment)
+        for selected_blocks in search_space.best_combinations(limit=limit)
+    ]
+    return candidate_pool, plans
+
+
+def refresh_enrollment_scheduling_ai_state(enrollment, *, occupancy=None):
+    """刷新候选时段池、风险评估和按 `_plan_sort_key` 排好的前三个推荐方案。
+
+    `occupancy` 是批量排课共享的占用快照，缺省时按本报名单独读取。
+    """
+    if not enrollment:
+        return {'candidate_slot_pool': [], 'recommended_bundle': None, 'risk_assessment': None, 'proposed_plans': []}
+
+    candidate_pool, valid_plans = _search_enrollment_plans(enrollment, occupancy=occupancy)
 
     recommended_bundle = valid_plans[0] if valid_plans else None
     risk_assessment = _assess_enrollment_scheduling_risk(enrollment, candidate_pool, recommended_bundle)
@@ -1581,45 +1702,83 @@ def refresh_enrollment_scheduling_ai_state(enrollment):
     }
 
 
+SESSION_DATES_CACHE_SIZE = 1024
+
+
+@functools.lru_cache(maxsize=SESSION_DATES_CACHE_SIZE)
+def _expand_session_dates(slot_days, total_sessions, excluded_dates, start):
+    """按周轮转展开课次，返回 (课次, 跳过的课次)，元素是 (日期字符串, 时段下标)。
+
+    不再逐周生成日期再查表：先用日期序号算出每个不可上课日期落在哪个时段的第几周，
+    再按“每周 k 节、扣掉已排除的课次”直接求出需要展开的周数，最后一次性生成。
+    参数都可哈希，结果在进程内按 (时段, 课次数, 不可上课日期, 起始日) 共享缓存。
+    """
+    slot_count = len(slot_days)
+    if not slot_count:
+        return (), ()
+    first_ordinals = [_first_occurrence_on_or_after(day, start).toordinal() for day in slot_days]
+    excluded_slots = set()
+    for value in excluded_dates:
+        try:
+            ordinal = date.fromisoformat(value).toordinal()
+        except (TypeError, ValueError):
+            continue
+        if date.fromordinal(ordinal).isoformat() != value:
+            continue
+        for index, first_ordinal in enumerate(first_ordinals):
+            offset = ordinal - first_ordinal
+            if offset >= 0 and offset % 7 == 0:
+                excluded_slots.add((offset // 7, index))
+
+    max_weeks = total_sessions + len(excluded_dates) + 52
+    excluded_weeks = sorted(week for week, _ in excluded_slots)
+    weeks = min(-(-total_sessions // slot_count), max_weeks)
+    while weeks < max_weeks and slot_count * weeks - bisect.bisect_left(excluded_weeks, weeks) < total_sessions:
+        weeks += 1
+
+    sessions = []
+    skipped = []
+    for week in range(weeks):
+        for index, first_ordinal in enumerate(first_ordinals):
+            entry = (date.fromordinal(first_ordinal + week * 7).isoformat(), index)
+            if (week, index) in excluded_slots:
+                skipped.append(entry)
+                continue
+            sessions.append(entry)
+            if len(sessions) >= total_sessions:
+                return tuple(sessions), tuple(skipped)
+    return tuple(sessions), tuple(skipped)
+
+
 def _build_session_dates(weekly_slots, total_sessions, excluded_set):
     """按周轮转生成具体课次，遇到不可上课日期则跳过并顺延到下周。"""
     if not weekly_slots:
         return [], []
 
     sorted_slots = sorted(weekly_slots, key=_slot_sort_key)
-    today = get_business_today()
-    first_dates = [
-        _first_occurrence_on_or_after(slot['day_of_week'], today)
-        for slot in sorted_slots
-    ]
+    sessions, skipped = _expand_session_dates(
+        tuple(slot['day_of_week'] for slot in sorted_slots),
+        total_sessions,
+        frozenset(excluded_set),
+        get_business_today(),
+    )
 
-    session_dates = []
-    skipped_dates = []
-    week_idx = 0
-    max_weeks = total_sessions + len(excluded_set) + 52
-
-    while len(session_dates) < total_sessions and week_idx < max_weeks:
-        for slot, first_date in zip(sorted_slots, first_dates):
-            current_date = first_date + timedelta(weeks=week_idx)
-            payload = {
-                'date': current_date.isoformat(),
-                'day_of_week': slot['day_of_week'],
-                'time_start': slot['time_start'],
-                'time_end': slot['time_end'],
+    def _payloads(entries):
+        return [
+            {
+                'date': session_date,
+                'day_of_week': sorted_slots[index]['day_of_week'],
+                'time_start': sorted_slots[index]['time_start'],
+                'time_end': sorted_slots[index]['time_end'],
             }
-            if payload['date'] in excluded_set:
-                skipped_dates.append(payload)
-                continue
-            session_dates.append(payload)
-            if len(session_dates) >= total_sessions:
-                break
-        week_idx += 1
+            for session_date, index in entries
+        ]
 
-    return session_dates, skipped_dates
+    return _payloads(sessions), _payloads(skipped)
 
 
-def _build_plan(weekly_slots, total_sessions, excluded_set):
-    """把每周 recurring slots 组装成一个可确认的排课 plan。"""
+def _build_plan(weekly_slots, total_sessions, excluded_set, *, session_dates=None, skipped_dates=None):
+    """把每周 recurring slots 组装成一个可确认的排课 plan；已有具体课次时直接沿用，不再重新展开。"""
     deduped = {}
     for slot in weekly_slots:
         key = _slot_signature(slot)
@@ -1627,7 +1786,9 @@ def _build_plan(weekly_slots, total_sessions, excluded_set):
             deduped[key] = dict(slot)
 
     ordered_slots = sorted(deduped.values(), key=_slot_sort_key)
-    session_dates, skipped_dates = _build_session_dates(ordered_slots, total_sessions, excluded_set)
+    if session_dates is None:
+        session_dates, skipped_dates = _build_session_dates(ordered_slots, total_sessions, excluded_set)
+    skipped_dates = skipped_dates or []
     date_values = [item['date'] for item in session_dates]
     estimated_weeks = 0
     if date_values:
@@ -1697,6 +1858,16 @@ def _merge_plan_metadata(raw_plan, plan):
     return plan
 
 
+def _plan_memo_key(raw_plan, enrollment=None):
+    if not isinstance(raw_plan, dict) or (enrollment is not None and enrollment.id is None):
+        return None
+    return (
+        json.dumps(raw_plan, ensure_ascii=False, sort_keys=True, default=str),
+        enrollment.id if enrollment is not None else None,
+    )
+
+
+@request_memoized(key=_plan_memo_key, tables=('enrollments', 'student_profiles'), copy_result=True)
 def normalize_plan(raw_plan, enrollment=None):
     """兼容旧单时段结构，统一为新的 multi-slot plan 结构。"""
     if not raw_plan:
@@ -1708,9 +1879,15 @@ def normalize_plan(raw_plan, enrollment=None):
     total_sessions = _get_total_sessions(enrollment) if enrollment else raw_plan.get('total_sessions', 1)
 
     if raw_plan.get('weekly_slots'):
-        plan = _build_plan(raw_plan.get('weekly_slots', []), total_sessions, excluded_set)
         session_dates = raw_plan.get('session_dates')
         skipped_dates = raw_plan.get('skipped_dates')
+        plan = _build_plan(
+            raw_plan.get('weekly_slots', []),
+            total_sessions,
+            excluded_set,
+            session_dates=session_dates,
+            skipped_dates=skipped_dates,
+        )
         if session_dates is not None:
             plan = _apply_session_dates_to_plan(
                 plan,
@@ -1933,91 +2110,80 @@ def _actor_can_manage_schedule_feedback(actor, schedule=None, *, teacher_id=None
     return _schedule_matches_teacher_actor(actor, schedule, teacher_id=teacher_id)
 
 
-def _collect_teacher_schedule_conflicts(enrollment, session_dates, *, ignore_schedule_ids=None):
+def _load_session_occupancy(enrollment, session_dates, *, ignore_schedule_ids=None):
+    """一次读入方案课次日期上老师和学生的全部占用，供多条冲突校验共用。"""
     from modules.oa.models import CourseSchedule
+    from modules.oa.schedule_conflicts import ScheduleOccupancy
 
     if not enrollment or not session_dates:
-        return []
-
+        return ScheduleOccupancy()
     ignore_ids = set(ignore_schedule_ids or [])
-    teacher_name = enrollment.teacher.display_name if enrollment.teacher else ''
-    teacher_filters = [CourseSchedule.teacher_id == enrollment.teacher_id]
-    if teacher_name:
-        teacher_filters.append(CourseSchedule.teacher == teacher_name)
+    return ScheduleOccupancy.load(
+        dates=[date.fromisoformat(session['date']) for session in session_dates],
+        teacher_id=enrollment.teacher_id,
+        teacher_name=enrollment.teacher.display_name if enrollment.teacher else None,
+        student_profile_id=enrollment.student_profile_id,
+        filters=[~CourseSchedule.id.in_(ignore_ids)] if ignore_ids else (),
+    )
 
-    session_dates_by_date = {}
-    for session in session_dates:
-        session_dates_by_date.setdefault(session['date'], []).append(session)
 
-    query = CourseSchedule.query.filter(
-        CourseSchedule.date.in_([date.fromisoformat(value) for value in session_dates_by_date]),
-        or_(*teacher_filters),
-        CourseSchedule.is_cancelled == False,
+def _session_schedule_conflicts(occupancy, session, bucket, *, ignore_schedule_ids=None, **owners):
+    conflicts = occupancy.find_conflicts(
+        date.fromisoformat(session['date']),
+        session['time_start'],
+        session['time_end'],
+        exclude_schedule_ids=ignore_schedule_ids,
+        require_teacher=False,
+        **owners,
     )
-    if ignore_ids:
-        query = query.filter(~CourseSchedule.id.in_(ignore_ids))
+    return conflicts[bucket]
 
-    conflicts = []
-    existing_by_date = {}
-    for schedule in query.all():
-        existing_by_date.setdefault(schedule.date.isoformat(), []).append(schedule)
 
+def _collect_teacher_schedule_conflicts(enrollment, session_dates, *, ignore_schedule_ids=None, occupancy=None):
+    if not enrollment or not session_dates:
+        return []
+
+    if occupancy is None:
+        occupancy = _load_session_occupancy(enrollment, session_dates, ignore_schedule_ids=ignore_schedule_ids)
+    teacher_name = enrollment.teacher.display_name if enrollment.teacher else ''
+    conflicts = []
     for session in session_dates:
-        for existing in existing_by_date.get(session['date'], []):
-            if _slots_overlap(
-                session['time_start'],
-                session['time_end'],
-                existing.time_start,
-                existing.time_end,
-            ):
-                conflicts.append(
-                    f'{session["date"]} {session["time_start"]}-{session["time_end"]} '
-                    f'与老师现有课程冲突：{existing.course_name} {existing.time_start}-{existing.time_end}'
-                )
+        for existing in _session_schedule_conflicts(
+            occupancy,
+            session,
+            'teacher',
+            ignore_schedule_ids=ignore_schedule_ids,
+            teacher_id=enrollment.teacher_id,
+            teacher_name=teacher_name,
+        ):
+            conflicts.append(
+                f'{session["date"]} {session["time_start"]}-{session["time_end"]} '
+                f'与老师现有课程冲突：{existing.course_name} {existing.time_start}-{existing.time_end}'
+            )
 
     return conflicts
 
 
-def _collect_student_schedule_conflicts(enrollment, session_dates, *, ignore_schedule_ids=None):
-    from modules.oa.models import CourseSchedule
-
+def _collect_student_schedule_conflicts(enrollment, session_dates, *, ignore_schedule_ids=None, occupancy=None):
     if not enrollment or not enrollment.student_profile_id or not session_dates:
         return []
 
-    ignore_ids = set(ignore_schedule_ids or [])
-    session_dates_by_date = {}
-    for session in session_dates:
-        session_dates_by_date.setdefault(session['date'], []).append(session)
-
-    query = CourseSchedule.query.filter(
-        student_schedule_profile_clause(enrollment.student_profile_id, schedule_model=CourseSchedule),
-        CourseSchedule.date.in_([date.fromisoformat(value) for value in session_dates_by_date]),
-        CourseSchedule.is_cancelled == False,
-    )
-    if ignore_ids:
-        query = query.filter(~CourseSchedule.id.in_(ignore_ids))
-    if enrollment.id:
-        query = query.filter(
-            or_(CourseSchedule.enrollment_id.is_(None), CourseSchedule.enrollment_id != enrollment.id)
-        )
-
+    if occupancy is None:
+        occupancy = _load_session_occupancy(enrollment, session_dates, ignore_schedule_ids=ignore_schedule_ids)
     conflicts = []
-    existing_by_date = {}
-    for schedule in query.all():
-        existing_by_date.setdefault(schedule.date.isoformat(), []).append(schedule)
-
     for session in session_dates:
-        for existing in existing_by_date.get(session['date'], []):
-            if _slots_overlap(
-                session['time_start'],
-                session['time_end'],
-                existing.time_start,
-                existing.time_end,
-            ):
-                conflicts.append(
-                    f'{session["date"]} {session["time_start"]}-{session["time_end"]} '
-                    f'与同一学生现有课程冲突：{existing.course_name} {existing.time_start}-{existing.time_end}'
-                )
+        for existing in _session_schedule_conflicts(
+            occupancy,
+            session,
+            'student',
+            ignore_schedule_ids=ignore_schedule_ids,
+            enrollment_id=enrollment.id,
+            student_profile_id=enrollment.student_profile_id,
+        ):
+            conflicts.append(
+                f'{session["date"]} {session["time_start"]}-{session["time_end"]} '
+                f'与同一学生现有课程冲突：{existing.course_name} {existing.time_start}-{existing.time_end}'
+            )
 
     return conflicts
 
@@ -2044,7 +2210,7 @@ def _build_weekly_slots_from_sessions(session_dates):
 
 def _build_manual_plan(session_dates):
     weekly_slots = _build_weekly_slots_from_sessions(session_dates)
-    plan = _build_plan(weekly_slots, len(session_dates), set())
+    plan = _build_plan(weekly_slots, len(session_dates), set(), session_dates=session_dates)
     plan = _apply_session_dates_to_plan(plan, session_dates, [])
     plan['is_manual'] = True
     return plan
@@ -2136,11 +2302,13 @@ def _collect_manual_plan_issues(enrollment, session_dates, weekly_slots=None):
     if enrollment and enrollment.id:
         ignore_ids = [schedule.id for schedule in _linked_schedule_query(enrollment.id).all()]
 
+    occupancy = _load_session_occupancy(enrollment, session_dates, ignore_schedule_ids=ignore_ids)
     errors.extend(
         _collect_teacher_schedule_conflicts(
             enrollment,
             session_dates,
             ignore_schedule_ids=ignore_ids,
+            occupancy=occupancy,
         )
     )
     errors.extend(
@@ -2148,6 +2316,7 @@ def _collect_manual_plan_issues(enrollment, session_dates, weekly_slots=None):
             enrollment,
             session_dates,
             ignore_schedule_ids=ignore_ids,
+            occupancy=occupancy,
         )
     )
 
@@ -2184,40 +2353,104 @@ def _extract_legacy_enrollment_id(note_text):
     return next(iter(matches))
 
 
+def linked_schedule_clause(enrollment_id, *, schedule_model=None):
+    """报名关联的课次：直接挂 enrollment_id，或未挂 enrollment_id 但备注里写了唯一的“报名#id”。"""
+    from modules.oa.models import CourseSchedule
+
+    schedule_model = schedule_model or CourseSchedule
+    return or_(
+        schedule_model.enrollment_id == enrollment_id,
+        and_(
+            schedule_model.enrollment_id.is_(None),
+            schedule_model.legacy_enrollment_id == enrollment_id,
+        ),
+    )
+
+
 def _linked_schedule_ids(enrollment_id, *, include_cancelled=False):
     from modules.oa.models import CourseSchedule
 
     if not enrollment_id:
         return []
-
-    direct_filters = [CourseSchedule.enrollment_id == enrollment_id]
-    if not include_cancelled:
-        direct_filters.append(CourseSchedule.is_cancelled == False)
-    schedule_ids = {
-        row[0]
-        for row in db.session.query(CourseSchedule.id).filter(*direct_filters).all()
-    }
-    legacy_candidate_filters = [
-        CourseSchedule.enrollment_id.is_(None),
-        CourseSchedule.notes.isnot(None),
-        CourseSchedule.notes.contains('报名#'),
-    ]
+    query = db.session.query(CourseSchedule.id).filter(linked_schedule_clause(enrollment_id))
     if not include_cancelled:
-        legacy_candidate_filters.append(CourseSchedule.is_cancelled == False)
-    legacy_candidates = CourseSchedule.query.filter(*legacy_candidate_filters).all()
-    for schedule in legacy_candidates:
-        if _extract_legacy_enrollment_id(schedule.notes) == enrollment_id:
-            schedule_ids.add(schedule.id)
-    return sorted(schedule_ids)
+        query = query.filter(CourseSchedule.is_cancelled == False)
+    return [row[0] for row in query.order_by(CourseSchedule.id.asc()).all()]
 
 
 def _linked_schedule_query(enrollment_id, *, include_cancelled=False):
     from modules.oa.models import CourseSchedule
 
-    linked_ids = _linked_schedule_ids(enrollment_id, include_cancelled=include_cancelled)
-    if not linked_ids:
+    if not enrollment_id:
         return CourseSchedule.query.filter(False)
-    return CourseSchedule.query.filter(CourseSchedule.id.in_(linked_ids))
+    query = CourseSchedule.query.filter(linked_schedule_clause(enrollment_id))
+    if not include_cancelled:
+        query = query.filter(CourseSchedule.is_cancelled == False)
+    return query
+
+
+def build_enrollment_progress_map(enrollments, *, today=None):
+    """一次窗口查询给所有报名的有效课次编号：{schedule_id: 进度信息}。
+
+    课次按报名分区、按日期和开始时间排序取 ROW_NUMBER；是否已交付用 EXISTS 判断，
+    不再逐个报名查课次、逐个课次懒加载反馈。
+    """
+    from modules.oa.models import CourseFeedback, CourseSchedule
+
+    today = today or get_business_today()
+    totals = {}
+    enrollments_by_id = {}
+    for enrollment in enrollments or []:
+        total_sessions = (
+            int(enrollment.total_hours / enrollment.hours_per_session)
+            if enrollment.total_hours and enrollment.hours_per_session else 0
+        )
+        if total_sessions > 0:
+            totals[enrollment.id] = total_sessions
+            enrollments_by_id[enrollment.id] = enrollment
+    if not totals:
+        return {}
+
+    enrollment_ids = list(totals)
+    link_id = db.func.coalesce(CourseSchedule.enrollment_id, CourseSchedule.legacy_enrollment_id)
+    delivered = db.session.query(CourseFeedback.id).filter(
+        CourseFeedback.schedule_id == CourseSchedule.id,
+        CourseFeedback.status == 'submitted',
+    ).exists()
+    rows = db.session.query(
+        CourseSchedule.id,
+        CourseSchedule.date,
+        link_id.label('link_enrollment_id'),
+        db.func.row_number().over(
+            partition_by=link_id,
+            order_by=(CourseSchedule.date, CourseSchedule.time_start, CourseSchedule.id),
+        ).label('session_number'),
+        delivered.label('delivered'),
+    ).filter(
+        CourseSchedule.is_cancelled == False,
+        or_(
+            CourseSchedule.enrollment_id.in_(enrollment_ids),
+            and_(
+                CourseSchedule.enrollment_id.is_(None),
+                CourseSchedule.legacy_enrollment_id.in_(enrollment_ids),
+            ),
+        ),
+    ).all()
+
+    progress_map = {}
+    for schedule_id, schedule_date, enrollment_id, session_number, is_delivered in rows:
+        enrollment = enrollments_by_id[enrollment_id]
+        total_sessions = totals[enrollment_id]
+        progress_map[schedule_id] = {
+            'session_number': session_number,
+            'total': total_sessions,
+            'is_ending': session_number > max(total_sessions - 3, 0),
+            'completed': schedule_date < today,
+            'delivered': bool(is_delivered),
+            'course_name': enrollment.course_name,
+            'student_name': enrollment.student_name,
+        }
+    return progress_map
 
 
 def get_accessible_enrollment_query(user):
@@ -2275,12 +2508,30 @@ def user_can_access_schedule(user, schedule):
     return False
 
 
+def _schedule_leave_requests_loaded(schedule):
+    """课次的 leave_requests 已被批量预取时，直接复用内存里的集合。"""
+    return 'leave_requests' not in sa_inspect(schedule).unloaded
+
+
+def _leave_request_recency_key(leave_request):
+    return (leave_request.created_at or datetime.min, leave_request.id or 0)
+
+
 def _latest_leave_request(schedule):
+    if not schedule:
+        return None
+    if _schedule_leave_requests_loaded(schedule):
+        return max(schedule.leave_requests, key=_leave_request_recency_key, default=None)
+    return _query_latest_leave_request(schedule.id)
+
+
+@request_memoized(key=lambda schedule_id: schedule_id, tables=('leave_requests',))
+def _query_latest_leave_request(schedule_id):
     from modules.auth.models import LeaveRequest
 
-    if not schedule:
+    if schedule_id is None:
         return None
-    return LeaveRequest.query.filter_by(schedule_id=schedule.id).order_by(
+    return LeaveRequest.query.filter_by(schedule_id=schedule_id).order_by(
         LeaveRequest.created_at.desc()
     ).first()
 
@@ -2295,6 +2546,8 @@ def schedule_has_historical_facts(schedule, reference=None):
     feedback = getattr(schedule, 'feedback', None)
     if feedback and feedback.status == 'submitted':
         return True
+    if _schedule_leave_requests_loaded(schedule):
+        return bool(schedule.leave_requests)
     return LeaveRequest.query.filter_by(schedule_id=schedule.id).count() > 0
 
 
@@ -2512,15 +2765,61 @@ def _filter_workflow_todos_for_actor(workflow_todos, actor=None):
     ]
 
 
+def _preload_schedule_payload_relations(schedules):
+    """一次性预取课次列表在组装 payload 时会访问的关联，避免逐条懒加载。"""
+    from modules.auth.models import LeaveRequest
+    from modules.oa.models import CourseFeedback, CourseSchedule
+
+    schedule_ids = list(dict.fromkeys(schedule.id for schedule in schedules or [] if schedule and schedule.id))
+    if not schedule_ids:
+        return
+    CourseSchedule.query.options(
+        selectinload(CourseSchedule.feedback).selectinload(CourseFeedback.teacher),
+        selectinload(CourseSchedule.meeting_material),
+        selectinload(CourseSchedule.leave_requests).selectinload(LeaveRequest.approver),
+        selectinload(CourseSchedule.cancelled_by),
+    ).filter(CourseSchedule.id.in_(schedule_ids)).all()
+
+
+def build_schedule_payloads(schedules, actor=None):
+    """批量组装课次 payload：请假、反馈、会议材料、工作流待办均按整批预取。"""
+    from modules.auth.workflow_services import get_schedules_workflow_todos
+
+    schedules = [schedule for schedule in schedules or [] if schedule]
+    if not schedules:
+        return []
+    _preload_schedule_payload_relations(schedules)
+    workflow_todos_by_schedule = get_schedules_workflow_todos(
+        [schedule.id for schedule in schedules],
+        actor,
+    )
+    return [
+        _build_schedule_payload(
+            schedule,
+            actor,
+            workflow_todos=workflow_todos_by_schedule.get(schedule.id, []),
+        )
+        for schedule in schedules
+    ]
+
+
 def build_schedule_payload(schedule, actor=None):
     from modules.auth.workflow_services import get_schedule_workflow_todos
+
+    return _build_schedule_payload(
+        schedule,
+        actor,
+        workflow_todos=get_schedule_workflow_todos(schedule.id, actor),
+    )
+
+
+def _build_schedule_payload(schedule, actor, *, workflow_todos):
     from modules.oa.services import delivery_mode_label, meeting_status_label
 
     payload = schedule.to_dict()
     latest_leave = _latest_leave_request(schedule)
     feedback = getattr(schedule, 'feedback', None)
     feedback_required = schedule_requires_course_feedback(schedule)
-    workflow_todos = get_schedule_workflow_todos(schedule.id, actor)
     if actor and getattr(actor, 'is_authenticated', False) and actor.role == 'student':
         if feedback and feedback.status != 'submitted':
             feedback = None
@@ -2724,23 +3023,58 @@ def build_leave_request_payload(leave_request, actor=None):
     return payload
 
 
-def _get_enrollment_delivery_meta(enrollment):
-    from modules.oa.models import CourseFeedback
+def _load_enrollment_delivery_records(enrollment_ids):
+    """按报名批量取有效课次（预取反馈与请假）和已提交反馈，返回 {enrollment_id: (课次, 反馈)}。"""
+    from modules.oa.models import CourseFeedback, CourseSchedule
 
-    schedules = _linked_schedule_query(enrollment.id).all()
-    schedule_ids = [schedule.id for schedule in schedules]
-    latest_feedback = None
-    completed_count = 0
-    pending_feedback_count = 0
-    approved_leave_count = 0
+    enrollment_ids = list(dict.fromkeys(enrollment_id for enrollment_id in enrollment_ids or [] if enrollment_id))
+    records = {enrollment_id: ([], []) for enrollment_id in enrollment_ids}
+    if not enrollment_ids:
+        return records
 
-    if schedule_ids:
+    schedules = CourseSchedule.query.options(
+        selectinload(CourseSchedule.feedback),
+        selectinload(CourseSchedule.leave_requests),
+    ).filter(
+        or_(
+            CourseSchedule.enrollment_id.in_(enrollment_ids),
+            and_(
+                CourseSchedule.enrollment_id.is_(None),
+                CourseSchedule.legacy_enrollment_id.in_(enrollment_ids),
+            ),
+        ),
+        CourseSchedule.is_cancelled == False,
+    ).order_by(CourseSchedule.id.asc()).all()
+    owner_by_schedule = {}
+    for schedule in schedules:
+        owner_id = schedule.enrollment_id or schedule.legacy_enrollment_id
+        owner_by_schedule[schedule.id] = owner_id
+        records[owner_id][0].append(schedule)
+
+    if owner_by_schedule:
         submitted_feedbacks = CourseFeedback.query.filter(
-            CourseFeedback.schedule_id.in_(schedule_ids),
+            CourseFeedback.schedule_id.in_(list(owner_by_schedule)),
             CourseFeedback.status == 'submitted',
         ).order_by(CourseFeedback.submitted_at.desc(), CourseFeedback.updated_at.desc()).all()
-        completed_count = len(submitted_feedbacks)
-        latest_feedback = submitted_feedbacks[0] if submitted_feedbacks else None
+        for feedback in submitted_feedbacks:
+            records[owner_by_schedule[feedback.schedule_id]][1].append(feedback)
+    return records
+
+
+@request_memoized(
+    key=lambda enrollment_id: enrollment_id or None,
+    tables=('course_schedules', 'course_feedback', 'leave_requests'),
+)
+def _enrollment_delivery_records(enrollment_id):
+    return _load_enrollment_delivery_records([enrollment_id]).get(enrollment_id, ([], []))
+
+
+def _get_enrollment_delivery_meta(enrollment):
+    schedules, submitted_feedbacks = _enrollment_delivery_records(enrollment.id)
+    completed_count = len(submitted_feedbacks)
+    latest_feedback = submitted_feedbacks[0] if submitted_feedbacks else None
+    approved_leave_count = 0
+    pending_feedback_count = 0
 
     now = get_business_now()
     for schedule in schedules:
@@ -2767,11 +3101,56 @@ def _get_enrollment_delivery_meta(enrollment):
     }
 
 
-def get_enrollment_feedback_meta(enrollment):
-    """返回报名最近一次学生排课反馈及未读状态，优先读取 workflow 结构化 rejection。"""
-    from modules.auth.models import ChatMessage
+def _load_enrollment_replan_todos(enrollment_ids):
+    """按报名批量取最近一次排课调整工作流，返回 {enrollment_id: OATodo | None}。"""
     from modules.oa.models import OATodo
 
+    enrollment_ids = list(dict.fromkeys(enrollment_id for enrollment_id in enrollment_ids or [] if enrollment_id))
+    latest = dict.fromkeys(enrollment_ids)
+    if not enrollment_ids:
+        return latest
+    todos = OATodo.query.filter(
+        OATodo.enrollment_id.in_(enrollment_ids),
+        OATodo.todo_type == OATodo.TODO_TYPE_ENROLLMENT_REPLAN,
+    ).order_by(OATodo.updated_at.desc(), OATodo.created_at.desc()).all()
+    for todo in todos:
+        if latest[todo.enrollment_id] is None:
+            latest[todo.enrollment_id] = todo
+    return latest
+
+
+@request_memoized(key=lambda enrollment_id: enrollment_id or None, tables=('oa_todos',))
+def _latest_enrollment_replan_todo(enrollment_id):
+    return _load_enrollment_replan_todos([enrollment_id]).get(enrollment_id)
+
+
+def _load_enrollment_feedback_messages(enrollment_ids):
+    """按报名批量取学生排课反馈消息，返回 {enrollment_id: (最新一条, 最新一条未读)}。"""
+    from modules.auth.models import ChatMessage
+
+    enrollment_ids = list(dict.fromkeys(enrollment_id for enrollment_id in enrollment_ids or [] if enrollment_id))
+    latest = {enrollment_id: (None, None) for enrollment_id in enrollment_ids}
+    if not enrollment_ids:
+        return latest
+    messages = ChatMessage.query.filter(
+        ChatMessage.enrollment_id.in_(enrollment_ids),
+        ChatMessage.content.startswith(FEEDBACK_PREFIX),
+    ).order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).all()
+    for message in messages:
+        newest, newest_unread = latest[message.enrollment_id]
+        if newest_unread is None and not message.is_read:
+            newest_unread = message
+        latest[message.enrollment_id] = (newest or message, newest_unread)
+    return latest
+
+
+@request_memoized(key=lambda enrollment_id: enrollment_id or None, tables=('chat_messages',))
+def _enrollment_feedback_messages(enrollment_id):
+    return _load_enrollment_feedback_messages([enrollment_id]).get(enrollment_id, (None, None))
+
+
+def get_enrollment_feedback_meta(enrollment):
+    """返回报名最近一次学生排课反馈及未读状态，优先读取 workflow 结构化 rejection。"""
     if not enrollment:
         return {
             'latest_feedback': None,
@@ -2779,12 +3158,9 @@ def get_enrollment_feedback_meta(enrollment):
             'has_unread_feedback': False,
         }
 
-    latest_workflow = OATodo.query.filter(
-        OATodo.enrollment_id == enrollment.id,
-        OATodo.todo_type == OATodo.TODO_TYPE_ENROLLMENT_REPLAN,
-    ).order_by(OATodo.updated_at.desc(), OATodo.created_at.desc()).first()
+    latest_workflow = _latest_enrollment_replan_todo(enrollment.id)
     if latest_workflow:
-        workflow_payload = latest_workflow.get_payload_data()
+        workflow_payload = latest_workflow.get_payload_view()
         latest_rejection = workflow_payload.get('latest_rejection') or {}
         feedback_text = (latest_rejection.get('message') or latest_rejection.get('reason') or '').strip()
         if feedback_text:
@@ -2792,11 +3168,7 @@ def get_enrollment_feedback_meta(enrollment):
             unread_reference = latest_rejection.get('created_at')
             has_unread = False
             if unread_reference:
-                latest_chat = ChatMessage.query.filter(
-                    ChatMessage.enrollment_id == enrollment.id,
-                    ChatMessage.content.startswith(FEEDBACK_PREFIX),
-                    ChatMessage.is_read == False,
-                ).order_by(ChatMessage.created_at.desc()).first()
+                latest_chat = _enrollment_feedback_messages(enrollment.id)[1]
                 if latest_chat and latest_chat.created_at:
                     has_unread = latest_chat.created_at.isoformat() <= unread_reference
             return {
@@ -2805,11 +3177,7 @@ def get_enrollment_feedback_meta(enrollment):
                 'has_unread_feedback': has_unread or bool(rejections and latest_workflow.is_open_workflow),
             }
 
-    query = ChatMessage.query.filter(
-        ChatMessage.enrollment_id == enrollment.id,
-        ChatMessage.content.startswith(FEEDBACK_PREFIX),
-    )
-    latest = query.order_by(ChatMessage.created_at.desc()).first()
+    latest, latest_unread = _enrollment_feedback_messages(enrollment.id)
     if not latest:
         return {
             'latest_feedback': None,
@@ -2820,7 +3188,7 @@ def get_enrollment_feedback_meta(enrollment):
     feedback_text = latest.content[len(FEEDBACK_PREFIX):].strip()
     if feedback_text.startswith('[') and '] ' in feedback_text:
         feedback_text = feedback_text.split('] ', 1)[1]
-    has_unread = query.filter(ChatMessage.is_read == False).count() > 0
+    has_unread = latest_unread is not None
     return {
         'latest_feedback': feedback_text,
         'latest_feedback_at': latest.created_at.isoformat() if latest.created_at else None,
@@ -2828,8 +3196,57 @@ def get_enrollment_feedback_meta(enrollment):
     }
 
 
+def _preload_enrollment_payload_relations(enrollments):
+    """一次性预取报名列表组装 payload 时会逐条查询的数据，结果写入请求级缓存。"""
+    from modules.auth.models import Enrollment
+
+    enrollment_ids = list(dict.fromkeys(
+        enrollment.id for enrollment in enrollments or [] if enrollment and enrollment.id
+    ))
+    if not enrollment_ids:
+        return
+    Enrollment.query.options(
+        selectinload(Enrollment.teacher),
+        selectinload(Enrollment.student_profile),
+    ).filter(Enrollment.id.in_(enrollment_ids)).all()
+    _latest_enrollment_replan_todo.prime(_load_enrollment_replan_todos(enrollment_ids))
+    _enrollment_feedback_messages.prime(_load_enrollment_feedback_messages(enrollment_ids))
+    _enrollment_delivery_records.prime(_load_enrollment_delivery_records(enrollment_ids))
+
+
+def build_enrollment_payloads(enrollments, actor=None):
+    """批量组装报名 payload：关联、反馈、课次、工作流待办均按整批预取。"""
+    from modules.auth.workflow_services import get_enrollments_workflow_todos
+
+    enrollments = [enrollment for enrollment in enrollments or [] if enrollment]
+    if not enrollments:
+        return []
+    _preload_enrollment_payload_relations(enrollments)
+    workflow_todos_by_enrollment = get_enrollments_workflow_todos(
+        [enrollment.id for enrollment in enrollments],
+        actor,
+    )
+    return [
+        _build_enrollment_payload(
+            enrollment,
+            actor,
+            workflow_todos=workflow_todos_by_enrollment.get(enrollment.id, []),
+        )
+        for enrollment in enrollments
+    ]
+
+
 def build_enrollment_payload(enrollment, actor=None):
     from modules.auth.workflow_services import get_enrollment_workflow_todos
+
+    return _build_enrollment_payload(
+        enrollment,
+        actor,
+        workflow_todos=get_enrollment_workflow_todos(enrollment.id, actor),
+    )
+
+
+def _build_enrollment_payload(enrollment, actor, *, workflow_todos):
     from modules.oa.services import delivery_mode_label
 
     payload = enrollment.to_dict()
@@ -2879,10 +3296,7 @@ def build_enrollment_payload(enrollment, actor=None):
         'risk_assessment': risk_assessment,
         'scheduling_complexity_hint': _build_scheduling_complexity_hint(enrollment),
     })
-    workflow_todos = _filter_workflow_todos_for_actor(
-        get_enrollment_workflow_todos(enrollment.id, actor),
-        actor,
-    )
+    workflow_todos = _filter_workflow_todos_for_actor(workflow_todos, actor)
     payload['workflow_todos'] = workflow_todos
     payload['active_workflow_todo'] = workflow_todos[0] if workflow_todos else None
     payload['current_plan_summary'] = _summarize_plan(payload.get('confirmed_slot'))
@@ -3616,12 +4030,40 @@ def delete_enrollment_hard(enrollment_id):
     return True, f'报名已删除，并清理 {len(schedule_ids)} 节关联课程'
 
 
+def materialize_legacy_enrollment_links(batch_size=500):
+    """把旧备注里的“报名#id”解析进 legacy_enrollment_id，只处理还没解析过的课次。
+
+    之后写备注时由模型上的校验器同步维护，这里只负责补齐历史数据。
+    """
+    from modules.oa.models import CourseSchedule
+
+    table = CourseSchedule.__table__
+    rows = db.session.query(CourseSchedule.id, CourseSchedule.notes).filter(
+        CourseSchedule.legacy_enrollment_id.is_(None),
+        CourseSchedule.notes.contains('报名#'),
+    ).all()
+    links = []
+    for schedule_id, notes in rows:
+        legacy_enrollment_id = _extract_legacy_enrollment_id(notes)
+        if legacy_enrollment_id:
+            links.append({'row_id': schedule_id, 'link_id': legacy_enrollment_id})
+    statement = table.update().where(table.c.id == db.bindparam('row_id')).values(
+        legacy_enrollment_id=db.bindparam('link_id'),
+        updated_at=table.c.updated_at,
+    )
+    for offset in range(0, len(links), batch_size):
+        db.session.execute(statement, links[offset:offset + batch_size])
+    if links:
+        db.session.commit()
+    return len(links)
+
+
 def backfill_schedule_relationships():
-    """回填历史自动排课记录的 teacher_id / enrollment_id。"""
+    """回填历史自动排课记录的 teacher_id / enrollment_id，并物化旧备注里的报名关联。"""
     from modules.auth.models import Enrollment, User
     from modules.oa.models import CourseSchedule
 
-    updated = 0
+    updated = materialize_legacy_enrollment_links()
     schedules = CourseSchedule.query.filter(
         or_(
             CourseSchedule.enrollment_id == None,
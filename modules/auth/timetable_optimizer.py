@@ -0,0 +1,170 @@
+"""多个待排课报名的联合排课预览。
+
+`find_matching_slots` 每次只看一个报名。先排的报名可能占掉更紧急报名唯一能用的时段。
+这里把一批待排课报名放在一起离线求解，用贪心加修复，不引入外部求解器：
+
+1. 所有报名共用一份占用快照（同批量重算）。每个报名按 `_plan_sort_key` 搜出至多
+   `alternatives` 个各自合法的方案作为备选，目标完成日等约束在搜索时已经校验；
+2. 按优先级依次为每个报名挑第一个和已选方案不冲突的备选。优先级依次看冲刺交付、
+   目标完成日、报名先后；
+3. 修复：挑不到时，看能否把唯一挡路的那个报名换到它的另一个备选上，腾出时段；
+4. 改进：反复尝试把已排报名换成候选评分更高的备选（评分相同时换完成更早的），
+   顺带给仍未排上的报名再找一次空位，直到没有可改进的替换。
+
+两个方案冲突，指同一老师或同一学生在同一天的课次时间重叠。结果只用于预览，不写库，
+也不会发给学生。
+"""
+from modules.oa.schedule_conflicts import time_to_minutes
+
+
+DEFAULT_ALTERNATIVES = 6
+MAX_ALTERNATIVES = 10
+
+
+class _PlanOption:
+    """某个报名的一个备选方案，按日期记录课次区间，用于两两判断冲突。"""
+
+    def __init__(self, enrollment, plan):
+        from modules.auth.services import _plan_sort_key
+
+        self.enrollment = enrollment
+        self.plan = plan
+        self.score = plan.get('plan_score', 0)
+        self.rank = (-self.score, _plan_sort_key(plan))
+        self.sessions = {}
+        for session in plan.get('session_dates') or []:
+            self.sessions.setdefault(session['date'], []).append(
+                (time_to_minutes(session['time_start']), time_to_minutes(session['time_end']))
+            )
+
+    def conflicts_with(self, other):
+        shares_teacher = self.enrollment.teacher_id == other.enrollment.teacher_id
+        shares_student = (
+            self.enrollment.student_profile_id
+            and self.enrollment.student_profile_id == other.enrollment.student_profile_id
+        )
+        if not (shares_teacher or shares_student):
+            return False
+        for course_date, intervals in self.sessions.items():
+            for start, end in other.sessions.get(course_date, ()):
+                if any(min(end, other_end) > max(start, other_start) for other_start, other_end in intervals):
+                    return True
+        return False
+
+
+def _is_free(option, chosen, *, skip=()):
+    return not any(
+        other is not None and position not in skip and option.conflicts_with(other)
+        for position, other in enumerate(chosen)
+    )
+
+
+def _repair(position, options_by_position, chosen):
+    """把唯一挡路的报名换到它另一个不冲突的备选上，为 `position` 腾出一个备选。"""
+    for option in options_by_position[position]:
+        blockers = [
+            index for index, other in enumerate(chosen)
+            if other is not None and option.conflicts_with(other)
+        ]
+        if len(blockers) != 1:
+            continue
+        blocker = blockers[0]
+        for alternative in options_by_position[blocker]:
+            if alternative is chosen[blocker] or alternative.conflicts_with(option):
+                continue
+            if _is_free(alternative, chosen, skip={blocker}):
+                chosen[blocker] = alternative
+                chosen[position] = option
+                return True
+    return False
+
+
+def _improve(options_by_position, chosen):
+    """逐个把已排报名换成排名更好的备选；每次替换只让一个报名变好，循环必然结束。"""
+    ranked_options = [sorted(options, key=lambda item: item.rank) for options in options_by_position]
+    improved = True
+    while improved:
+        improved = False
+        for position, options in enumerate(ranked_options):
+            current = chosen[position]
+            for option in options:
+                if current is not None and option.rank >= current.rank:
+                    break
+                if _is_free(option, chosen, skip={position}):
+                    chosen[position] = option
+                    improved = True
+                    break
+
+
+def solve_plan_assignment(options_by_position):
+    """`options_by_position` 已按优先级排好，每项是该报名按 `_plan_sort_key` 排序的备选。
+
+    返回与之等长的列表，每个报名选中的备选或 None。
+    """
+    chosen = [None] * len(options_by_position)
+    for position, options in enumerate(options_by_position):
+        for option in options:
+            if _is_free(option, chosen):
+                chosen[position] = option
+                break
+        else:
+            _repair(position, options_by_position, chosen)
+    _improve(options_by_position, chosen)
+    return chosen
+
+
+def preview_enrollment_timetable(*, enrollment_ids=None, alternatives=DEFAULT_ALTERNATIVES):
+    """联合排待排课报名，返回每个报名的选中方案；只读，不改动报名。"""
+    from sqlalchemy.orm import selectinload
+
+    from modules.auth.batch_planning import _load_shared_occupancy, _replan_priority_key
+    from modules.auth.models import Enrollment
+    from modules.auth.services import _search_enrollment_plans, get_business_today
+
+    query = Enrollment.query.filter(Enrollment.status == 'pending_schedule').options(
+        selectinload(Enrollment.teacher),
+        selectinload(Enrollment.student_profile),
+    )
+    if enrollment_ids is not None:
+        # 显式传入空列表表示一个都不处理，不能退化成全部待排课报名
+        query = query.filter(Enrollment.id.in_(enrollment_ids))
+    enrollments = sorted(query.all(), key=_replan_priority_key)
+    if not enrollments:
+        return {'assigned': 0, 'unassigned': 0, 'total_score': 0, 'enrollments': []}
+
+    alternatives = min(max(int(alternatives or DEFAULT_ALTERNATIVES), 1), MAX_ALTERNATIVES)
+    occupancy = _load_shared_occupancy(enrollments, get_business_today())
+    options_by_position = []
+    for enrollment in enrollments:
+        plans = []
+        if enrollment.student_profile:
+            _, plans = _search_enrollment_plans(enrollment, occupancy=occupancy, limit=alternatives)
+        options_by_position.append([_PlanOption(enrollment, plan) for plan in plans])
+
+    chosen = solve_plan_assignment(options_by_position)
+    items = []
+    for priority, (enrollment, options, option) in enumerate(zip(enrollments, options_by_position, chosen), start=1):
+        reason = None
+        if option is None:
+            reason = '所有备选方案都与更优先报名的方案冲突' if options else '没有可行的排课方案'
+        items.append({
+            'enrollment_id': enrollment.id,
+            'priority': priority,
+            'student_name': enrollment.student_name,
+            'course_name': enrollment.course_name,
+            'teacher_id': enrollment.teacher_id,
+            'teacher_name': enrollment.teacher.display_name if enrollment.teacher else '',
+            'delivery_urgency': enrollment.delivery_urgency or 'normal',
+            'target_finish_date': enrollment.target_finish_date.isoformat() if enrollment.target_finish_date else None,
+            'alternatives': len(options),
+            'plan': option.plan if option else None,
+            'is_independent_best': bool(option and options and option is options[0]),
+            'reason': reason,
+        })
+    assigned = [option for option in chosen if option is not None]
+    return {
+        'assigned': len(assigned),
+        'unassigned': len(chosen) - len(assigned),
+        'total_score': sum(option.score for option in assigned),
+        'enrollments': items,
+    }
@@ -1,12 +1,17 @@
 import json
+import threading
 from datetime import date, datetime
 
-from sqlalchemy import or_
+from flask import current_app, has_app_context
+
+from sqlalchemy import and_, event, inspect as sa_inspect, or_
+from sqlalchemy.orm import Session, selectinload
 
 from extensions import db
 from modules.auth import services as auth_services
 from modules.auth.models import ChatMessage, Enrollment, LeaveRequest
-from modules.oa.models import CourseSchedule, OATodo
+from modules.oa.models import CourseFeedback, CourseSchedule, OATodo
+from modules.oa.schedule_conflicts import ScheduleOccupancy
 
 MAKEUP_FEEDBACK_PREFIX = '[补课反馈]'
 MAKEUP_PLAN_PREFIX = '[补课方案]'
@@ -40,11 +45,8 @@ def _set_todo_state(todo, workflow_status):
 
 
 def _load_enrollment_confirmed_slot(enrollment):
-    if not enrollment or not enrollment.confirmed_slot:
-        return None
-    try:
-        raw_plan = json.loads(enrollment.confirmed_slot)
-    except (TypeError, ValueError):
+    raw_plan = enrollment.json_copy('confirmed_slot') if enrollment else None
+    if raw_plan is None:
         return None
     return auth_services.normalize_plan(raw_plan, enrollment)
 
@@ -107,7 +109,7 @@ def _workflow_target_teacher_id(todo):
         return todo.schedule.teacher_id
     if todo.leave_request and todo.leave_request.schedule and todo.leave_request.schedule.teacher_id:
         return todo.leave_request.schedule.teacher_id
-    payload = todo.get_payload_data() or {}
+    payload = todo.get_payload_view()
     context = payload.get('context') or {}
     return context.get('teacher_id')
 
@@ -119,7 +121,7 @@ def _workflow_target_teacher_name(todo):
         return todo.schedule.teacher
     if todo.leave_request and todo.leave_request.schedule and todo.leave_request.schedule.teacher:
         return todo.leave_request.schedule.teacher
-    payload = todo.get_payload_data() or {}
+    payload = todo.get_payload_view()
     context = payload.get('context') or {}
     return context.get('teacher_name')
 
@@ -340,43 +342,19 @@ def list_workflow_todos_for_user(user, *, status='open', todo_type=None, enrollm
             OATodo.enrollment.has(Enrollment.student_profile_id == profile.id),
         )
 
-    todos = query.order_by(
+    return query.filter(workflow_todo_visible_clause()).order_by(
         OATodo.is_completed,
         OATodo.priority,
         OATodo.due_date.is_(None).asc(),
         OATodo.due_date.asc(),
         OATodo.created_at.desc(),
     ).all()
-    visible_todos = []
-    changed = False
-    for todo in todos:
-        if reconcile_stale_workflow_todo(todo):
-            changed = True
-        if workflow_todo_stale_reason(todo):
-            continue
-        if (
-            todo.todo_type == OATodo.TODO_TYPE_SCHEDULE_FEEDBACK
-            and not auth_services.schedule_requires_course_feedback(todo.schedule)
-        ):
-            if not todo.is_completed:
-                cancel_schedule_feedback_todo(
-                    todo.schedule_id,
-                    reason=auth_services.get_course_feedback_skip_reason(todo.schedule) or '',
-                )
-                changed = True
-            continue
-        visible_todos.append(todo)
-    if changed:
-        db.session.commit()
-    return visible_todos
 
 
 def get_workflow_todo(todo_id):
     todo = db.session.get(OATodo, todo_id)
     if not todo or not todo.is_workflow:
         return None
-    if reconcile_stale_workflow_todo(todo):
-        db.session.commit()
     if workflow_todo_stale_reason(todo):
         return None
     return todo
@@ -493,7 +471,8 @@ def build_workflow_todo_payload(todo, actor=None):
         return None
 
     payload = todo.to_dict()
-    workflow_payload = _copy_jsonable(todo.get_payload_data()) or {}
+    # 只改顶层键，嵌套结构沿用实例缓存的只读解析结果
+    workflow_payload = dict(todo.get_payload_view())
     enrollment = todo.enrollment
     schedule = todo.schedule
     leave_request = todo.leave_request
@@ -656,46 +635,69 @@ def build_workflow_todo_payload(todo, actor=None):
 
 
 def get_enrollment_workflow_todos(enrollment_id, actor=None, *, include_closed=False):
-    query = OATodo.query.filter(
+    return get_enrollments_workflow_todos(
+        [enrollment_id],
+        actor,
+        include_closed=include_closed,
+    ).get(enrollment_id, [])
+
+
+def get_enrollments_workflow_todos(enrollment_ids, actor=None, *, include_closed=False):
+    """按报名批量取工作流待办 payload，返回 {enrollment_id: [payload, ...]}。"""
+    enrollment_ids = list(dict.fromkeys(enrollment_id for enrollment_id in enrollment_ids or [] if enrollment_id))
+    if not enrollment_ids:
+        return {}
+    query = OATodo.query.options(
+        selectinload(OATodo.enrollment).selectinload(Enrollment.teacher),
+        selectinload(OATodo.leave_request),
+        selectinload(OATodo.creator),
+    ).filter(
         OATodo.todo_type != OATodo.TODO_TYPE_GENERIC,
-        OATodo.enrollment_id == enrollment_id,
+        OATodo.enrollment_id.in_(enrollment_ids),
     )
     if not include_closed:
         query = query.filter(OATodo.is_completed == False)
     if actor and getattr(actor, 'role', None) == 'student':
         query = query.filter(OATodo.todo_type.in_(tuple(PROCESS_WORKFLOW_TYPES)))
     todos = query.order_by(OATodo.created_at.desc()).all()
-    return [build_workflow_todo_payload(todo, actor) for todo in todos]
+
+    grouped = {}
+    for todo in todos:
+        grouped.setdefault(todo.enrollment_id, []).append(build_workflow_todo_payload(todo, actor))
+    return grouped
 
 
 def get_schedule_workflow_todos(schedule_id, actor=None, *, include_closed=False):
-    query = OATodo.query.filter(
+    return get_schedules_workflow_todos(
+        [schedule_id],
+        actor,
+        include_closed=include_closed,
+    ).get(schedule_id, [])
+
+
+def get_schedules_workflow_todos(schedule_ids, actor=None, *, include_closed=False):
+    """按课次批量取工作流待办 payload，返回 {schedule_id: [payload, ...]}。"""
+    schedule_ids = list(dict.fromkeys(schedule_id for schedule_id in schedule_ids or [] if schedule_id))
+    if not schedule_ids:
+        return {}
+    query = OATodo.query.options(
+        selectinload(OATodo.enrollment).selectinload(Enrollment.teacher),
+        selectinload(OATodo.leave_request),
+        selectinload(OATodo.creator),
+    ).filter(
         OATodo.todo_type != OATodo.TODO_TYPE_GENERIC,
-        OATodo.schedule_id == schedule_id,
+        OATodo.schedule_id.in_(schedule_ids),
     )
     if not include_closed:
         query = query.filter(OATodo.is_completed == False)
     if actor and getattr(actor, 'role', None) == 'student':
         query = query.filter(OATodo.todo_type.in_(tuple(PROCESS_WORKFLOW_TYPES)))
-    todos = query.order_by(OATodo.created_at.desc()).all()
-    visible_todos = []
-    changed = False
+    todos = query.filter(workflow_todo_visible_clause()).order_by(OATodo.created_at.desc()).all()
+
+    grouped = {}
     for todo in todos:
-        if (
-            todo.todo_type == OATodo.TODO_TYPE_SCHEDULE_FEEDBACK
-            and not auth_services.schedule_requires_course_feedback(todo.schedule)
-        ):
-            if not todo.is_completed:
-                cancel_schedule_feedback_todo(
-                    todo.schedule_id,
-                    reason=auth_services.get_course_feedback_skip_reason(todo.schedule) or '',
-                )
-                changed = True
-            continue
-        visible_todos.append(todo)
-    if changed:
-        db.session.commit()
-    return [build_workflow_todo_payload(todo, actor) for todo in visible_todos]
+        grouped.setdefault(todo.schedule_id, []).append(build_workflow_todo_payload(todo, actor))
+    return grouped
 
 
 def get_leave_request_workflow(leave_request_id, actor=None):
@@ -962,23 +964,21 @@ def _collect_makeup_plan_issues(leave_request, session_dates):
         errors.append('补课时间不能早于当前业务时间')
 
     ignore_ids = [leave_request.schedule_id] if leave_request.schedule_id else []
-    query = CourseSchedule.query.filter(
-        CourseSchedule.teacher_id == enrollment.teacher_id,
-        CourseSchedule.date == date.fromisoformat(session['date']),
-    )
-    if ignore_ids:
-        query = query.filter(~CourseSchedule.id.in_(ignore_ids))
-    for existing in query.all():
-        if auth_services._slots_overlap(
-            session['time_start'],
-            session['time_end'],
-            existing.time_start,
-            existing.time_end,
-        ):
-            errors.append(
-                f'{session["date"]} {session["time_start"]}-{session["time_end"]} '
-                f'与老师现有课程冲突：{existing.course_name} {existing.time_start}-{existing.time_end}'
-            )
+    session_date = date.fromisoformat(session['date'])
+    occupancy = ScheduleOccupancy.load(dates=[session_date], teacher_id=enrollment.teacher_id)
+    teacher_conflicts = occupancy.find_conflicts(
+        session_date,
+        session['time_start'],
+        session['time_end'],
+        teacher_id=enrollment.teacher_id,
+        exclude_schedule_ids=ignore_ids,
+        require_teacher=False,
+    )['teacher']
+    for existing in teacher_conflicts:
+        errors.append(
+            f'{session["date"]} {session["time_start"]}-{session["time_end"]} '
+            f'与老师现有课程冲突：{existing.course_name} {existing.time_start}-{existing.time_end}'
+        )
 
     teacher_ranges = auth_services._load_teacher_available_ranges(enrollment.teacher_id)
     preferred_slot_entries = auth_services._normalize_available_slot_entries(leave_request.makeup_available_slots_json)
@@ -1021,36 +1021,29 @@ def _collect_student_profile_conflicts(enrollment, session_dates):
     if not enrollment or not getattr(enrollment, 'student_profile_id', None) or not session_dates:
         return []
 
-    session_dates_set = {session['date'] for session in session_dates if session.get('date')}
-    if not session_dates_set:
+    sessions = [session for session in session_dates if session.get('date')]
+    if not sessions:
         return []
 
-    query = db.session.query(CourseSchedule).filter(
-        auth_services.student_schedule_profile_clause(enrollment.student_profile_id, schedule_model=CourseSchedule),
-        CourseSchedule.date.in_(session_dates_set),
+    occupancy = ScheduleOccupancy.load(
+        dates=[date.fromisoformat(session['date']) for session in sessions],
+        student_profile_id=enrollment.student_profile_id,
     )
-    if enrollment.id:
-        query = query.filter(
-            or_(CourseSchedule.enrollment_id.is_(None), CourseSchedule.enrollment_id != enrollment.id)
-        )
-
-    existing_by_date = {}
-    for schedule in query.all():
-        existing_by_date.setdefault(schedule.date.isoformat(), []).append(schedule)
-
     errors = []
-    for session in session_dates:
-        for existing in existing_by_date.get(session.get('date'), []):
-            if auth_services._slots_overlap(
-                session['time_start'],
-                session['time_end'],
-                existing.time_start,
-                existing.time_end,
-            ):
-                errors.append(
-                    f'{session["date"]} {session["time_start"]}-{session["time_end"]} '
-                    f'与同一学生跨报名课次冲突：{existing.course_name} {existing.time_start}-{existing.time_end}'
-                )
+    for session in sessions:
+        student_conflicts = occupancy.find_conflicts(
+            date.fromisoformat(session['date']),
+            session['time_start'],
+            session['time_end'],
+            enrollment_id=enrollment.id,
+            student_profile_id=enrollment.student_profile_id,
+            require_teacher=False,
+        )['student']
+        for existing in student_conflicts:
+            errors.append(
+                f'{session["date"]} {session["time_start"]}-{session["time_end"]} '
+                f'与同一学生跨报名课次冲突：{existing.course_name} {existing.time_start}-{existing.time_end}'
+            )
     return list(dict.fromkeys(errors))
 
 
@@ -1189,7 +1182,7 @@ def preview_teacher_workflow_proposal(todo, actor, session_dates, weekly_slots=N
         plan, errors, warnings = _proposal_validation(todo, session_dates, weekly_slots=weekly_slots)
 
     current_plan_summary = auth_services._summarize_plan(plan) if plan else None
-    context = (todo.get_payload_data() or {}).get('context') or {}
+    context = todo.get_payload_view().get('context') or {}
     risk_assessment = context.get('risk_assessment') or {}
     return {
         'success': True,
@@ -1770,6 +1763,10 @@ def cancel_schedule_feedback_todo(schedule_id, *, reason=''):
     ).order_by(OATodo.created_at.desc()).first()
     if not todo:
         return None
+    return _cancel_feedback_todo(todo, reason=reason)
+
+
+def _cancel_feedback_todo(todo, *, reason=''):
     payload = _workflow_base_payload(todo)
     if reason:
         payload['cancel_reason'] = reason
@@ -1778,6 +1775,236 @@ def cancel_schedule_feedback_todo(schedule_id, *, reason=''):
     return todo
 
 
+def _schedule_requires_feedback_clause():
+    return and_(
+        CourseSchedule.is_cancelled == False,
+        or_(
+            CourseSchedule.import_run_id.is_(None),
+            CourseSchedule.date >= auth_services.IMPORTED_SCHEDULE_FEEDBACK_START_DATE,
+        ),
+    )
+
+
+def workflow_todo_visible_clause():
+    """SQL 版的 workflow_todo_stale_reason + 课后反馈可见性判断。
+
+    列表接口只用它过滤，不在读请求里改写待办；失效待办由 reconcile_stale_workflow_todos 统一关闭。
+    """
+    return or_(
+        ~OATodo.todo_type.in_(tuple(OATodo.workflow_types())),
+        and_(
+            OATodo.todo_type == OATodo.TODO_TYPE_ENROLLMENT_REPLAN,
+            OATodo.enrollment.has(),
+        ),
+        and_(
+            OATodo.todo_type == OATodo.TODO_TYPE_LEAVE_MAKEUP,
+            OATodo.leave_request.has(),
+            or_(
+                OATodo.enrollment.has(),
+                OATodo.schedule.has(),
+                OATodo.leave_request.has(LeaveRequest.schedule.has()),
+            ),
+        ),
+        and_(
+            OATodo.todo_type == OATodo.TODO_TYPE_SCHEDULE_FEEDBACK,
+            OATodo.schedule.has(_schedule_requires_feedback_clause()),
+        ),
+    )
+
+
+def filter_visible_oa_todos(query):
+    """OA 通用待办列表的可见性：普通待办全部展示，工作流待办只展示仍在进行中的。"""
+    return query.filter(
+        workflow_todo_visible_clause(),
+        or_(
+            ~OATodo.todo_type.in_(tuple(OATodo.workflow_types())),
+            and_(
+                OATodo.is_completed == False,
+                or_(
+                    OATodo.workflow_status.is_(None),
+                    ~OATodo.workflow_status.in_([
+                        OATodo.WORKFLOW_STATUS_COMPLETED,
+                        OATodo.WORKFLOW_STATUS_CANCELLED,
+                    ]),
+                ),
+            ),
+        ),
+    )
+
+
+def reconcile_stale_workflow_todos(*, session=None, commit=True, dry_run=False):
+    """关闭关联已删除的流程待办，以及课次已无需反馈的课后反馈待办。
+
+    读接口只按 `workflow_todo_visible_clause()` 过滤，不再顺手落库；真正的关闭由
+    提交后排队的后台任务（见 `process_pending_workflow_reconcile()`）和定时兜底任务调用这里完成。
+    """
+    session = session or db.session
+    todos = session.query(OATodo).filter(
+        OATodo.todo_type.in_(tuple(OATodo.workflow_types())),
+        OATodo.is_completed == False,
+        ~workflow_todo_visible_clause(),
+    ).all()
+    if dry_run:
+        return {'reconciled': len(todos), 'todo_ids': [todo.id for todo in todos], 'dry_run': True}
+    reconciled_ids = []
+    for todo in todos:
+        if reconcile_stale_workflow_todo(todo):
+            reconciled_ids.append(todo.id)
+        elif todo.todo_type == OATodo.TODO_TYPE_SCHEDULE_FEEDBACK:
+            _cancel_feedback_todo(
+                todo,
+                reason=auth_services.get_course_feedback_skip_reason(todo.schedule) or '',
+            )
+            reconciled_ids.append(todo.id)
+    if reconciled_ids and commit:
+        session.commit()
+    return {'reconciled': len(reconciled_ids), 'todo_ids': reconciled_ids}
+
+
+_WORKFLOW_RECONCILE_FLAG = 'scf_reconcile_workflow_todos'
+_WORKFLOW_RECONCILE_STATE_KEY = 'scf_workflow_reconcile'
+_SCHEDULE_FEEDBACK_SCOPE_FIELDS = ('is_cancelled', 'import_run_id', 'date')
+
+
+_FEEDBACK_PENDING_SCHEDULE_IDS = 'scf_feedback_pending_schedule_ids'
+
+
+def _affected_schedule_ids(obj):
+    if isinstance(obj, CourseSchedule):
+        return {obj.id}
+    # 反馈/请假改挂到别的课次时，新旧两个课次都要重算
+    state = sa_inspect(obj)
+    history = state.attrs.schedule_id.history
+    return (
+        set(history.unchanged or ()) | set(history.added or ()) | set(history.deleted or ())
+        | {state.dict.get('schedule_id')}
+    )
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_feedback_pending_schedules(session, flush_context):
+    schedule_ids = set()
+    for obj in session.new:
+        if isinstance(obj, (CourseSchedule, CourseFeedback, LeaveRequest)):
+            schedule_ids |= _affected_schedule_ids(obj)
+    for obj in session.deleted:
+        if isinstance(obj, (CourseFeedback, LeaveRequest)):
+            schedule_ids |= _affected_schedule_ids(obj)
+    for obj in session.dirty:
+        if isinstance(obj, (CourseFeedback, LeaveRequest)):
+            schedule_ids |= _affected_schedule_ids(obj)
+        elif isinstance(obj, CourseSchedule):
+            state = sa_inspect(obj)
+            if any(state.attrs[field].history.has_changes() for field in _SCHEDULE_FEEDBACK_SCOPE_FIELDS):
+                schedule_ids.add(obj.id)
+    schedule_ids.discard(None)
+    if schedule_ids:
+        session.info.setdefault(_FEEDBACK_PENDING_SCHEDULE_IDS, set()).update(schedule_ids)
+
+
+@event.listens_for(Session, 'after_flush')
+def _flag_workflow_todo_reconcile(session, flush_context):
+    if session.info.get(_WORKFLOW_RECONCILE_FLAG):
+        return
+    for obj in session.deleted:
+        if isinstance(obj, (Enrollment, LeaveRequest, CourseSchedule)):
+            session.info[_WORKFLOW_RECONCILE_FLAG] = True
+            return
+    for obj in session.new:
+        if isinstance(obj, OATodo) and obj.is_workflow:
+            session.info[_WORKFLOW_RECONCILE_FLAG] = True
+            return
+    for obj in session.dirty:
+        if not isinstance(obj, CourseSchedule):
+            continue
+        state = sa_inspect(obj)
+        if any(state.attrs[field].history.has_changes() for field in _SCHEDULE_FEEDBACK_SCOPE_FIELDS):
+            session.info[_WORKFLOW_RECONCILE_FLAG] = True
+            return
+
+
+_FEEDBACK_SCOPE_MODELS = (CourseSchedule, CourseFeedback, LeaveRequest)
+
+
+def _has_unflushed_feedback_scope_changes(session):
+    return any(
+        isinstance(obj, _FEEDBACK_SCOPE_MODELS)
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+    )
+
+
+@event.listens_for(Session, 'before_commit')
+def _refresh_flagged_feedback_pending(session):
+    # 只有本事务碰过课次/反馈/请假时才需要 flush 出待重算的课次，其余提交直接放行
+    if _FEEDBACK_PENDING_SCHEDULE_IDS not in session.info and not _has_unflushed_feedback_scope_changes(session):
+        return
+    session.flush()
+    schedule_ids = session.info.pop(_FEEDBACK_PENDING_SCHEDULE_IDS, None)
+    if schedule_ids:
+        auth_services.refresh_schedule_feedback_pending(schedule_ids, session=session)
+
+
+class _WorkflowReconcileState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = False
+        self.worker_running = False
+
+
+def _workflow_reconcile_state():
+    state = current_app.extensions.get(_WORKFLOW_RECONCILE_STATE_KEY)
+    if state is None:
+        state = current_app.extensions[_WORKFLOW_RECONCILE_STATE_KEY] = _WorkflowReconcileState()
+    return state
+
+
+@event.listens_for(Session, 'after_commit')
+def _queue_workflow_todo_reconcile(session):
+    """提交里删了关联对象或新建了流程待办时，排一次后台清理，不占用本次提交。"""
+    if not session.info.pop(_WORKFLOW_RECONCILE_FLAG, False) or not has_app_context():
+        return
+    state = _workflow_reconcile_state()
+    with state.lock:
+        state.pending = True
+        if state.worker_running or not current_app.config.get('SCF_WORKFLOW_RECONCILE_ASYNC'):
+            return
+        state.worker_running = True
+    from core.tasks import TaskRunner
+
+    TaskRunner.run_async(_run_workflow_reconcile_worker)
+
+
+def process_pending_workflow_reconcile():
+    """执行排队中的流程待办清理；没有排队时什么也不做。返回清理结果或 None。"""
+    state = _workflow_reconcile_state()
+    with state.lock:
+        if not state.pending:
+            return None
+        state.pending = False
+    return reconcile_stale_workflow_todos()
+
+
+def _run_workflow_reconcile_worker():
+    state = _workflow_reconcile_state()
+    while True:
+        try:
+            process_pending_workflow_reconcile()
+        except Exception:
+            # 读接口已经按可见性过滤，这里失败只是晚点关闭，定时任务会兜底
+            db.session.rollback()
+            current_app.logger.exception('workflow todo reconcile failed')
+        with state.lock:
+            if not state.pending:
+                state.worker_running = False
+                return
+
+
+@event.listens_for(Session, 'after_rollback')
+def _clear_workflow_todo_reconcile_flag(session):
+    session.info.pop(_WORKFLOW_RECONCILE_FLAG, None)
+    session.info.pop(_FEEDBACK_PENDING_SCHEDULE_IDS, None)
+
+
 def workflow_todo_stale_reason(todo):
     if not todo or not todo.is_workflow:
         return None
@@ -1,20 +1,89 @@
+import hashlib
+import json
 import os
+import shutil
+import stat
 import subprocess
 import tempfile
+import threading
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+# 编译命令参与缓存 key，修改 _compile 里的 gcc 参数时同步修改这里，旧二进制自然失效
+COMPILER_SIGNATURE = 'gcc -Wall -lm'
+DEFAULT_CACHE_DIR_NAME = 'c_binaries'
+DEFAULT_CACHE_SIZE = 200
+
+_compile_locks = {}
+_compile_locks_guard = threading.Lock()
+
+
+def _default_cache_dir():
+    """
+    缓存目录默认放在应用私有的运行目录（SCF_RUNTIME_ROOT）下，可用 C_BINARY_CACHE_DIR 覆盖；
+    脱离应用上下文（脚本、单测）时放在当前用户的 ~/.cache 下。不放在共享的 /tmp。
+    """
+    from flask import current_app, has_app_context
+
+    if has_app_context():
+        configured = current_app.config.get('C_BINARY_CACHE_DIR')
+        if configured:
+            return configured
+        runtime_root = current_app.config.get('SCF_RUNTIME_ROOT')
+        if runtime_root:
+            return os.path.join(runtime_root, DEFAULT_CACHE_DIR_NAME)
+    return os.path.join(os.path.expanduser('~'), '.cache', 'scf', DEFAULT_CACHE_DIR_NAME)
+
+
+def _ensure_private_dir(path):
+    """
+    创建（或确认）只有当前用户能写的缓存目录。
+
+    缓存里的二进制会被直接执行，目录如果是别人建的、是符号链接，或者组/其他用户可写，
+    就可能被预先放进伪造的编译结果，这种目录一律不用。
+    """
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        info = os.lstat(path)
+    except OSError:
+        return False
+    if not stat.S_ISDIR(info.st_mode):
+        return False
+    if os.name == 'nt':
+        return True
+    return info.st_uid == os.geteuid() and not info.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def _compile_lock(key):
+    """同一份源码并发提交时只让一个线程真正去编译。"""
+    with _compile_locks_guard:
+        lock = _compile_locks.get(key)
+        if lock is None:
+            lock = _compile_locks[key] = threading.Lock()
+        return lock
 
 
 class CExecutor:
     """C语言代码编译执行器"""
 
-    def __init__(self, compile_timeout=10, run_timeout=5):
+    def __init__(self, compile_timeout=10, run_timeout=5, *, cache_dir=None, cache_size=DEFAULT_CACHE_SIZE):
         """
         初始化C代码执行器
         :param compile_timeout: 编译超时时间（秒）
         :param run_timeout: 运行超时时间（秒）
+        :param cache_dir: 编译产物缓存目录，按源码哈希命名；默认见 `_default_cache_dir()`，
+            目录不属于当前用户或他人可写时不使用缓存
+        :param cache_size: 缓存保留的编译结果数量，超出后按最近使用时间淘汰
         """
         self.compile_timeout = compile_timeout
         self.run_timeout = run_timeout
+        self._cache_dir = cache_dir
+        self.cache_size = max(1, int(cache_size))
+
+    @property
+    def cache_dir(self):
+        return self._cache_dir or _default_cache_dir()
 
     def execute(self, code: str, stdin_input: str = "") -> dict:
         """
@@ -23,33 +92,160 @@ class CExecutor:
         :param stdin_input: 标准输入
         :return: 执行结果字典
         """
-        # 创建临时目录
-        temp_dir = tempfile.gettempdir()
-        unique_id = str(uuid.uuid4())[:8]
-        source_file = os.path.join(temp_dir, f"code_{unique_id}.c")
+        return self.execute_many(code, [stdin_input])[0]
+
+    def execute_many(self, code: str, stdin_inputs: list, max_workers: int = None) -> list:
+        """
+        只编译一次，用同一个二进制依次（或并行）跑多组输入
+        :param code: C源代码
+        :param stdin_inputs: 每个测试用例的标准输入
+        :param max_workers: 并行运行的用例数，默认按 CPU 核数
+        :return: 与 stdin_inputs 一一对应的执行结果字典列表
+        """
+        stdin_inputs = list(stdin_inputs)
+        compile_result = self.compile(code)
+        if not compile_result['success']:
+            error_result = {
+                key: value for key, value in compile_result.items()
+                if key not in ('binary', 'cached', 'temporary')
+            }
+            return [dict(error_result) for _ in stdin_inputs]
+
+        binary_file = compile_result['binary']
+        workers = min(len(stdin_inputs), max_workers or os.cpu_count() or 1)
+        try:
+            if workers <= 1:
+                return [self._run(binary_file, stdin_input) for stdin_input in stdin_inputs]
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                return list(pool.map(lambda stdin_input: self._run(binary_file, stdin_input), stdin_inputs))
+        finally:
+            if compile_result.get('temporary'):
+                shutil.rmtree(os.path.dirname(binary_file), ignore_errors=True)
 
+    def compile(self, code: str) -> dict:
+        """
+        编译C代码，结果按源码哈希缓存在磁盘上；同样的代码再次提交直接复用
+        :param code: C源代码
+        :return: 成功时 {'success': True, 'binary', 'warnings', 'cached'}，失败时为编译错误结果；
+            缓存目录不可信时编译到临时目录，结果带 'temporary': True，由调用方用完后删除
+        """
+        cache_dir = self.cache_dir
+        if not _ensure_private_dir(cache_dir):
+            return self._compile_uncached(code)
+
+        key = self._cache_key(code)
+        cached = self._load_cached(key)
+        if cached is not None:
+            return cached
+
+        with _compile_lock(key):
+            cached = self._load_cached(key)
+            if cached is not None:
+                return cached
+            result = self._compile_into_cache(code, key)
+        self._prune_cache()
+        return result
+
+    def _cache_key(self, code: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(COMPILER_SIGNATURE.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(code.encode('utf-8'))
+        return digest.hexdigest()
+
+    def _cache_paths(self, key: str):
         # Windows 和 Linux 的可执行文件扩展名不同
-        if os.name == 'nt':
-            binary_file = os.path.join(temp_dir, f"code_{unique_id}.exe")
-        else:
-            binary_file = os.path.join(temp_dir, f"code_{unique_id}")
+        binary_name = f"{key}.exe" if os.name == 'nt' else key
+        return os.path.join(self.cache_dir, binary_name), os.path.join(self.cache_dir, f"{key}.json")
+
+    def _load_cached(self, key: str):
+        binary_file, meta_file = self._cache_paths(key)
+        try:
+            with open(meta_file, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if meta.get('success'):
+            if not os.path.exists(binary_file):
+                return None
+            self._touch(binary_file)
+        self._touch(meta_file)
+        meta['binary'] = binary_file if meta.get('success') else None
+        meta['cached'] = True
+        return meta
+
+    def _compile_uncached(self, code: str) -> dict:
+        work_dir = tempfile.mkdtemp(prefix='scf_c_')
+        binary_name = 'program.exe' if os.name == 'nt' else 'program'
+        source_file = os.path.join(work_dir, 'code.c')
+        binary_file = os.path.join(work_dir, binary_name)
+        with open(source_file, 'w', encoding='utf-8') as f:
+            f.write(code)
+        result = self._compile(source_file, binary_file)
+        if not result['success']:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            return result
+        result.update(binary=binary_file, cached=False, temporary=True)
+        return result
+
+    def _compile_into_cache(self, code: str, key: str) -> dict:
+        binary_file, meta_file = self._cache_paths(key)
+        work_dir = tempfile.mkdtemp(prefix='scf_c_', dir=self.cache_dir)
+        unique_id = str(uuid.uuid4())[:8]
+        source_file = os.path.join(work_dir, f"code_{unique_id}.c")
+        built_file = os.path.join(work_dir, os.path.basename(binary_file))
 
         try:
-            # 写入源代码
             with open(source_file, 'w', encoding='utf-8') as f:
                 f.write(code)
 
-            # 编译
-            compile_result = self._compile(source_file, binary_file)
-            if not compile_result['success']:
-                return compile_result
+            result = self._compile(source_file, built_file)
+            if result.get('timeout'):
+                # 超时可能只是机器繁忙，不写缓存
+                return result
+            if result['success']:
+                os.replace(built_file, binary_file)
 
-            # 执行
-            return self._run(binary_file, stdin_input)
+            meta = {key: value for key, value in result.items() if key != 'binary'}
+            tmp_meta = os.path.join(work_dir, 'meta.json')
+            with open(tmp_meta, 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+            os.replace(tmp_meta, meta_file)
 
+            result['binary'] = binary_file if result['success'] else None
+            result['cached'] = False
+            return result
         finally:
-            # 清理临时文件
-            self._cleanup(source_file, binary_file)
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def _prune_cache(self):
+        """按最近使用时间（mtime）淘汰超出数量的编译结果。"""
+        try:
+            entries = [
+                entry for entry in os.scandir(self.cache_dir)
+                if entry.is_file() and entry.name.endswith('.json')
+            ]
+        except OSError:
+            return
+        if len(entries) <= self.cache_size:
+            return
+
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.cache_size]:
+            key = entry.name[:-len('.json')]
+            for path in self._cache_paths(key):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    @staticmethod
+    def _touch(path: str):
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
 
     def _compile(self, source_file: str, binary_file: str) -> dict:
         """编译C代码"""
@@ -166,13 +362,3 @@ class CExecutor:
         error = error.replace(source_file, 'main.c')
         error = error.replace(filename, 'main.c')
         return error
-
-    def _cleanup(self, source_file: str, binary_file: str):
-        """清理临时文件"""
-        try:
-            if os.path.exists(source_file):
-                os.remove(source_file)
-            if os.path.exists(binary_file):
-                os.remove(binary_file)
-        except Exception:
-            pass  # 忽略清理错误
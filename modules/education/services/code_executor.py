@@ -1,111 +1,91 @@
-import sys
-import io
-import traceback
-import threading
-import queue
-from contextlib import redirect_stdout, redirect_stderr
+from concurrent.futures import ThreadPoolExecutor
+
+from .sandbox_pool import (
+    DEFAULT_MAX_RUNS,
+    DEFAULT_MEMORY_LIMIT_MB,
+    DEFAULT_OUTPUT_LIMIT,
+    DEFAULT_POOL_SIZE,
+    get_sandbox_pool,
+)
+
+
+def _sandbox_option(name, default):
+    """优先读取 Flask 配置，脱离应用上下文（脚本、单测）时回落到默认值。"""
+    from flask import current_app, has_app_context
+
+    if has_app_context():
+        value = current_app.config.get(name)
+        if value not in (None, ''):
+            return value
+    return default
 
 
 class CodeExecutor:
-    """Python代码执行器"""
+    """Python代码执行器（进程池沙箱）"""
 
-    def __init__(self, timeout=5):
+    def __init__(self, timeout=5, *, pool_size=None, max_runs=None, memory_limit_mb=None, output_limit=None):
         """
         初始化代码执行器
-        :param timeout: 执行超时时间（秒）
+        :param timeout: 执行超时时间（秒），超时后工作进程会被直接杀掉
+        :param pool_size: 预启动的工作进程数，默认读 CODE_SANDBOX_WORKERS
+        :param max_runs: 单个工作进程执行多少次后回收，默认读 CODE_SANDBOX_MAX_RUNS
+        :param memory_limit_mb: 工作进程地址空间上限（MB），默认读 CODE_SANDBOX_MEMORY_MB
+        :param output_limit: 单次执行的输出字符上限，默认读 CODE_SANDBOX_OUTPUT_LIMIT
         """
         self.timeout = timeout
+        self.pool_size = pool_size
+        self.max_runs = max_runs
+        self.memory_limit_mb = memory_limit_mb
+        self.output_limit = output_limit
+
+    def _pool(self):
+        return get_sandbox_pool(
+            # CODE_SANDBOX_WORKERS=0 表示按 CPU 核数，同样回落到默认值
+            size=int(self.pool_size or _sandbox_option('CODE_SANDBOX_WORKERS', DEFAULT_POOL_SIZE) or DEFAULT_POOL_SIZE),
+            max_runs=int(self.max_runs or _sandbox_option('CODE_SANDBOX_MAX_RUNS', DEFAULT_MAX_RUNS)),
+            memory_limit_mb=int(
+                self.memory_limit_mb or _sandbox_option('CODE_SANDBOX_MEMORY_MB', DEFAULT_MEMORY_LIMIT_MB)
+            ),
+            output_limit=int(self.output_limit or _sandbox_option('CODE_SANDBOX_OUTPUT_LIMIT', DEFAULT_OUTPUT_LIMIT)),
+        )
 
     def execute(self, code: str, stdin_input: str = "") -> dict:
         """
         执行Python代码
         :param code: 要执行的代码
         :param stdin_input: 标准输入
-        :return: 执行结果字典
+        :return: 执行结果字典 {'output', 'error', 'success'[, 'timeout']}
         """
-        result_queue = queue.Queue()
-
-        # 预先创建StringIO对象
-        stdout_capture = io.StringIO()
-        stderr_capture = io.StringIO()
-        stdin_capture = io.StringIO(stdin_input)
-
-        def run_code():
-            # 保存原始的标准输入输出
-            old_stdout = sys.stdout
-            old_stderr = sys.stderr
-            old_stdin = sys.stdin
-
-            # 重定向标准输入输出（使用外部创建的StringIO对象）
-            sys.stdout = stdout_capture
-            sys.stderr = stderr_capture
-            sys.stdin = stdin_capture
+        return self._pool().run(code, stdin_input or '', timeout=self.timeout)
 
-            error = None
-            try:
-                # 创建执行环境，包含自定义的input函数
-                def custom_input(prompt=""):
-                    # 如果有提示符，先输出到stdout
-                    if prompt:
-                        sys.stdout.write(str(prompt))
-                    # 从stdin读取一行
-                    line = stdin_capture.readline()
-                    if line:
-                        return line.rstrip('\n')
-                    raise EOFError("没有更多输入了")
-
-                exec_globals = {
-                    '__builtins__': __builtins__,
-                    '__name__': '__main__',
-                    'input': custom_input  # 覆盖内置input函数
-                }
-                exec(code, exec_globals)
-            except EOFError as e:
-                # 输入不足的错误，给出友好提示
-                error = f"输入不足：你的代码调用了太多次 input()，但测试用例没有提供足够的输入数据。\n请检查你的 input() 调用次数是否正确。"
-            except Exception as e:
-                error = traceback.format_exc()
-            finally:
-                output = stdout_capture.getvalue()
-                error_output = stderr_capture.getvalue()
-
-                # 恢复标准输入输出
-                sys.stdout = old_stdout
-                sys.stderr = old_stderr
-                sys.stdin = old_stdin
-
-                # 组合错误信息
-                final_error = None
-                if error:
-                    final_error = error
-                elif error_output:
-                    final_error = error_output
-
-                result_queue.put({
-                    'output': output,
-                    'error': final_error,
-                    'success': error is None and not error_output
-                })
+    def execute_many(self, code: str, stdin_inputs: list, max_workers: int = None) -> list:
+        """
+        用多组输入执行同一段代码，用例分散到沙箱池的不同工作进程并行执行
+        :return: 与 stdin_inputs 一一对应的执行结果字典列表
+        """
+        stdin_inputs = list(stdin_inputs)
+        # 在当前线程解析好进程池，线程池里的线程没有 Flask 应用上下文
+        sandbox = self._pool()
 
-        # 使用线程执行，实现超时控制
-        thread = threading.Thread(target=run_code)
-        thread.daemon = True
-        thread.start()
-        thread.join(timeout=self.timeout)
+        def _run(stdin_input):
+            return sandbox.run(code, stdin_input or '', timeout=self.timeout)
 
-        if thread.is_alive():
-            return {
-                'output': '',
-                'error': f'执行超时（超过{self.timeout}秒），请检查是否有死循环',
-                'success': False,
-                'timeout': True
-            }
+        workers = min(len(stdin_inputs), max_workers or sandbox.size)
+        if workers <= 1:
+            return [_run(stdin_input) for stdin_input in stdin_inputs]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(_run, stdin_inputs))
 
-        try:
-            return result_queue.get_nowait()
-        except queue.Empty:
-            return {
-                'output': '',
-                'error': '执行出错',
-                'success': False
-            }
+    def run_function_tests(self, code: str, function_name: str, tests: list) -> dict:
+        """
+        加载一次学生代码，在同一次执行里调用所有函数用例，每个用例单独计时
+        :param tests: function_tests 列表，每项含 args / expected
+        :return: {'load': 加载结果字典, 'cases': [{'passed', 'output', 'error', 'actual_repr', ...}]}
+        """
+        return self._pool().run_function_tests(
+            code,
+            function_name,
+            [{'args': list(test.get('args', [])), 'expected': test.get('expected')} for test in tests],
+            load_timeout=self.timeout,
+            case_timeout=self.timeout,
+        )
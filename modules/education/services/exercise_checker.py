@@ -44,11 +44,11 @@ class ExerciseChecker:
         code_output = ''
         code_error = ''
 
-        for i, case in enumerate(cases):
-            stdin_input = case.get('input', '')
-            expected = str(case.get('expected_output', '')).strip()
+        # C 代码只编译一次，所有用例复用同一个二进制
+        case_results = self.executor.execute_many(code, [case.get('input', '') for case in cases])
 
-            result = self.executor.execute(code, stdin_input)
+        for i, (case, result) in enumerate(zip(cases, case_results)):
+            expected = str(case.get('expected_output', '')).strip()
             actual = result['output'].strip()
 
             # 保存第一个测试用例的输出用于展示
@@ -99,7 +99,7 @@ class ExerciseChecker:
         }
 
     def _check_function(self, code: str, config: dict) -> dict:
-        """检查函数型题目"""
+        """检查函数型题目：学生代码只加载一次，所有用例在同一次执行里调用"""
         func_name = config.get('function_name', '')
         tests = config.get('function_tests', [])
         results = []
@@ -108,31 +108,27 @@ class ExerciseChecker:
         code_output = ''
         code_error = ''
 
-        for i, test in enumerate(tests):
+        if not hasattr(self.executor, 'run_function_tests'):
+            return {'success': False, 'error': '该语言暂不支持函数型题目'}
+
+        harness = self.executor.run_function_tests(code, func_name, tests)
+
+        for i, (test, case) in enumerate(zip(tests, harness['cases'])):
             args = test.get('args', [])
             expected = test.get('expected')
-
-            # 构造测试代码
             args_str = ', '.join(repr(arg) for arg in args)
-            test_code = f"{code}\n\n__result__ = {func_name}({args_str})\nprint(repr(__result__))"
-
-            result = self.executor.execute(test_code)
+            is_passed = bool(case.get('passed'))
 
             # 保存第一个测试用例的输出用于展示
             if i == 0:
-                code_output = f"调用 {func_name}({args_str}) 的返回值: {result['output'].strip()}"
-                code_error = result.get('error', '')
+                shown = case.get('actual_repr') if 'actual_repr' in case else (case.get('output') or '').strip()
+                code_output = f"调用 {func_name}({args_str}) 的返回值: {shown}"
+                code_error = case.get('error') or ''
 
-            try:
-                if result['success'] and result['output'].strip():
-                    actual = eval(result['output'].strip())
-                    is_passed = (actual == expected)
-                else:
-                    actual = result.get('error', '执行错误')
-                    is_passed = False
-            except Exception as e:
-                actual = result['output'].strip() if result['output'] else str(e)
-                is_passed = False
+            if 'actual_repr' in case:
+                actual = case['actual_repr'] if is_passed else case['actual_str']
+            else:
+                actual = case.get('error') or '执行错误'
 
             if is_passed:
                 passed += 1
@@ -142,8 +138,8 @@ class ExerciseChecker:
                 'passed': is_passed,
                 'input': f'{func_name}({args_str})',
                 'expected': repr(expected),
-                'actual': repr(actual) if is_passed else str(actual),
-                'error': result.get('error') if not is_passed else None
+                'actual': actual,
+                'error': case.get('error') if not is_passed else None
             })
 
         total = len(tests)
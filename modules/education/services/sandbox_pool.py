@@ -0,0 +1,331 @@
+"""预启动的 Python 代码沙箱进程池。
+
+每个工作进程都是独立的解释器（见 `sandbox_worker.py`），启动时设置内存上限；
+它只负责孵化，每个任务都 fork 一个干净的子进程执行，子进程设置 CPU 秒数上限，
+输出超过上限直接截断。父进程这边：
+
+- 空闲进程放在队列里，多个请求可以同时落到不同进程、在不同核上并行执行；
+- 等待结果超过超时时间就杀掉整个进程组（孵化进程和正在跑的子进程）；
+- 进程超时、崩溃、不支持 fork 或累计执行满 `max_runs` 次后回收，换一个新进程补位。
+"""
+
+import atexit
+import json
+import os
+import queue
+import signal
+import struct
+import subprocess
+import sys
+import threading
+from contextlib import contextmanager
+
+
+_HEADER = struct.Struct('>I')
+_WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sandbox_worker.py')
+
+# 单核机器上也至少留两个进程，避免一个慢任务让所有运行请求排队
+DEFAULT_POOL_SIZE = max(2, min(4, os.cpu_count() or 1))
+DEFAULT_MAX_RUNS = 50
+DEFAULT_MEMORY_LIMIT_MB = 256
+DEFAULT_OUTPUT_LIMIT = 64 * 1024
+WORKER_START_TIMEOUT = 10
+WORKER_EXIT_TIMEOUT = 5
+
+
+def _hit_cpu_limit(exit_code):
+    """子进程因 RLIMIT_CPU 被 SIGXCPU 杀掉；没有该信号的平台只能靠父进程超时强杀。"""
+    return hasattr(signal, 'SIGXCPU') and exit_code == -signal.SIGXCPU
+
+
+class _SandboxWorker:
+    """父进程里对单个工作进程的封装：负责收发帧和超时强杀。"""
+
+    def __init__(self, *, memory_limit_bytes, output_limit):
+        self.runs = 0
+        self.forks = False
+        self.idle = True
+        self.process = subprocess.Popen(
+            [sys.executable, '-I', _WORKER_SCRIPT, str(memory_limit_bytes), str(output_limit)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            # 独立进程组，超时时连同正在执行任务的子进程一起杀掉
+            start_new_session=True,
+        )
+        self._responses = queue.Queue()
+        self._reader = threading.Thread(target=self._read_loop, daemon=True)
+        self._reader.start()
+        try:
+            # 吃掉启动完成的握手帧；启动失败时后续 run() 会按进程退出处理
+            ready = self._responses.get(timeout=WORKER_START_TIMEOUT)
+        except queue.Empty:
+            ready = None
+        self.forks = bool(ready and ready.get('fork'))
+
+    def _read_exact(self, size):
+        chunks = []
+        while size > 0:
+            chunk = self.process.stdout.read(size)
+            if not chunk:
+                return None
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    def _read_loop(self):
+        try:
+            while True:
+                header = self._read_exact(_HEADER.size)
+                if header is None:
+                    break
+                body = self._read_exact(_HEADER.unpack(header)[0])
+                if body is None:
+                    break
+                self._responses.put(json.loads(body.decode('utf-8')))
+        except (OSError, ValueError):
+            pass
+        self._responses.put(None)
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def reusable(self):
+        """只有能 fork、且上一个任务已完整结束的孵化进程才能继续接任务。"""
+        return self.forks and self.idle and self.is_alive()
+
+    def send(self, job):
+        """写入一帧任务；管道已断开时返回 False。"""
+        self.runs += 1
+        self.idle = False
+        body = json.dumps(job, ensure_ascii=False).encode('utf-8')
+        try:
+            self.process.stdin.write(_HEADER.pack(len(body)) + body)
+            self.process.stdin.flush()
+        except OSError:
+            return False
+        return True
+
+    def receive(self, timeout):
+        """
+        读取一帧结果；超时会杀掉进程返回 `('timeout', None)`，
+        执行任务的子进程（或工作进程本身）提前退出返回 `('crashed', 退出码)`。
+        """
+        try:
+            response = self._responses.get(timeout=timeout)
+        except queue.Empty:
+            self.kill()
+            return 'timeout', None
+        if response is None:
+            return 'crashed', self.process.wait()
+        if response.get('event') == 'exit':
+            self.idle = True
+            return 'crashed', response.get('exit_code')
+        return 'ok', response
+
+    def finish(self, timeout=WORKER_EXIT_TIMEOUT):
+        """读掉任务结束后的退出帧；读到别的帧说明协议已错位，直接杀掉。"""
+        if self.idle or not self.is_alive():
+            return
+        self.receive(timeout)
+        if not self.idle:
+            self.kill()
+
+    def run(self, code, stdin_input, *, timeout, cpu_seconds):
+        """执行一次普通任务，返回值同 `receive()`。"""
+        if not self.send({'code': code, 'stdin': stdin_input, 'cpu_seconds': cpu_seconds}):
+            return 'crashed', self.process.poll()
+        return self.receive(timeout)
+
+    def kill(self):
+        if self.is_alive():
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except (AttributeError, OSError):
+                self.process.kill()
+        try:
+            self.process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            pass
+        for stream in (self.process.stdin, self.process.stdout):
+            try:
+                stream.close()
+            except OSError:
+                pass
+
+
+class SandboxPool:
+    """固定大小的沙箱进程池，首次使用时才预启动全部工作进程。"""
+
+    def __init__(
+        self,
+        *,
+        size=DEFAULT_POOL_SIZE,
+        max_runs=DEFAULT_MAX_RUNS,
+        memory_limit_mb=DEFAULT_MEMORY_LIMIT_MB,
+        output_limit=DEFAULT_OUTPUT_LIMIT,
+    ):
+        self.size = max(1, int(size))
+        self.max_runs = max(1, int(max_runs))
+        self.memory_limit_bytes = int(memory_limit_mb or 0) * 1024 * 1024
+        self.output_limit = int(output_limit)
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+        self._closed = False
+
+    def _spawn(self):
+        return _SandboxWorker(
+            memory_limit_bytes=self.memory_limit_bytes,
+            output_limit=self.output_limit,
+        )
+
+    def _ensure_started(self):
+        if self._started:
+            return
+        with self._lock:
+            if self._started:
+                return
+            for _ in range(self.size):
+                self._idle.put(self._spawn())
+            self._started = True
+
+    @contextmanager
+    def _checkout(self):
+        """借出一个空闲工作进程；用完后不可复用或到达 max_runs 的进程换新补位。"""
+        self._ensure_started()
+        worker = self._idle.get()
+        try:
+            if not worker.is_alive():
+                worker.kill()
+                worker = self._spawn()
+            yield worker
+        except BaseException:
+            worker.kill()
+            raise
+        finally:
+            worker.finish()
+            if not worker.reusable() or worker.runs >= self.max_runs:
+                worker.kill()
+                worker = None if self._closed else self._spawn()
+            if worker is not None:
+                self._idle.put(worker)
+
+    def run(self, code, stdin_input='', *, timeout):
+        """在空闲工作进程里执行代码，返回 `CodeExecutor.execute` 约定的结果字典。"""
+        with self._checkout() as worker:
+            status, data = worker.run(code, stdin_input, timeout=timeout, cpu_seconds=timeout)
+        if status == 'ok':
+            return data
+        if status == 'timeout' or _hit_cpu_limit(data):
+            return _timeout_result(timeout)
+        return _crashed_result(data)
+
+    def run_function_tests(self, code, function_name, tests, *, load_timeout, case_timeout):
+        """
+        加载一次学生代码后在同一个进程里跑完所有函数用例。
+
+        用例超时优先由工作进程内的 SIGALRM 打断；打断不了（或平台不支持）时父进程
+        强杀进程，该用例记为超时，剩余用例换一个新进程重新加载后继续。
+        :return: {'load': 加载结果字典, 'cases': 与 tests 一一对应的用例结果}
+        """
+        tests = list(tests)
+        cases = [None] * len(tests)
+        load_result = None
+        start = 0
+        while load_result is None or start < len(tests):
+            pending = tests[start:]
+            with self._checkout() as worker:
+                sent = worker.send({
+                    'mode': 'function_tests',
+                    'code': code,
+                    'function_name': function_name,
+                    'tests': pending,
+                    'cpu_seconds': load_timeout,
+                    'case_timeout': case_timeout,
+                })
+                status, frame = worker.receive(load_timeout) if sent else ('crashed', worker.process.poll())
+                if status != 'ok':
+                    if status == 'timeout' or _hit_cpu_limit(frame):
+                        failure = _timeout_result(load_timeout)
+                    else:
+                        failure = _crashed_result(frame)
+                    load_result = load_result or failure
+                    for index in range(start, len(tests)):
+                        cases[index] = _failed_case(failure)
+                    break
+                load_result = load_result or frame
+
+                offset = start
+                for offset in range(start, len(tests)):
+                    # 工作进程内的闹钟先触发，父进程多留一点余量
+                    status, frame = worker.receive(case_timeout + 1)
+                    if status != 'ok':
+                        if status == 'timeout' or _hit_cpu_limit(frame):
+                            failure = _timeout_result(case_timeout)
+                        else:
+                            failure = _crashed_result(frame)
+                        cases[offset] = _failed_case(failure)
+                        break
+                    cases[offset] = frame
+                else:
+                    worker.receive(case_timeout + 1)  # done 帧
+                    break
+                start = offset + 1
+        return {'load': load_result, 'cases': cases}
+
+    def shutdown(self):
+        self._closed = True
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            worker.kill()
+
+
+def _crashed_result(exit_code):
+    return {
+        'output': '',
+        'error': f'执行出错：代码运行进程异常退出（退出码 {exit_code}）',
+        'success': False,
+    }
+
+
+def _failed_case(result):
+    case = {'passed': False, 'output': '', 'error': result['error']}
+    if result.get('timeout'):
+        case['timeout'] = True
+    return case
+
+
+def _timeout_result(timeout):
+    return {
+        'output': '',
+        'error': f'执行超时（超过{timeout}秒），请检查是否有死循环',
+        'success': False,
+        'timeout': True,
+    }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_sandbox_pool(**options):
+    """按配置共享进程池；同一组参数在整个进程里只会有一个池。"""
+    key = tuple(sorted(options.items()))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = SandboxPool(**options)
+            _pools[key] = pool
+        return pool
+
+
+@atexit.register
+def _shutdown_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown()
+        _pools.clear()
@@ -0,0 +1,334 @@
+"""Python 代码沙箱工作进程。
+
+由 `sandbox_pool.SandboxPool` 以 `python -I <本文件>` 的方式预先启动，只依赖标准库，
+不导入项目里的任何包。进程启动后先收紧资源限制，再循环从 stdin 读取任务、
+把结果写回 stdout；协议是「4 字节大端长度 + UTF-8 JSON」的帧。
+
+任务分两种：普通执行一帧请求对应一帧结果；`mode=function_tests` 只加载一次学生
+代码，然后每跑完一个函数用例就写回一帧，最后以 `{'event': 'done'}` 结束。
+
+工作进程本身不执行学生代码，只作为「孵化进程」：每个任务都 fork 一个全新的子进程
+去跑，子进程退出后再写一帧 `{'event': 'exit', 'exit_code': ...}`。学生对 builtins、
+sys.modules、信号处理、线程等的改动随子进程一起消失，不会带到下一个学生的任务里。
+不支持 fork 的平台上直接在本进程执行，写完退出帧后进程退出，由父进程换新。
+
+真实的 0/1 号文件描述符会被复制成协议通道后重定向到空设备，学生代码即使
+直接 `os.write(1, ...)` 也不会污染协议。
+"""
+
+import io
+import json
+import math
+import os
+import signal
+import struct
+import sys
+import traceback
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，只能依赖父进程的超时强杀
+    resource = None
+
+
+_HEADER = struct.Struct('>I')
+
+EOF_ERROR_MESSAGE = (
+    "输入不足：你的代码调用了太多次 input()，但测试用例没有提供足够的输入数据。\n"
+    "请检查你的 input() 调用次数是否正确。"
+)
+
+
+class OutputLimitExceeded(BaseException):
+    """输出超过上限。继承 BaseException，避免被学生代码里的 except Exception 吞掉。"""
+
+
+class _CappedStringIO(io.StringIO):
+    def __init__(self, limit):
+        super().__init__()
+        self._limit = limit
+        self._size = 0
+        self.truncated = False
+
+    def write(self, text):
+        text = str(text)
+        if self.truncated:
+            raise OutputLimitExceeded()
+        remaining = self._limit - self._size
+        if len(text) > remaining:
+            super().write(text[:max(remaining, 0)])
+            self._size = self._limit
+            self.truncated = True
+            raise OutputLimitExceeded()
+        self._size += len(text)
+        return super().write(text)
+
+
+def _read_frame(stream):
+    header = stream.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        return None
+    (length,) = _HEADER.unpack(header)
+    body = stream.read(length)
+    if len(body) < length:
+        return None
+    return json.loads(body.decode('utf-8'))
+
+
+def _write_frame(stream, payload):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    stream.write(_HEADER.pack(len(body)) + body)
+    stream.flush()
+
+
+def _apply_memory_limit(memory_limit_bytes):
+    if resource is None or not memory_limit_bytes:
+        return
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit_bytes, memory_limit_bytes))
+    except (ValueError, OSError):
+        pass
+
+
+def _apply_cpu_limit(cpu_seconds):
+    """RLIMIT_CPU 按进程累计计时，这里把软限制设为「已用 CPU + 本次额度」。"""
+    if resource is None or not cpu_seconds:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft_limit = int(math.ceil(usage.ru_utime + usage.ru_stime + cpu_seconds))
+    try:
+        _, hard_limit = resource.getrlimit(resource.RLIMIT_CPU)
+        if hard_limit != resource.RLIM_INFINITY:
+            soft_limit = min(soft_limit, hard_limit)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft_limit, hard_limit))
+    except (ValueError, OSError):
+        pass
+
+
+def _output_limit_message(output_limit):
+    return f'输出内容过多（超过{output_limit}个字符），已截断，请检查是否有死循环输出'
+
+
+def _run_captured(action, stdin_input, output_limit):
+    """重定向标准输入输出后执行 action(custom_input)，返回 (返回值, 结果字典)。"""
+    stdout_capture = _CappedStringIO(output_limit)
+    stderr_capture = _CappedStringIO(output_limit)
+    stdin_capture = io.StringIO(stdin_input)
+
+    old_stdout, old_stderr, old_stdin = sys.stdout, sys.stderr, sys.stdin
+    sys.stdout, sys.stderr, sys.stdin = stdout_capture, stderr_capture, stdin_capture
+
+    def custom_input(prompt=""):
+        if prompt:
+            sys.stdout.write(str(prompt))
+        line = stdin_capture.readline()
+        if line:
+            return line.rstrip('\n')
+        raise EOFError("没有更多输入了")
+
+    value = None
+    error = None
+    timed_out = False
+    try:
+        value = action(custom_input)
+    except CaseTimeout:
+        timed_out = True
+    except EOFError:
+        error = EOF_ERROR_MESSAGE
+    except OutputLimitExceeded:
+        error = _output_limit_message(output_limit)
+    except SystemExit:
+        pass
+    except MemoryError:
+        error = '内存超出限制，请检查是否创建了过大的数据结构'
+    except Exception:
+        error = traceback.format_exc()
+    finally:
+        sys.stdout, sys.stderr, sys.stdin = old_stdout, old_stderr, old_stdin
+
+    output = stdout_capture.getvalue()
+    error_output = stderr_capture.getvalue()
+    if stdout_capture.truncated and error is None:
+        error = _output_limit_message(output_limit)
+
+    result = {
+        'output': output,
+        'error': error or error_output or None,
+        'success': error is None and not error_output and not timed_out,
+    }
+    if timed_out:
+        result['timeout'] = True
+    return value, result
+
+
+def run_code(code, stdin_input, output_limit, exec_globals=None):
+    """在当前进程内执行一段代码，返回与 `CodeExecutor.execute` 一致的结果字典。"""
+    exec_globals = {} if exec_globals is None else exec_globals
+
+    def _exec(custom_input):
+        exec_globals.update({
+            '__builtins__': __builtins__,
+            '__name__': '__main__',
+            'input': custom_input,
+        })
+        exec(code, exec_globals)
+
+    return _run_captured(_exec, stdin_input, output_limit)[1]
+
+
+class CaseTimeout(BaseException):
+    """单个函数用例超时（由 SIGALRM 触发）。"""
+
+
+def _raise_case_timeout(signum, frame):
+    raise CaseTimeout()
+
+
+def _call_with_alarm(func, args, case_timeout):
+    if not case_timeout or not hasattr(signal, 'setitimer'):
+        return func(*args)
+    previous = signal.signal(signal.SIGALRM, _raise_case_timeout)
+    signal.setitimer(signal.ITIMER_REAL, case_timeout)
+    try:
+        return func(*args)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _safe_text(render, value):
+    try:
+        return render(value)
+    except Exception:
+        return f'<无法显示的 {type(value).__name__} 对象>'
+
+
+def _values_equal(actual, expected):
+    try:
+        return bool(actual == expected)
+    except Exception:
+        return False
+
+
+def run_function_tests(proto_out, job, output_limit):
+    """加载一次学生代码，逐个调用 function_tests，每个用例一帧结果流式写回。"""
+    function_name = job.get('function_name') or ''
+    case_timeout = job.get('case_timeout')
+    namespace = {}
+
+    _apply_cpu_limit(job.get('cpu_seconds'))
+    load_result = run_code(job.get('code') or '', '', output_limit, exec_globals=namespace)
+    _write_frame(proto_out, {'event': 'loaded', **load_result})
+
+    func = namespace.get(function_name) if load_result['success'] else None
+    for index, test in enumerate(job.get('tests') or []):
+        case = {'event': 'case', 'index': index}
+        if not load_result['success']:
+            case.update(passed=False, error=load_result['error'] or '执行错误', output='')
+        elif not callable(func):
+            case.update(passed=False, error=f'代码中没有定义函数 {function_name}()', output='')
+        else:
+            _apply_cpu_limit(case_timeout)
+            args = list(test.get('args') or [])
+            actual, result = _run_captured(
+                lambda _input: _call_with_alarm(func, args, case_timeout),
+                '',
+                output_limit,
+            )
+            case.update(output=result['output'])
+            if result.get('timeout'):
+                case.update(passed=False, timeout=True, error=f'执行超时（超过{case_timeout}秒），请检查是否有死循环')
+            elif not result['success']:
+                case.update(passed=False, error=result['error'] or '执行错误')
+            else:
+                case.update(
+                    passed=_values_equal(actual, test.get('expected')),
+                    error=None,
+                    actual_repr=_safe_text(repr, actual),
+                    actual_str=_safe_text(str, actual),
+                )
+        _write_frame(proto_out, case)
+
+    _write_frame(proto_out, {'event': 'done'})
+
+
+def _protocol_streams():
+    proto_in = os.fdopen(os.dup(0), 'rb', buffering=0)
+    proto_out = os.fdopen(os.dup(1), 'wb')
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    os.close(devnull)
+    return _BufferedReader(proto_in), proto_out
+
+
+class _BufferedReader:
+    """非缓冲管道上的定长读取。"""
+
+    def __init__(self, raw):
+        self._raw = raw
+
+    def read(self, size):
+        chunks = []
+        while size > 0:
+            chunk = self._raw.read(size)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    def close(self):
+        self._raw.close()
+
+
+def _run_job(proto_out, job, output_limit):
+    if job.get('mode') == 'function_tests':
+        run_function_tests(proto_out, job, output_limit)
+        return
+    _apply_cpu_limit(job.get('cpu_seconds'))
+    _write_frame(proto_out, run_code(job.get('code') or '', job.get('stdin') or '', output_limit))
+
+
+def _run_forked(proto_in, proto_out, job, output_limit):
+    """fork 一个子进程执行任务，返回子进程退出码（被信号杀掉时为负的信号值）。"""
+    pid = os.fork()
+    if pid == 0:
+        exit_code = 0
+        try:
+            proto_in.close()
+            _run_job(proto_out, job, output_limit)
+        except BaseException:
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+    _, status = os.waitpid(pid, 0)
+    return os.waitstatus_to_exitcode(status)
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    memory_limit_bytes = int(argv[0]) if argv else 0
+    output_limit = int(argv[1]) if len(argv) > 1 else 1024 * 1024
+    can_fork = hasattr(os, 'fork')
+
+    proto_in, proto_out = _protocol_streams()
+    _apply_memory_limit(memory_limit_bytes)
+    _write_frame(proto_out, {'ready': True, 'fork': can_fork})
+
+    while True:
+        job = _read_frame(proto_in)
+        if not job:
+            return 0
+        if can_fork:
+            exit_code = _run_forked(proto_in, proto_out, job, output_limit)
+        else:
+            _run_job(proto_out, job, output_limit)
+            exit_code = 0
+        _write_frame(proto_out, {'event': 'exit', 'exit_code': exit_code})
+        if not can_fork:
+            return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
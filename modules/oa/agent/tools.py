@@ -357,11 +357,6 @@ def _time_to_minutes(t: str) -> int:
     return int(h) * 60 + int(m)
 
 
-def _times_overlap(s1: int, e1: int, s2: int, e2: int) -> bool:
-    """Check if [s1, e1) overlaps with [s2, e2). All in minutes."""
-    return s1 < e2 and s2 < e1
-
-
 # ---------------------------------------------------------------------------
 # Tool execution functions
 # ---------------------------------------------------------------------------
@@ -434,6 +429,7 @@ def _exec_query_schedules(args: dict) -> dict:
 
 def _exec_find_available_slots(args: dict) -> dict:
     from modules.oa.models import CourseSchedule
+    from modules.oa.schedule_conflicts import ScheduleOccupancy
 
     teacher = args["teacher"]
     date_start = date.fromisoformat(args["date_start"])
@@ -441,20 +437,12 @@ def _exec_find_available_slots(args: dict) -> dict:
     student_slots = args.get("student_available_slots", [])
     duration = args.get("duration_hours", 2)
 
-    # Fetch teacher's existing schedules in the range
-    existing = CourseSchedule.query.filter(
-        CourseSchedule.teacher.contains(teacher),
-        CourseSchedule.date >= date_start,
-        CourseSchedule.date <= date_end,
-    ).all()
-
-    # Build occupied-time map: {date_iso: [(start_min, end_min), ...]}
-    occupied = {}
-    for s in existing:
-        d = s.date.isoformat()
-        occupied.setdefault(d, []).append(
-            (_time_to_minutes(s.time_start), _time_to_minutes(s.time_end))
-        )
+    # Load the teacher's occupancy for the whole range once
+    occupancy = ScheduleOccupancy.load(
+        date_start=date_start,
+        date_end=date_end,
+        filters=[CourseSchedule.teacher.contains(teacher)],
+    )
 
     # If no student slots, use full day range
     if not student_slots:
@@ -475,7 +463,6 @@ def _exec_find_available_slots(args: dict) -> dict:
     while current <= date_end:
         dow = current.weekday()
         d_iso = current.isoformat()
-        day_occupied = occupied.get(d_iso, [])
 
         for slot in slots_by_dow.get(dow, []):
             slot_start = _time_to_minutes(slot["time_start"])
@@ -484,12 +471,7 @@ def _exec_find_available_slots(args: dict) -> dict:
             if (slot_end - slot_start) < duration * 60:
                 continue
 
-            has_conflict = any(
-                _times_overlap(slot_start, slot_end, occ_s, occ_e)
-                for occ_s, occ_e in day_occupied
-            )
-
-            if not has_conflict:
+            if occupancy.is_free(current, slot_start, slot_end):
                 available.append({
                     "date": d_iso,
                     "day_of_week": dow,
@@ -508,32 +490,32 @@ def _exec_find_available_slots(args: dict) -> dict:
 
 
 def _exec_propose_create(args: dict) -> dict:
+    from sqlalchemy import or_
+
     from modules.oa.models import CourseSchedule
+    from modules.oa.schedule_conflicts import ScheduleOccupancy
 
     schedules = args["schedules"]
     summary = args["summary"]
     conflicts = []
 
+    teachers = {s["teacher"] for s in schedules}
+    occupancy = ScheduleOccupancy.load(
+        dates=[date.fromisoformat(s["date"]) for s in schedules],
+        filters=[or_(*[CourseSchedule.teacher.contains(t) for t in teachers])],
+    ) if schedules else ScheduleOccupancy()
+
     for i, s in enumerate(schedules):
         d = date.fromisoformat(s["date"])
-        s_start = _time_to_minutes(s["time_start"])
-        s_end = _time_to_minutes(s["time_end"])
-
-        existing = CourseSchedule.query.filter(
-            CourseSchedule.teacher.contains(s["teacher"]),
-            CourseSchedule.date == d,
-        ).all()
-
-        for ex in existing:
-            ex_start = _time_to_minutes(ex.time_start)
-            ex_end = _time_to_minutes(ex.time_end)
-            if _times_overlap(s_start, s_end, ex_start, ex_end):
-                conflicts.append({
-                    "index": i,
-                    "date": s["date"],
-                    "time": f"{s['time_start']}-{s['time_end']}",
-                    "existing_course": f"{ex.course_name} ({ex.time_start}-{ex.time_end})",
-                })
+        for ex in occupancy.overlapping(d, s["time_start"], s["time_end"]):
+            if s["teacher"].lower() not in (ex.teacher or "").lower():
+                continue
+            conflicts.append({
+                "index": i,
+                "date": s["date"],
+                "time": f"{s['time_start']}-{s['time_end']}",
+                "existing_course": f"{ex.course_name} ({ex.time_start}-{ex.time_end})",
+            })
 
     return {
         "action": "create",
@@ -2,24 +2,27 @@
 from calendar import monthrange
 from datetime import date, datetime, timedelta
 
-from flask import request
+from flask import current_app, request, url_for
 from sqlalchemy import func
 
 from extensions import db
 from modules.auth.models import Enrollment, LeaveRequest, User
 from modules.auth.services import (
-    get_course_feedback_skip_reason,
-    schedule_requires_course_feedback,
     sync_enrollment_status,
     sync_schedule_student_snapshot,
 )
+from modules.auth.workflow_services import filter_visible_oa_todos
 from modules.oa import oa_bp
 from modules.oa import schedule_actions
 from modules.oa.external_api import external_api_required, external_error, external_success
-from modules.oa.models import CourseFeedback, CourseSchedule, OATodo, ScheduleMeetingMaterial
+from modules.oa.models import CourseFeedback, CourseSchedule, OATodo, ScheduleImportRun, ScheduleMeetingMaterial
+from modules.oa.schedule_progress import SCOPE_EXTERNAL, build_schedule_progress_map
 from modules.oa.services import (
+    ScheduleImportBusyError,
     apply_schedule_excel_import,
     build_schedule_delivery_fields,
+    enqueue_schedule_excel_import,
+    get_schedule_import_status,
     resolve_schedule_teacher_reference,
 )
 
@@ -31,41 +34,6 @@ def _get_json_payload():
     return data, None
 
 
-def _filter_visible_todos(todos, *, reconcile_feedback_visibility=False):
-    visible = []
-    changed = False
-    for todo in todos:
-        if todo.is_workflow:
-            from modules.auth.workflow_services import reconcile_stale_workflow_todo, workflow_todo_stale_reason
-
-            if reconcile_stale_workflow_todo(todo):
-                changed = True
-            if workflow_todo_stale_reason(todo):
-                continue
-            if todo.is_completed or todo.workflow_status in {
-                OATodo.WORKFLOW_STATUS_COMPLETED,
-                OATodo.WORKFLOW_STATUS_CANCELLED,
-            }:
-                continue
-        if (
-            todo.todo_type == OATodo.TODO_TYPE_SCHEDULE_FEEDBACK
-            and not schedule_requires_course_feedback(getattr(todo, 'schedule', None))
-        ):
-            if reconcile_feedback_visibility and not todo.is_completed:
-                from modules.auth.workflow_services import cancel_schedule_feedback_todo
-
-                cancel_schedule_feedback_todo(
-                    todo.schedule_id,
-                    reason=get_course_feedback_skip_reason(getattr(todo, 'schedule', None)) or '',
-                )
-                changed = True
-            continue
-        visible.append(todo)
-    if changed:
-        db.session.commit()
-    return visible
-
-
 def _guard_external_generic_todo_mutation(todo):
     if todo and todo.is_workflow:
         return external_error(
@@ -108,10 +76,9 @@ def _resolve_teacher_from_payload(data):
 def external_dashboard_stats():
     today = date.today()
     today_count = CourseSchedule.query.filter(CourseSchedule.date == today).count()
-    pending_count = len(_filter_visible_todos(
-        OATodo.query.filter(OATodo.is_completed == False).all(),
-        reconcile_feedback_visibility=True,
-    ))
+    pending_count = filter_visible_oa_todos(
+        OATodo.query.filter(OATodo.is_completed == False)
+    ).count()
     monday = today - timedelta(days=today.weekday())
     sunday = monday + timedelta(days=6)
     week_count = CourseSchedule.query.filter(
@@ -369,24 +336,20 @@ def external_list_schedule_students():
 @oa_bp.route('/api/external/schedules/progress', methods=['GET'])
 @external_api_required
 def external_schedule_progress():
-    all_schedules = CourseSchedule.query.order_by(CourseSchedule.date, CourseSchedule.time_start).all()
-    progress_map = {}
-    grouped = {}
-    for schedule in all_schedules:
-        key = (schedule.course_name, schedule.teacher, schedule.students or '')
-        grouped.setdefault(key, []).append(schedule)
-
-    for schedules in grouped.values():
-        total = len(schedules)
-        if total < 2:
-            continue
-        for index, schedule in enumerate(schedules, 1):
-            progress_map[schedule.id] = {
-                'current': index,
-                'total': total,
-                'is_ending': index > max(total - 3, 0),
-            }
-
+    date_start = date_end = None
+    if request.args.get('start'):
+        date_start, error = _parse_iso_date(request.args.get('start'), 'start')
+        if error:
+            return error
+    if request.args.get('end'):
+        date_end, error = _parse_iso_date(request.args.get('end'), 'end')
+        if error:
+            return error
+    progress_map = build_schedule_progress_map(
+        date_start=date_start,
+        date_end=date_end,
+        scope=SCOPE_EXTERNAL,
+    )
     return external_success(progress_map)
 
 
@@ -409,15 +372,12 @@ def external_list_todos():
     if priority:
         query = query.filter(OATodo.priority == priority)
 
-    todos = _filter_visible_todos(
-        query.order_by(
-            OATodo.is_completed,
-            OATodo.priority,
-            OATodo.due_date.is_(None).asc(),
-            OATodo.due_date.asc(),
-        ).all(),
-        reconcile_feedback_visibility=True,
-    )
+    todos = filter_visible_oa_todos(query).order_by(
+        OATodo.is_completed,
+        OATodo.priority,
+        OATodo.due_date.is_(None).asc(),
+        OATodo.due_date.asc(),
+    ).all()
     return external_success({'items': [todo.to_dict() for todo in todos], 'total': len(todos)})
 
 
@@ -574,8 +534,25 @@ def external_import_excel():
         return external_error('仅支持 .xlsx 或 .xls 文件')
 
     try:
+        if current_app.config.get('SCF_SCHEDULE_IMPORT_ASYNC'):
+            run = enqueue_schedule_excel_import(file)
+            data = get_schedule_import_status(run)
+            data['status_url'] = url_for('oa.external_import_excel_status', import_id=run.id)
+            return external_success(data, status=202)
+
         _, summary = apply_schedule_excel_import(file)
         return external_success(summary)
+    except ScheduleImportBusyError as exc:
+        return external_error(str(exc), status=409, code='import_in_progress')
     except Exception as exc:
         db.session.rollback()
         return external_error(f'导入失败: {str(exc)}', status=500)
+
+
+@oa_bp.route('/api/external/import-excel/<int:import_id>', methods=['GET'])
+@external_api_required
+def external_import_excel_status(import_id):
+    run = db.session.get(ScheduleImportRun, import_id)
+    if not run:
+        return external_error('导入任务不存在', status=404)
+    return external_success(get_schedule_import_status(run))
@@ -50,10 +50,10 @@ def _exclude_approved_leave(payloads):
 
 def _pending_feedback_payloads_for_actor(actor):
     today = auth_services.get_business_today()
-    payloads = [
-        auth_services.build_schedule_payload(schedule, actor)
-        for schedule in _actor_schedule_query(actor, end=today).all()
-    ]
+    payloads = auth_services.build_schedule_payloads(
+        _actor_schedule_query(actor, end=today).all(),
+        actor,
+    )
     pending = [
         item for item in payloads
         if item.get('next_action_status') == 'waiting_teacher_feedback'
@@ -96,10 +96,10 @@ def _workflow_payloads(actor):
 def _upcoming_schedule_payloads(actor, *, days=7):
     today = auth_services.get_business_today()
     end = today + timedelta(days=days)
-    payloads = [
-        auth_services.build_schedule_payload(schedule, actor)
-        for schedule in _actor_schedule_query(actor, start=today, end=end).all()
-    ]
+    payloads = auth_services.build_schedule_payloads(
+        _actor_schedule_query(actor, start=today, end=end).all(),
+        actor,
+    )
     return _sort_items(_exclude_approved_leave(payloads))
 
 
@@ -221,10 +221,10 @@ def build_openclaw_summary(actor):
 
 
 def list_openclaw_schedules(actor, *, start=None, end=None):
-    payloads = [
-        auth_services.build_schedule_payload(schedule, actor)
-        for schedule in _actor_schedule_query(actor, start=start, end=end).all()
-    ]
+    payloads = auth_services.build_schedule_payloads(
+        _actor_schedule_query(actor, start=start, end=end).all(),
+        actor,
+    )
     return _sort_items(payloads)
 
 
@@ -1,12 +1,25 @@
 import json
-import json
 from datetime import datetime
+
+from sqlalchemy.orm import validates
+
+from core.json_text import JsonTextMixin
 from extensions import db
 
 
 class CourseSchedule(db.Model):
     """课程排课模型 - 对应2026年总课表"""
     __tablename__ = 'course_schedules'
+    __table_args__ = (
+        db.Index('ix_course_schedules_cancelled_date_time', 'is_cancelled', 'date', 'time_start'),
+        db.Index('ix_course_schedules_teacher_id_date', 'teacher_id', 'date'),
+        db.Index('ix_course_schedules_teacher_date', 'teacher', 'date'),
+        db.Index('ix_course_schedules_enrollment_date', 'enrollment_id', 'date'),
+        db.Index('ix_course_schedules_student_snapshot_date', 'student_profile_id_snapshot', 'date'),
+        db.Index('ix_course_schedules_meeting_external_id', 'meeting_external_id'),
+        db.Index('ix_course_schedules_feedback_pending_date', 'feedback_pending', 'date', 'time_start'),
+        db.Index('ix_course_schedules_legacy_enrollment_date', 'legacy_enrollment_id', 'date'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Date, nullable=False)
@@ -17,6 +30,8 @@ class CourseSchedule(db.Model):
     teacher_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     course_name = db.Column(db.String(200), nullable=False)
     enrollment_id = db.Column(db.Integer, db.ForeignKey('enrollments.id'), nullable=True)
+    # 旧版自动排课只在备注里写“报名#id”；写备注时解析落到这一列，关联查询直接走索引
+    legacy_enrollment_id = db.Column(db.Integer, nullable=True)
     student_profile_id_snapshot = db.Column(db.Integer, db.ForeignKey('student_profiles.id'), nullable=True)
     students = db.Column(db.Text)
     location = db.Column(db.String(200))
@@ -36,6 +51,8 @@ class CourseSchedule(db.Model):
     cancelled_at = db.Column(db.DateTime)
     cancel_reason = db.Column(db.Text)
     cancelled_by_user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    # 待交课后反馈集合：需要反馈、未提交反馈、最近一次请假未获批。由提交前的 session 钩子维护
+    feedback_pending = db.Column(db.Boolean, default=False, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -64,6 +81,13 @@ class CourseSchedule(db.Model):
     enrollment = db.relationship('Enrollment', foreign_keys=[enrollment_id], lazy=True, back_populates='schedules')
     cancelled_by = db.relationship('User', foreign_keys=[cancelled_by_user_id], lazy=True)
 
+    @validates('notes')
+    def _sync_legacy_enrollment_link(self, key, value):
+        from modules.auth.services import _extract_legacy_enrollment_id
+
+        self.legacy_enrollment_id = _extract_legacy_enrollment_id(value)
+        return value
+
     @classmethod
     def active_query(cls):
         return cls.query.filter(cls.is_cancelled == False)
@@ -105,20 +129,34 @@ class CourseSchedule(db.Model):
 
 
 class ScheduleImportRun(db.Model):
-    """课表导入记录，用于保存原始 Excel 与导入摘要。"""
+    """课表导入任务：保存原始 Excel、执行状态、进度计数与导入摘要。"""
     __tablename__ = 'schedule_import_runs'
 
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+
     id = db.Column(db.Integer, primary_key=True)
     original_filename = db.Column(db.String(255), nullable=False)
     stored_path = db.Column(db.String(500))
     uploaded_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     status = db.Column(db.String(30), default='pending', nullable=False)
     summary_json = db.Column(db.Text)
+    progress_stage = db.Column(db.String(30))
+    progress_done = db.Column(db.Integer, default=0, nullable=False)
+    progress_total = db.Column(db.Integer, default=0, nullable=False)
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
 
     uploader = db.relationship('User', foreign_keys=[uploaded_by])
     schedules = db.relationship('CourseSchedule', backref='import_run', lazy=True)
 
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_COMPLETED, self.STATUS_FAILED)
+
     def get_summary_data(self):
         if not self.summary_json:
             return {}
@@ -143,7 +181,14 @@ class ScheduleImportRun(db.Model):
             'uploader_name': self.uploader.display_name if self.uploader else None,
             'status': self.status,
             'summary': self.get_summary_data(),
+            'progress': {
+                'stage': self.progress_stage,
+                'done': self.progress_done or 0,
+                'total': self.progress_total or 0,
+            },
             'uploaded_at': self.uploaded_at.isoformat() if self.uploaded_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
         }
 
 
@@ -250,9 +295,15 @@ class ScheduleMeetingMaterial(db.Model):
         }
 
 
-class OATodo(db.Model):
+class OATodo(JsonTextMixin, db.Model):
     """OA待办事项模型"""
     __tablename__ = 'oa_todos'
+    __table_args__ = (
+        db.Index('ix_oa_todos_type_completed', 'todo_type', 'is_completed'),
+        db.Index('ix_oa_todos_schedule_type', 'schedule_id', 'todo_type'),
+        db.Index('ix_oa_todos_enrollment_type', 'enrollment_id', 'todo_type'),
+        db.Index('ix_oa_todos_leave_request', 'leave_request_id'),
+    )
 
     TODO_TYPE_GENERIC = 'generic'
     TODO_TYPE_EXCEL_IMPORT = 'excel_import'
@@ -309,19 +360,14 @@ class OATodo(db.Model):
         }
 
     def get_payload_data(self):
-        if not self.payload:
-            return {}
-        try:
-            data = json.loads(self.payload)
-        except (TypeError, ValueError):
-            return {}
-        return data if isinstance(data, dict) else {}
+        return self.json_copy('payload', {}, expect=dict)
+
+    def get_payload_view(self):
+        """只读的已解析 payload，同一实例内只解析一次；需要修改时用 get_payload_data。"""
+        return self.json_view('payload', {}, expect=dict)
 
     def set_payload_data(self, value):
-        if value is None:
-            self.payload = None
-            return
-        self.payload = json.dumps(value, ensure_ascii=False)
+        self.set_json('payload', value)
 
     @staticmethod
     def parse_responsible_people(value):
@@ -370,7 +416,7 @@ class OATodo(db.Model):
             'created_by': self.created_by,
             'creator_name': self.creator.display_name if self.creator else None,
             'completed_at': self.completed_at.isoformat() if self.completed_at else None,
-            'payload': self.get_payload_data(),
+            'payload': self.get_payload_view(),
             'is_workflow': self.is_workflow,
             'is_open_workflow': self.is_open_workflow,
             'created_at': self.created_at.isoformat() if self.created_at else None,
@@ -1,10 +1,13 @@
 """Reminder event services for OpenClaw pull feeds."""
 
+from sqlalchemy import and_, or_
+
 from extensions import db
 from modules.auth import services as auth_services
 from modules.auth.models import LeaveRequest, ReminderDelivery, ReminderEvent
 from modules.auth.workflow_services import build_workflow_todo_payload, list_workflow_todos_for_user
 from modules.oa.models import CourseSchedule
+from modules.oa.reminder_sync import ensure_actor_reminders_fresh
 from modules.oa.schedule_actions import build_schedule_preview_payload
 
 
@@ -65,10 +68,10 @@ def _pending_leave_request_payloads(actor):
 
 def _pending_feedback_payloads(actor):
     today = auth_services.get_business_today()
-    payloads = [
-        auth_services.build_schedule_payload(schedule, actor)
-        for schedule in _actor_schedule_query(actor, end=today).all()
-    ]
+    payloads = auth_services.build_schedule_payloads(
+        _actor_schedule_query(actor, end=today).all(),
+        actor,
+    )
     pending = [
         item for item in payloads
         if item.get('next_action_status') == 'waiting_teacher_feedback'
@@ -331,17 +334,6 @@ def record_schedule_action_reminders(
     return created_events
 
 
-def _get_delivery_map(event_ids, external_user_id):
-    if not event_ids:
-        return {}
-    deliveries = ReminderDelivery.query.filter(
-        ReminderDelivery.event_id.in_(event_ids),
-        ReminderDelivery.channel == OPENCLAW_FEED_CHANNEL,
-        ReminderDelivery.receiver_external_id == external_user_id,
-    ).all()
-    return {delivery.event_id: delivery for delivery in deliveries}
-
-
 def _touch_delivery(event, external_user_id, *, ack=False):
     delivery = ReminderDelivery.query.filter_by(
         event_id=event.id,
@@ -385,61 +377,99 @@ def build_reminder_payload(event, delivery=None):
         'scope_id': event.scope_id,
         'status': event.status,
         'delivery_status': delivery.delivery_status if delivery else None,
-        'payload': event.get_payload_data(),
+        'payload': event.get_payload_view(),
         'created_at': event.created_at.isoformat() if event.created_at else None,
         'updated_at': event.updated_at.isoformat() if event.updated_at else None,
     }
 
 
+def _reminder_cursor_clause(cursor):
+    """Keyset filter after the cursor event, which is still the last event id of the previous page."""
+    try:
+        cursor_id = int(cursor)
+    except (TypeError, ValueError):
+        return None
+    cursor_created_at = db.session.query(ReminderEvent.created_at).filter(
+        ReminderEvent.id == cursor_id,
+    ).scalar()
+    if cursor_created_at is None:
+        return ReminderEvent.id < cursor_id
+    return or_(
+        ReminderEvent.created_at < cursor_created_at,
+        and_(ReminderEvent.created_at == cursor_created_at, ReminderEvent.id < cursor_id),
+    )
+
+
+def _touch_page_deliveries(rows, external_user_id):
+    """Mark the page as fetched, reusing the deliveries loaded by the feed join."""
+    now = auth_services.get_business_now()
+    touched = []
+    for event, delivery in rows:
+        if delivery is None:
+            delivery = ReminderDelivery(
+                event_id=event.id,
+                channel=OPENCLAW_FEED_CHANNEL,
+                receiver_external_id=external_user_id,
+                delivery_status='pending',
+                fetched_at=now,
+            )
+            db.session.add(delivery)
+        elif delivery.delivery_status != 'acked':
+            delivery.delivery_status = 'pending'
+            delivery.fetched_at = now
+        touched.append((event, delivery))
+    return touched
+
+
 def list_openclaw_reminders(actor, external_user_id, *, status='pending', limit=20, cursor=None):
-    sync_actor_snapshot_reminders(actor)
+    ensure_actor_reminders_fresh(actor)
 
-    query = ReminderEvent.query.filter(
+    is_acked = and_(
+        ReminderDelivery.id.isnot(None),
+        ReminderDelivery.delivery_status == 'acked',
+    )
+    query = db.session.query(ReminderEvent, ReminderDelivery).outerjoin(
+        ReminderDelivery,
+        and_(
+            ReminderDelivery.event_id == ReminderEvent.id,
+            ReminderDelivery.channel == OPENCLAW_FEED_CHANNEL,
+            ReminderDelivery.receiver_external_id == external_user_id,
+        ),
+    ).filter(
         ReminderEvent.target_user_id == actor.id,
         ReminderEvent.status != 'cancelled',
-    ).order_by(ReminderEvent.created_at.desc(), ReminderEvent.id.desc())
-    events = query.all()
-    if cursor is not None:
-        try:
-            cursor_id = int(cursor)
-            events = [event for event in events if event.id < cursor_id]
-        except (TypeError, ValueError):
-            pass
-
-    event_ids = [event.id for event in events]
-    delivery_map = _get_delivery_map(event_ids, external_user_id)
-    items = []
-    for event in events:
-        delivery = delivery_map.get(event.id)
-        is_acked = bool(delivery and delivery.delivery_status == 'acked')
-        if status == 'acked' and not is_acked:
-            continue
-        if status != 'acked' and is_acked:
-            continue
-        items.append((event, delivery))
+        is_acked if status == 'acked' else ~is_acked,
+    )
+    total = query.with_entities(db.func.count(ReminderEvent.id)).scalar() or 0
 
+    if cursor is not None:
+        cursor_clause = _reminder_cursor_clause(cursor)
+        if cursor_clause is not None:
+            query = query.filter(cursor_clause)
     normalized_limit = max(int(limit or 20), 1)
-    limited = items[:normalized_limit]
-    for event, delivery in limited:
-        if status != 'acked':
-            delivery = _touch_delivery(event, external_user_id, ack=False)
-            delivery_map[event.id] = delivery
-    if limited:
-        db.session.commit()
-
-    payload_items = [
-        build_reminder_payload(event, delivery_map.get(event.id) or delivery)
-        for event, delivery in limited
-    ]
-    next_cursor = limited[-1][0].id if len(items) > len(limited) and limited else None
-    return {
+    rows = query.order_by(
+        ReminderEvent.created_at.desc(),
+        ReminderEvent.id.desc(),
+    ).limit(normalized_limit + 1).all()
+    has_more = len(rows) > normalized_limit
+    rows = rows[:normalized_limit]
+
+    if status != 'acked':
+        rows = _touch_page_deliveries(rows, external_user_id)
+    # Serialize before committing so expired rows are not reloaded one by one.
+    items = [build_reminder_payload(event, delivery) for event, delivery in rows]
+    next_cursor = rows[-1][0].id if has_more else None
+    payload = {
         'actor': actor.to_dict(),
         'status': 'acked' if status == 'acked' else 'pending',
-        'items': payload_items,
-        'total': len(items),
+        'items': items,
+        'total': total,
         'next_cursor': next_cursor,
         'has_more': next_cursor is not None,
     }
+    if rows and status != 'acked':
+        db.session.commit()
+    return payload
 
 
 def ack_openclaw_reminders(actor, external_user_id, event_ids):
@@ -0,0 +1,228 @@
+"""Change-driven refresh of OpenClaw snapshot reminders.
+
+Snapshot reminders (open workflow todos, pending leave requests, overdue
+feedback) used to be rebuilt for the actor on every reminder poll. Instead, an
+`after_flush` hook records which schedules, enrollments and teachers a
+transaction touched on `OATodo`, `LeaveRequest`, `CourseFeedback` or
+`CourseSchedule`. After commit, those scopes are queued for the app. A
+background worker then resolves them to the affected OpenClaw actors and
+resyncs only those actors. Changes that land close together are coalesced into
+one resync per actor.
+
+A poll only does work in two cases:
+- scopes are still queued, so the poll drains them itself (read-your-writes);
+- the actor's last full resync is older than `SCF_REMINDER_RESYNC_SECONDS`.
+  This debounced resync is the safety net for time-based changes, such as a
+  lesson becoming overdue, and for writes that bypass the ORM.
+
+State is kept per process in `app.extensions`, matching the single gunicorn
+worker deployment.
+"""
+import threading
+import time
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, or_
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import Session
+
+from extensions import db
+from modules.auth.models import Enrollment, ExternalIdentity, LeaveRequest, User
+from modules.oa.models import CourseFeedback, CourseSchedule, OATodo
+
+
+_EXTENSION_KEY = 'scf_reminder_sync'
+_PENDING_SCOPES = 'scf_reminder_sync_scopes'
+_SUPPRESS_COLLECT = 'scf_reminder_sync_suppress'
+DEFAULT_RESYNC_SECONDS = 900
+
+
+def _empty_scopes():
+    return {'teacher_ids': set(), 'schedule_ids': set(), 'enrollment_ids': set(), 'leave_request_ids': set()}
+
+
+class _ReminderSyncState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sync_lock = threading.RLock()
+        self.pending = _empty_scopes()
+        self.has_pending = False
+        self.worker_running = False
+        self.synced_at = {}
+
+    def take_pending(self):
+        with self.lock:
+            if not self.has_pending:
+                return None
+            pending = self.pending
+            self.pending = _empty_scopes()
+            self.has_pending = False
+            return pending
+
+    def add_pending(self, scopes):
+        with self.lock:
+            for key, values in scopes.items():
+                self.pending[key] |= values
+            self.has_pending = True
+
+
+def _state():
+    state = current_app.extensions.get(_EXTENSION_KEY)
+    if state is None:
+        state = current_app.extensions[_EXTENSION_KEY] = _ReminderSyncState()
+    return state
+
+
+def _attribute_values(obj, field):
+    """Current and pre-flush values of a column, without emitting SQL."""
+    state = sa_inspect(obj)
+    history = state.attrs[field].history
+    values = set(history.added or ()) | set(history.deleted or ()) | set(history.unchanged or ())
+    values.add(state.dict.get(field))
+    values.discard(None)
+    return values
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_reminder_scopes(session, flush_context):
+    if session.info.get(_SUPPRESS_COLLECT):
+        return
+    scopes = None
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, CourseSchedule):
+            scope_fields = {'teacher_ids': 'teacher_id', 'schedule_ids': 'id'}
+        elif isinstance(obj, (LeaveRequest, CourseFeedback)):
+            scope_fields = {'schedule_ids': 'schedule_id'}
+        elif isinstance(obj, OATodo):
+            scope_fields = {
+                'schedule_ids': 'schedule_id',
+                'enrollment_ids': 'enrollment_id',
+                'leave_request_ids': 'leave_request_id',
+            }
+        else:
+            continue
+        if scopes is None:
+            scopes = session.info.setdefault(_PENDING_SCOPES, _empty_scopes())
+        for key, field in scope_fields.items():
+            scopes[key] |= _attribute_values(obj, field)
+
+
+@event.listens_for(Session, 'after_commit')
+def _queue_reminder_scopes(session):
+    scopes = session.info.pop(_PENDING_SCOPES, None)
+    if scopes is None or not has_app_context():
+        return
+    state = _state()
+    state.add_pending(scopes)
+    if not current_app.config.get('SCF_REMINDER_SYNC_ASYNC'):
+        return
+    with state.lock:
+        if state.worker_running:
+            return
+        state.worker_running = True
+    from core.tasks import TaskRunner
+
+    TaskRunner.run_async(_run_reminder_sync_worker)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_reminder_scopes(session):
+    session.info.pop(_PENDING_SCOPES, None)
+
+
+def _resolve_affected_actors(scopes):
+    """OpenClaw actors whose snapshot may have changed: every linked admin plus the touched teachers."""
+    teacher_ids = set(scopes['teacher_ids'])
+    teacher_names = set()
+    schedule_ids = set(scopes['schedule_ids'])
+    if scopes['leave_request_ids']:
+        schedule_ids.update(
+            row[0] for row in db.session.query(LeaveRequest.schedule_id).filter(
+                LeaveRequest.id.in_(scopes['leave_request_ids']),
+            )
+        )
+    if scopes['enrollment_ids']:
+        teacher_ids.update(
+            row[0] for row in db.session.query(Enrollment.teacher_id).filter(
+                Enrollment.id.in_(scopes['enrollment_ids']),
+            )
+        )
+    if schedule_ids:
+        for teacher_id, teacher_name in db.session.query(CourseSchedule.teacher_id, CourseSchedule.teacher).filter(
+            CourseSchedule.id.in_(schedule_ids),
+        ):
+            if teacher_id is not None:
+                teacher_ids.add(teacher_id)
+            elif teacher_name:
+                teacher_names.add(teacher_name)
+    teacher_ids.discard(None)
+
+    teacher_clauses = []
+    if teacher_ids:
+        teacher_clauses.append(User.id.in_(teacher_ids))
+    if teacher_names:
+        teacher_clauses.append(User.display_name.in_(teacher_names))
+        teacher_clauses.append(User.username.in_(teacher_names))
+    actor_clause = User.role == 'admin'
+    if teacher_clauses:
+        actor_clause = or_(actor_clause, (User.role == 'teacher') & or_(*teacher_clauses))
+    linked_user_ids = db.session.query(ExternalIdentity.user_id).filter(ExternalIdentity.status == 'active')
+    return User.query.filter(
+        actor_clause,
+        User.is_active == True,
+        User.id.in_(linked_user_ids),
+    ).order_by(User.id).all()
+
+
+def _sync_actor(state, actor):
+    from modules.oa.reminder_services import sync_actor_snapshot_reminders
+
+    session = db.session
+    session.info[_SUPPRESS_COLLECT] = True
+    try:
+        sync_actor_snapshot_reminders(actor)
+    finally:
+        session.info.pop(_SUPPRESS_COLLECT, None)
+    state.synced_at[actor.id] = time.monotonic()
+
+
+def process_pending_reminder_syncs():
+    """Resync the actors affected by queued changes; returns the number of actors refreshed."""
+    state = _state()
+    refreshed = 0
+    with state.sync_lock:
+        while True:
+            scopes = state.take_pending()
+            if scopes is None:
+                return refreshed
+            for actor in _resolve_affected_actors(scopes):
+                _sync_actor(state, actor)
+                refreshed += 1
+
+
+def _run_reminder_sync_worker():
+    state = _state()
+    while True:
+        try:
+            process_pending_reminder_syncs()
+        except Exception:
+            # Forget the sync times so every actor's next poll does a full resync instead
+            db.session.rollback()
+            state.synced_at.clear()
+            current_app.logger.exception('reminder snapshot sync failed')
+        with state.lock:
+            if not state.has_pending:
+                state.worker_running = False
+                return
+
+
+def ensure_actor_reminders_fresh(actor):
+    """Called by the reminder feed before reading: cheap unless changes are queued or the debounce window expired."""
+    state = _state()
+    if state.has_pending:
+        process_pending_reminder_syncs()
+    resync_seconds = current_app.config.get('SCF_REMINDER_RESYNC_SECONDS', DEFAULT_RESYNC_SECONDS)
+    with state.sync_lock:
+        synced_at = state.synced_at.get(actor.id)
+        if synced_at is None or time.monotonic() - synced_at >= resync_seconds:
+            _sync_actor(state, actor)
@@ -1,9 +1,8 @@
 import json
 from calendar import monthrange
-from collections import defaultdict
 from datetime import date, datetime, timedelta
 
-from flask import current_app, jsonify, render_template, request
+from flask import current_app, jsonify, render_template, request, url_for
 from flask_login import current_user
 
 from extensions import db
@@ -12,22 +11,25 @@ from modules.auth.models import Enrollment, LeaveRequest, User
 from modules.auth.services import (
     BUSINESS_TIMEZONE,
     _schedule_effective_student_profile_id,
-    build_schedule_payload,
-    get_course_feedback_skip_reason,
+    build_schedule_payloads,
     get_business_now,
     get_business_today,
     schedule_has_historical_facts,
-    schedule_requires_course_feedback,
     sync_schedule_student_snapshot,
     sync_enrollment_status,
 )
+from modules.auth.workflow_services import filter_visible_oa_todos
 from modules.oa import oa_bp
 from . import schedule_actions
-from modules.oa.models import CourseFeedback, CourseSchedule, OATodo
+from modules.oa.models import CourseFeedback, CourseSchedule, OATodo, ScheduleImportRun
 from modules.oa.reminder_services import record_schedule_action_reminders
+from modules.oa.schedule_progress import build_schedule_progress_map
 from modules.oa.services import (
+    ScheduleImportBusyError,
     apply_schedule_excel_import,
     build_schedule_delivery_fields,
+    enqueue_schedule_excel_import,
+    get_schedule_import_status,
     delivery_mode_from_color_tag,
     resolve_schedule_teacher_reference,
     validate_schedule_conflicts,
@@ -45,41 +47,6 @@ def _get_staff_options():
     return ['李宇', '范晓东', '周行', '包睿旻', '黎怡君', '张渝', '陈冠如', '王艳龙', '卢老师', '田鹏', '陈东豪']
 
 
-def _filter_visible_todos(todos, *, reconcile_feedback_visibility=False):
-    visible = []
-    changed = False
-    for todo in todos:
-        if todo.is_workflow:
-            from modules.auth.workflow_services import reconcile_stale_workflow_todo, workflow_todo_stale_reason
-
-            if reconcile_stale_workflow_todo(todo):
-                changed = True
-            if workflow_todo_stale_reason(todo):
-                continue
-            if todo.is_completed or todo.workflow_status in {
-                OATodo.WORKFLOW_STATUS_COMPLETED,
-                OATodo.WORKFLOW_STATUS_CANCELLED,
-            }:
-                continue
-        if (
-            todo.todo_type == OATodo.TODO_TYPE_SCHEDULE_FEEDBACK
-            and not schedule_requires_course_feedback(getattr(todo, 'schedule', None))
-        ):
-            if reconcile_feedback_visibility and not todo.is_completed:
-                from modules.auth.workflow_services import cancel_schedule_feedback_todo
-
-                cancel_schedule_feedback_todo(
-                    todo.schedule_id,
-                    reason=get_course_feedback_skip_reason(getattr(todo, 'schedule', None)) or '',
-                )
-                changed = True
-            continue
-        visible.append(todo)
-    if changed:
-        db.session.commit()
-    return visible
-
-
 def _time_to_minutes(time_str):
     hour, minute = time_str.split(':')
     return int(hour) * 60 + int(minute)
@@ -411,20 +378,26 @@ def _schedule_factual_edit_block_reason(schedule):
 
 
 def _build_oa_schedule_payload(schedule):
-    payload = build_schedule_payload(schedule, current_user)
-    delete_block_reason = schedule_actions.schedule_cancel_block_reason(schedule)
-    reschedule_block_reason = (
-        '该课程已取消'
-        if getattr(schedule, 'is_cancelled', False)
-        else schedule_actions.schedule_factual_edit_block_reason(schedule)
-    )
-    payload.update({
-        'admin_can_delete': delete_block_reason is None,
-        'admin_delete_block_reason': delete_block_reason,
-        'admin_can_reschedule': reschedule_block_reason is None,
-        'admin_reschedule_block_reason': reschedule_block_reason,
-    })
-    return payload
+    return _build_oa_schedule_payloads([schedule])[0]
+
+
+def _build_oa_schedule_payloads(schedules):
+    payloads = build_schedule_payloads(schedules, current_user)
+    factual_edit_block_reasons = schedule_actions.schedule_factual_edit_block_reasons(schedules)
+    for schedule, payload in zip(schedules, payloads):
+        delete_block_reason = schedule_actions.schedule_cancel_block_reason(schedule)
+        reschedule_block_reason = (
+            '该课程已取消'
+            if getattr(schedule, 'is_cancelled', False)
+            else factual_edit_block_reasons.get(schedule.id)
+        )
+        payload.update({
+            'admin_can_delete': delete_block_reason is None,
+            'admin_delete_block_reason': delete_block_reason,
+            'admin_can_reschedule': reschedule_block_reason is None,
+            'admin_reschedule_block_reason': reschedule_block_reason,
+        })
+    return payloads
 
 
 def _guard_generic_todo_mutation(todo):
@@ -502,7 +475,7 @@ def api_list_schedules():
 
     return jsonify({
         'success': True,
-        'data': [_build_oa_schedule_payload(schedule) for schedule in schedules],
+        'data': _build_oa_schedule_payloads(schedules),
         'total': len(schedules),
     })
 
@@ -551,7 +524,7 @@ def api_schedules_by_date():
 
     return jsonify({
         'success': True,
-        'data': [_build_oa_schedule_payload(schedule) for schedule in schedules],
+        'data': _build_oa_schedule_payloads(schedules),
         'total': len(schedules),
     })
 
@@ -835,6 +808,48 @@ def api_run_internal_tencent_meeting_feedback_drafts():
     return jsonify({'success': True, 'data': result})
 
 
+@oa_bp.route('/api/internal/workflow-todos/reconcile/run', methods=['POST'])
+def api_run_internal_workflow_todo_reconcile():
+    expected_token = (current_app.config.get('SCF_WORKFLOW_JOB_TOKEN') or '').strip()
+    provided_token = (request.headers.get('X-Workflow-Job-Token') or '').strip()
+    if not expected_token:
+        return jsonify({'success': False, 'error': '流程待办兜底任务未配置 token'}), 503
+    if provided_token != expected_token:
+        return jsonify({'success': False, 'error': '无效的流程待办任务 token'}), 401
+
+    payload = request.get_json(silent=True) or {}
+    from modules.auth.workflow_services import reconcile_stale_workflow_todos
+
+    result = reconcile_stale_workflow_todos(dry_run=bool(payload.get('dry_run')))
+    return jsonify({'success': True, 'data': result})
+
+
+@oa_bp.route('/api/internal/enrollments/replan/run', methods=['POST'])
+def api_run_internal_enrollment_replan():
+    expected_token = (current_app.config.get('SCF_SCHEDULING_JOB_TOKEN') or '').strip()
+    provided_token = (request.headers.get('X-Scheduling-Job-Token') or '').strip()
+    if not expected_token:
+        return jsonify({'success': False, 'error': '批量排课任务未配置 token'}), 503
+    if provided_token != expected_token:
+        return jsonify({'success': False, 'error': '无效的排课任务 token'}), 401
+
+    payload = request.get_json(silent=True) or {}
+    enrollment_ids = payload.get('enrollment_ids')
+    if enrollment_ids is not None and (
+        not isinstance(enrollment_ids, list)
+        or not all(isinstance(item, int) and not isinstance(item, bool) for item in enrollment_ids)
+    ):
+        return jsonify({'success': False, 'error': 'enrollment_ids 必须是报名 id 列表'}), 400
+
+    from modules.auth.batch_planning import replan_pending_enrollments
+
+    result = replan_pending_enrollments(
+        enrollment_ids=enrollment_ids,
+        dry_run=bool(payload.get('dry_run')),
+    )
+    return jsonify({'success': True, 'data': result})
+
+
 @oa_bp.route('/api/integrations/tencent-meeting/webhook', methods=['GET', 'POST'])
 def api_tencent_meeting_webhook():
     from modules.oa.tencent_meeting_services import (
@@ -902,33 +917,15 @@ def api_list_students():
 @oa_bp.route('/api/schedules/progress', methods=['GET'])
 @role_required('admin')
 def api_schedule_progress():
-    all_schedules = CourseSchedule.query.filter(
-        CourseSchedule.is_cancelled == False,
-    ).order_by(
-        CourseSchedule.date,
-        CourseSchedule.time_start,
-    ).all()
-
-    groups = defaultdict(list)
-    for schedule in all_schedules:
-        if schedule.enrollment_id:
-            key = ('enrollment', schedule.enrollment_id)
-        else:
-            key = ('legacy', schedule.course_name, schedule.teacher_id or schedule.teacher, schedule.students or '')
-        groups[key].append(schedule)
-
-    progress_map = {}
-    for schedules in groups.values():
-        total = len(schedules)
-        if total < 2:
-            continue
-        for index, schedule in enumerate(schedules, 1):
-            progress_map[schedule.id] = {
-                'current': index,
-                'total': total,
-                'is_ending': index > max(total - 3, 0),
-            }
-
+    """课次进度；日历按当前视图传 start/end，只返回范围内的课次。"""
+    start_str = request.args.get('start')
+    end_str = request.args.get('end')
+    try:
+        date_start = date.fromisoformat(start_str) if start_str else None
+        date_end = date.fromisoformat(end_str) if end_str else None
+    except ValueError:
+        return jsonify({'success': False, 'error': '日期格式错误，请使用 YYYY-MM-DD'}), 400
+    progress_map = build_schedule_progress_map(date_start=date_start, date_end=date_end)
     return jsonify({'success': True, 'data': progress_map})
 
 
@@ -958,15 +955,12 @@ def api_list_todos():
     if todo_type:
         query = query.filter(OATodo.todo_type == todo_type)
 
-    todos = _filter_visible_todos(
-        query.order_by(
-            OATodo.is_completed,
-            OATodo.priority,
-            OATodo.due_date.is_(None).asc(),
-            OATodo.due_date.asc(),
-        ).all(),
-        reconcile_feedback_visibility=True,
-    )
+    todos = filter_visible_oa_todos(query).order_by(
+        OATodo.is_completed,
+        OATodo.priority,
+        OATodo.due_date.is_(None).asc(),
+        OATodo.due_date.asc(),
+    ).all()
     return jsonify({'success': True, 'data': [_build_oa_todo_payload(todo) for todo in todos], 'total': len(todos)})
 
 
@@ -1130,20 +1124,37 @@ def api_import_excel():
     if not file.filename.endswith(('.xlsx', '.xls')):
         return jsonify({'success': False, 'error': '仅支持 .xlsx 或 .xls 文件'}), 400
 
+    uploaded_by = current_user.id if getattr(current_user, 'is_authenticated', False) else None
     try:
-        _, summary = apply_schedule_excel_import(
-            file,
-            uploaded_by=current_user.id if getattr(current_user, 'is_authenticated', False) else None,
-        )
+        if current_app.config.get('SCF_SCHEDULE_IMPORT_ASYNC'):
+            run = enqueue_schedule_excel_import(file, uploaded_by=uploaded_by)
+            data = get_schedule_import_status(run)
+            data['status_url'] = url_for('oa.api_import_excel_status', import_id=run.id)
+            return jsonify({'success': True, 'data': data}), 202
+
+        _, summary = apply_schedule_excel_import(file, uploaded_by=uploaded_by)
         return jsonify({
             'success': True,
             'data': summary,
         })
+    except ScheduleImportBusyError as exc:
+        data = get_schedule_import_status(exc.run)
+        data['status_url'] = url_for('oa.api_import_excel_status', import_id=exc.run.id)
+        return jsonify({'success': False, 'error': str(exc), 'data': data}), 409
     except Exception as exc:
         db.session.rollback()
         return jsonify({'success': False, 'error': f'导入失败: {str(exc)}'}), 500
 
 
+@oa_bp.route('/api/import-excel/<int:import_id>', methods=['GET'])
+@role_required('admin')
+def api_import_excel_status(import_id):
+    run = db.session.get(ScheduleImportRun, import_id)
+    if not run:
+        return jsonify({'success': False, 'error': '导入任务不存在'}), 404
+    return jsonify({'success': True, 'data': get_schedule_import_status(run)})
+
+
 # ========== 仪表盘统计 API ==========
 
 
@@ -1155,10 +1166,9 @@ def api_dashboard_stats():
         CourseSchedule.date == today,
         CourseSchedule.is_cancelled == False,
     ).count()
-    pending_count = len(_filter_visible_todos(
-        OATodo.query.filter(OATodo.is_completed == False).all(),
-        reconcile_feedback_visibility=True,
-    ))
+    pending_count = filter_visible_oa_todos(
+        OATodo.query.filter(OATodo.is_completed == False)
+    ).count()
 
     monday = today - timedelta(days=today.weekday())
     sunday = monday + timedelta(days=6)
@@ -1179,7 +1189,7 @@ def api_dashboard_stats():
             'today_count': today_count,
             'pending_todos': pending_count,
             'week_count': week_count,
-        'today_schedules': [_build_oa_schedule_payload(schedule) for schedule in today_schedules],
+        'today_schedules': _build_oa_schedule_payloads(today_schedules),
         }
     })
 
@@ -1,6 +1,8 @@
 """Shared schedule action helpers for OA and external integrations."""
 from datetime import date, timedelta
 
+from sqlalchemy import or_
+
 from extensions import db
 from modules.auth import services as auth_services
 from modules.auth.models import Enrollment, LeaveRequest, User
@@ -70,9 +72,7 @@ def schedule_locked_by_leave(schedule, updates):
     if not (touched_fields & protected_fields):
         return False
 
-    latest_leave = LeaveRequest.query.filter_by(schedule_id=schedule.id).order_by(
-        LeaveRequest.created_at.desc()
-    ).first()
+    latest_leave = auth_services._latest_leave_request(schedule)
     if not latest_leave:
         return False
     if latest_leave.status == 'pending':
@@ -363,6 +363,86 @@ def schedule_factual_edit_block_reason(schedule):
     return None
 
 
+def schedule_factual_edit_block_reasons(schedules):
+    """批量计算 schedule_factual_edit_block_reason，返回 {schedule_id: reason}。
+
+    课表列表一次可能有几百节课，这里把请假锁定与未完成工作流的判断合并成一次待办查询。
+    """
+    from modules.auth.workflow_services import PROCESS_WORKFLOW_TYPES
+
+    schedules = [schedule for schedule in schedules or [] if schedule and schedule.id]
+    if not schedules:
+        return {}
+
+    latest_leaves = {schedule.id: auth_services._latest_leave_request(schedule) for schedule in schedules}
+    schedule_ids = [schedule.id for schedule in schedules]
+    enrollment_ids = {schedule.enrollment_id for schedule in schedules if schedule.enrollment_id}
+    approved_leave_ids = {
+        leave_request.id
+        for leave_request in latest_leaves.values()
+        if leave_request and leave_request.status == 'approved'
+    }
+    clauses = [OATodo.schedule_id.in_(schedule_ids)]
+    if enrollment_ids:
+        clauses.append(OATodo.enrollment_id.in_(enrollment_ids))
+    if approved_leave_ids:
+        clauses.append(OATodo.leave_request_id.in_(approved_leave_ids))
+    open_todo_rows = db.session.query(
+        OATodo.todo_type,
+        OATodo.schedule_id,
+        OATodo.enrollment_id,
+        OATodo.leave_request_id,
+    ).filter(
+        OATodo.todo_type != OATodo.TODO_TYPE_GENERIC,
+        OATodo.is_completed == False,
+        ~OATodo.workflow_status.in_([
+            OATodo.WORKFLOW_STATUS_COMPLETED,
+            OATodo.WORKFLOW_STATUS_CANCELLED,
+        ]),
+        or_(*clauses),
+    ).all()
+
+    open_makeup_leave_ids = set()
+    process_schedule_ids, process_enrollment_ids = set(), set()
+    workflow_schedule_ids, workflow_enrollment_ids = set(), set()
+    for todo_type, schedule_id, enrollment_id, leave_request_id in open_todo_rows:
+        if todo_type == OATodo.TODO_TYPE_LEAVE_MAKEUP and leave_request_id:
+            open_makeup_leave_ids.add(leave_request_id)
+        if todo_type in PROCESS_WORKFLOW_TYPES:
+            process_schedule_ids.add(schedule_id)
+            process_enrollment_ids.add(enrollment_id)
+        workflow_schedule_ids.add(schedule_id)
+        workflow_enrollment_ids.add(enrollment_id)
+
+    reasons = {}
+    for schedule in schedules:
+        latest_leave = latest_leaves.get(schedule.id)
+        locked_by_leave = bool(
+            latest_leave
+            and (
+                latest_leave.status == 'pending'
+                or (latest_leave.status == 'approved' and latest_leave.id in open_makeup_leave_ids)
+            )
+        )
+        if locked_by_leave:
+            reasons[schedule.id] = '该课程已有请假记录，请通过调课流程处理，不能直接覆盖'
+        elif schedule.id in process_schedule_ids or (
+            schedule.enrollment_id and schedule.enrollment_id in process_enrollment_ids
+        ):
+            reasons[schedule.id] = '该课程关联未完成的工作流，仅允许修改备注、地点或上课方式'
+        elif schedule.id in workflow_schedule_ids or (
+            schedule.enrollment_id and schedule.enrollment_id in workflow_enrollment_ids
+        ):
+            reasons[schedule.id] = '该课程关联未完成的工作流，不能直接改绑报名'
+        elif getattr(schedule, 'is_cancelled', False):
+            reasons[schedule.id] = '该课程已取消'
+        elif auth_services.schedule_has_historical_facts(schedule):
+            reasons[schedule.id] = '该课程已产生交付事实，仅允许修改备注、地点或上课方式'
+        else:
+            reasons[schedule.id] = None
+    return reasons
+
+
 def schedule_cancel_block_reason(schedule):
     if not schedule:
         return '课程不存在'
@@ -0,0 +1,198 @@
+"""课次占用索引：统一的排课冲突引擎。
+
+一次把某个日期范围内（未取消的）课次读进内存，按日期分桶、桶内按开始分钟排序。
+每个桶额外记录最长课次时长，和查询区间 [start, end) 重叠的课次开始时间一定落在
+(start - 最长时长, end) 内，两次二分就能圈出候选，之后只看这一小段。
+
+手动排课校验、补课提案校验、Excel 导入和排课助手的空闲时段查询都用它，
+冲突口径和 `find_schedule_conflicts` 保持一致：老师按 id 或姓名、同一报名、
+同一学生档案（课次学生快照优先，没有快照时看报名上的档案）。
+"""
+
+import bisect
+
+from sqlalchemy import or_
+
+
+def time_to_minutes(time_str):
+    if not time_str:
+        return None
+    try:
+        hour, minute = str(time_str).split(':', 1)
+        return int(hour) * 60 + int(minute)
+    except (ValueError, TypeError):
+        return None
+
+
+class ScheduleOccupancy:
+    """按日期分桶的课次区间索引，可在导入等批量流程中通过 `track()` 增量更新。"""
+
+    def __init__(self, schedules=(), *, enrollments_by_id=None):
+        self._days = {}
+        self._max_length = {}
+        self._entries = {}
+        self._enrollments_by_id = enrollments_by_id
+        for schedule in schedules:
+            self.track(schedule)
+
+    @classmethod
+    def load(
+        cls,
+        *,
+        date_start=None,
+        date_end=None,
+        dates=None,
+        teacher_id=None,
+        teacher_name=None,
+        enrollment_id=None,
+        student_profile_id=None,
+        teacher_ids=(),
+        teacher_names=(),
+        student_profile_ids=(),
+        filters=(),
+        enrollments_by_id=None,
+    ):
+        """一次查询读入占用：`dates` 或 [date_start, date_end] 限定日期，老师/报名/学生条件之间取并集。
+
+        复数参数用于批量排课，一次读入多位老师、多个学生的占用。
+        """
+        from sqlalchemy.orm import selectinload
+
+        from modules.auth.services import student_schedule_profile_clause
+        from modules.oa.models import CourseSchedule
+
+        query = CourseSchedule.query.filter(CourseSchedule.is_cancelled == False)
+        if dates is not None:
+            dates = sorted(set(dates))
+            if not dates:
+                return cls(enrollments_by_id=enrollments_by_id)
+            query = query.filter(CourseSchedule.date.in_(dates))
+        if date_start is not None:
+            query = query.filter(CourseSchedule.date >= date_start)
+        if date_end is not None:
+            query = query.filter(CourseSchedule.date <= date_end)
+
+        teacher_ids = {item for item in (teacher_id, *teacher_ids) if item}
+        teacher_names = {item for item in (teacher_name, *teacher_names) if item}
+        student_profile_ids = {item for item in (student_profile_id, *student_profile_ids) if item}
+        owner_clauses = []
+        if teacher_ids:
+            owner_clauses.append(CourseSchedule.teacher_id.in_(teacher_ids))
+        if teacher_names:
+            owner_clauses.append(CourseSchedule.teacher.in_(teacher_names))
+        if enrollment_id:
+            owner_clauses.append(CourseSchedule.enrollment_id == enrollment_id)
+        if student_profile_ids:
+            owner_clauses.append(student_schedule_profile_clause(student_profile_ids, schedule_model=CourseSchedule))
+        if owner_clauses:
+            query = query.filter(or_(*owner_clauses))
+        for clause in filters:
+            query = query.filter(clause)
+        if student_profile_ids and enrollments_by_id is None:
+            # 学生维度要看报名上的档案，随课次一起预加载
+            query = query.options(selectinload(CourseSchedule.enrollment))
+        return cls(query.all(), enrollments_by_id=enrollments_by_id)
+
+    def track(self, schedule):
+        """写入（或刷新）一条课次；已取消或时间无法解析的只做移除。"""
+        previous = self._entries.pop(id(schedule), None)
+        if previous is not None:
+            day = self._days.get(previous[0])
+            if day:
+                day.remove(previous[1])
+
+        start = time_to_minutes(schedule.time_start)
+        end = time_to_minutes(schedule.time_end)
+        if schedule.is_cancelled or not schedule.date or start is None or end is None:
+            return
+        entry = (start, end, schedule.id or 0, id(schedule), schedule)
+        bisect.insort(self._days.setdefault(schedule.date, []), entry)
+        # 移除时不回收最长时长，只会让候选段略宽，不影响结果
+        self._max_length[schedule.date] = max(self._max_length.get(schedule.date, 0), end - start)
+        self._entries[id(schedule)] = (schedule.date, entry)
+
+    def overlapping(self, course_date, time_start, time_end, *, exclude_schedule_ids=None):
+        """与 [time_start, time_end) 有重叠的课次，按课次 id 排序。"""
+        start = time_to_minutes(time_start) if isinstance(time_start, str) else time_start
+        end = time_to_minutes(time_end) if isinstance(time_end, str) else time_end
+        day = self._days.get(course_date)
+        if not day or start is None or end is None:
+            return []
+        lower = bisect.bisect_right(day, (start - self._max_length.get(course_date, 0),))
+        upper = bisect.bisect_left(day, (end,))
+        exclude_ids = set(exclude_schedule_ids or ())
+        matches = [
+            entry[4] for entry in day[lower:upper]
+            if entry[1] > start and not (entry[4].id and entry[4].id in exclude_ids)
+        ]
+        return sorted(matches, key=lambda schedule: schedule.id or 0)
+
+    def is_free(self, course_date, time_start, time_end, **kwargs):
+        return not self.overlapping(course_date, time_start, time_end, **kwargs)
+
+    def schedule_profile_id(self, schedule):
+        if schedule.student_profile_id_snapshot is not None:
+            return schedule.student_profile_id_snapshot
+        if self._enrollments_by_id is not None:
+            enrollment = self._enrollments_by_id.get(schedule.enrollment_id)
+        else:
+            enrollment = schedule.enrollment if schedule.enrollment_id else None
+        return enrollment.student_profile_id if enrollment else None
+
+    def find_conflicts(
+        self,
+        course_date,
+        time_start,
+        time_end,
+        *,
+        teacher_id=None,
+        teacher_name=None,
+        enrollment_id=None,
+        student_profile_id=None,
+        exclude_schedule_id=None,
+        exclude_schedule_ids=None,
+        require_teacher=True,
+    ):
+        """返回 {'error', 'teacher', 'enrollment', 'student', 'all'}，结构同 `find_schedule_conflicts`。"""
+        result = {
+            'error': None,
+            'teacher': [],
+            'enrollment': [],
+            'student': [],
+        }
+        if not course_date or not time_start or not time_end or (require_teacher and not (teacher_id or teacher_name)):
+            result['error'] = '缺少冲突校验所需的日期、时间或教师信息'
+            result['all'] = []
+            return result
+        start = time_to_minutes(time_start)
+        end = time_to_minutes(time_end)
+        if start is None or end is None or end <= start:
+            result['error'] = '结束时间必须晚于开始时间'
+            result['all'] = []
+            return result
+
+        exclude_ids = set(exclude_schedule_ids or ())
+        if exclude_schedule_id:
+            exclude_ids.add(exclude_schedule_id)
+        for schedule in self.overlapping(course_date, start, end, exclude_schedule_ids=exclude_ids):
+            if (teacher_id and schedule.teacher_id == teacher_id) or (teacher_name and schedule.teacher == teacher_name):
+                result['teacher'].append(schedule)
+            if enrollment_id and schedule.enrollment_id == enrollment_id:
+                result['enrollment'].append(schedule)
+            if (
+                student_profile_id
+                and (not enrollment_id or schedule.enrollment_id != enrollment_id)
+                and self.schedule_profile_id(schedule) == student_profile_id
+            ):
+                result['student'].append(schedule)
+
+        deduped_conflicts = []
+        seen_ids = set()
+        for bucket in ('teacher', 'enrollment', 'student'):
+            for schedule in result[bucket]:
+                if id(schedule) in seen_ids:
+                    continue
+                seen_ids.add(id(schedule))
+                deduped_conflicts.append(schedule)
+        result['all'] = deduped_conflicts
+        return result
@@ -0,0 +1,248 @@
+"""课表进度：课次在所属课程分组里是第几节、共几节。
+
+编号交给数据库的窗口函数（`ROW_NUMBER()` / `COUNT() OVER (PARTITION BY ...)`，
+SQLite 3.25+ 和 MySQL 8 都支持），只读请求日期范围内出现过的分组，
+不再把全部历史课次读进 Python 分组。
+
+分组口径和原来一致：
+- 内部日历：有报名的按报名分组，没有报名的按（课程名、老师 id 或姓名、学生）分组，不含已取消课次；
+- 对外接口：按（课程名、老师姓名、学生）分组，包含已取消课次。
+
+每个分组的编号结果缓存在 `app.extensions` 里（按应用隔离，gunicorn 单 worker 部署），
+课次新增、删除或改期/取消时，在事务结束后按分组失效；
+改动分组字段（改挂报名、换老师等）或按条件批量删除课次时整个缓存失效。
+"""
+
+import threading
+
+from flask import current_app, has_app_context
+from sqlalchemy import case, event, func, or_
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import Session
+
+from extensions import db
+from modules.oa.models import CourseSchedule
+
+SCOPE_INTERNAL = 'internal'
+SCOPE_EXTERNAL = 'external'
+
+_EXTENSION_KEY = 'scf_schedule_progress'
+_PENDING_KEYS = 'scf_schedule_progress_keys'
+_RESET_ALL = object()
+_MAX_CACHED_GROUPS = 20000
+_KEY_BATCH_SIZE = 500
+_GROUP_FIELDS = ('enrollment_id', 'course_name', 'teacher_id', 'teacher', 'students')
+_PROGRESS_FIELDS = ('date', 'time_start', 'is_cancelled') + _GROUP_FIELDS
+_lock = threading.Lock()
+
+
+def _group_columns(scope):
+    if scope == SCOPE_EXTERNAL:
+        return (
+            CourseSchedule.course_name,
+            CourseSchedule.teacher,
+            func.coalesce(CourseSchedule.students, ''),
+        )
+    legacy = CourseSchedule.enrollment_id.is_(None)
+    return (
+        CourseSchedule.enrollment_id,
+        case((legacy, CourseSchedule.course_name)),
+        case((legacy, CourseSchedule.teacher_id)),
+        case((legacy & CourseSchedule.teacher_id.is_(None), CourseSchedule.teacher)),
+        case((legacy, func.coalesce(CourseSchedule.students, ''))),
+    )
+
+
+def _group_key(scope, values):
+    """把对象字段（或查询行）折算成和 `_group_columns` 一一对应的分组键。"""
+    if scope == SCOPE_EXTERNAL:
+        return (values['course_name'], values['teacher'], values['students'] or '')
+    if values['enrollment_id'] is not None:
+        return (values['enrollment_id'], None, None, None, None)
+    teacher_id = values['teacher_id']
+    return (
+        None,
+        values['course_name'],
+        teacher_id,
+        values['teacher'] if teacher_id is None else None,
+        values['students'] or '',
+    )
+
+
+def _scope_filters(scope):
+    if scope == SCOPE_EXTERNAL:
+        return ()
+    return (CourseSchedule.is_cancelled == False,)
+
+
+def _group_filter(scope, keys):
+    """圈出包含这些分组全部课次的行集合（可能多读同名分组，窗口分区会把它们分开）。"""
+    course_names = {key[0] if scope == SCOPE_EXTERNAL else key[1] for key in keys}
+    if scope == SCOPE_EXTERNAL:
+        return CourseSchedule.course_name.in_(course_names)
+    clauses = []
+    enrollment_ids = {key[0] for key in keys if key[0] is not None}
+    if enrollment_ids:
+        clauses.append(CourseSchedule.enrollment_id.in_(enrollment_ids))
+    course_names.discard(None)
+    if course_names:
+        clauses.append(CourseSchedule.enrollment_id.is_(None) & CourseSchedule.course_name.in_(course_names))
+    return or_(*clauses)
+
+
+def _app_cache():
+    if not has_app_context():
+        return None
+    return current_app.extensions.setdefault(_EXTENSION_KEY, {})
+
+
+def _session_has_pending_changes(session):
+    return bool(session.new or session.deleted or session.dirty or session.info.get(_PENDING_KEYS))
+
+
+def _load_groups(scope, keys):
+    """窗口查询给指定分组编号：{分组键: [(课次 id, 日期, 第几节, 共几节), ...]}。"""
+    columns = _group_columns(scope)
+    groups = {key: [] for key in keys}
+    keys = list(keys)
+    for offset in range(0, len(keys), _KEY_BATCH_SIZE):
+        batch = keys[offset:offset + _KEY_BATCH_SIZE]
+        rows = db.session.query(
+            CourseSchedule.id,
+            CourseSchedule.date,
+            *columns,
+            func.row_number().over(
+                partition_by=columns,
+                order_by=(CourseSchedule.date, CourseSchedule.time_start, CourseSchedule.id),
+            ),
+            func.count(CourseSchedule.id).over(partition_by=columns),
+        ).filter(
+            *_scope_filters(scope),
+            _group_filter(scope, batch),
+        ).all()
+        for row in rows:
+            key = tuple(row[2:2 + len(columns)])
+            if key in groups:
+                groups[key].append((row[0], row[1], row[-2], row[-1]))
+    return groups
+
+
+def build_schedule_progress_map(*, date_start=None, date_end=None, scope=SCOPE_INTERNAL):
+    """课次进度：{schedule_id: {'current', 'total', 'is_ending'}}。
+
+    只返回 [date_start, date_end] 内的课次，但节次按分组的全部课次计算；
+    不传日期范围时返回全部课次。只有一节课的分组不返回。
+    """
+    columns = _group_columns(scope)
+    window_query = db.session.query(*columns).filter(*_scope_filters(scope))
+    if date_start is not None:
+        window_query = window_query.filter(CourseSchedule.date >= date_start)
+    if date_end is not None:
+        window_query = window_query.filter(CourseSchedule.date <= date_end)
+    keys = {tuple(row) for row in window_query.distinct().all()}
+    if not keys:
+        return {}
+
+    cache = _app_cache()
+    use_cache = cache is not None and not _session_has_pending_changes(db.session)
+    groups = {}
+    if use_cache:
+        with _lock:
+            for key in keys:
+                cached = cache.get((scope, key))
+                if cached is not None:
+                    groups[key] = cached
+    missing = keys - set(groups)
+    if missing:
+        loaded = _load_groups(scope, missing)
+        groups.update(loaded)
+        if use_cache:
+            with _lock:
+                if len(cache) + len(loaded) > _MAX_CACHED_GROUPS:
+                    cache.clear()
+                for key, entries in loaded.items():
+                    cache[(scope, key)] = entries
+
+    progress_map = {}
+    for entries in groups.values():
+        for schedule_id, schedule_date, current, total in entries:
+            if total < 2:
+                continue
+            if date_start is not None and schedule_date < date_start:
+                continue
+            if date_end is not None and schedule_date > date_end:
+                continue
+            progress_map[schedule_id] = {
+                'current': current,
+                'total': total,
+                'is_ending': current > max(total - 3, 0),
+            }
+    return progress_map
+
+
+def invalidate_schedule_progress(keys=None):
+    """按 (scope, 分组键) 失效缓存；不传时清空。"""
+    cache = _app_cache()
+    if cache is None:
+        return
+    with _lock:
+        if keys is None:
+            cache.clear()
+            return
+        for key in keys:
+            cache.pop(key, None)
+
+
+def _affected_group_keys(schedule, *, is_new=False):
+    """课次所在分组的缓存键；分组字段被改动或没加载时无法确定旧分组，返回 None 表示全部失效。"""
+    state = sa_inspect(schedule)
+    if any(field in state.unloaded for field in _GROUP_FIELDS):
+        return None
+    if not is_new and any(state.attrs[field].history.has_changes() for field in _GROUP_FIELDS):
+        return None
+    values = {field: state.dict.get(field) for field in _GROUP_FIELDS}
+    return {(scope, _group_key(scope, values)) for scope in (SCOPE_INTERNAL, SCOPE_EXTERNAL)}
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_schedule_progress_keys(session, flush_context):
+    changed = [(obj, True) for obj in session.new if isinstance(obj, CourseSchedule)]
+    changed += [(obj, False) for obj in session.deleted if isinstance(obj, CourseSchedule)]
+    for obj in session.dirty:
+        if not isinstance(obj, CourseSchedule):
+            continue
+        state = sa_inspect(obj)
+        if any(state.attrs[field].history.has_changes() for field in _PROGRESS_FIELDS):
+            changed.append((obj, False))
+    keys = set()
+    for obj, is_new in changed:
+        affected = _affected_group_keys(obj, is_new=is_new)
+        if affected is None:
+            keys.add(_RESET_ALL)
+            break
+        keys |= affected
+    if keys:
+        session.info.setdefault(_PENDING_KEYS, set()).update(keys)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _flag_bulk_schedule_delete(orm_execute_state):
+    if not orm_execute_state.is_delete:
+        return
+    if any(mapper.class_ is CourseSchedule for mapper in orm_execute_state.all_mappers):
+        orm_execute_state.session.info.setdefault(_PENDING_KEYS, set()).add(_RESET_ALL)
+
+
+def _apply_pending_invalidation(session):
+    # 回滚时同样失效，宁可多算一次
+    keys = session.info.pop(_PENDING_KEYS, None)
+    if not keys:
+        return
+    if _RESET_ALL in keys:
+        invalidate_schedule_progress()
+    else:
+        invalidate_schedule_progress(keys)
+
+
+event.listen(Session, 'after_commit', _apply_pending_invalidation)
+event.listen(Session, 'after_rollback', _apply_pending_invalidation)
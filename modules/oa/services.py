@@ -2,13 +2,18 @@
 import os
 import json
 import re
+import threading
 from collections import Counter
-from datetime import date, timedelta
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, datetime, timedelta
 
 from flask import current_app
 from sqlalchemy import or_
 from werkzeug.utils import secure_filename
 
+from core.request_cache import request_memoized
+
 # Monkey-patch openpyxl DataValidation to accept 'id' kwarg
 # (compatibility fix for Excel files created with newer Office versions)
 import openpyxl.worksheet.datavalidation as _dv
@@ -279,9 +284,27 @@ def _strip_inline_annotation(value):
     return re.sub(r'[（(][^）)]*[）)]', '', str(value)).strip()
 
 
+# 导入期间由 `_preloaded_teacher_names` 注入，解析每个单元格时不再重复查老师名单
+_KNOWN_TEACHER_NAMES = ContextVar('scf_known_teacher_names', default=None)
+
+
+@contextmanager
+def _preloaded_teacher_names(names):
+    token = _KNOWN_TEACHER_NAMES.set(frozenset(names))
+    try:
+        yield
+    finally:
+        _KNOWN_TEACHER_NAMES.reset(token)
+
+
+@request_memoized(key=lambda: None if _KNOWN_TEACHER_NAMES.get() is not None else (), tables=('users',))
 def _get_known_teacher_names():
     from modules.auth.models import User
 
+    preloaded = _KNOWN_TEACHER_NAMES.get()
+    if preloaded is not None:
+        return preloaded
+
     names = set(TEACHER_ALIAS_MAP.keys()) | set(TEACHER_ALIAS_MAP.values())
     try:
         users = User.query.filter(
@@ -292,7 +315,7 @@ def _get_known_teacher_names():
         names.update(user.username for user in users if user.username)
     except Exception:
         pass
-    return names
+    return frozenset(names)
 
 
 def _split_people_tokens(value):
@@ -419,6 +442,7 @@ def normalize_teacher_name(value):
     return canonical, alias_hit
 
 
+@request_memoized(key=lambda teacher_name: str(teacher_name or ''), tables=('users',))
 def resolve_schedule_teacher_user(teacher_name):
     from modules.auth.models import User
 
@@ -610,26 +634,6 @@ def apply_schedule_delivery_fields(schedule, **kwargs):
     return fields
 
 
-def _time_to_minutes(time_str):
-    if not time_str:
-        return None
-    try:
-        hour, minute = str(time_str).split(':', 1)
-        return int(hour) * 60 + int(minute)
-    except (ValueError, TypeError):
-        return None
-
-
-def _time_ranges_overlap(start_a, end_a, start_b, end_b):
-    a_start = _time_to_minutes(start_a)
-    a_end = _time_to_minutes(end_a)
-    b_start = _time_to_minutes(start_b)
-    b_end = _time_to_minutes(end_b)
-    if None in {a_start, a_end, b_start, b_end}:
-        return False
-    return max(a_start, b_start) < min(a_end, b_end)
-
-
 def find_schedule_conflicts(
     *,
     course_date=None,
@@ -641,88 +645,33 @@ def find_schedule_conflicts(
     student_profile_id=None,
     exclude_schedule_id=None,
 ):
-    from modules.auth.services import student_schedule_profile_clause
     from extensions import db
     from modules.auth.models import Enrollment
-    from modules.oa.models import CourseSchedule
-
-    result = {
-        'error': None,
-        'teacher': [],
-        'enrollment': [],
-        'student': [],
-    }
-
-    if not course_date or not time_start or not time_end or not (teacher_id or teacher_name):
-        result['error'] = '缺少冲突校验所需的日期、时间或教师信息'
-        result['all'] = []
-        return result
-    if _time_to_minutes(time_end) <= _time_to_minutes(time_start):
-        result['error'] = '结束时间必须晚于开始时间'
-        result['all'] = []
-        return result
-
-    teacher_clauses = []
-    if teacher_id:
-        teacher_clauses.append(CourseSchedule.teacher_id == teacher_id)
-    if teacher_name:
-        teacher_clauses.append(CourseSchedule.teacher == teacher_name)
-    teacher_query = CourseSchedule.query.filter(
-        CourseSchedule.date == course_date,
-        or_(*teacher_clauses),
-        CourseSchedule.is_cancelled == False,
-    )
-    if exclude_schedule_id:
-        teacher_query = teacher_query.filter(CourseSchedule.id != exclude_schedule_id)
-    result['teacher'] = [
-        schedule for schedule in teacher_query.all()
-        if _time_ranges_overlap(time_start, time_end, schedule.time_start, schedule.time_end)
-    ]
-
-    if enrollment_id:
-        enrollment_query = CourseSchedule.query.filter(
-            CourseSchedule.enrollment_id == enrollment_id,
-            CourseSchedule.date == course_date,
-            CourseSchedule.is_cancelled == False,
-        )
-        if exclude_schedule_id:
-            enrollment_query = enrollment_query.filter(CourseSchedule.id != exclude_schedule_id)
-        result['enrollment'] = [
-            schedule for schedule in enrollment_query.all()
-            if _time_ranges_overlap(time_start, time_end, schedule.time_start, schedule.time_end)
-        ]
-
-    if student_profile_id is None and enrollment_id:
-        enrollment = db.session.get(Enrollment, enrollment_id)
-        student_profile_id = enrollment.student_profile_id if enrollment else None
-
-    if student_profile_id:
-        student_query = CourseSchedule.query.filter(
-            student_schedule_profile_clause(student_profile_id, schedule_model=CourseSchedule),
-            CourseSchedule.date == course_date,
-            CourseSchedule.is_cancelled == False,
+    from modules.oa.schedule_conflicts import ScheduleOccupancy
+
+    occupancy = ScheduleOccupancy()
+    if course_date and (teacher_id or teacher_name):
+        if student_profile_id is None and enrollment_id:
+            enrollment = db.session.get(Enrollment, enrollment_id)
+            student_profile_id = enrollment.student_profile_id if enrollment else None
+        # 老师、报名、学生三个维度合成一次查询
+        occupancy = ScheduleOccupancy.load(
+            dates=[course_date],
+            teacher_id=teacher_id,
+            teacher_name=teacher_name,
+            enrollment_id=enrollment_id,
+            student_profile_id=student_profile_id,
         )
-        if enrollment_id:
-            student_query = student_query.filter(
-                or_(CourseSchedule.enrollment_id.is_(None), CourseSchedule.enrollment_id != enrollment_id)
-            )
-        if exclude_schedule_id:
-            student_query = student_query.filter(CourseSchedule.id != exclude_schedule_id)
-        result['student'] = [
-            schedule for schedule in student_query.all()
-            if _time_ranges_overlap(time_start, time_end, schedule.time_start, schedule.time_end)
-        ]
-
-    deduped_conflicts = []
-    seen_ids = set()
-    for bucket in ('teacher', 'enrollment', 'student'):
-        for schedule in result[bucket]:
-            if schedule.id in seen_ids:
-                continue
-            seen_ids.add(schedule.id)
-            deduped_conflicts.append(schedule)
-    result['all'] = deduped_conflicts
-    return result
+    return occupancy.find_conflicts(
+        course_date,
+        time_start,
+        time_end,
+        teacher_id=teacher_id,
+        teacher_name=teacher_name,
+        enrollment_id=enrollment_id,
+        student_profile_id=student_profile_id,
+        exclude_schedule_id=exclude_schedule_id,
+    )
 
 
 def validate_schedule_conflicts(**kwargs):
@@ -745,25 +694,6 @@ def validate_schedule_conflicts(**kwargs):
     return None
 
 
-def _resolve_unique_teacher_user(teacher_name):
-    from modules.auth.models import User
-
-    canonical_name, alias_hit = normalize_teacher_name(teacher_name)
-    if not canonical_name:
-        return None, canonical_name, alias_hit, 'missing'
-
-    candidates = User.query.filter(
-        User.is_active == True,
-        User.role.in_(['teacher', 'admin']),
-        or_(User.display_name == canonical_name, User.username == canonical_name),
-    ).all()
-    if len(candidates) == 1:
-        return candidates[0], candidates[0].display_name, alias_hit, None
-    if len(candidates) > 1:
-        return None, canonical_name, alias_hit, 'ambiguous'
-    return None, canonical_name, alias_hit, 'missing'
-
-
 def _serialize_enrollment_candidate(enrollment):
     return {
         'id': enrollment.id,
@@ -776,31 +706,6 @@ def _serialize_enrollment_candidate(enrollment):
     }
 
 
-def _find_import_enrollment_candidates(student_name, course_name):
-    from modules.auth.models import Enrollment
-
-    student_name = (student_name or '').strip()
-    course_name = (course_name or '').strip()
-    if not student_name or not course_name:
-        return []
-
-    return Enrollment.query.filter(
-        Enrollment.student_name == student_name,
-        Enrollment.course_name == course_name,
-    ).order_by(Enrollment.id.asc()).all()
-
-
-def _find_safe_import_enrollment(teacher_user, student_name, course_name):
-    if not teacher_user:
-        return None, []
-
-    candidates = _find_import_enrollment_candidates(student_name, course_name)
-    teacher_candidates = [enrollment for enrollment in candidates if enrollment.teacher_id == teacher_user.id]
-    if len(teacher_candidates) == 1:
-        return teacher_candidates[0], candidates
-    return None, candidates
-
-
 def _build_import_binding_todo_payload(schedule, *, issue_type, issue_message, candidate_enrollments):
     return {
         'schedule_id': schedule.id,
@@ -821,7 +726,28 @@ def _build_import_binding_todo_payload(schedule, *, issue_type, issue_message, c
     }
 
 
-def _upsert_import_binding_todo(schedule, *, issue_type, issue_message, candidate_enrollments, created_by=None):
+def _find_import_binding_todo(schedule, binding_todos=None):
+    from modules.oa.models import OATodo
+
+    if binding_todos is not None:
+        todos = binding_todos.get(schedule.id)
+        return todos[0] if todos else None
+    return OATodo.query.filter_by(
+        schedule_id=schedule.id,
+        todo_type=OATodo.TODO_TYPE_EXCEL_IMPORT,
+    ).first()
+
+
+def _upsert_import_binding_todo(
+    schedule,
+    *,
+    issue_type,
+    issue_message,
+    candidate_enrollments,
+    created_by=None,
+    binding_todos=None,
+):
+    """`binding_todos` 为预加载的 {schedule_id: [待绑定待办]}，传入时不查库、新建也不单独 flush。"""
     from extensions import db
     from modules.oa.models import OATodo
 
@@ -832,10 +758,7 @@ def _upsert_import_binding_todo(schedule, *, issue_type, issue_message, candidat
         candidate_enrollments=candidate_enrollments,
     )
 
-    todo = OATodo.query.filter_by(
-        schedule_id=schedule.id,
-        todo_type=OATodo.TODO_TYPE_EXCEL_IMPORT,
-    ).first()
+    todo = _find_import_binding_todo(schedule, binding_todos)
     created = False
     if not todo:
         todo = OATodo(
@@ -849,7 +772,10 @@ def _upsert_import_binding_todo(schedule, *, issue_type, issue_message, candidat
             created_by=created_by,
         )
         db.session.add(todo)
-        db.session.flush()
+        if binding_todos is None:
+            db.session.flush()
+        else:
+            binding_todos[schedule.id] = [todo]
         created = True
 
     todo.title = f'Excel 待绑定：{schedule.course_name}'
@@ -865,14 +791,10 @@ def _upsert_import_binding_todo(schedule, *, issue_type, issue_message, candidat
     return todo, created
 
 
-def _complete_import_binding_todo(schedule, *, note=None):
+def _complete_import_binding_todo(schedule, *, note=None, binding_todos=None):
     from extensions import db
-    from modules.oa.models import OATodo
 
-    todo = OATodo.query.filter_by(
-        schedule_id=schedule.id,
-        todo_type=OATodo.TODO_TYPE_EXCEL_IMPORT,
-    ).first()
+    todo = _find_import_binding_todo(schedule, binding_todos)
     if not todo:
         return None
 
@@ -883,36 +805,16 @@ def _complete_import_binding_todo(schedule, *, note=None):
     return todo
 
 
-def _find_import_schedule_conflicts(
-    course_date,
-    time_start,
-    time_end,
-    *,
-    teacher_id=None,
-    teacher_name=None,
-    enrollment_id=None,
-    student_profile_id=None,
-    exclude_schedule_id=None,
-):
-    return find_schedule_conflicts(
-        course_date=course_date,
-        time_start=time_start,
-        time_end=time_end,
-        teacher_id=teacher_id,
-        teacher_name=teacher_name,
-        enrollment_id=enrollment_id,
-        student_profile_id=student_profile_id,
-        exclude_schedule_id=exclude_schedule_id,
-    )
-
-
-def _preserve_import_row_artifacts(existing_schedule, *, touched_schedule_ids, touched_todo_ids):
+def _preserve_import_row_artifacts(existing_schedule, *, touched_schedule_ids, touched_todo_ids, binding_todos=None):
     from modules.oa.models import OATodo
 
     if not existing_schedule:
         return
 
     touched_schedule_ids.add(existing_schedule.id)
+    if binding_todos is not None:
+        touched_todo_ids.update(todo.id for todo in binding_todos.get(existing_schedule.id, []))
+        return
     for todo in OATodo.query.filter_by(
         schedule_id=existing_schedule.id,
         todo_type=OATodo.TODO_TYPE_EXCEL_IMPORT,
@@ -920,6 +822,115 @@ def _preserve_import_row_artifacts(existing_schedule, *, touched_schedule_ids, t
         touched_todo_ids.add(todo.id)
 
 
+class _ImportTeacherDirectory:
+    """一次导入里复用的老师名录：在职老师/管理员按显示名和用户名建索引，解析时不再逐格查库。"""
+
+    def __init__(self):
+        from modules.auth.models import User
+
+        self.users_by_id = {}
+        self._active_by_name = {}
+        self.known_names = set(TEACHER_ALIAS_MAP.keys()) | set(TEACHER_ALIAS_MAP.values())
+        for user in User.query.filter(User.role.in_(['teacher', 'admin'])).order_by(User.id.asc()).all():
+            self.users_by_id[user.id] = user
+            if not user.is_active:
+                continue
+            for name in {user.display_name, user.username}:
+                if name:
+                    self._active_by_name.setdefault(name, []).append(user)
+                    self.known_names.add(name)
+
+    def get_user(self, user_id):
+        from extensions import db
+        from modules.auth.models import User
+
+        if not user_id:
+            return None
+        user = self.users_by_id.get(user_id)
+        if user is None:
+            user = db.session.get(User, user_id)
+            self.users_by_id[user_id] = user
+        return user
+
+    def resolve(self, teacher_name):
+        """返回 (老师, 规范化姓名, 别名命中, 错误)；错误为 missing / ambiguous 或 None。"""
+        canonical_name, alias_hit = normalize_teacher_name(teacher_name)
+        if not canonical_name:
+            return None, canonical_name, alias_hit, 'missing'
+
+        candidates = self._active_by_name.get(canonical_name) or []
+        if len(candidates) == 1:
+            return candidates[0], candidates[0].display_name, alias_hit, None
+        if len(candidates) > 1:
+            return None, canonical_name, alias_hit, 'ambiguous'
+        return None, canonical_name, alias_hit, 'missing'
+
+
+class _ImportScheduleIndex:
+    """导入期间的课次/报名内存索引，冲突判断委托给 `ScheduleOccupancy`。
+
+    导入过程中新建或改写的课次通过 `track()` 同步进索引，后面的行能看到前面行
+    写入的结果，和逐行查库时一致。
+    """
+
+    def __init__(self, payloads):
+        from sqlalchemy.orm import selectinload
+        from modules.auth.models import Enrollment
+        from modules.oa.schedule_conflicts import ScheduleOccupancy
+
+        self.enrollments_by_id = {}
+        self._enrollments_by_pair = {}
+        for enrollment in Enrollment.query.options(
+            selectinload(Enrollment.teacher),
+        ).order_by(Enrollment.id.asc()).all():
+            self.enrollments_by_id[enrollment.id] = enrollment
+            pair = ((enrollment.student_name or '').strip(), (enrollment.course_name or '').strip())
+            self._enrollments_by_pair.setdefault(pair, []).append(enrollment)
+
+        dates = [payload['date'] for payload in payloads if payload.get('date')]
+        if dates:
+            self.occupancy = ScheduleOccupancy.load(
+                date_start=min(dates),
+                date_end=max(dates),
+                enrollments_by_id=self.enrollments_by_id,
+            )
+        else:
+            self.occupancy = ScheduleOccupancy(enrollments_by_id=self.enrollments_by_id)
+
+    def enrollment_candidates(self, student_name, course_name):
+        student_name = (student_name or '').strip()
+        course_name = (course_name or '').strip()
+        if not student_name or not course_name:
+            return []
+        return list(self._enrollments_by_pair.get((student_name, course_name), []))
+
+    def safe_enrollment(self, teacher_user, student_name, course_name):
+        if not teacher_user:
+            return None, []
+
+        candidates = self.enrollment_candidates(student_name, course_name)
+        teacher_candidates = [enrollment for enrollment in candidates if enrollment.teacher_id == teacher_user.id]
+        if len(teacher_candidates) == 1:
+            return teacher_candidates[0], candidates
+        return None, candidates
+
+    def track(self, schedule):
+        self.occupancy.track(schedule)
+
+    def find_conflicts(self, course_date, time_start, time_end, *, enrollment_id=None, student_profile_id=None, **kwargs):
+        if student_profile_id is None and enrollment_id:
+            enrollment = self.enrollments_by_id.get(enrollment_id)
+            student_profile_id = enrollment.student_profile_id if enrollment else None
+        return self.occupancy.find_conflicts(
+            course_date,
+            time_start,
+            time_end,
+            enrollment_id=enrollment_id,
+            student_profile_id=student_profile_id,
+            **kwargs,
+        )
+
+
 def _extract_fill_rgb(cell):
     fill = getattr(cell, 'fill', None)
     if not fill or getattr(fill, 'patternType', None) in (None, 'none'):
@@ -1019,15 +1030,51 @@ def _read_week_dates(row, expected_year):
     return week_dates
 
 
-def import_schedule_from_excel(file_path, original_filename=None):
+def import_schedule_from_excel(file_path, original_filename=None, *, teacher_directory=None, progress=None):
     """Parse the Excel schedule file into structured schedule and todo payloads."""
-    from modules.oa.models import OATodo
-
-    wb = openpyxl.load_workbook(file_path, data_only=True)
     schedules = []
     todos = []
     warnings = []
     teacher_alias_hits = Counter()
+    collectors = {'schedule': schedules, 'todo': todos, 'warning': warnings}
+    for kind, item in iter_schedule_workbook_items(
+        file_path,
+        original_filename,
+        teacher_directory=teacher_directory,
+    ):
+        if kind == 'teacher_alias_hit':
+            teacher_alias_hits[item] += 1
+        else:
+            collectors[kind].append(item)
+        if kind == 'schedule' and progress is not None:
+            progress.advance()
+
+    return {
+        'schedules': schedules,
+        'todos': todos,
+        'warnings': warnings,
+        'teacher_alias_hits': dict(teacher_alias_hits),
+    }
+
+
+def iter_schedule_workbook_items(file_path, original_filename=None, *, teacher_directory=None):
+    """以只读流式方式逐行解析总课表，按出现顺序产出 `(kind, item)`。
+
+    kind 为 schedule / todo / warning / teacher_alias_hit。工作簿用 openpyxl 的
+    read_only 模式打开，单元格（含填充色）逐行读取，不会把所有月份工作表和样式
+    一次性载入内存。
+    """
+    teacher_directory = teacher_directory or _ImportTeacherDirectory()
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        with _preloaded_teacher_names(teacher_directory.known_names):
+            yield from _iter_workbook_sheets(wb, file_path, original_filename, teacher_directory)
+    finally:
+        wb.close()
+
+
+def _iter_workbook_sheets(wb, file_path, original_filename, teacher_directory):
+    from modules.oa.models import OATodo
 
     filename = original_filename or os.path.basename(file_path)
     target_year = None
@@ -1047,7 +1094,11 @@ def import_schedule_from_excel(file_path, original_filename=None):
 
         week_dates = None
 
-        for row_idx, row in enumerate(ws.iter_rows(min_row=2), start=2):
+        # 只读模式信任文件里记录的 <dimension>，WPS 等导出的工作簿常常记错，
+        # 超出记录范围的行会被悄悄丢掉；这里改为按实际内容扫描，列补齐到 A-K
+        # （A-G 课次，H-K 待办标题、完成状态、负责人、备注）
+        ws.reset_dimensions()
+        for row_idx, row in enumerate(ws.iter_rows(min_row=2, max_col=11), start=2):
             if len(row) < 7:
                 continue
 
@@ -1090,16 +1141,16 @@ def import_schedule_from_excel(file_path, original_filename=None):
                 delivery_mode, color_tag, unknown_color = _resolve_color_semantics(fill_rgb)
                 if unknown_color:
                     if unknown_color == 'NO_FILL':
-                        warnings.append(
+                        yield 'warning', (
                             f'{sheet_name}!{cell.coordinate} 缺少线上/线下颜色标记，已跳过导入'
                         )
                     else:
-                        warnings.append(
+                        yield 'warning', (
                             f'{sheet_name}!{cell.coordinate} 颜色 {unknown_color} 不再受支持，已跳过导入'
                         )
                     continue
                 if not delivery_mode or not color_tag:
-                    warnings.append(
+                    yield 'warning', (
                         f'{sheet_name}!{cell.coordinate} 无法识别线上/线下语义，已跳过导入'
                     )
                     continue
@@ -1107,25 +1158,25 @@ def import_schedule_from_excel(file_path, original_filename=None):
                 for course in parsed:
                     teacher_name, alias_hit = normalize_teacher_name(course['teacher'])
                     if alias_hit:
-                        teacher_alias_hits[f'{alias_hit}->{teacher_name}'] += 1
+                        yield 'teacher_alias_hit', f'{alias_hit}->{teacher_name}'
 
                     course_name = (course['course_name'] or '').strip()
                     if not course_name:
-                        warnings.append(
+                        yield 'warning', (
                             f'{sheet_name}!{cell.coordinate} {course_date.isoformat()} {course["time_start"]}-{course["time_end"]} 缺少课程名称，已使用“未命名课程”'
                         )
                         course_name = '未命名课程'
 
                     if not teacher_name:
-                        warnings.append(
+                        yield 'warning', (
                             f'{sheet_name}!{cell.coordinate} {course_date.isoformat()} {course["time_start"]}-{course["time_end"]} 缺少教师姓名，已标记为待匹配教师'
                         )
                         teacher_name = '待匹配教师'
                         teacher_user = None
                     else:
-                        teacher_user, resolved_teacher_name, _, teacher_error = _resolve_unique_teacher_user(teacher_name)
+                        teacher_user, resolved_teacher_name, _, teacher_error = teacher_directory.resolve(teacher_name)
                         if teacher_error:
-                            warnings.append(
+                            yield 'warning', (
                                 f'{sheet_name}!{cell.coordinate} 教师“{teacher_name}”无法唯一匹配，已按文本导入'
                             )
                             teacher_name = resolved_teacher_name or teacher_name
@@ -1133,7 +1184,7 @@ def import_schedule_from_excel(file_path, original_filename=None):
                         else:
                             teacher_name = resolved_teacher_name
 
-                    schedules.append({
+                    yield 'schedule', {
                         'date': course_date,
                         'day_of_week': course_date.weekday(),
                         'time_start': course['time_start'],
@@ -1144,7 +1195,7 @@ def import_schedule_from_excel(file_path, original_filename=None):
                         'students': (course['students'] or '').strip(),
                         'color_tag': color_tag,
                         'delivery_mode': delivery_mode,
-                    })
+                    }
 
             if len(row) > 7:
                 todo_cell = row[7]
@@ -1167,22 +1218,14 @@ def import_schedule_from_excel(file_path, original_filename=None):
                             notes = str(row[10].value).strip()
 
                         week_ref_date = next((d for d in week_dates if d), None)
-                        todos.append({
+                        yield 'todo', {
                             'title': todo_text,
                             'is_completed': is_completed,
                             'responsible_person': person,
                             'notes': notes,
                             'due_date': week_ref_date,
                             'todo_type': OATodo.TODO_TYPE_EXCEL_IMPORT,
-                        })
-
-    wb.close()
-    return {
-        'schedules': schedules,
-        'todos': todos,
-        'warnings': warnings,
-        'teacher_alias_hits': dict(teacher_alias_hits),
-    }
+                        }
 
 
 def _resolve_data_root():
@@ -1283,34 +1326,231 @@ def _summarize_schedule(schedule):
     return f'{schedule.date.isoformat()} {schedule.time_start}-{schedule.time_end} {schedule.teacher} / {schedule.course_name}'
 
 
+_SCHEDULE_IMPORT_PROGRESS = {}
+_SCHEDULE_IMPORT_PROGRESS_LOCK = threading.Lock()
+# 登记导入任务时「检查有无进行中的任务 + 插入新任务」需要串行
+_SCHEDULE_IMPORT_SUBMIT_LOCK = threading.Lock()
+SCHEDULE_IMPORT_ABANDONED_ERROR = '导入任务已中断（服务重启或执行超时），请重新上传'
+
+
+class ScheduleImportBusyError(RuntimeError):
+    """已有课表导入任务在排队或执行中，新的上传会和它互相删除对方导入的课次。"""
+
+    def __init__(self, run):
+        self.run = run
+        super().__init__(f'已有导入任务（#{run.id}）正在进行，请等待它完成后再上传')
+
+
+class _ScheduleImportProgress:
+    """导入任务的实时进度。
+
+    导入在一个大事务里完成，提交前不能为了写进度去 commit，所以逐行计数只记在
+    进程内存里，阶段切换时才写回 `ScheduleImportRun`；轮询接口把两者合并返回。
+    """
+
+    def __init__(self, run_id):
+        self.run_id = run_id
+        self.stage = None
+        self.done = 0
+        self.total = 0
+
+    def start(self, stage, total=0):
+        with _SCHEDULE_IMPORT_PROGRESS_LOCK:
+            self.stage = stage
+            self.done = 0
+            self.total = total
+            _SCHEDULE_IMPORT_PROGRESS[self.run_id] = self
+
+    def advance(self, count=1):
+        with _SCHEDULE_IMPORT_PROGRESS_LOCK:
+            self.done += count
+
+    def snapshot(self):
+        with _SCHEDULE_IMPORT_PROGRESS_LOCK:
+            return {'stage': self.stage, 'done': self.done, 'total': self.total}
+
+    def persist(self, run):
+        snapshot = self.snapshot()
+        run.progress_stage = snapshot['stage']
+        run.progress_done = snapshot['done']
+        run.progress_total = snapshot['total']
+
+    def finish(self):
+        with _SCHEDULE_IMPORT_PROGRESS_LOCK:
+            _SCHEDULE_IMPORT_PROGRESS.pop(self.run_id, None)
+
+
+def get_schedule_import_status(run):
+    """导入任务的轮询结果：数据库里的任务记录，执行中时换成本进程的实时进度。"""
+    data = run.to_dict()
+    if not run.is_finished:
+        with _SCHEDULE_IMPORT_PROGRESS_LOCK:
+            live = _SCHEDULE_IMPORT_PROGRESS.get(run.id)
+        if live is not None:
+            data['progress'] = live.snapshot()
+    return data
+
+
+def fail_abandoned_schedule_import_runs(*, stale_after_seconds=None, now=None):
+    """
+    把没人在执行的未结束导入任务记为失败，返回处理的条数。
+
+    本进程正在执行的任务不动；其余任务从开始（或上传）算起超过
+    `stale_after_seconds` 仍未结束，就认为执行它的进程已经不在了。
+    传 0 表示不看时间，启动时用来清理上次进程遗留的任务。
+    """
+    from extensions import db
+    from modules.oa.models import ScheduleImportRun
+
+    if stale_after_seconds is None:
+        stale_after_seconds = current_app.config.get('SCF_SCHEDULE_IMPORT_STALE_SECONDS', 1800)
+    now = now or datetime.utcnow()
+    stale_after_seconds = max(int(stale_after_seconds or 0), 0)
+    cutoff = now - timedelta(seconds=stale_after_seconds)
+    with _SCHEDULE_IMPORT_PROGRESS_LOCK:
+        live_run_ids = set(_SCHEDULE_IMPORT_PROGRESS)
+
+    failed = 0
+    for run in ScheduleImportRun.query.filter(
+        ScheduleImportRun.status.in_([ScheduleImportRun.STATUS_PENDING, ScheduleImportRun.STATUS_RUNNING]),
+    ).all():
+        if run.id in live_run_ids:
+            continue
+        if stale_after_seconds and (run.started_at or run.uploaded_at or now) > cutoff:
+            continue
+        run.status = ScheduleImportRun.STATUS_FAILED
+        run.finished_at = now
+        run.set_summary_data({'error': SCHEDULE_IMPORT_ABANDONED_ERROR})
+        failed += 1
+    if failed:
+        db.session.commit()
+    return failed
+
+
+def get_active_schedule_import_run():
+    """当前排队或执行中的导入任务（超时遗留的任务先记为失败）。"""
+    from modules.oa.models import ScheduleImportRun
+
+    fail_abandoned_schedule_import_runs()
+    return ScheduleImportRun.query.filter(
+        ScheduleImportRun.status.in_([ScheduleImportRun.STATUS_PENDING, ScheduleImportRun.STATUS_RUNNING]),
+    ).order_by(ScheduleImportRun.id.asc()).first()
+
+
+def create_schedule_import_run(file_storage, *, uploaded_by=None):
+    """
+    登记导入任务并保存上传的原始 Excel，返回待执行的 ScheduleImportRun。
+
+    同一时间只允许一个导入任务：每次导入都会删掉不属于本次任务的导入课次，
+    两个任务并行会互删对方的数据，所以已有任务未结束时抛 ScheduleImportBusyError。
+    """
+    from extensions import db
+    from modules.oa.models import ScheduleImportRun
+
+    with _SCHEDULE_IMPORT_SUBMIT_LOCK:
+        active_run = get_active_schedule_import_run()
+        if active_run is not None:
+            raise ScheduleImportBusyError(active_run)
+        run = ScheduleImportRun(
+            original_filename=(getattr(file_storage, 'filename', None) or 'schedule.xlsx'),
+            uploaded_by=uploaded_by,
+            status=ScheduleImportRun.STATUS_PENDING,
+            progress_stage='queued',
+        )
+        db.session.add(run)
+        db.session.commit()
+
+    try:
+        stored_path = save_schedule_import_file(file_storage, run.id, original_filename=run.original_filename)
+    except Exception as exc:
+        db.session.rollback()
+        run = db.session.get(ScheduleImportRun, run.id)
+        run.status = ScheduleImportRun.STATUS_FAILED
+        run.finished_at = datetime.utcnow()
+        run.set_summary_data({'error': str(exc)})
+        db.session.commit()
+        raise
+    run.stored_path = stored_path
+    db.session.commit()
+    return run
+
+
 def apply_schedule_excel_import(file_storage, *, uploaded_by=None):
+    """同步导入：登记任务后在当前请求里执行完，返回 (run, summary)。"""
+    run = create_schedule_import_run(file_storage, uploaded_by=uploaded_by)
+    return execute_schedule_import_run(run.id)
+
+
+def enqueue_schedule_excel_import(file_storage, *, uploaded_by=None):
+    """异步导入：登记任务后交给后台线程执行，立即返回待执行的 ScheduleImportRun。"""
+    from core.tasks import TaskRunner
+
+    run = create_schedule_import_run(file_storage, uploaded_by=uploaded_by)
+    TaskRunner.run_async(_run_schedule_import_job, run.id)
+    return run
+
+
+def _run_schedule_import_job(run_id):
+    try:
+        execute_schedule_import_run(run_id)
+    except Exception:
+        # 失败状态和错误信息已经写回任务记录，这里只留日志
+        current_app.logger.exception('schedule import run %s failed', run_id)
+
+
+def execute_schedule_import_run(run_id):
+    """执行一条已登记的导入任务，返回 (run, summary)；失败时任务记为 failed 并抛出原异常。"""
     from extensions import db
     from modules.auth.models import Enrollment
     from modules.auth.services import schedule_has_historical_facts, sync_enrollment_status, sync_schedule_student_snapshot
     from modules.auth.workflow_services import cancel_schedule_feedback_todo, ensure_schedule_feedback_todo
     from modules.oa.models import CourseSchedule, OATodo, ScheduleImportRun
-
-    run = ScheduleImportRun(
-        original_filename=(getattr(file_storage, 'filename', None) or 'schedule.xlsx'),
-        uploaded_by=uploaded_by,
-        status='pending',
-    )
-    db.session.add(run)
+    from sqlalchemy.orm import selectinload
+
+    run = db.session.get(ScheduleImportRun, run_id)
+    uploaded_by = run.uploaded_by
+    stored_path = run.stored_path
+    progress = _ScheduleImportProgress(run.id)
+    progress.start('parsing')
+    run.status = ScheduleImportRun.STATUS_RUNNING
+    run.started_at = datetime.utcnow()
+    progress.persist(run)
     db.session.commit()
 
+    names_token = None
     try:
-        stored_path = save_schedule_import_file(file_storage, run.id, original_filename=run.original_filename)
-        run = db.session.get(ScheduleImportRun, run.id)
-        run.stored_path = stored_path
-        db.session.commit()
-
-        parsed = import_schedule_from_excel(stored_path, original_filename=run.original_filename)
+        teacher_directory = _ImportTeacherDirectory()
+        # 课次 key 和老师名归一化都依赖老师名单，整个导入期间复用同一份
+        names_token = _KNOWN_TEACHER_NAMES.set(frozenset(teacher_directory.known_names))
+        parsed = import_schedule_from_excel(
+            stored_path,
+            original_filename=run.original_filename,
+            teacher_directory=teacher_directory,
+            progress=progress,
+        )
         schedules, removed_schedule_duplicates = deduplicate_schedule_payloads(parsed['schedules'])
         todos, removed_todo_duplicates = deduplicate_todo_payloads(parsed['todos'])
         warnings = list(parsed.get('warnings') or [])
         teacher_alias_hits = dict(parsed.get('teacher_alias_hits') or {})
 
-        existing_schedules = CourseSchedule.query.order_by(CourseSchedule.id.asc()).all()
+        # 解析阶段还没有写库，可以直接提交阶段进度
+        progress.start('applying', total=len(schedules) + len(todos))
+        progress.persist(run)
+        db.session.commit()
+
+        # 老师、报名、日期范围内课次、Excel 待办一次性读进内存，逐行处理时不再查库
+        schedule_index = _ImportScheduleIndex(schedules)
+        binding_todos = {}
+        for todo in OATodo.query.filter(
+            OATodo.todo_type == OATodo.TODO_TYPE_EXCEL_IMPORT,
+            OATodo.schedule_id.isnot(None),
+        ).order_by(OATodo.id.asc()).all():
+            binding_todos.setdefault(todo.schedule_id, []).append(todo)
+
+        existing_schedules = CourseSchedule.query.options(
+            selectinload(CourseSchedule.feedback),
+            selectinload(CourseSchedule.leave_requests),
+        ).order_by(CourseSchedule.id.asc()).all()
         schedule_map = {}
         for schedule in existing_schedules:
             key = build_schedule_import_key(schedule)
@@ -1324,194 +1564,149 @@ def apply_schedule_excel_import(file_storage, *, uploaded_by=None):
         unmatched_schedules = []
         conflict_rows = []
         touched_todo_ids = set()
-
-        for payload in schedules:
-            key = build_schedule_import_key(payload)
-            matched_schedule = schedule_map.get(key)
-            existing = matched_schedule if matched_schedule and matched_schedule.import_run_id is not None else None
-            date_value = payload.get('date')
-            schedule_teacher_name = (payload.get('teacher') or '').strip()
-            teacher_user = None
-            resolved_teacher_name = schedule_teacher_name
-            if payload.get('teacher_id'):
-                teacher_user = db.session.get(
-                    __import__('modules.auth.models', fromlist=['User']).User,
-                    payload['teacher_id'],
-                )
-                if teacher_user:
-                    resolved_teacher_name = teacher_user.display_name or teacher_user.username or schedule_teacher_name
-            elif schedule_teacher_name and '待匹配' not in schedule_teacher_name:
-                teacher_user, resolved_teacher_name, _, _ = _resolve_unique_teacher_user(schedule_teacher_name)
-            teacher_name_for_conflict = resolved_teacher_name if resolved_teacher_name and '待匹配' not in resolved_teacher_name else None
-
-            candidate_enrollments = _find_import_enrollment_candidates(
-                payload.get('students'),
-                payload.get('course_name'),
-            )
-            safe_enrollment = None
-            if teacher_user:
-                safe_enrollment, candidate_enrollments = _find_safe_import_enrollment(
-                    teacher_user,
+        touched_todos = []
+        affected_enrollment_ids = set()
+        # (课次, 安全绑定的报名, 候选报名, 是否已有课次)，统一 flush 拿到 id 后再补待办
+        imported_rows = []
+
+        with db.session.no_autoflush:
+            for payload in schedules:
+                progress.advance()
+                key = build_schedule_import_key(payload)
+                matched_schedule = schedule_map.get(key)
+                existing = matched_schedule if matched_schedule and matched_schedule.import_run_id is not None else None
+                date_value = payload.get('date')
+                schedule_teacher_name = (payload.get('teacher') or '').strip()
+                teacher_user = None
+                resolved_teacher_name = schedule_teacher_name
+                if payload.get('teacher_id'):
+                    teacher_user = teacher_directory.get_user(payload['teacher_id'])
+                    if teacher_user:
+                        resolved_teacher_name = teacher_user.display_name or teacher_user.username or schedule_teacher_name
+                elif schedule_teacher_name and '待匹配' not in schedule_teacher_name:
+                    teacher_user, resolved_teacher_name, _, _ = teacher_directory.resolve(schedule_teacher_name)
+                teacher_name_for_conflict = resolved_teacher_name if resolved_teacher_name and '待匹配' not in resolved_teacher_name else None
+
+                candidate_enrollments = schedule_index.enrollment_candidates(
                     payload.get('students'),
                     payload.get('course_name'),
                 )
-            elif candidate_enrollments:
-                safe_candidates = [
-                    enrollment for enrollment in candidate_enrollments
-                    if enrollment.teacher_id is not None and payload.get('teacher_id') == enrollment.teacher_id
-                ]
-                if len(safe_candidates) == 1:
-                    safe_enrollment = safe_candidates[0]
-
-            if existing and schedule_has_historical_facts(existing):
-                _preserve_import_row_artifacts(
-                    existing,
-                    touched_schedule_ids=touched_schedule_ids,
-                    touched_todo_ids=touched_todo_ids,
-                )
-                warnings.append(
-                    f'导入保留历史课次：{date_value.isoformat() if date_value else ""} '
-                    f'{payload.get("time_start")}-{payload.get("time_end")} '
-                    f'{existing.teacher} / {existing.course_name}，因为该课次已产生交付事实'
-                )
-                continue
-
-            conflict_target_id = existing.id if existing else None
-            conflicts = _find_import_schedule_conflicts(
-                payload.get('date'),
-                payload.get('time_start'),
-                payload.get('time_end'),
-                teacher_id=teacher_user.id if teacher_user else payload.get('teacher_id'),
-                teacher_name=teacher_name_for_conflict,
-                enrollment_id=safe_enrollment.id if safe_enrollment else None,
-                student_profile_id=safe_enrollment.student_profile_id if safe_enrollment else None,
-                exclude_schedule_id=conflict_target_id,
-            )
-            if conflicts['error']:
-                _preserve_import_row_artifacts(
-                    existing,
-                    touched_schedule_ids=touched_schedule_ids,
-                    touched_todo_ids=touched_todo_ids,
-                )
-                warnings.append(
-                    f'导入跳过异常课次：{date_value.isoformat() if date_value else ""} '
-                    f'{payload.get("time_start")}-{payload.get("time_end")} '
-                    f'{schedule_teacher_name or "待匹配教师"} / {payload.get("course_name")}，'
-                    f'{conflicts["error"]}'
-                )
-                continue
-            if conflicts['all']:
-                _preserve_import_row_artifacts(
-                    existing,
-                    touched_schedule_ids=touched_schedule_ids,
-                    touched_todo_ids=touched_todo_ids,
-                )
-                conflict_rows.append({
-                    'date': payload.get('date').isoformat() if payload.get('date') else None,
-                    'time_start': payload.get('time_start'),
-                    'time_end': payload.get('time_end'),
-                    'teacher': schedule_teacher_name,
-                    'course_name': payload.get('course_name'),
-                    'students': payload.get('students') or '',
-                    'conflicting_schedule_ids': [schedule.id for schedule in conflicts['all']],
-                    'conflicting_schedules': [
-                        {
-                            'id': schedule.id,
-                            'date': schedule.date.isoformat() if schedule.date else None,
-                            'time_start': schedule.time_start,
-                            'time_end': schedule.time_end,
-                            'teacher': schedule.teacher,
-                            'course_name': schedule.course_name,
-                        }
-                        for schedule in conflicts['all']
-                    ],
-                })
-                teacher_label = teacher_name_for_conflict or schedule_teacher_name or '待匹配教师'
-                warnings.append(
-                    f'导入跳过冲突课次：{date_value.isoformat() if date_value else ""} '
-                    f'{payload.get("time_start")}-{payload.get("time_end")} '
-                    f'{teacher_label} / {payload.get("course_name")} 与现有课表冲突'
-                )
-                continue
-
-            if existing:
-                previous_enrollment_id = existing.enrollment_id
-                _apply_imported_schedule_payload(existing, payload, import_run_id=run.id)
+                safe_enrollment = None
                 if teacher_user:
-                    existing.teacher = resolved_teacher_name
-                    existing.teacher_id = teacher_user.id
-                elif payload.get('teacher_id'):
-                    existing.teacher_id = payload.get('teacher_id')
-                else:
-                    existing.teacher_id = None
-
-                if safe_enrollment:
-                    existing.enrollment_id = safe_enrollment.id
-                    sync_schedule_student_snapshot(existing, enrollment=safe_enrollment, preserve_history=False)
-                    ensure_schedule_feedback_todo(
+                    safe_enrollment, candidate_enrollments = schedule_index.safe_enrollment(
+                        teacher_user,
+                        payload.get('students'),
+                        payload.get('course_name'),
+                    )
+                elif candidate_enrollments:
+                    safe_candidates = [
+                        enrollment for enrollment in candidate_enrollments
+                        if enrollment.teacher_id is not None and payload.get('teacher_id') == enrollment.teacher_id
+                    ]
+                    if len(safe_candidates) == 1:
+                        safe_enrollment = safe_candidates[0]
+
+                if existing and schedule_has_historical_facts(existing):
+                    _preserve_import_row_artifacts(
                         existing,
-                        created_by=uploaded_by,
+                        touched_schedule_ids=touched_schedule_ids,
+                        touched_todo_ids=touched_todo_ids,
+                        binding_todos=binding_todos,
                     )
-                    binding_todo = _complete_import_binding_todo(
+                    warnings.append(
+                        f'导入保留历史课次：{date_value.isoformat() if date_value else ""} '
+                        f'{payload.get("time_start")}-{payload.get("time_end")} '
+                        f'{existing.teacher} / {existing.course_name}，因为该课次已产生交付事实'
+                    )
+                    continue
+
+                conflict_target_id = existing.id if existing else None
+                conflicts = schedule_index.find_conflicts(
+                    payload.get('date'),
+                    payload.get('time_start'),
+                    payload.get('time_end'),
+                    teacher_id=teacher_user.id if teacher_user else payload.get('teacher_id'),
+                    teacher_name=teacher_name_for_conflict,
+                    enrollment_id=safe_enrollment.id if safe_enrollment else None,
+                    student_profile_id=safe_enrollment.student_profile_id if safe_enrollment else None,
+                    exclude_schedule_id=conflict_target_id,
+                )
+                if conflicts['error']:
+                    _preserve_import_row_artifacts(
                         existing,
-                        note='已自动绑定报名，待绑定任务已关闭',
+                        touched_schedule_ids=touched_schedule_ids,
+                        touched_todo_ids=touched_todo_ids,
+                        binding_todos=binding_todos,
                     )
-                    if binding_todo:
-                        touched_todo_ids.add(binding_todo.id)
-                    sync_enrollment_status(safe_enrollment)
-                else:
-                    existing.enrollment_id = None
-                    sync_schedule_student_snapshot(existing, enrollment=None, preserve_history=False)
-                    cancel_schedule_feedback_todo(existing.id, reason='课次待重新绑定报名')
-                    issue_message = (
-                        f'未找到唯一报名绑定: {existing.date.isoformat()} {existing.time_start}-{existing.time_end} '
-                        f'{existing.teacher} / {existing.course_name}'
+                    warnings.append(
+                        f'导入跳过异常课次：{date_value.isoformat() if date_value else ""} '
+                        f'{payload.get("time_start")}-{payload.get("time_end")} '
+                        f'{schedule_teacher_name or "待匹配教师"} / {payload.get("course_name")}，'
+                        f'{conflicts["error"]}'
                     )
-                    todo, created = _upsert_import_binding_todo(
+                    continue
+                if conflicts['all']:
+                    _preserve_import_row_artifacts(
                         existing,
-                        issue_type='unmatched_enrollment',
-                        issue_message=issue_message,
-                        candidate_enrollments=[_serialize_enrollment_candidate(enrollment) for enrollment in candidate_enrollments],
-                        created_by=uploaded_by,
+                        touched_schedule_ids=touched_schedule_ids,
+                        touched_todo_ids=touched_todo_ids,
+                        binding_todos=binding_todos,
                     )
-                    touched_todo_ids.add(todo.id)
-                    if created:
-                        binding_todos_created += 1
-                    unmatched_schedules.append({
-                        'schedule_id': existing.id,
-                        'date': existing.date.isoformat() if existing.date else None,
-                        'time_start': existing.time_start,
-                        'time_end': existing.time_end,
-                        'teacher': existing.teacher,
-                        'course_name': existing.course_name,
-                        'issue_type': 'unmatched_enrollment',
-                        'issue_message': issue_message,
-                        'candidate_enrollments': [_serialize_enrollment_candidate(enrollment) for enrollment in candidate_enrollments],
+                    conflict_rows.append({
+                        'date': payload.get('date').isoformat() if payload.get('date') else None,
+                        'time_start': payload.get('time_start'),
+                        'time_end': payload.get('time_end'),
+                        'teacher': schedule_teacher_name,
+                        'course_name': payload.get('course_name'),
+                        'students': payload.get('students') or '',
+                        'conflicting_schedule_ids': [schedule.id for schedule in conflicts['all']],
+                        'conflicting_schedules': [
+                            {
+                                'id': schedule.id,
+                                'date': schedule.date.isoformat() if schedule.date else None,
+                                'time_start': schedule.time_start,
+                                'time_end': schedule.time_end,
+                                'teacher': schedule.teacher,
+                                'course_name': schedule.course_name,
+                            }
+                            for schedule in conflicts['all']
+                        ],
                     })
+                    teacher_label = teacher_name_for_conflict or schedule_teacher_name or '待匹配教师'
+                    warnings.append(
+                        f'导入跳过冲突课次：{date_value.isoformat() if date_value else ""} '
+                        f'{payload.get("time_start")}-{payload.get("time_end")} '
+                        f'{teacher_label} / {payload.get("course_name")} 与现有课表冲突'
+                    )
+                    continue
+
+                if existing:
+                    if existing.enrollment_id:
+                        affected_enrollment_ids.add(existing.enrollment_id)
+                    _apply_imported_schedule_payload(existing, payload, import_run_id=run.id)
+                    schedule = existing
+                    schedules_updated += 1
+                else:
+                    schedule = CourseSchedule(
+                        date=payload['date'],
+                        day_of_week=payload['day_of_week'],
+                        time_start=payload['time_start'],
+                        time_end=payload['time_end'],
+                        teacher=payload['teacher'],
+                        teacher_id=payload.get('teacher_id'),
+                        course_name=payload['course_name'],
+                        students=payload.get('students') or '',
+                        import_run_id=run.id,
+                        **build_schedule_delivery_fields(
+                            delivery_mode=payload.get('delivery_mode'),
+                            color_tag=payload.get('color_tag'),
+                            allow_unknown=False,
+                        ),
+                    )
+                    db.session.add(schedule)
+                    schedule_map[key] = schedule
+                    schedules_created += 1
 
-                if previous_enrollment_id and previous_enrollment_id != existing.enrollment_id:
-                    previous_enrollment = db.session.get(Enrollment, previous_enrollment_id)
-                    if previous_enrollment:
-                        sync_enrollment_status(previous_enrollment)
-                schedules_updated += 1
-                touched_schedule_ids.add(existing.id)
-            else:
-                schedule = CourseSchedule(
-                    date=payload['date'],
-                    day_of_week=payload['day_of_week'],
-                    time_start=payload['time_start'],
-                    time_end=payload['time_end'],
-                    teacher=payload['teacher'],
-                    teacher_id=payload.get('teacher_id'),
-                    course_name=payload['course_name'],
-                    students=payload.get('students') or '',
-                    import_run_id=run.id,
-                    **build_schedule_delivery_fields(
-                        delivery_mode=payload.get('delivery_mode'),
-                        color_tag=payload.get('color_tag'),
-                        allow_unknown=False,
-                    ),
-                )
                 if teacher_user:
                     schedule.teacher = resolved_teacher_name
                     schedule.teacher_id = teacher_user.id
@@ -1520,58 +1715,72 @@ def apply_schedule_excel_import(file_storage, *, uploaded_by=None):
                 else:
                     schedule.teacher_id = None
 
-                if safe_enrollment:
-                    schedule.enrollment_id = safe_enrollment.id
+                schedule.enrollment_id = safe_enrollment.id if safe_enrollment else None
+                if existing:
+                    sync_schedule_student_snapshot(existing, enrollment=safe_enrollment, preserve_history=False)
                 else:
-                    schedule.enrollment_id = None
-                sync_schedule_student_snapshot(schedule, enrollment=safe_enrollment, preserve_history=False)
+                    # 新课次不可能已有请假记录，快照直接取报名上的学生档案
+                    schedule.student_profile_id_snapshot = (
+                        safe_enrollment.student_profile_id if safe_enrollment else None
+                    )
+                if safe_enrollment:
+                    affected_enrollment_ids.add(safe_enrollment.id)
+                schedule_index.track(schedule)
+                imported_rows.append((schedule, safe_enrollment, candidate_enrollments, bool(existing)))
 
-                db.session.add(schedule)
-                db.session.flush()
-                schedule_map[key] = schedule
-                touched_schedule_ids.add(schedule.id)
-                schedules_created += 1
+        db.session.flush()
 
-                if safe_enrollment:
-                    ensure_schedule_feedback_todo(
-                        schedule,
-                        created_by=uploaded_by,
-                    )
-                    binding_todo = _complete_import_binding_todo(
-                        schedule,
-                        note='已自动绑定报名，待绑定任务已关闭',
-                    )
-                    if binding_todo:
-                        touched_todo_ids.add(binding_todo.id)
-                    sync_enrollment_status(safe_enrollment)
-                else:
-                    issue_message = (
-                        f'未找到唯一报名绑定: {schedule.date.isoformat()} {schedule.time_start}-{schedule.time_end} '
-                        f'{schedule.teacher} / {schedule.course_name}'
-                    )
-                    todo, created = _upsert_import_binding_todo(
-                        schedule,
-                        issue_type='unmatched_enrollment',
-                        issue_message=issue_message,
-                        candidate_enrollments=[_serialize_enrollment_candidate(enrollment) for enrollment in candidate_enrollments],
-                        created_by=uploaded_by,
-                    )
-                    touched_todo_ids.add(todo.id)
-                    if created:
-                        binding_todos_created += 1
-                    unmatched_schedules.append({
-                        'schedule_id': schedule.id,
-                        'date': schedule.date.isoformat() if schedule.date else None,
-                        'time_start': schedule.time_start,
-                        'time_end': schedule.time_end,
-                        'teacher': schedule.teacher,
-                        'course_name': schedule.course_name,
-                        'issue_type': 'unmatched_enrollment',
-                        'issue_message': issue_message,
-                        'candidate_enrollments': [_serialize_enrollment_candidate(enrollment) for enrollment in candidate_enrollments],
-                    })
+        for schedule, safe_enrollment, candidate_enrollments, is_existing in imported_rows:
+            touched_schedule_ids.add(schedule.id)
+            if safe_enrollment:
+                ensure_schedule_feedback_todo(
+                    schedule,
+                    created_by=uploaded_by,
+                )
+                binding_todo = _complete_import_binding_todo(
+                    schedule,
+                    note='已自动绑定报名，待绑定任务已关闭',
+                    binding_todos=binding_todos,
+                )
+                if binding_todo:
+                    touched_todos.append(binding_todo)
+                continue
+
+            if is_existing:
+                cancel_schedule_feedback_todo(schedule.id, reason='课次待重新绑定报名')
+            issue_message = (
+                f'未找到唯一报名绑定: {schedule.date.isoformat()} {schedule.time_start}-{schedule.time_end} '
+                f'{schedule.teacher} / {schedule.course_name}'
+            )
+            serialized_candidates = [_serialize_enrollment_candidate(enrollment) for enrollment in candidate_enrollments]
+            todo, created = _upsert_import_binding_todo(
+                schedule,
+                issue_type='unmatched_enrollment',
+                issue_message=issue_message,
+                candidate_enrollments=serialized_candidates,
+                created_by=uploaded_by,
+                binding_todos=binding_todos,
+            )
+            touched_todos.append(todo)
+            if created:
+                binding_todos_created += 1
+            unmatched_schedules.append({
+                'schedule_id': schedule.id,
+                'date': schedule.date.isoformat() if schedule.date else None,
+                'time_start': schedule.time_start,
+                'time_end': schedule.time_end,
+                'teacher': schedule.teacher,
+                'course_name': schedule.course_name,
+                'issue_type': 'unmatched_enrollment',
+                'issue_message': issue_message,
+                'candidate_enrollments': serialized_candidates,
+            })
 
-        stale_imported_schedules = CourseSchedule.query.filter(
+        stale_imported_schedules = CourseSchedule.query.options(
+            selectinload(CourseSchedule.feedback),
+            selectinload(CourseSchedule.leave_requests),
+            selectinload(CourseSchedule.todos),
+        ).filter(
             CourseSchedule.import_run_id.isnot(None),
             CourseSchedule.import_run_id != run.id,
         ).all()
@@ -1583,6 +1792,8 @@ def apply_schedule_excel_import(file_storage, *, uploaded_by=None):
                     f'保留历史导入课表 #{schedule.id}：{_summarize_schedule(schedule)}，因为已有反馈/请假/待办关联'
                 )
                 continue
+            if schedule.enrollment_id:
+                affected_enrollment_ids.add(schedule.enrollment_id)
             db.session.delete(schedule)
             schedules_deleted += 1
 
@@ -1599,6 +1810,7 @@ def apply_schedule_excel_import(file_storage, *, uploaded_by=None):
         excel_todos_deleted = 0
 
         for payload in todos:
+            progress.advance()
             normalized_payload = dict(payload)
             normalized_payload['responsible_person'] = OATodo.normalize_responsible_people(
                 normalized_payload.get('responsible_person', '')
@@ -1609,24 +1821,28 @@ def apply_schedule_excel_import(file_storage, *, uploaded_by=None):
             existing = todo_map.get(key)
             if existing:
                 _apply_imported_todo_payload(existing, normalized_payload)
-                touched_todo_ids.add(existing.id)
+                touched_todos.append(existing)
                 excel_todos_updated += 1
             else:
                 todo = OATodo(**normalized_payload)
                 db.session.add(todo)
-                db.session.flush()
                 todo_map[key] = todo
-                touched_todo_ids.add(todo.id)
+                touched_todos.append(todo)
                 excel_todos_created += 1
 
+        db.session.flush()
+        touched_todo_ids.update(todo.id for todo in touched_todos)
+
         for todo in existing_excel_todos:
             if todo.id in touched_todo_ids:
                 continue
             db.session.delete(todo)
             excel_todos_deleted += 1
 
-        for enrollment in Enrollment.query.all():
-            sync_enrollment_status(enrollment)
+        # 只重算这次导入改动过课次的报名
+        if affected_enrollment_ids:
+            for enrollment in Enrollment.query.filter(Enrollment.id.in_(affected_enrollment_ids)).all():
+                sync_enrollment_status(enrollment)
 
         summary = {
             'import_id': run.id,
@@ -1648,19 +1864,28 @@ def apply_schedule_excel_import(file_storage, *, uploaded_by=None):
             'stored_path': stored_path,
         }
 
-        run = db.session.get(ScheduleImportRun, run.id)
-        run.status = 'completed'
+        run = db.session.get(ScheduleImportRun, run_id)
+        run.status = ScheduleImportRun.STATUS_COMPLETED
+        run.finished_at = datetime.utcnow()
+        progress.persist(run)
+        run.progress_stage = ScheduleImportRun.STATUS_COMPLETED
         run.set_summary_data(summary)
         db.session.commit()
         return run, summary
     except Exception as exc:
         db.session.rollback()
-        run = db.session.get(ScheduleImportRun, run.id)
+        run = db.session.get(ScheduleImportRun, run_id)
         if run:
-            run.status = 'failed'
+            run.status = ScheduleImportRun.STATUS_FAILED
+            run.finished_at = datetime.utcnow()
+            progress.persist(run)
             run.set_summary_data({'error': str(exc)})
             db.session.commit()
         raise
+    finally:
+        progress.finish()
+        if names_token is not None:
+            _KNOWN_TEACHER_NAMES.reset(names_token)
 
 
 def backfill_schedule_semantics():
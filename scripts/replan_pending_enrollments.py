@@ -0,0 +1,62 @@
+"""批量重算待排课报名的候选时段池、推荐方案和风险评估。
+
+所有 pending_schedule 报名共用一份占用快照，按冲刺交付、目标完成日、报名先后依次排，
+前面报名的推荐方案会占住对应时段；结果分批提交。
+
+    python scripts/replan_pending_enrollments.py --dry-run
+    python scripts/replan_pending_enrollments.py --enrollment-id 12 --enrollment-id 15
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+os.environ.setdefault('SCF_SKIP_APP_AUTO_CREATE', '1')
+
+
+from app_factory import create_app
+from config import Config
+from modules.auth.batch_planning import DEFAULT_CHUNK_SIZE, replan_pending_enrollments
+
+
+def _build_app():
+    return create_app(
+        Config,
+        migrate_columns=True,
+        init_data=False,
+        backfill_schedule_links=False,
+        cleanup_expired=False,
+        run_once_migrations=False,
+    )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--enrollment-id', type=int, action='append', dest='enrollment_ids',
+                        help='只重算指定报名，可重复传入')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='每排多少个报名提交一次')
+    parser.add_argument('--dry-run', action='store_true', help='只计算不落库')
+    args = parser.parse_args(argv)
+
+    app = _build_app()
+    with app.app_context():
+        result = replan_pending_enrollments(
+            enrollment_ids=args.enrollment_ids,
+            chunk_size=args.chunk_size,
+            dry_run=args.dry_run,
+        )
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,242 @@
+"""课表/待办热点查询的索引前后对比（查询计划 + 耗时）。
+
+在临时 SQLite 库里灌入模拟数据，先删掉模型声明的索引跑一遍，再用启动迁移里的
+`_migrate_add_indexes()` 补建索引后再跑一遍，输出每条查询的 EXPLAIN QUERY PLAN
+和中位耗时。
+
+    python scripts/schedule_index_benchmark.py --schedules 20000
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+os.environ.setdefault('SCF_SKIP_APP_AUTO_CREATE', '1')
+
+
+HOT_QUERIES = [
+    (
+        'find_schedule_conflicts 老师当天课次',
+        'SELECT id, time_start, time_end FROM course_schedules '
+        'WHERE date = :day AND (teacher_id = :teacher_id OR teacher = :teacher_name) AND is_cancelled = 0',
+    ),
+    (
+        '/oa/api/schedules 月视图',
+        'SELECT id FROM course_schedules '
+        'WHERE date >= :month_start AND date <= :month_end AND is_cancelled = 0 '
+        'ORDER BY date, time_start',
+    ),
+    (
+        '报名已排课次',
+        'SELECT id FROM course_schedules WHERE enrollment_id = :enrollment_id AND is_cancelled = 0 ORDER BY date',
+    ),
+    (
+        '腾讯会议回调按会议号查课次',
+        'SELECT id FROM course_schedules WHERE meeting_external_id = :meeting_id',
+    ),
+    (
+        '课次工作流待办',
+        "SELECT id FROM oa_todos WHERE schedule_id = :schedule_id AND todo_type != 'generic' AND is_completed = 0",
+    ),
+    (
+        '未完成课后反馈待办',
+        "SELECT id FROM oa_todos WHERE todo_type = 'schedule_feedback' AND is_completed = 0",
+    ),
+    (
+        '课次最近一条请假',
+        'SELECT id FROM leave_requests WHERE schedule_id = :schedule_id ORDER BY created_at DESC LIMIT 1',
+    ),
+    (
+        'OpenClaw 提醒流',
+        "SELECT id FROM reminder_events WHERE target_user_id = :user_id AND status != 'cancelled' "
+        'ORDER BY created_at DESC, id DESC LIMIT 20',
+    ),
+]
+
+
+def _seed(db, *, schedule_count, teacher_count, enrollment_count):
+    from modules.auth.models import Enrollment, LeaveRequest, ReminderEvent, User
+    from modules.oa.models import CourseSchedule, OATodo
+
+    rng = random.Random(20260401)
+    db.session.execute(db.insert(User), [
+        {
+            'username': f'bench-teacher-{index}',
+            'display_name': f'压测老师{index}',
+            'password_hash': 'x',
+            'role': 'teacher',
+            'is_active': True,
+        }
+        for index in range(1, teacher_count + 1)
+    ])
+    db.session.execute(db.insert(Enrollment), [
+        {
+            'student_name': f'压测学生{index}',
+            'course_name': '压测课程',
+            'teacher_id': rng.randint(1, teacher_count),
+            'status': 'confirmed',
+            'intake_token': f'bench-token-{index}',
+        }
+        for index in range(1, enrollment_count + 1)
+    ])
+
+    start = date(2024, 1, 1)
+    schedule_rows = []
+    for index in range(1, schedule_count + 1):
+        course_date = start + timedelta(days=rng.randint(0, 3 * 365))
+        hour = rng.randint(8, 20)
+        teacher_id = rng.randint(1, teacher_count)
+        schedule_rows.append({
+            'date': course_date,
+            'day_of_week': course_date.weekday(),
+            'time_start': f'{hour:02d}:00',
+            'time_end': f'{hour + 1:02d}:00',
+            'teacher': f'压测老师{teacher_id}',
+            'teacher_id': teacher_id,
+            'course_name': '压测课程',
+            'enrollment_id': rng.randint(1, enrollment_count),
+            'meeting_external_id': f'meeting-{index}' if index % 3 == 0 else None,
+            'is_cancelled': index % 20 == 0,
+        })
+    db.session.execute(db.insert(CourseSchedule), schedule_rows)
+
+    db.session.execute(db.insert(OATodo), [
+        {
+            'title': '课后反馈',
+            'schedule_id': rng.randint(1, schedule_count),
+            'todo_type': OATodo.TODO_TYPE_SCHEDULE_FEEDBACK,
+            'workflow_status': OATodo.WORKFLOW_STATUS_WAITING_TEACHER_PROPOSAL,
+            'is_completed': index % 4 != 0,
+        }
+        for index in range(1, schedule_count + 1)
+    ])
+    db.session.execute(db.insert(LeaveRequest), [
+        {
+            'student_name': '压测学生',
+            'schedule_id': rng.randint(1, schedule_count),
+            'leave_date': start,
+            'status': 'approved',
+            'created_at': datetime(2024, 1, 1) + timedelta(minutes=index),
+        }
+        for index in range(1, schedule_count // 10 + 1)
+    ])
+    db.session.execute(db.insert(ReminderEvent), [
+        {
+            'event_key': f'bench-event-{index}',
+            'event_type': 'workflow.todo',
+            'target_user_id': rng.randint(1, teacher_count),
+            'target_role': 'teacher',
+            'scope_type': 'oa_todo',
+            'scope_id': index,
+            'title': '压测提醒',
+            'status': 'pending',
+            'created_at': datetime(2024, 1, 1) + timedelta(minutes=index),
+        }
+        for index in range(1, schedule_count + 1)
+    ])
+    db.session.commit()
+
+
+def _query_params(schedule_count, teacher_count, enrollment_count):
+    return {
+        'day': '2025-03-18',
+        'teacher_id': teacher_count // 2,
+        'teacher_name': f'压测老师{teacher_count // 2}',
+        'month_start': '2025-03-01',
+        'month_end': '2025-03-31',
+        'enrollment_id': enrollment_count // 2,
+        'meeting_id': f'meeting-{(schedule_count // 2) // 3 * 3}',
+        'schedule_id': schedule_count // 2,
+        'user_id': teacher_count // 2,
+    }
+
+
+def _measure(db, params, repeat):
+    results = []
+    for label, sql in HOT_QUERIES:
+        plan_rows = db.session.execute(db.text(f'EXPLAIN QUERY PLAN {sql}'), params).all()
+        plan = '; '.join(str(row[-1]) for row in plan_rows)
+        durations = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            db.session.execute(db.text(sql), params).all()
+            durations.append((time.perf_counter() - started) * 1000)
+        results.append((label, plan, statistics.median(durations)))
+    return results
+
+
+def _declared_indexes(db):
+    return [index for table in db.metadata.sorted_tables for index in table.indexes]
+
+
+def run_benchmark(*, schedule_count, teacher_count, enrollment_count, repeat):
+    from app import create_app
+    from app_factory import _migrate_add_indexes
+    from config import TestingConfig
+    from extensions import db
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app = create_app(
+            TestingConfig,
+            config_overrides={'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_dir}/index-benchmark.db'},
+        )
+        with app.app_context():
+            for index in _declared_indexes(db):
+                index.drop(bind=db.engine, checkfirst=True)
+            _seed(
+                db,
+                schedule_count=schedule_count,
+                teacher_count=teacher_count,
+                enrollment_count=enrollment_count,
+            )
+            db.session.execute(db.text('ANALYZE'))
+            params = _query_params(schedule_count, teacher_count, enrollment_count)
+            before = _measure(db, params, repeat)
+
+            _migrate_add_indexes()
+            _migrate_add_indexes()
+            db.session.execute(db.text('ANALYZE'))
+            after = _measure(db, params, repeat)
+            db.session.remove()
+            db.engine.dispose()
+
+    return before, after
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='对比课表/待办热点查询在补建索引前后的查询计划与耗时')
+    parser.add_argument('--schedules', type=int, default=20000, help='模拟课次数量')
+    parser.add_argument('--teachers', type=int, default=40, help='模拟老师数量')
+    parser.add_argument('--enrollments', type=int, default=600, help='模拟报名数量')
+    parser.add_argument('--repeat', type=int, default=20, help='每条查询重复次数（取中位数）')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    before, after = run_benchmark(
+        schedule_count=args.schedules,
+        teacher_count=args.teachers,
+        enrollment_count=args.enrollments,
+        repeat=args.repeat,
+    )
+    for (label, before_plan, before_ms), (_, after_plan, after_ms) in zip(before, after):
+        print(f'== {label}')
+        print(f'   before {before_ms:8.3f} ms  {before_plan}')
+        print(f'   after  {after_ms:8.3f} ms  {after_plan}')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -323,6 +323,91 @@ def test_admin_action_center_removes_feedback_after_submit_and_student_sees_feed
     assert payload['recent_feedbacks'][0]['id'] == schedule.id
 
 
+def test_feedback_pending_flag_tracks_feedback_leave_and_cancel_and_bucket_pages_by_cursor(client, login_as):
+    admin = create_user(username='pending-page-admin', display_name='分页教务', role='admin')
+    teacher = create_user(username='pending-page-teacher', display_name='分页老师', role='teacher')
+    schedules = [
+        create_schedule(
+            teacher=teacher,
+            course_name='分页课程',
+            schedule_date=date(2026, 3, day),
+            time_start='08:00',
+            time_end='09:00',
+        )
+        for day in (10, 11, 12, 13, 14)
+    ]
+    future_schedule = create_schedule(
+        teacher=teacher,
+        course_name='分页课程',
+        schedule_date=date(2026, 3, 20),
+        time_start='10:00',
+        time_end='11:00',
+    )
+    assert all(schedule.feedback_pending for schedule in schedules + [future_schedule])
+
+    create_feedback(schedule=schedules[0], teacher=teacher, status='submitted', submitted_at=datetime(2026, 3, 10, 10))
+    leave = create_leave_request(schedule=schedules[1], status='pending')
+    assert schedules[1].feedback_pending is True
+    leave.status = 'approved'
+    schedules[2].is_cancelled = True
+    db.session.commit()
+    assert [schedule.feedback_pending for schedule in schedules] == [False, False, False, True, True]
+
+    leave.status = 'rejected'
+    db.session.commit()
+    assert schedules[1].feedback_pending is True
+
+    login_as(admin)
+    payload = client.get('/auth/api/admin/action-center').get_json()['data']
+    assert [item['id'] for item in payload['pending_feedback_schedules']] == [
+        schedules[1].id, schedules[3].id, schedules[4].id,
+    ]
+    assert payload['counts']['pending_feedback_schedules'] == 3
+    assert payload['pending_feedback_schedules'][0]['missing_feedback_count_for_teacher_recent'] == 3
+
+    response = client.get('/auth/api/admin/action-center/pending-feedback', query_string={'limit': 2})
+    page = response.get_json()['data']
+    assert [item['id'] for item in page['items']] == [schedules[1].id, schedules[3].id]
+    assert page['has_more'] is True
+    assert page['next_cursor'] == f'2026-03-13|08:00|{schedules[3].id}'
+
+    response = client.get(
+        '/auth/api/admin/action-center/pending-feedback',
+        query_string={'cursor': page['next_cursor'], 'limit': 2},
+    )
+    data = response.get_json()['data']
+    assert [item['id'] for item in data['items']] == [schedules[4].id]
+    assert data['has_more'] is False
+    assert data['next_cursor'] is None
+    assert data['total'] == 3
+
+    assert client.get('/auth/api/admin/action-center/unknown').status_code == 404
+
+
+def test_admin_action_center_lists_every_pending_feedback_and_leave_case(client, login_as):
+    admin = create_user(username='full-list-admin', display_name='完整列表教务', role='admin')
+    teacher = create_user(username='full-list-teacher', display_name='完整列表老师', role='teacher')
+    schedules = [
+        create_schedule(
+            teacher=teacher,
+            course_name='完整列表课程',
+            schedule_date=date(2026, 2, 1) + timedelta(days=index),
+            time_start='08:00',
+            time_end='09:00',
+        )
+        for index in range(25)
+    ]
+    leaves = [create_leave_request(schedule=schedule, status='pending') for schedule in schedules]
+    login_as(admin)
+
+    payload = client.get('/auth/api/admin/action-center').get_json()['data']
+
+    assert {item['id'] for item in payload['pending_feedback_schedules']} == {schedule.id for schedule in schedules}
+    assert {item['id'] for item in payload['leave_cases']} == {leave.id for leave in leaves}
+    assert payload['counts']['pending_feedback_schedules'] == 25
+    assert payload['counts']['leave_cases'] == 25
+
+
 @freeze_time('2026-03-21 12:00:00')
 def test_student_my_info_uses_upcoming_schedules_and_recent_feedbacks_independently(client, login_as):
     teacher = create_user(username='student-info-teacher', display_name='信息老师', role='teacher')
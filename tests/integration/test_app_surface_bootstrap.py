@@ -170,3 +170,38 @@ def test_oa_factory_skips_seed_init_by_default_even_if_config_requests_it(tmp_pa
         assert app is not None
     finally:
         _teardown(app)
+
+
+def test_migrate_add_columns_backfills_declared_indexes_idempotently(tmp_path):
+    from sqlalchemy import inspect
+
+    from app_factory import _migrate_add_columns, create_app
+
+    app = create_app(
+        TestingConfig,
+        config_overrides={
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{(tmp_path / "indexes.db").as_posix()}',
+        },
+    )
+    try:
+        with app.app_context():
+            schedule_table = db.metadata.tables['course_schedules']
+            for index in schedule_table.indexes:
+                index.drop(bind=db.engine)
+            assert not inspect(db.engine).get_indexes('course_schedules')
+
+            _migrate_add_columns()
+            _migrate_add_columns()
+
+            inspector = inspect(db.engine)
+            schedule_indexes = {item['name'] for item in inspector.get_indexes('course_schedules')}
+            todo_indexes = {item['name'] for item in inspector.get_indexes('oa_todos')}
+            assert {
+                'ix_course_schedules_cancelled_date_time',
+                'ix_course_schedules_teacher_id_date',
+                'ix_course_schedules_enrollment_date',
+                'ix_course_schedules_meeting_external_id',
+            } <= schedule_indexes
+            assert 'ix_oa_todos_schedule_type' in todo_indexes
+    finally:
+        _teardown(app)
@@ -171,6 +171,42 @@ def test_chat_contacts_include_all_allowed_partners_for_student_and_teacher(clie
     assert {item['id'] for item in payload['data']} == {admin.id, student.id}
 
 
+def test_chat_conversations_summarize_all_partners_in_one_query(client, login_as):
+    admin = create_user(username='summary-admin', display_name='汇总教务', role='admin')
+    partners = [
+        create_user(username=f'summary-teacher-{index}', display_name=f'汇总老师{index}', role='teacher')
+        for index in range(3)
+    ]
+    base = datetime(2026, 3, 10, 1, 0, 0)
+    for index, partner in enumerate(partners):
+        for offset in range(index + 1):
+            message = create_chat_message(sender=partner, receiver=admin, content=f'老师{index}第{offset}条', is_read=False)
+            message.created_at = base.replace(hour=1 + offset, minute=index)
+        reply = create_chat_message(sender=admin, receiver=partner, content=f'回复老师{index}', is_read=False)
+        reply.created_at = base.replace(hour=1, minute=30 + index)
+    db.session.commit()
+    login_as(admin)
+
+    statements = []
+
+    def _listener(conn, cursor, statement, parameters, context, executemany):
+        if 'chat_messages' in statement:
+            statements.append(statement)
+
+    db.event.listen(db.engine, 'before_cursor_execute', _listener)
+    try:
+        payload = client.get('/auth/api/chat/conversations').get_json()
+    finally:
+        db.event.remove(db.engine, 'before_cursor_execute', _listener)
+
+    assert len(statements) == 1
+    assert [item['user_id'] for item in payload['data']] == [partners[2].id, partners[1].id, partners[0].id]
+    assert [item['unread_count'] for item in payload['data']] == [3, 2, 1]
+    assert payload['data'][0]['last_message'] == '老师2第2条'
+    assert payload['data'][2]['last_message'] == '回复老师0'
+    assert client.get('/auth/api/chat/unread-count').get_json()['count'] == 6
+
+
 def test_chat_history_remains_visible_after_relationship_is_removed(client, login_as):
     teacher = create_user(username='history-teacher', display_name='历史老师', role='teacher')
     student = create_user(username='history-student', display_name='历史学生', role='student')
@@ -0,0 +1,151 @@
+import threading
+
+import pytest
+
+from core.pubsub import LocalBroker
+from extensions import db
+from tests.factories import create_chat_message, create_user
+
+
+pytestmark = pytest.mark.integration
+
+
+def _capture_chat_queries():
+    statements = []
+
+    def _listener(conn, cursor, statement, parameters, context, executemany):
+        if 'chat_messages' in statement:
+            statements.append(statement)
+
+    return statements, _listener
+
+
+def test_chat_updates_resume_from_since_id_and_idle_polls_skip_the_database(client, login_as):
+    admin = create_user(username='push-admin', display_name='推送教务', role='admin')
+    teacher = create_user(username='push-teacher', display_name='推送老师', role='teacher')
+    create_chat_message(sender=teacher, receiver=admin, content='第一条', is_read=False)
+    login_as(admin)
+
+    baseline = client.get('/auth/api/chat/updates').get_json()['data']
+    assert baseline['messages'] == []
+    assert baseline['unread_count'] == 1
+    since_id = baseline['last_id']
+
+    statements, listener = _capture_chat_queries()
+    db.event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        idle = client.get(f'/auth/api/chat/updates?since_id={since_id}&timeout=0').get_json()['data']
+        assert client.get('/auth/api/chat/unread-count').get_json()['count'] == 1
+    finally:
+        db.event.remove(db.engine, 'before_cursor_execute', listener)
+    assert statements == []
+    assert idle == {'messages': [], 'last_id': since_id, 'unread_count': 1}
+
+    create_chat_message(sender=teacher, receiver=admin, content='第二条', is_read=False)
+    update = client.get(f'/auth/api/chat/updates?since_id={since_id}&timeout=5').get_json()['data']
+    assert [item['content'] for item in update['messages']] == ['第二条']
+    assert update['unread_count'] == 2
+    assert update['last_id'] == update['messages'][0]['id']
+
+    client.get(f'/auth/api/chat/messages?with={teacher.id}')
+    assert client.get('/auth/api/chat/unread-count').get_json()['count'] == 0
+
+    sent = client.post('/auth/api/chat/send', json={'receiver_id': teacher.id, 'content': '收到'})
+    assert sent.status_code == 201
+    resumed = client.get(f'/auth/api/chat/updates?since_id={update["last_id"]}').get_json()['data']
+    assert [item['content'] for item in resumed['messages']] == ['收到']
+
+
+def test_local_broker_wakes_waiters_on_publish():
+    broker = LocalBroker()
+    version, _ = broker.seed('chat:user:1', {'last_id': 0})
+    timer = threading.Timer(0.05, broker.publish, args=('chat:user:1', {'last_id': 7}))
+    timer.start()
+    try:
+        assert broker.wait('chat:user:1', version, timeout=5) == (1, {'last_id': 7})
+    finally:
+        timer.cancel()
+    assert broker.wait('chat:user:1', 1, timeout=0) == (1, {'last_id': 7})
+
+    broker.invalidate_all()
+    assert broker.get('chat:user:1') == (2, {})
+
+    assert broker.publish_if_version('chat:user:1', 1, {'last_id': 8}) is None
+    assert broker.publish_if_version('chat:user:1', 2, {'last_id': 8}) == 3
+    assert broker.publish_if_version('chat:user:2', None, {'last_id': 0}) == 1
+
+
+def test_chat_state_reload_does_not_overwrite_a_concurrent_invalidation(app, monkeypatch):
+    from core.pubsub import get_broker
+    from modules.auth import chat_services
+
+    broker = get_broker()
+    channel = chat_services.chat_channel(42)
+    loads = []
+
+    def _load_while_a_commit_lands(user_id):
+        loads.append(user_id)
+        if len(loads) == 1:
+            # 第一次重算期间有提交把频道标记为过期（频道此前还不存在）
+            broker.publish(channel, {})
+            return {'last_id': 1, 'unread_count': 1}
+        return {'last_id': 2, 'unread_count': 0}
+
+    monkeypatch.setattr(chat_services, '_load_chat_state', _load_while_a_commit_lands)
+
+    assert chat_services.current_chat_state(42) == (2, {'last_id': 2, 'unread_count': 0})
+    assert len(loads) == 2
+    assert broker.get(channel) == (2, {'last_id': 2, 'unread_count': 0})
+
+
+def test_chat_history_pages_by_message_id_and_marks_read_once(client, login_as):
+    admin = create_user(username='page-admin', display_name='分页教务', role='admin')
+    teacher = create_user(username='page-teacher', display_name='分页老师', role='teacher')
+    for index in range(5):
+        create_chat_message(sender=teacher, receiver=admin, content=f'消息{index}', is_read=False)
+    login_as(admin)
+
+    latest = client.get(f'/auth/api/chat/messages?with={teacher.id}&limit=2').get_json()
+    assert [item['content'] for item in latest['data']] == ['消息3', '消息4']
+    assert latest['has_more'] is True
+    assert client.get('/auth/api/chat/unread-count').get_json()['count'] == 0
+
+    older = client.get(f'/auth/api/chat/messages?with={teacher.id}&limit=2&before_id={latest["oldest_id"]}').get_json()
+    assert [item['content'] for item in older['data']] == ['消息1', '消息2']
+    oldest = client.get(f'/auth/api/chat/messages?with={teacher.id}&limit=2&before_id={older["oldest_id"]}').get_json()
+    assert [item['content'] for item in oldest['data']] == ['消息0'] and oldest['has_more'] is False
+
+    create_chat_message(sender=teacher, receiver=admin, content='新消息', is_read=False)
+    statements, listener = _capture_chat_queries()
+    db.event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        newer = client.get(f'/auth/api/chat/messages?with={teacher.id}&after_id={latest["newest_id"]}').get_json()
+    finally:
+        db.event.remove(db.engine, 'before_cursor_execute', listener)
+    assert [item['content'] for item in newer['data']] == ['新消息']
+    assert newer['has_more'] is False
+    assert sum(statement.lstrip().upper().startswith('UPDATE') for statement in statements) == 1
+
+    conflict = client.get(f'/auth/api/chat/messages?with={teacher.id}&after_id=1&before_id=3')
+    assert conflict.status_code == 400
+
+
+def test_chat_updates_answer_immediately_when_long_poll_slots_are_full(app, client, login_as):
+    import time
+
+    from modules.auth.chat_services import chat_long_poll_slot
+
+    admin = create_user(username='slots-admin', display_name='名额教务', role='admin')
+    login_as(admin)
+    app.config['SCF_CHAT_LONG_POLL_MAX_WAITERS'] = 1
+    since_id = client.get('/auth/api/chat/updates').get_json()['data']['last_id']
+
+    with chat_long_poll_slot() as acquired:
+        assert acquired is True
+        started = time.monotonic()
+        busy = client.get(f'/auth/api/chat/updates?since_id={since_id}&timeout=5').get_json()['data']
+        assert time.monotonic() - started < 2
+    assert busy == {'messages': [], 'last_id': since_id, 'unread_count': 0, 'retry_after': 5}
+
+    with chat_long_poll_slot() as acquired:
+        assert acquired is True
@@ -0,0 +1,219 @@
+import json
+import os
+import shutil
+import threading
+
+import pytest
+
+from config import TestingConfig
+from extensions import db
+from modules.education.services import CExecutor, CodeExecutor, ExerciseChecker
+
+
+pytestmark = pytest.mark.integration
+
+
+def test_code_run_keeps_result_contract_and_stdin(tmp_path):
+    from app_factory import create_app
+
+    app = create_app(
+        TestingConfig,
+        config_overrides={
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{(tmp_path / "code-runner.db").as_posix()}',
+        },
+    )
+    try:
+        client = app.test_client()
+        response = client.post('/api/code/run', json={
+            'code': "name = input('name: ')\nprint('hi', name)",
+            'input': 'scf\n',
+        })
+
+        assert response.status_code == 200
+        assert response.get_json() == {'output': 'name: hi scf\n', 'error': None, 'success': True}
+
+        missing_input = client.post('/api/code/run', json={'code': 'input()\ninput()', 'input': '1\n'}).get_json()
+        assert missing_input['success'] is False
+        assert '输入不足' in missing_input['error']
+    finally:
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+
+def test_code_executor_kills_timed_out_worker_and_recovers():
+    executor = CodeExecutor(timeout=1, pool_size=1, max_runs=3)
+
+    timed_out = executor.execute('while True:\n    pass')
+    assert timed_out['success'] is False
+    assert timed_out['timeout'] is True
+
+    assert executor.execute("print('alive')") == {'output': 'alive\n', 'error': None, 'success': True}
+
+
+def test_code_executor_runs_each_job_in_a_clean_interpreter():
+    executor = CodeExecutor(timeout=2, pool_size=1, max_runs=50)
+
+    polluted = executor.execute(
+        "import builtins, signal, sys, threading, time\n"
+        "builtins.print = lambda *args, **kwargs: None\n"
+        "sys.modules['json'] = None\n"
+        "signal.signal(signal.SIGALRM, signal.SIG_IGN)\n"
+        "threading.Thread(target=time.sleep, args=(30,), daemon=True).start()\n"
+    )
+    assert polluted['success'] is True
+
+    result = executor.execute(
+        "import json, signal, threading\n"
+        "print(json.dumps([threading.active_count(), signal.getsignal(signal.SIGALRM) == signal.SIG_DFL]))"
+    )
+    assert result == {'output': '[1, true]\n', 'error': None, 'success': True}
+
+
+def test_code_executor_caps_output_and_isolates_concurrent_runs():
+    executor = CodeExecutor(timeout=3, pool_size=2, output_limit=1000)
+
+    flood = executor.execute("while True:\n    print('x' * 50)")
+    assert flood['success'] is False
+    assert '输出内容过多' in flood['error']
+    assert len(flood['output']) == 1000
+
+    results = {}
+
+    def _run(index):
+        results[index] = executor.execute(f"for _ in range(200):\n    print({index})")
+
+    threads = [threading.Thread(target=_run, args=(index,)) for index in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for index, result in results.items():
+        assert result['success'] is True
+        assert set(result['output'].split()) == {str(index)}
+
+
+@pytest.mark.skipif(shutil.which('gcc') is None, reason='gcc not installed')
+def test_c_executor_compiles_once_and_reuses_cached_binary(tmp_path, monkeypatch):
+    executor = CExecutor(cache_dir=str(tmp_path / 'c-cache'), cache_size=2)
+    code = '#include <stdio.h>\nint main(){int a,b;scanf("%d %d",&a,&b);printf("%d\\n",a+b);return 0;}'
+
+    results = executor.execute_many(code, ['1 2', '3 4', '5 6'])
+    assert [result['output'] for result in results] == ['3\n', '7\n', '11\n']
+    assert all(result['success'] for result in results)
+
+    def _fail_compile(*args, **kwargs):
+        raise AssertionError('cached source should not be recompiled')
+
+    monkeypatch.setattr(executor, '_compile', _fail_compile)
+    assert executor.compile(code)['cached'] is True
+    assert executor.execute(code, '10 20') == {'success': True, 'output': '30\n', 'error': None}
+    monkeypatch.undo()
+
+    broken = executor.execute('int main(){ return missing; }')
+    assert broken['compile_error'] is True
+    assert 'main.c' in broken['error']
+    assert 'binary' not in broken
+
+    executor.execute('int main(){ return 0; }')
+    cached_entries = [path for path in (tmp_path / 'c-cache').iterdir() if path.suffix == '.json']
+    assert len(cached_entries) == 2
+
+
+@pytest.mark.skipif(shutil.which('gcc') is None, reason='gcc not installed')
+def test_c_executor_refuses_cache_dir_writable_by_others(tmp_path):
+    shared_dir = tmp_path / 'shared-cache'
+    shared_dir.mkdir()
+    shared_dir.chmod(0o777)
+    executor = CExecutor(cache_dir=str(shared_dir))
+    code = '#include <stdio.h>\nint main(){puts("ok");return 0;}'
+
+    compiled = executor.compile(code)
+    assert compiled['success'] is True
+    assert compiled['temporary'] is True
+    assert not str(compiled['binary']).startswith(str(shared_dir))
+    shutil.rmtree(os.path.dirname(compiled['binary']))
+
+    assert executor.execute(code) == {'success': True, 'output': 'ok\n', 'error': None}
+    assert list(shared_dir.iterdir()) == []
+
+    private_dir = tmp_path / 'private-cache'
+    CExecutor(cache_dir=str(private_dir)).compile(code)
+    assert oct(private_dir.stat().st_mode & 0o777) == oct(0o700)
+
+
+def test_c_executor_defaults_cache_to_runtime_root(tmp_path):
+    from app_factory import create_app
+
+    app = create_app(
+        TestingConfig,
+        config_overrides={
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{(tmp_path / "c-cache.db").as_posix()}',
+            'SCF_RUNTIME_ROOT': str(tmp_path / 'runtime'),
+        },
+    )
+    try:
+        with app.app_context():
+            assert CExecutor().cache_dir == str(tmp_path / 'runtime' / 'c_binaries')
+            app.config['C_BINARY_CACHE_DIR'] = str(tmp_path / 'configured')
+            assert CExecutor().cache_dir == str(tmp_path / 'configured')
+    finally:
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+
+def test_function_exercise_loads_module_once_and_times_out_single_case():
+    checker = ExerciseChecker('python')
+    checker.executor = CodeExecutor(timeout=1, pool_size=1)
+    code = (
+        "calls = []\n"
+        "def add(a, b):\n"
+        "    calls.append(a)\n"
+        "    print('debug', a)\n"
+        "    if a == 0:\n"
+        "        while True:\n"
+        "            pass\n"
+        "    return len(calls) if a == 9 else (a + b)\n"
+    )
+    config = {
+        'test_type': 'function',
+        'function_name': 'add',
+        'function_tests': [
+            {'args': [1, 2], 'expected': 3},
+            {'args': [0, 0], 'expected': 0},
+            {'args': [2, 2], 'expected': 4},
+            {'args': [9, 0], 'expected': 4},
+        ],
+    }
+
+    result = checker.check_submission(code, json.dumps(config))
+
+    assert [case['passed'] for case in result['results']] == [True, False, True, True]
+    assert '执行超时' in result['results'][1]['error']
+    assert result['code_output'] == '调用 add(1, 2) 的返回值: 3'
+    assert result['message'] == '通过 3/4 个测试用例'
+
+    missing = checker.check_submission('def other():\n    pass\n', json.dumps(config))
+    assert missing['passed_cases'] == 0
+    assert 'add()' in missing['results'][0]['error']
+
+
+def test_code_executor_default_worker_setting_uses_more_than_one_process(tmp_path):
+    from app_factory import create_app
+
+    app = create_app(
+        TestingConfig,
+        config_overrides={
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{(tmp_path / "code-pool.db").as_posix()}',
+        },
+    )
+    try:
+        with app.app_context():
+            assert app.config['CODE_SANDBOX_WORKERS'] == 0
+            assert CodeExecutor()._pool().size > 1
+    finally:
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
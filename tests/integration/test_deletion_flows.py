@@ -2,6 +2,7 @@ import pytest
 
 from extensions import db
 from modules.auth.models import ChatMessage, Enrollment, StudentProfile, User
+from modules.auth.workflow_services import process_pending_workflow_reconcile
 from modules.oa.models import CourseFeedback, CourseSchedule, OATodo
 from tests.factories import (
     create_chat_message,
@@ -114,6 +115,8 @@ def test_stale_replan_workflow_is_hidden_from_auth_and_oa_lists(client, login_as
 
     db.session.delete(enrollment)
     db.session.commit()
+    # 测试配置下提交后排队的清理不起后台线程，这里手动跑一次
+    process_pending_workflow_reconcile()
     db.session.expire_all()
 
     login_as(admin)
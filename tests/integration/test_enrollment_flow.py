@@ -12,6 +12,7 @@ from modules.auth.services import (
     _build_manual_plan,
     _linked_schedule_query,
     backfill_schedule_relationships,
+    materialize_legacy_enrollment_links,
     find_matching_slots,
     propose_enrollment_schedule,
     reject_enrollment_schedule,
@@ -21,6 +22,7 @@ from modules.auth.services import (
 from modules.oa.models import CourseSchedule, OATodo
 from tests.factories import (
     create_enrollment,
+    create_feedback,
     create_leave_request,
     create_schedule,
     create_todo,
@@ -1766,6 +1768,97 @@ def test_backfill_schedule_relationships_matches_legacy_notes_exactly(app):
     assert refreshed_ambiguous.enrollment_id != target.id
 
 
+def test_legacy_enrollment_links_are_materialized_on_write_and_backfill(app):
+    teacher = create_user(username='legacy-link-teacher', display_name='LegacyLinkTeacher', role='teacher')
+    enrollment = create_enrollment(teacher=teacher, student_name='Link学生', course_name='Link课程', status='confirmed')
+    schedule = create_schedule(
+        teacher=teacher,
+        course_name='Link课程',
+        schedule_date=date(2026, 3, 18),
+        notes=f'自动排课 - 报名#{enrollment.id}',
+    )
+    assert schedule.legacy_enrollment_id == enrollment.id
+
+    schedule.notes = '改成手工备注'
+    db.session.commit()
+    assert schedule.legacy_enrollment_id is None
+    assert _linked_schedule_query(enrollment.id).all() == []
+
+    table = CourseSchedule.__table__
+    db.session.execute(table.update().where(table.c.id == schedule.id).values(
+        notes=f'旧数据 报名#{enrollment.id}',
+        legacy_enrollment_id=None,
+    ))
+    db.session.commit()
+    assert materialize_legacy_enrollment_links() == 1
+    assert materialize_legacy_enrollment_links() == 0
+    db.session.expire_all()
+    assert [item.id for item in _linked_schedule_query(enrollment.id).all()] == [schedule.id]
+
+
+@freeze_time('2026-03-21 12:00:00')
+def test_enrollment_progress_numbers_linked_schedules_in_one_query(client, login_as):
+    admin = create_user(username='progress-admin', display_name='进度教务', role='admin')
+    teacher = create_user(username='progress-teacher', display_name='进度老师', role='teacher')
+    enrollment = create_enrollment(
+        teacher=teacher,
+        student_name='进度学生',
+        course_name='进度课程',
+        status='active',
+        total_hours=8,
+        hours_per_session=2.0,
+    )
+    first = create_schedule(
+        teacher=teacher,
+        course_name='进度课程',
+        enrollment=enrollment,
+        schedule_date=date(2026, 3, 16),
+    )
+    cancelled = create_schedule(
+        teacher=teacher,
+        course_name='进度课程',
+        enrollment=enrollment,
+        schedule_date=date(2026, 3, 18),
+    )
+    cancelled.is_cancelled = True
+    legacy = create_schedule(
+        teacher=teacher,
+        course_name='进度课程',
+        schedule_date=date(2026, 3, 23),
+        notes=f'自动排课 - 报名#{enrollment.id}',
+    )
+    db.session.commit()
+    create_feedback(schedule=first, teacher=teacher, status='submitted')
+
+    login_as(admin)
+    statements = []
+
+    def _listener(conn, cursor, statement, parameters, context, executemany):
+        if 'FROM course_schedules' in statement:
+            statements.append(statement)
+
+    db.event.listen(db.engine, 'before_cursor_execute', _listener)
+    try:
+        data = client.get('/auth/api/enrollments/progress').get_json()['data']
+    finally:
+        db.event.remove(db.engine, 'before_cursor_execute', _listener)
+
+    assert set(data) == {str(first.id), str(legacy.id)}
+    assert data[str(first.id)] == {
+        'session_number': 1,
+        'total': 4,
+        'is_ending': False,
+        'completed': True,
+        'delivered': True,
+        'course_name': '进度课程',
+        'student_name': '进度学生',
+    }
+    assert data[str(legacy.id)]['session_number'] == 2
+    assert data[str(legacy.id)]['is_ending'] is True
+    assert data[str(legacy.id)]['completed'] is False
+    assert len(statements) == 1
+
+
 def test_update_intake_reopens_waiting_student_confirm_workflow_with_latest_profile_context(client, login_as, logout):
     teacher = create_user(username='intake-refresh-teacher', display_name='改档老师', role='teacher')
     admin = create_user(username='intake-refresh-admin', display_name='改档教务', role='admin')
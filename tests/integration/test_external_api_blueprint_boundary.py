@@ -48,6 +48,7 @@ OA_DOMAIN_EXTERNAL_PATHS = [
     '/oa/api/external/todos/<int:todo_id>/toggle',
     '/oa/api/external/todos/batch',
     '/oa/api/external/import-excel',
+    '/oa/api/external/import-excel/<int:import_id>',
 ]
 
 
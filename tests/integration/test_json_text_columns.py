@@ -0,0 +1,74 @@
+import math
+
+import pytest
+
+from core import json_text
+from extensions import db
+from modules.oa.models import OATodo
+from tests.factories import create_enrollment, create_todo, create_user
+
+
+pytestmark = pytest.mark.integration
+
+
+def _count_loads(monkeypatch):
+    calls = []
+    original = json_text.loads
+
+    def _loads(text):
+        calls.append(text)
+        return original(text)
+
+    monkeypatch.setattr(json_text, 'loads', _loads)
+    return calls
+
+
+def test_enrollment_json_columns_parse_once_per_raw_value(app, monkeypatch):
+    teacher = create_user(username='json-teacher', display_name='JSON老师', role='teacher')
+    enrollment = create_enrollment(teacher=teacher, student_name='JSON学生')
+    enrollment.set_json('confirmed_slot', {'weekly_slots': [{'day_of_week': 1}], 'note': '首版'})
+    enrollment.set_json('risk_assessment', {'summary': '稳定'})
+    db.session.commit()
+
+    calls = _count_loads(monkeypatch)
+    first = enrollment.to_dict()
+    second = enrollment.to_dict()
+    assert len(calls) == 2
+    assert first['confirmed_slot'] == second['confirmed_slot'] == {'weekly_slots': [{'day_of_week': 1}], 'note': '首版'}
+    assert second['proposed_slots'] == [] and second['proposed_slots'] is not first['proposed_slots']
+
+    enrollment.set_json('confirmed_slot', {'weekly_slots': [], 'note': '改版'})
+    assert enrollment.to_dict()['confirmed_slot']['note'] == '改版'
+    assert len(calls) == 3
+
+    db.session.commit()
+    db.session.expire(enrollment)
+    assert enrollment.to_dict()['risk_assessment'] == {'summary': '稳定'}
+    assert len(calls) == 3
+
+
+def test_todo_payload_view_is_cached_and_data_is_a_private_copy(app):
+    todo = create_todo(title='JSON待办', todo_type=OATodo.TODO_TYPE_ENROLLMENT_REPLAN)
+    todo.set_payload_data({'context': {'teacher_id': 7}, 'rejections': []})
+    db.session.commit()
+
+    assert todo.get_payload_view() is todo.get_payload_view()
+    data = todo.get_payload_data()
+    data['rejections'].append({'message': '不合适'})
+    assert todo.get_payload_view()['rejections'] == []
+    assert todo.to_dict()['payload'] == {'context': {'teacher_id': 7}, 'rejections': []}
+
+    todo.payload = '["not", "a", "dict"]'
+    assert todo.get_payload_view() == {}
+    assert todo.get_payload_data() == {}
+    todo.set_payload_data(None)
+    assert todo.payload is None
+
+
+def test_json_text_loads_falls_back_for_literals_orjson_rejects():
+    assert math.isnan(json_text.loads('NaN'))
+    assert json_text.loads('{"名称": [1, 2]}') == {'名称': [1, 2]}
+    with pytest.raises(TypeError):
+        json_text.loads(None)
+    with pytest.raises(ValueError):
+        json_text.loads('{broken')
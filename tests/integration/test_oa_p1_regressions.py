@@ -1,6 +1,6 @@
 import io
 import json
-from datetime import date
+from datetime import date, timedelta
 
 import pytest
 from freezegun import freeze_time
@@ -11,7 +11,7 @@ from openpyxl.utils.datetime import to_excel
 from extensions import db
 from modules.auth.models import Enrollment
 from modules.auth.services import _build_manual_plan
-from modules.auth.workflow_services import ensure_schedule_feedback_todo
+from modules.auth.workflow_services import ensure_schedule_feedback_todo, process_pending_workflow_reconcile
 from modules.oa.models import CourseSchedule, OATodo, ScheduleImportRun
 from tests.factories import (
     create_enrollment,
@@ -643,6 +643,8 @@ def test_historical_imported_schedule_before_april_is_hidden_and_cancelled_from_
         todo_type=OATodo.TODO_TYPE_SCHEDULE_FEEDBACK,
         workflow_status=OATodo.WORKFLOW_STATUS_WAITING_TEACHER_PROPOSAL,
     )
+    # 测试配置下提交后排队的清理不起后台线程，这里手动跑一次
+    process_pending_workflow_reconcile()
 
     login_as(admin)
     action_center = client.get('/auth/api/admin/action-center').get_json()['data']
@@ -855,3 +857,381 @@ def test_excel_reimport_conflict_keeps_existing_binding_todo(client, login_as):
     assert refreshed_todo is not None
     assert refreshed_todo.id == binding_todo.id
     assert refreshed_todo.is_completed is False
+
+
+@freeze_time('2026-04-02 12:00:00')
+def test_todo_reads_do_not_write_and_sweeper_closes_legacy_stale_feedback_todos(app, client, login_as):
+    admin = create_user(username='oa-p1-sweeper-admin', display_name='SweeperAdmin', role='admin')
+    teacher = create_user(username='oa-p1-sweeper-teacher', display_name='SweeperTeacher', role='teacher')
+    import_run = ScheduleImportRun(
+        original_filename='sweeper.xlsx',
+        uploaded_by=admin.id,
+        status='completed',
+    )
+    db.session.add(import_run)
+    db.session.flush()
+    schedule = create_schedule(
+        teacher=teacher,
+        course_name='SweeperCourse',
+        students='SweeperStudent',
+        schedule_date=date(2026, 3, 16),
+        time_start='10:00',
+        time_end='12:00',
+    )
+    feedback_todo = create_todo(
+        title='历史课次反馈',
+        responsible_person=teacher.display_name,
+        schedule=schedule,
+        due_date=schedule.date,
+        todo_type=OATodo.TODO_TYPE_SCHEDULE_FEEDBACK,
+        workflow_status=OATodo.WORKFLOW_STATUS_WAITING_TEACHER_PROPOSAL,
+    )
+    # 绕过 ORM 直接改库，模拟钩子上线前遗留的脏数据
+    db.session.execute(
+        db.update(CourseSchedule)
+        .where(CourseSchedule.id == schedule.id)
+        .values(import_run_id=import_run.id)
+    )
+    db.session.commit()
+
+    write_statements = []
+
+    def _record_writes(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().split(' ', 1)[0].upper() in {'INSERT', 'UPDATE', 'DELETE'}:
+            write_statements.append(statement)
+
+    login_as(admin)
+    db.event.listen(db.engine, 'before_cursor_execute', _record_writes)
+    try:
+        todo_payload = client.get('/oa/api/todos?status=pending').get_json()
+        stats_payload = client.get('/oa/api/dashboard-stats').get_json()['data']
+    finally:
+        db.event.remove(db.engine, 'before_cursor_execute', _record_writes)
+
+    assert all(item['id'] != feedback_todo.id for item in todo_payload['data'])
+    assert stats_payload['pending_todos'] == 0
+    assert write_statements == []
+    db.session.expire_all()
+    assert db.session.get(OATodo, feedback_todo.id).is_completed is False
+
+    assert client.post('/oa/api/internal/workflow-todos/reconcile/run').status_code == 503
+    app.config['SCF_WORKFLOW_JOB_TOKEN'] = 'workflow-token'
+    assert client.post(
+        '/oa/api/internal/workflow-todos/reconcile/run',
+        headers={'X-Workflow-Job-Token': 'wrong'},
+    ).status_code == 401
+
+    dry_run = client.post(
+        '/oa/api/internal/workflow-todos/reconcile/run',
+        json={'dry_run': True},
+        headers={'X-Workflow-Job-Token': 'workflow-token'},
+    ).get_json()['data']
+    assert dry_run['todo_ids'] == [feedback_todo.id]
+    db.session.expire_all()
+    assert db.session.get(OATodo, feedback_todo.id).is_completed is False
+
+    result = client.post(
+        '/oa/api/internal/workflow-todos/reconcile/run',
+        headers={'X-Workflow-Job-Token': 'workflow-token'},
+    ).get_json()['data']
+    assert result == {'reconciled': 1, 'todo_ids': [feedback_todo.id]}
+    db.session.expire_all()
+    refreshed_todo = db.session.get(OATodo, feedback_todo.id)
+    assert refreshed_todo.workflow_status == OATodo.WORKFLOW_STATUS_CANCELLED
+    assert refreshed_todo.is_completed is True
+
+
+def test_workflow_todo_reconcile_runs_after_commit_instead_of_inside_it(app):
+    import time
+
+    teacher = create_user(username='oa-p1-queue-teacher', display_name='QueueTeacher', role='teacher')
+    enrollment = create_enrollment(
+        teacher=teacher,
+        student_name='QueueStudent',
+        course_name='QueueCourse',
+        status='pending_schedule',
+    )
+    todo = create_todo(
+        title='排队清理',
+        responsible_person=teacher.display_name,
+        enrollment=enrollment,
+        todo_type=OATodo.TODO_TYPE_ENROLLMENT_REPLAN,
+        workflow_status=OATodo.WORKFLOW_STATUS_WAITING_TEACHER_PROPOSAL,
+    )
+    process_pending_workflow_reconcile()
+
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    db.event.listen(db.engine, 'before_cursor_execute', _record)
+    try:
+        db.session.delete(enrollment)
+        db.session.commit()
+    finally:
+        db.event.remove(db.engine, 'before_cursor_execute', _record)
+    # 提交本身不做全表扫描，只排队
+    assert not any('oa_todos' in statement and statement.lstrip().upper().startswith('SELECT') for statement in statements)
+    db.session.expire_all()
+    assert db.session.get(OATodo, todo.id).is_completed is False
+
+    assert process_pending_workflow_reconcile() == {'reconciled': 1, 'todo_ids': [todo.id]}
+    assert process_pending_workflow_reconcile() is None
+
+    # 开启异步时由后台线程执行
+    app.config['SCF_WORKFLOW_RECONCILE_ASYNC'] = True
+    other = create_enrollment(teacher=teacher, student_name='QueueStudent2', course_name='QueueCourse', status='pending_schedule')
+    other_todo = create_todo(
+        title='后台清理',
+        responsible_person=teacher.display_name,
+        enrollment=other,
+        todo_type=OATodo.TODO_TYPE_ENROLLMENT_REPLAN,
+        workflow_status=OATodo.WORKFLOW_STATUS_WAITING_TEACHER_PROPOSAL,
+    )
+    db.session.delete(other)
+    db.session.commit()
+    for _ in range(100):
+        db.session.expire_all()
+        if db.session.get(OATodo, other_todo.id).is_completed:
+            break
+        time.sleep(0.05)
+    assert db.session.get(OATodo, other_todo.id).workflow_status == OATodo.WORKFLOW_STATUS_CANCELLED
+
+
+def _build_bulk_import_workbook(week_count):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = '5月'
+    sheet['H1'] = 'todo'
+    first_monday = date(2026, 5, 4)
+    for week in range(week_count):
+        separator_row = 2 + week * 2
+        for weekday in range(7):
+            column = chr(ord('A') + weekday)
+            course_date = first_monday + timedelta(days=week * 7 + weekday)
+            sheet[f'{column}{separator_row}'] = int(to_excel(course_date))
+            sheet[f'{column}{separator_row + 1}'] = (
+                f'10:00-12:00 BulkTeacher\nBulkCourse AI\nBulkStudent{weekday}\n'
+                f'14:00-16:00 BulkTeacher\nBulkCourse AI\nBulkStudent{weekday}'
+            )
+            sheet[f'{column}{separator_row + 1}'].fill = ONLINE_IMPORT_FILL
+
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def test_excel_import_uses_preloaded_lookups_instead_of_per_row_queries(app, client, login_as):
+    admin = create_user(username='oa-p1-bulk-admin', display_name='BulkAdmin', role='admin')
+    teacher = create_user(username='oa-p1-bulk-teacher', display_name='BulkTeacher', role='teacher')
+    create_schedule(
+        teacher=teacher,
+        course_name='BulkExisting',
+        students='Other',
+        schedule_date=date(2026, 5, 6),
+        time_start='11:00',
+        time_end='13:00',
+    )
+    login_as(admin)
+
+    statements = []
+
+    def _count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    def _import(week_count, filename):
+        statements.clear()
+        db.event.listen(db.engine, 'before_cursor_execute', _count_statement)
+        try:
+            response = client.post(
+                '/oa/api/import-excel',
+                data={'file': (_build_bulk_import_workbook(week_count), filename)},
+                content_type='multipart/form-data',
+            )
+        finally:
+            db.event.remove(db.engine, 'before_cursor_execute', _count_statement)
+        assert response.status_code == 200
+        return response.get_json()['data'], len(statements)
+
+    small_summary, _ = _import(1, '2026-bulk-small.xlsx')
+    assert small_summary['schedules_created'] == 13
+    assert [row['conflicting_schedule_ids'] for row in small_summary['conflict_rows']] == [
+        [CourseSchedule.query.filter_by(course_name='BulkExisting').one().id]
+    ]
+
+    CourseSchedule.query.filter(CourseSchedule.import_run_id.isnot(None)).delete()
+    OATodo.query.filter_by(todo_type=OATodo.TODO_TYPE_EXCEL_IMPORT).delete()
+    db.session.commit()
+    _, small_count = _import(1, '2026-bulk-small.xlsx')
+    CourseSchedule.query.filter(CourseSchedule.import_run_id.isnot(None)).delete()
+    OATodo.query.filter_by(todo_type=OATodo.TODO_TYPE_EXCEL_IMPORT).delete()
+    db.session.commit()
+    large_summary, large_count = _import(4, '2026-bulk-large.xlsx')
+
+    assert large_summary['schedules_created'] == 55
+    assert large_summary['binding_todos_created'] == 55
+    # 插入语句按行数增长是正常的，读库次数不应随行数增长
+    small_reads = small_count - 2 * 13
+    large_reads = large_count - 2 * 55
+    assert large_reads == small_reads
+
+
+def test_excel_import_streams_workbook_rows_in_read_only_mode(app, tmp_path, monkeypatch):
+    import openpyxl
+
+    from modules.oa import services as oa_services
+
+    create_user(username='oa-p1-stream-teacher', display_name='BulkTeacher', role='teacher')
+    workbook_path = tmp_path / '2026-stream.xlsx'
+    workbook = openpyxl.load_workbook(_build_bulk_import_workbook(3))
+    workbook['5月']['A5'].fill = PatternFill(fill_type=None)
+    workbook['5月']['H3'] = '周例会'
+    workbook.create_sheet('备注')
+    workbook.save(workbook_path)
+
+    opened = []
+    real_load_workbook = openpyxl.load_workbook
+
+    def _spy_load_workbook(*args, **kwargs):
+        opened.append(real_load_workbook(*args, **kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr(oa_services.openpyxl, 'load_workbook', _spy_load_workbook)
+
+    items = oa_services.iter_schedule_workbook_items(str(workbook_path))
+    kind, first = next(items)
+    assert opened[0].read_only is True
+    assert kind == 'schedule'
+    assert first['date'] == date(2026, 5, 4)
+    assert first['delivery_mode'] == 'online'
+    items.close()
+
+    parsed = oa_services.import_schedule_from_excel(str(workbook_path))
+    assert all(book.read_only for book in opened)
+    assert len(parsed['schedules']) == 3 * 7 * 2 - 2
+    assert {item['teacher'] for item in parsed['schedules']} == {'BulkTeacher'}
+    assert parsed['warnings'] == ['5月!A5 缺少线上/线下颜色标记，已跳过导入']
+    assert [todo['title'] for todo in parsed['todos']] == ['周例会']
+    assert parsed['todos'][0]['due_date'] == date(2026, 5, 4)
+
+
+def test_excel_import_runs_as_background_job_with_progress_polling(app, client, login_as):
+    import time
+
+    admin = create_user(username='oa-p1-async-admin', display_name='AsyncAdmin', role='admin')
+    create_user(username='oa-p1-async-teacher', display_name='BulkTeacher', role='teacher')
+    app.config['SCF_SCHEDULE_IMPORT_ASYNC'] = True
+    login_as(admin)
+
+    response = client.post(
+        '/oa/api/import-excel',
+        data={'file': (_build_bulk_import_workbook(2), '2026-async.xlsx')},
+        content_type='multipart/form-data',
+    )
+    assert response.status_code == 202
+    job = response.get_json()['data']
+    assert job['status'] in {'pending', 'running', 'completed'}
+    status_url = job['status_url']
+    assert status_url == f'/oa/api/import-excel/{job["id"]}'
+
+    for _ in range(200):
+        job = client.get(status_url).get_json()['data']
+        if job['status'] in {'completed', 'failed'}:
+            break
+        time.sleep(0.05)
+
+    assert job['status'] == 'completed', job['summary']
+    assert job['progress'] == {'stage': 'completed', 'done': 28, 'total': 28}
+    assert job['summary']['schedules_created'] == 28
+    assert job['started_at'] and job['finished_at']
+    db.session.expire_all()
+    run = db.session.get(ScheduleImportRun, job['id'])
+    assert CourseSchedule.query.filter_by(import_run_id=run.id).count() == 28
+
+    assert client.get('/oa/api/import-excel/999999').status_code == 404
+
+
+def test_excel_import_rejects_overlapping_runs_and_fails_abandoned_ones(app, client, login_as):
+    import app_factory
+    from datetime import datetime
+
+    admin = create_user(username='oa-p1-busy-admin', display_name='BusyAdmin', role='admin')
+    create_user(username='oa-p1-busy-teacher', display_name='BulkTeacher', role='teacher')
+    login_as(admin)
+
+    running = ScheduleImportRun(
+        original_filename='running.xlsx',
+        uploaded_by=admin.id,
+        status=ScheduleImportRun.STATUS_RUNNING,
+        started_at=datetime.utcnow(),
+    )
+    db.session.add(running)
+    db.session.commit()
+
+    response = client.post(
+        '/oa/api/import-excel',
+        data={'file': (_build_bulk_import_workbook(1), '2026-busy.xlsx')},
+        content_type='multipart/form-data',
+    )
+    assert response.status_code == 409
+    payload = response.get_json()
+    assert payload['data']['id'] == running.id
+    assert payload['data']['status_url'] == f'/oa/api/import-excel/{running.id}'
+    assert ScheduleImportRun.query.count() == 1
+
+    # 开始时间超过期限、又不在本进程执行中的任务视为已中断
+    running.started_at = datetime.utcnow() - timedelta(seconds=app.config['SCF_SCHEDULE_IMPORT_STALE_SECONDS'] + 1)
+    db.session.commit()
+    response = client.post(
+        '/oa/api/import-excel',
+        data={'file': (_build_bulk_import_workbook(1), '2026-busy.xlsx')},
+        content_type='multipart/form-data',
+    )
+    assert response.status_code == 200, response.get_json()
+    db.session.expire_all()
+    assert running.status == ScheduleImportRun.STATUS_FAILED
+    assert '中断' in running.get_summary_data()['error']
+
+    # 启动时上一个进程遗留的任务不论新旧都记为失败
+    queued = ScheduleImportRun(original_filename='queued.xlsx', status=ScheduleImportRun.STATUS_PENDING)
+    db.session.add(queued)
+    db.session.commit()
+    app_factory._cleanup_expired()
+    db.session.expire_all()
+    assert queued.status == ScheduleImportRun.STATUS_FAILED
+    assert queued.finished_at is not None
+
+
+def test_excel_import_ignores_wrong_dimension_records(app, tmp_path):
+    import re
+    import zipfile
+
+    import openpyxl
+
+    from modules.oa import services as oa_services
+
+    create_user(username='oa-p1-dimension-teacher', display_name='BulkTeacher', role='teacher')
+    workbook = openpyxl.load_workbook(_build_bulk_import_workbook(3))
+    sheet = workbook['5月']
+    sheet['H5'], sheet['I5'], sheet['J5'], sheet['K5'] = '周例会', 1, '负责人', '备注'
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    source = zipfile.ZipFile(buffer)
+    workbook_path = tmp_path / '2026-dimension.xlsx'
+    # 模拟 WPS 等导出器：工作表记录的范围只到第 3 行
+    with zipfile.ZipFile(workbook_path, 'w') as target:
+        for info in source.infolist():
+            data = source.read(info.filename)
+            if info.filename.startswith('xl/worksheets/'):
+                data = re.sub(rb'<dimension ref="[^"]*"\s*/>', b'<dimension ref="A1:C3"/>', data)
+            target.writestr(info, data)
+
+    parsed = oa_services.import_schedule_from_excel(str(workbook_path))
+    assert len(parsed['schedules']) == 3 * 7 * 2
+    # 待办的 I-K 列（完成状态、负责人、备注）也要完整读出
+    assert [
+        {key: todo[key] for key in ('title', 'is_completed', 'responsible_person', 'notes')}
+        for todo in parsed['todos']
+    ] == [{'title': '周例会', 'is_completed': True, 'responsible_person': '负责人', 'notes': '备注'}]
@@ -473,3 +473,65 @@ def test_quick_shift_blocks_conflicts_but_admin_can_move_historical_schedule(cli
     payload = response.get_json()
     assert response.status_code == 200
     assert payload['data']['date'] == '2026-03-20'
+
+
+def test_oa_schedule_list_uses_batched_payloads_with_constant_queries(app, client, login_as):
+    from sqlalchemy import event
+
+    admin = create_user(username='oa-batch-admin', display_name='批量管理员', role='admin')
+    teacher = create_user(username='oa-batch-teacher', display_name='批量老师', role='teacher')
+    enrollment = create_enrollment(teacher=teacher, student_name='批量学生', status='confirmed')
+
+    def _seed(days):
+        for offset in range(days):
+            schedule = create_schedule(
+                teacher=teacher,
+                enrollment=enrollment,
+                students='批量学生',
+                schedule_date=date(2026, 3, 1 + offset),
+            )
+            if offset % 3 == 0:
+                create_leave_request(schedule=schedule, enrollment=enrollment, student_name='批量学生')
+            if offset % 4 == 0:
+                create_feedback(schedule=schedule, teacher=teacher, status='submitted')
+
+    statements = []
+
+    def _count_statement(*args, **kwargs):
+        statements.append(args[2])
+
+    login_as(admin)
+    _seed(4)
+    event.listen(db.engine, 'before_cursor_execute', _count_statement)
+    try:
+        response = client.get('/oa/api/schedules/by-date?start=2026-03-01&end=2026-03-31')
+        small_query_count = len(statements)
+        assert response.get_json()['total'] == 4
+
+        extra_schedules = [
+            create_schedule(
+                teacher=teacher,
+                enrollment=enrollment,
+                students='批量学生',
+                schedule_date=date(2026, 3, 10 + offset),
+            )
+            for offset in range(12)
+        ]
+        for schedule in extra_schedules[::2]:
+            create_leave_request(schedule=schedule, enrollment=enrollment, student_name='批量学生')
+
+        statements.clear()
+        response = client.get('/oa/api/schedules/by-date?start=2026-03-01&end=2026-03-31')
+        payload = response.get_json()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', _count_statement)
+
+    assert payload['total'] == 16
+    assert len(statements) == small_query_count
+
+    single_payloads = {}
+    for item in payload['data']:
+        response = client.get(f"/oa/api/schedules/{item['id']}")
+        single_payloads[item['id']] = response.get_json()['data']
+    for item in payload['data']:
+        assert item == single_payloads[item['id']]
@@ -1,8 +1,11 @@
-from datetime import date
+from datetime import date, datetime
 
+from extensions import db
 from modules.auth.models import ReminderDelivery, ReminderEvent
+from modules.oa import reminder_services
 from tests.factories import (
     create_external_identity,
+    create_leave_request,
     create_schedule,
     create_user,
 )
@@ -164,3 +167,114 @@ def test_reminders_are_actor_scoped_and_ack_removes_pending_item(client, app):
     )
     assert acked_feed.status_code == 200
     assert any(item['id'] == schedule_item['id'] for item in acked_feed.get_json()['data']['items'])
+
+
+def test_reminder_feed_pages_by_keyset_and_filters_acked_in_sql(client, app):
+    teacher = create_user(role='teacher', username='reminder-teacher-pages')
+    identity = create_external_identity(user=teacher, external_user_id='ou_reminder_teacher_pages')
+    created = [datetime(2026, 3, 10, 9, 0), datetime(2026, 3, 11, 9, 0), datetime(2026, 3, 11, 9, 0),
+               datetime(2026, 3, 12, 9, 0), datetime(2026, 3, 13, 9, 0)]
+    events = []
+    for index, created_at in enumerate(created):
+        event = ReminderEvent(
+            event_key=f'manual.page:{index}',
+            event_type='schedule.reschedule.apply',
+            target_user_id=teacher.id,
+            target_role='teacher',
+            scope_type='schedule',
+            scope_id=index + 1,
+            title=f'提醒{index}',
+            status='pending',
+            created_at=created_at,
+        )
+        db.session.add(event)
+        events.append(event)
+    db.session.add(ReminderEvent(
+        event_key='manual.page:cancelled',
+        event_type='schedule.reschedule.apply',
+        target_user_id=teacher.id,
+        target_role='teacher',
+        scope_type='schedule',
+        scope_id=99,
+        title='已取消',
+        status='cancelled',
+    ))
+    db.session.commit()
+    event_ids = [event.id for event in events]
+
+    ack = client.post(
+        '/oa/api/integration/openclaw/reminders/ack',
+        json={**_identity_params(identity), 'request_id': 'req-page-ack', 'event_ids': [event_ids[3]]},
+        headers=_headers(app),
+    )
+    assert ack.status_code == 200
+
+    seen = []
+    cursor = None
+    while True:
+        params = {**_identity_params(identity), 'limit': 2}
+        if cursor is not None:
+            params['cursor'] = cursor
+        data = client.get('/oa/api/integration/openclaw/reminders', query_string=params, headers=_headers(app)).get_json()['data']
+        assert data['total'] == 4
+        seen.extend(item['id'] for item in data['items'])
+        assert all(item['delivery_status'] == 'pending' for item in data['items'])
+        cursor = data['next_cursor']
+        if not data['has_more']:
+            break
+    assert seen == [event_ids[4], event_ids[2], event_ids[1], event_ids[0]]
+    assert ReminderDelivery.query.filter_by(receiver_external_id=identity.external_user_id).count() == 5
+
+    acked = client.get(
+        '/oa/api/integration/openclaw/reminders',
+        query_string={**_identity_params(identity), 'status': 'acked'},
+        headers=_headers(app),
+    ).get_json()['data']
+    assert [item['id'] for item in acked['items']] == [event_ids[3]]
+    assert acked['total'] == 1 and acked['has_more'] is False
+
+
+def test_snapshot_reminders_resync_only_after_relevant_changes(client, app, monkeypatch):
+    teacher = create_user(role='teacher', username='reminder-teacher-sync')
+    other_teacher = create_user(role='teacher', username='reminder-teacher-other')
+    identity = create_external_identity(user=teacher, external_user_id='ou_reminder_teacher_sync')
+    schedule = create_schedule(teacher=teacher, course_name='Physics', schedule_date=date(2026, 3, 20))
+    other_schedule = create_schedule(teacher=other_teacher, course_name='Biology', schedule_date=date(2026, 3, 20))
+    leave = create_leave_request(schedule=schedule)
+
+    synced = []
+    original_sync = reminder_services.sync_actor_snapshot_reminders
+
+    def _sync(actor):
+        synced.append(actor.id)
+        return original_sync(actor)
+
+    monkeypatch.setattr(reminder_services, 'sync_actor_snapshot_reminders', _sync)
+
+    def _leave_items():
+        response = client.get(
+            '/oa/api/integration/openclaw/reminders',
+            query_string=_identity_params(identity),
+            headers=_headers(app),
+        )
+        assert response.status_code == 200
+        return [item for item in response.get_json()['data']['items'] if item['event_type'] == 'leave.request']
+
+    assert [item['scope_id'] for item in _leave_items()] == [leave.id]
+    assert synced == [teacher.id]
+
+    assert len(_leave_items()) == 1
+    other_schedule.time_start = '11:00'
+    db.session.commit()
+    assert len(_leave_items()) == 1
+    assert synced == [teacher.id]
+
+    leave.status = 'approved'
+    db.session.commit()
+    assert _leave_items() == []
+    assert synced == [teacher.id, teacher.id]
+    assert ReminderEvent.query.filter_by(scope_type='leave_request', scope_id=leave.id).one().status == 'cancelled'
+
+    app.config['SCF_REMINDER_RESYNC_SECONDS'] = 0
+    _leave_items()
+    assert synced == [teacher.id, teacher.id, teacher.id]
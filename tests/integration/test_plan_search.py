@@ -0,0 +1,338 @@
+import json
+from datetime import date, timedelta
+from itertools import combinations
+
+import pytest
+
+from extensions import db
+from modules.auth.models import Enrollment
+from modules.auth.services import (
+    _build_plan,
+    _build_session_dates,
+    _candidate_pool_for_enrollment,
+    _collect_manual_plan_issues,
+    _expand_session_dates,
+    _first_occurrence_on_or_after,
+    _get_total_sessions,
+    _load_student_excluded_dates,
+    _plan_sort_key,
+    _slot_signature,
+    _slot_sort_key,
+    find_matching_slots,
+    get_business_today,
+    normalize_plan,
+    refresh_enrollment_scheduling_ai_state,
+)
+from tests.factories import (
+    create_enrollment,
+    create_schedule,
+    create_student_profile,
+    create_teacher_availability,
+    create_user,
+)
+
+
+pytestmark = pytest.mark.integration
+
+
+def _build_enrollment():
+    teacher = create_user(username='search-teacher', display_name='搜索老师', role='teacher')
+    other_teacher = create_user(username='search-other-teacher', display_name='其他老师', role='teacher')
+    student = create_user(username='search-student', display_name='搜索学生', role='student')
+    for day in range(5):
+        create_teacher_availability(user=teacher, day_of_week=day, time_start='08:00', time_end='11:00', is_preferred=day == 3)
+    profile = create_student_profile(
+        user=student,
+        name='搜索学生',
+        available_slots=[{'day': day, 'start': '08:00', 'end': '11:00'} for day in range(4)],
+        excluded_dates=['2026-03-24'],
+    )
+    enrollment = create_enrollment(
+        teacher=teacher,
+        student_name='搜索学生',
+        course_name='搜索课程',
+        student_profile=profile,
+        status='pending_schedule',
+        total_hours=24,
+        hours_per_session=2.0,
+        sessions_per_week=3,
+    )
+    other_enrollment = create_enrollment(
+        teacher=other_teacher,
+        student_name='搜索学生',
+        course_name='其他课程',
+        student_profile=profile,
+    )
+    # 第三周周三学生有别的课，两个周三时段都不能用
+    create_schedule(
+        teacher=other_teacher,
+        course_name='其他课程',
+        students='搜索学生',
+        enrollment=other_enrollment,
+        schedule_date=date(2026, 4, 1),
+        time_start='09:30',
+        time_end='10:30',
+    )
+    # 报名自己已有的课次在校验时忽略
+    create_schedule(
+        teacher=teacher,
+        course_name='搜索课程',
+        students='搜索学生',
+        enrollment=enrollment,
+        schedule_date=date(2026, 3, 19),
+        time_start='09:00',
+        time_end='11:00',
+    )
+    db.session.commit()
+    return enrollment
+
+
+def _brute_force_plans(enrollment, limit=3):
+    candidate_pool, _, _ = _candidate_pool_for_enrollment(enrollment)
+    required_weekly = enrollment.sessions_per_week
+    total_sessions = _get_total_sessions(enrollment)
+    excluded_set = _load_student_excluded_dates(enrollment.student_profile)
+    top_candidates = candidate_pool[: max(required_weekly + 6, 8)]
+    valid_plans = []
+    for combo in combinations(top_candidates, required_weekly):
+        selected_blocks = sorted(combo, key=_slot_sort_key)
+        plan = normalize_plan(_build_plan(selected_blocks, total_sessions, excluded_set), enrollment)
+        errors, _ = _collect_manual_plan_issues(enrollment, plan['session_dates'], weekly_slots=selected_blocks)
+        if not errors:
+            valid_plans.append(plan)
+    return sorted(valid_plans, key=_plan_sort_key)[:limit]
+
+
+def test_plan_search_matches_per_combination_validation_without_per_combination_queries(app):
+    enrollment = _build_enrollment()
+    expected = _brute_force_plans(enrollment)
+
+    statements = []
+
+    def _listener(conn, cursor, statement, parameters, context, executemany):
+        if 'course_schedules' in statement:
+            statements.append(statement)
+
+    db.event.listen(db.engine, 'before_cursor_execute', _listener)
+    try:
+        state = refresh_enrollment_scheduling_ai_state(enrollment)
+    finally:
+        db.event.remove(db.engine, 'before_cursor_execute', _listener)
+
+    plans = state['proposed_plans']
+    assert len(statements) <= 3
+    assert len(plans) == 3
+    assert [_plan_sort_key(plan) for plan in plans] == [_plan_sort_key(plan) for plan in expected]
+    assert [plan['session_dates'] for plan in plans] == [plan['session_dates'] for plan in expected]
+    assert state['recommended_bundle'] == plans[0]
+
+    used_slots = {_slot_signature(slot) for plan in plans for slot in plan['weekly_slots']}
+    assert not any(day == 2 for day, _, _ in used_slots)
+    assert (0, '08:00', '10:00') not in used_slots
+    assert all(
+        session['date'] != '2026-03-24'
+        for plan in plans
+        for session in plan['session_dates']
+    )
+
+
+def test_find_matching_slots_returns_best_plans_first(app):
+    enrollment = _build_enrollment()
+
+    plans, error = find_matching_slots(enrollment.id)
+
+    assert error is None
+    assert plans == sorted(plans, key=_plan_sort_key)
+    assert plans[0]['sessions_per_week'] == 3
+    assert plans[0]['total_sessions'] == 12
+
+
+def test_candidate_pool_penalizes_teacher_conflicts_inside_the_plan_horizon(app):
+    teacher = create_user(username='horizon-teacher', display_name='规划期老师', role='teacher')
+    student = create_user(username='horizon-student', display_name='规划期学生', role='student')
+    for day in range(4):
+        create_teacher_availability(user=teacher, day_of_week=day, time_start='10:00', time_end='12:00')
+    profile = create_student_profile(
+        user=student,
+        name='规划期学生',
+        available_slots=[{'day': day, 'start': '10:00', 'end': '12:00'} for day in range(4)],
+    )
+    enrollment = create_enrollment(
+        teacher=teacher,
+        student_name='规划期学生',
+        course_name='规划期课程',
+        student_profile=profile,
+        status='pending_schedule',
+        total_hours=8,
+        hours_per_session=2.0,
+        sessions_per_week=2,
+        target_finish_date=date(2026, 5, 1),
+    )
+    # 一年前的周一、规划期之后的周三都不影响；规划期内周二撞一次保留扣分，周四撞三次剔除
+    for schedule_date in (
+        date(2025, 3, 17),
+        date(2026, 3, 24),
+        date(2026, 9, 2),
+        date(2026, 3, 19),
+        date(2026, 3, 26),
+        date(2026, 4, 2),
+    ):
+        create_schedule(teacher=teacher, course_name='旧课', students='别的学生', schedule_date=schedule_date)
+    db.session.commit()
+
+    candidate_pool, _, _ = _candidate_pool_for_enrollment(enrollment)
+
+    assert [
+        (slot['day_of_week'], slot['time_start'], slot['conflict_dates'], slot['score'])
+        for slot in candidate_pool
+    ] == [(0, '10:00', 0, 6), (2, '10:00', 0, 6), (1, '10:00', 1, 4)]
+    assert [item['date'] for item in candidate_pool[2]['conflicts']] == ['2026-03-24']
+
+    result = refresh_enrollment_scheduling_ai_state(enrollment)
+    assert {slot['day_of_week'] for slot in result['recommended_bundle']['weekly_slots']} == {0, 2}
+
+
+def test_batch_replan_reserves_slots_for_urgent_enrollments_first(app, client):
+    teacher = create_user(username='batch-teacher', display_name='批量老师', role='teacher')
+    for day in (0, 1):
+        create_teacher_availability(user=teacher, day_of_week=day, time_start='10:00', time_end='12:00')
+    enrollments = []
+    for index, (days, urgency, target) in enumerate((((0, 1), 'normal', None), ((0,), 'rush', date(2026, 5, 1)))):
+        student = create_user(username=f'batch-student-{index}', display_name=f'批量学生{index}', role='student')
+        profile = create_student_profile(
+            user=student,
+            name=f'批量学生{index}',
+            available_slots=[{'day': day, 'start': '10:00', 'end': '12:00'} for day in days],
+        )
+        enrollment = create_enrollment(
+            teacher=teacher,
+            student_name=f'批量学生{index}',
+            student_profile=profile,
+            status='pending_schedule',
+            total_hours=8,
+            hours_per_session=2.0,
+            sessions_per_week=1,
+        )
+        enrollment.delivery_urgency = urgency
+        enrollment.target_finish_date = target
+        enrollments.append(enrollment)
+    db.session.commit()
+    normal_id, rush_id = (enrollment.id for enrollment in enrollments)
+    url = '/oa/api/internal/enrollments/replan/run'
+
+    assert client.post(url).status_code == 503
+    app.config['SCF_SCHEDULING_JOB_TOKEN'] = 'scheduling-token'
+    headers = {'X-Scheduling-Job-Token': 'scheduling-token'}
+    assert client.post(url, headers={'X-Scheduling-Job-Token': 'wrong'}).status_code == 401
+    assert client.post(url, json={'enrollment_ids': 'all'}, headers=headers).status_code == 400
+    empty = client.post(url, json={'enrollment_ids': []}, headers=headers).get_json()['data']
+    assert empty['replanned'] == 0 and empty['enrollments'] == [] and empty['committed_chunks'] == 0
+    db.session.expire_all()
+    assert all(db.session.get(Enrollment, enrollment.id).recommended_bundle is None for enrollment in enrollments)
+
+    dry_run = client.post(url, json={'dry_run': True}, headers=headers).get_json()['data']
+    assert [item['enrollment_id'] for item in dry_run['enrollments']] == [rush_id, normal_id]
+    db.session.expire_all()
+    assert db.session.get(Enrollment, normal_id).recommended_bundle is None
+
+    result = client.post(url, headers=headers).get_json()['data']
+    assert result['replanned'] == 2 and result['recommended'] == 2
+    db.session.expire_all()
+    bundles = {
+        enrollment_id: json.loads(db.session.get(Enrollment, enrollment_id).recommended_bundle)
+        for enrollment_id in (normal_id, rush_id)
+    }
+    assert [slot['day_of_week'] for slot in bundles[rush_id]['weekly_slots']] == [0]
+    assert [slot['day_of_week'] for slot in bundles[normal_id]['weekly_slots']] == [1]
+
+
+def test_timetable_preview_moves_an_urgent_enrollment_to_free_the_only_slot_of_another(client, login_as):
+    admin = create_user(username='timetable-admin', display_name='联合排课教务', role='admin')
+    teacher = create_user(username='timetable-teacher', display_name='联合排课老师', role='teacher')
+    for day in (0, 1):
+        create_teacher_availability(user=teacher, day_of_week=day, time_start='10:00', time_end='12:00')
+    enrollments = []
+    for index, (days, urgency) in enumerate((((0, 1), 'rush'), ((0,), 'normal'))):
+        student = create_user(username=f'timetable-student-{index}', display_name=f'联合学生{index}', role='student')
+        profile = create_student_profile(
+            user=student,
+            name=f'联合学生{index}',
+            available_slots=[{'day': day, 'start': '10:00', 'end': '12:00'} for day in days],
+        )
+        enrollment = create_enrollment(
+            teacher=teacher,
+            student_name=f'联合学生{index}',
+            student_profile=profile,
+            status='pending_schedule',
+            total_hours=8,
+            hours_per_session=2.0,
+            sessions_per_week=1,
+        )
+        enrollment.delivery_urgency = urgency
+        enrollments.append(enrollment)
+    enrollments[0].target_finish_date = date(2026, 5, 1)
+    db.session.commit()
+    rush_id, normal_id = (enrollment.id for enrollment in enrollments)
+
+    login_as(teacher)
+    assert client.post('/auth/api/enrollments/timetable/preview', json={}).status_code == 403
+    login_as(admin)
+    empty = client.post('/auth/api/enrollments/timetable/preview', json={'enrollment_ids': []}).get_json()['data']
+    assert empty['enrollments'] == [] and empty['assigned'] == 0
+    response = client.post('/auth/api/enrollments/timetable/preview', json={'enrollment_ids': [rush_id, normal_id]})
+    assert response.status_code == 200
+    data = response.get_json()['data']
+
+    assert data['assigned'] == 2 and data['unassigned'] == 0
+    items = {item['enrollment_id']: item for item in data['enrollments']}
+    assert items[rush_id]['priority'] == 1
+    assert [slot['day_of_week'] for slot in items[rush_id]['plan']['weekly_slots']] == [1]
+    assert items[rush_id]['is_independent_best'] is False
+    assert [slot['day_of_week'] for slot in items[normal_id]['plan']['weekly_slots']] == [0]
+    db.session.expire_all()
+    assert db.session.get(Enrollment, rush_id).recommended_bundle is None
+    assert db.session.get(Enrollment, normal_id).proposed_slots is None
+
+
+def _reference_session_dates(weekly_slots, total_sessions, excluded_set):
+    sorted_slots = sorted(weekly_slots, key=_slot_sort_key)
+    first_dates = [_first_occurrence_on_or_after(slot['day_of_week'], get_business_today()) for slot in sorted_slots]
+    session_dates, skipped_dates = [], []
+    week_idx = 0
+    while len(session_dates) < total_sessions and week_idx < total_sessions + len(excluded_set) + 52:
+        for slot, first_date in zip(sorted_slots, first_dates):
+            payload = {
+                'date': (first_date + timedelta(weeks=week_idx)).isoformat(),
+                'day_of_week': slot['day_of_week'],
+                'time_start': slot['time_start'],
+                'time_end': slot['time_end'],
+            }
+            if payload['date'] in excluded_set:
+                skipped_dates.append(payload)
+                continue
+            session_dates.append(payload)
+            if len(session_dates) >= total_sessions:
+                break
+        week_idx += 1
+    return session_dates, skipped_dates
+
+
+@pytest.mark.parametrize('days, total_sessions, excluded_set', [
+    ((0,), 5, set()),
+    ((0, 2, 4), 10, {'2026-03-16', '2026-03-25', '2026-04-03', '2026-04-06', '2026-03-17', 'not-a-date'}),
+    ((3, 3, 1), 7, {'2026-03-19', '2026-03-26', '2026-3-24'}),
+    ((1, 5), 4, {'2026-03-24', '2026-03-28', '2026-03-31', '2026-04-04', '2026-04-07'}),
+    ((6,), 3, {(date(2026, 3, 22) + timedelta(weeks=week)).isoformat() for week in range(60)}),
+    ((0, 1), 0, {'2026-03-16'}),
+])
+def test_session_date_expansion_matches_week_by_week_rotation(app, days, total_sessions, excluded_set):
+    slots = [
+        {'day_of_week': day, 'time_start': f'{10 + index:02d}:00', 'time_end': f'{11 + index:02d}:00'}
+        for index, day in enumerate(days)
+    ]
+    _expand_session_dates.cache_clear()
+
+    expected = _reference_session_dates(slots, total_sessions, excluded_set)
+    assert _build_session_dates(slots, total_sessions, excluded_set) == expected
+    assert _build_session_dates(slots, total_sessions, excluded_set) == expected
+    assert _expand_session_dates.cache_info().hits == 1
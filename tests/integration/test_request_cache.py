@@ -0,0 +1,187 @@
+import pytest
+from flask import g
+
+from datetime import date, datetime, timedelta
+
+from core.request_cache import request_memoized
+from extensions import db
+from modules.auth.models import Enrollment
+from modules.auth.services import FEEDBACK_PREFIX, _teacher_work_context, build_enrollment_payload
+from modules.oa.models import CourseSchedule
+from tests.factories import (
+    create_chat_message,
+    create_enrollment,
+    create_feedback,
+    create_schedule,
+    create_student_profile,
+    create_teacher_availability,
+    create_user,
+)
+
+
+pytestmark = pytest.mark.integration
+
+
+def _capture_selects():
+    statements = []
+
+    def _listener(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append(statement)
+
+    return statements, _listener
+
+
+def test_request_memo_reuses_helper_results_until_commit(app):
+    teacher = create_user(username='memo-teacher', display_name='缓存老师', role='teacher')
+    create_teacher_availability(user=teacher)
+
+    with app.test_request_context('/'):
+        first = _teacher_work_context(teacher)
+
+        statements, listener = _capture_selects()
+        db.event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            second = _teacher_work_context(teacher.id)
+        finally:
+            db.event.remove(db.engine, 'before_cursor_execute', listener)
+        assert statements == []
+        assert second == first
+        second['default_working_template'].append({'day': 0})
+        assert _teacher_work_context(teacher)['default_working_template'] == first['default_working_template']
+
+        teacher.teacher_work_mode = 'full_time'
+        assert _teacher_work_context(teacher)['teacher_work_mode'] == 'full_time'
+        db.session.commit()
+        assert _teacher_work_context(teacher)['availability_source'] == 'company_template'
+
+
+def test_request_memo_is_request_scoped_and_opt_in(app, client):
+    calls = []
+
+    @request_memoized(key=lambda value: value)
+    def _double(value):
+        calls.append(value)
+        return value * 2
+
+    assert _double(2) == 4 and _double(2) == 4
+    assert calls == [2, 2]
+
+    with app.test_request_context('/'):
+        assert _double(3) == 6 and _double(3) == 6
+        assert _double([3]) == [3, 3]
+    assert calls == [2, 2, 3, [3]]
+
+    client.get('/auth/login')
+    assert getattr(g, '_scf_request_memo', None) is None
+
+
+def test_request_memo_survives_writes_to_unrelated_tables(app):
+    teacher = create_user(username='memo-flush-teacher', display_name='缓存老师', role='teacher')
+    create_teacher_availability(user=teacher)
+    enrollment = create_enrollment(teacher=teacher, student_name='缓存学生')
+
+    with app.test_request_context('/'):
+        _teacher_work_context(teacher.id)
+
+        enrollment.notes = '只改报名备注'
+        db.session.flush()
+        statements, listener = _capture_selects()
+        db.event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            _teacher_work_context(teacher.id)
+        finally:
+            db.event.remove(db.engine, 'before_cursor_execute', listener)
+        assert statements == []
+
+        db.session.query(CourseSchedule).filter(CourseSchedule.id == -1).update(
+            {'notes': 'x'}, synchronize_session=False
+        )
+        teacher.teacher_work_mode = 'full_time'
+        db.session.flush()
+        assert _teacher_work_context(teacher.id)['teacher_work_mode'] == 'full_time'
+
+        db.session.query(type(teacher)).filter_by(id=teacher.id).update(
+            {'teacher_work_mode': 'part_time'}, synchronize_session=False
+        )
+        db.session.expire(teacher)
+        assert _teacher_work_context(teacher.id)['teacher_work_mode'] == 'part_time'
+        db.session.rollback()
+
+
+def _seed_enrollments(count):
+    admin = create_user(username='memo-admin', role='admin')
+    teacher = create_user(username='memo-list-teacher', display_name='列表老师', role='teacher')
+    create_teacher_availability(user=teacher)
+    for index in range(count):
+        profile = create_student_profile(name=f'列表学生{index}')
+        enrollment = create_enrollment(
+            teacher=teacher,
+            student_name=profile.name,
+            student_profile=profile,
+            status='pending_schedule',
+        )
+        if index % 5 == 0:
+            schedule = create_schedule(
+                teacher=teacher,
+                students=profile.name,
+                schedule_date=date(2026, 3, 9) + timedelta(days=index),
+                enrollment=enrollment,
+            )
+            create_feedback(
+                schedule=schedule,
+                teacher=teacher,
+                status='submitted',
+                submitted_at=datetime(2026, 3, 10, 12, 0),
+            )
+            create_chat_message(
+                sender=admin,
+                receiver=teacher,
+                enrollment=enrollment,
+                content=f'{FEEDBACK_PREFIX} 周末不方便',
+            )
+    return admin
+
+
+@pytest.mark.parametrize('url', ['/auth/api/enrollments', '/auth/api/admin/action-center'])
+def test_enrollment_list_endpoints_do_not_query_per_enrollment(app, client, login_as, url):
+    enrollment_count = 20
+    admin = _seed_enrollments(enrollment_count)
+    login_as(admin)
+
+    statements, listener = _capture_selects()
+    db.event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        response = client.get(url)
+    finally:
+        db.event.remove(db.engine, 'before_cursor_execute', listener)
+
+    assert response.status_code == 200
+    # 逐条组装时每个报名约 5~6 条 SELECT（20 个报名 120 条以上），批量后与报名数无关
+    assert len(statements) < enrollment_count, statements
+
+
+def test_batched_enrollment_payloads_match_single_payloads(app, client, login_as):
+    admin = _seed_enrollments(6)
+    login_as(admin)
+
+    listed = client.get('/auth/api/enrollments').get_json()['data']
+    with app.test_request_context('/'):
+        single = {
+            enrollment.id: build_enrollment_payload(enrollment, admin)
+            for enrollment in Enrollment.query.all()
+        }
+    for item in listed:
+        expected = single[item['id']]
+        for key in (
+            'scheduled_count',
+            'completed_count',
+            'latest_teacher_feedback',
+            'latest_feedback',
+            'has_unread_feedback',
+            'student_profile',
+            'workflow_todos',
+        ):
+            assert item[key] == expected[key], key
+    assert sum(item['completed_count'] for item in listed) == 2
+    assert sum(bool(item['latest_feedback']) for item in listed) == 2
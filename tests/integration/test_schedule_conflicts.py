@@ -0,0 +1,113 @@
+from datetime import date
+
+import pytest
+
+from extensions import db
+from modules.auth.services import _collect_manual_plan_issues
+from modules.oa.agent.tools import execute_tool
+from modules.oa.schedule_conflicts import ScheduleOccupancy
+from modules.oa.services import find_schedule_conflicts
+from tests.factories import create_enrollment, create_schedule, create_student_profile, create_user
+
+
+pytestmark = pytest.mark.integration
+
+
+def _count_selects():
+    statements = []
+
+    def _listener(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append(statement)
+
+    return statements, _listener
+
+
+def test_schedule_occupancy_answers_overlaps_per_day_and_skips_cancelled(app):
+    teacher = create_user(username='conflict-teacher', display_name='ConflictTeacher', role='teacher')
+    day = date(2026, 3, 20)
+    long_block = create_schedule(teacher=teacher, schedule_date=day, time_start='08:00', time_end='12:00')
+    short_block = create_schedule(teacher=teacher, schedule_date=day, time_start='13:00', time_end='14:00')
+    cancelled = create_schedule(teacher=teacher, schedule_date=day, time_start='15:00', time_end='16:00')
+    cancelled.is_cancelled = True
+    db.session.commit()
+    create_schedule(teacher=teacher, schedule_date=date(2026, 3, 21), time_start='10:00', time_end='11:00')
+
+    occupancy = ScheduleOccupancy.load(date_start=day, date_end=day, teacher_id=teacher.id)
+
+    assert occupancy.overlapping(day, '11:30', '13:30') == [long_block, short_block]
+    assert occupancy.overlapping(day, '12:00', '13:00') == []
+    assert occupancy.overlapping(day, '10:00', '10:30', exclude_schedule_ids=[long_block.id]) == []
+    assert occupancy.is_free(day, '15:00', '16:00')
+    assert occupancy.is_free(date(2026, 3, 21), '10:00', '11:00')
+
+
+def test_find_schedule_conflicts_loads_all_dimensions_in_one_query(app):
+    teacher = create_user(username='conflict-owner', display_name='ConflictOwner', role='teacher')
+    other_teacher = create_user(username='conflict-other', display_name='ConflictOther', role='teacher')
+    profile = create_student_profile(name='ConflictStudent')
+    enrollment = create_enrollment(teacher=teacher, student_name='ConflictStudent', student_profile=profile)
+    sibling_enrollment = create_enrollment(
+        teacher=other_teacher,
+        student_name='ConflictStudent',
+        course_name='Sibling',
+        student_profile=profile,
+    )
+    day = date(2026, 3, 20)
+    teacher_busy = create_schedule(teacher=teacher, schedule_date=day, time_start='09:00', time_end='10:00')
+    student_busy = create_schedule(
+        teacher=other_teacher,
+        schedule_date=day,
+        time_start='09:30',
+        time_end='11:00',
+        enrollment=sibling_enrollment,
+    )
+    create_schedule(teacher=other_teacher, schedule_date=day, time_start='09:00', time_end='10:00')
+
+    statements, listener = _count_selects()
+    db.event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        conflicts = find_schedule_conflicts(
+            course_date=day,
+            time_start='09:00',
+            time_end='10:30',
+            teacher_id=teacher.id,
+            teacher_name=teacher.display_name,
+            enrollment_id=enrollment.id,
+        )
+    finally:
+        db.event.remove(db.engine, 'before_cursor_execute', listener)
+
+    assert conflicts['error'] is None
+    assert conflicts['teacher'] == [teacher_busy]
+    assert conflicts['student'] == [student_busy]
+    assert conflicts['all'] == [teacher_busy, student_busy]
+    schedule_selects = [statement for statement in statements if 'FROM course_schedules' in statement]
+    assert len(schedule_selects) == 1
+
+
+def test_manual_plan_and_agent_slot_search_share_occupancy(app):
+    teacher = create_user(username='conflict-plan-teacher', display_name='PlanTeacher', role='teacher')
+    enrollment = create_enrollment(teacher=teacher, student_name='PlanStudent', sessions_per_week=1, total_hours=2)
+    day = date(2026, 3, 23)
+    create_schedule(teacher=teacher, schedule_date=day, time_start='10:00', time_end='12:00')
+    cancelled = create_schedule(teacher=teacher, schedule_date=day, time_start='14:00', time_end='16:00')
+    cancelled.is_cancelled = True
+    db.session.commit()
+
+    errors, _ = _collect_manual_plan_issues(enrollment, [
+        {'date': day.isoformat(), 'day_of_week': day.weekday(), 'time_start': '11:00', 'time_end': '13:00'},
+    ])
+    assert any('与老师现有课程冲突' in error for error in errors)
+
+    result = execute_tool('find_available_slots', {
+        'teacher': 'PlanTeacher',
+        'date_start': day.isoformat(),
+        'date_end': day.isoformat(),
+        'duration_hours': 2,
+        'student_available_slots': [
+            {'day_of_week': day.weekday(), 'time_start': '10:00', 'time_end': '12:00'},
+            {'day_of_week': day.weekday(), 'time_start': '14:00', 'time_end': '16:00'},
+        ],
+    })
+    assert [(slot['time_start'], slot['time_end']) for slot in result['available_slots']] == [('14:00', '16:00')]
@@ -230,6 +230,11 @@ def test_run_once_migrations_applies_enrollment_v4_before_schedule_delivery_sms(
         '_backfill_schedule_delivery_sms_v3',
         lambda: calls.append('backfill:v3'),
     )
+    monkeypatch.setattr(
+        migrations_once,
+        '_backfill_schedule_feedback_pending',
+        lambda: calls.append('backfill:feedback-pending'),
+    )
     monkeypatch.setattr(migrations_once, '_mark_applied', lambda name: calls.append(f'mark:{name}'))
 
     migrations_once.run_once_migrations()
@@ -240,6 +245,8 @@ def test_run_once_migrations_applies_enrollment_v4_before_schedule_delivery_sms(
         'mark:enrollment_ai_scheduling_v4',
         'backfill:v3',
         'mark:oa_schedule_delivery_sms_v3',
+        'backfill:feedback-pending',
+        'mark:schedule_feedback_pending_v1',
     ]
 
 
@@ -0,0 +1,112 @@
+from datetime import date
+
+import pytest
+
+from extensions import db
+from tests.factories import create_enrollment, create_schedule, create_user
+
+
+pytestmark = pytest.mark.integration
+
+
+def _capture_selects():
+    statements = []
+
+    def _listener(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and 'course_schedules' in statement:
+            statements.append(statement)
+
+    return statements, _listener
+
+
+def _build_history(teacher):
+    enrollment = create_enrollment(teacher=teacher, student_name='进度学生', course_name='进度课程')
+    sessions = [
+        create_schedule(
+            teacher=teacher,
+            course_name='进度课程',
+            students='进度学生',
+            enrollment=enrollment,
+            schedule_date=schedule_date,
+        )
+        for schedule_date in (date(2026, 1, 5), date(2026, 2, 2), date(2026, 3, 2), date(2026, 3, 9), date(2026, 4, 6))
+    ]
+    cancelled = create_schedule(
+        teacher=teacher,
+        course_name='进度课程',
+        students='进度学生',
+        enrollment=enrollment,
+        schedule_date=date(2026, 3, 5),
+    )
+    cancelled.is_cancelled = True
+    legacy = [
+        create_schedule(teacher=teacher, course_name='旧课', students='旧学生', schedule_date=schedule_date)
+        for schedule_date in (date(2026, 2, 10), date(2026, 3, 10))
+    ]
+    single = create_schedule(teacher=teacher, course_name='单节', students='单学生', schedule_date=date(2026, 3, 11))
+    db.session.commit()
+    return sessions, cancelled, legacy, single
+
+
+def test_schedule_progress_numbers_whole_group_but_returns_window(app, client, login_as):
+    admin = create_user(username='progress-admin', display_name='进度教务', role='admin')
+    teacher = create_user(username='progress-teacher', display_name='进度老师', role='teacher')
+    sessions, cancelled, legacy, single = _build_history(teacher)
+    login_as(admin)
+
+    response = client.get('/oa/api/schedules/progress?start=2026-03-01&end=2026-03-31')
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert set(data) == {str(sessions[2].id), str(sessions[3].id), str(legacy[1].id)}
+    assert data[str(sessions[2].id)] == {'current': 3, 'total': 5, 'is_ending': True}
+    assert data[str(legacy[1].id)] == {'current': 2, 'total': 2, 'is_ending': True}
+
+    full = client.get('/oa/api/schedules/progress').get_json()['data']
+    assert full[str(sessions[0].id)] == {'current': 1, 'total': 5, 'is_ending': False}
+    assert str(cancelled.id) not in full and str(single.id) not in full
+
+    assert client.get('/oa/api/schedules/progress?start=2026-13-01').status_code == 400
+
+
+def test_schedule_progress_cache_is_reused_and_invalidated_on_commit(app, client, login_as):
+    admin = create_user(username='progress-cache-admin', display_name='缓存教务', role='admin')
+    teacher = create_user(username='progress-cache-teacher', display_name='缓存老师', role='teacher')
+    sessions, cancelled, _, _ = _build_history(teacher)
+    login_as(admin)
+    url = '/oa/api/schedules/progress?start=2026-03-01&end=2026-03-31'
+    client.get(url)
+
+    statements, listener = _capture_selects()
+    db.event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        cached = client.get(url).get_json()['data']
+    finally:
+        db.event.remove(db.engine, 'before_cursor_execute', listener)
+    assert len(statements) == 1
+    assert 'row_number' not in statements[0].lower()
+    assert cached[str(sessions[3].id)]['current'] == 4
+
+    cancelled.is_cancelled = False
+    db.session.commit()
+    refreshed = client.get(url).get_json()['data']
+    assert refreshed[str(cancelled.id)] == {'current': 4, 'total': 6, 'is_ending': True}
+    assert refreshed[str(sessions[3].id)]['current'] == 5
+
+    sessions[0].enrollment_id = None
+    db.session.commit()
+    assert client.get(url).get_json()['data'][str(sessions[3].id)]['current'] == 4
+
+
+def test_external_schedule_progress_keeps_text_grouping(app, client):
+    teacher = create_user(username='progress-ext-teacher', display_name='外部进度老师', role='teacher')
+    sessions, cancelled, legacy, _ = _build_history(teacher)
+
+    response = client.get(
+        '/oa/api/external/schedules/progress?start=2026-03-01&end=2026-03-31',
+        headers={'X-OA-API-Key': app.config['OA_EXTERNAL_API_KEY']},
+    )
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert data[str(cancelled.id)] == {'current': 4, 'total': 6, 'is_ending': True}
+    assert data[str(sessions[3].id)] == {'current': 5, 'total': 6, 'is_ending': True}
+    assert str(legacy[1].id) in data and str(sessions[4].id) not in data